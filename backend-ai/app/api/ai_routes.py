@@ -2,11 +2,18 @@
 API Routes for AI queries and predictions
 """
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+import functools
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
 from app.models.schemas import (
     QueryRequest, QueryResponse,
-    RangePredictionRequest, RangePredictionResponse
+    RangePredictionRequest, RangePredictionResponse,
+    BatchRangePredictionRequest, BatchRangePredictionResponse,
+    AnalysisJobRequest
 )
+from app.services.coaching_service import coaching_service
 from app.services.llm_service import llm_service
 from app.services.rag_service import rag_service
 
@@ -19,7 +26,7 @@ async def process_query(request: QueryRequest):
     Routes query to appropriate RAG system and generates response
     """
     try:
-        result = llm_service.process_query(
+        result = await llm_service.aprocess_query(
             query=request.query,
             user_id=request.user_id
         )
@@ -38,20 +45,25 @@ async def process_query(request: QueryRequest):
 
 
 @router.post("/predict-range", response_model=RangePredictionResponse)
-async def predict_range(request: RangePredictionRequest):
+async def predict_range(request: RangePredictionRequest, narrate: bool = Query(False)):
     """
     Predict if user can reach destination with current battery
-    Uses both RAG systems for accurate prediction
+    Computed from trip statistics, the user's profile and the energy model;
+    with narrate=true the LLM also explains the numbers (slower)
     """
     try:
-        result = llm_service.predict_range(
+        predict = functools.partial(
+            llm_service.predict_range,
             user_id=request.user_id,
             start=request.start_location,
             end=request.end_location,
             current_battery=request.current_battery_percent,
             weather=request.weather,
-            traffic=request.traffic
+            traffic=request.traffic,
+            narrate=narrate
         )
+        # Off the event loop either way: store reads, and the similarity index builds on first use
+        result = await asyncio.to_thread(predict)
         
         return RangePredictionResponse(
             success=True,
@@ -60,6 +72,10 @@ async def predict_range(request: RangePredictionRequest):
             recommended_stops=result.get("charging_stops", []),
             confidence=result.get("confidence"),
             energy_estimate=result.get("energy_needed_kwh"),
+            energy_interval=result.get("energy_interval_kwh"),
+            verdict=result["estimate"]["verdict"],
+            distance_km=result["estimate"]["distance_km"],
+            arrival_battery_percent=result["estimate"]["arrival_battery_percent"],
             tips=result.get("personalized_tips", [])
         )
     
@@ -67,26 +83,80 @@ async def predict_range(request: RangePredictionRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/predict-range/batch", response_model=BatchRangePredictionResponse)
+async def predict_range_batch(request: BatchRangePredictionRequest):
+    """
+    Range checks for a fleet: verdict, energy needed, margin and arrival battery
+    per item, computed together from trip statistics and user profiles (no LLM).
+    With narrate=true, borderline items are also explained by the LLM.
+    """
+    try:
+        result = await asyncio.to_thread(
+            llm_service.predict_ranges, [item.model_dump() for item in request.items], request.narrate
+        )
+        return BatchRangePredictionResponse(success=True, **result)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/user/{user_id}/analysis")
-async def analyze_user_performance(user_id: str):
+async def analyze_user_performance(user_id: str, wait: float = Query(0, ge=0, le=120)):
     """
     AI-powered analysis of user's driving performance
     Compares with community average
+    
+    Served from the precomputed report (stale reports are refreshed in the
+    background). Without one, answers 202 with a job to poll, or waits up to
+    `wait` seconds for it.
     """
     try:
-        result = llm_service.analyze_performance(user_id=user_id)
+        report = coaching_service.report(user_id)
+        if report is None:
+            job = coaching_service.submit(user_id)
+            deadline = asyncio.get_running_loop().time() + wait
+            while job["status"] in ("queued", "running") and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.1)
+                job = coaching_service.job(job["job_id"])
+            if job["status"] != "done":
+                return JSONResponse(status_code=202, content={"success": True, **job})
+            report = coaching_service.report(user_id)
         
         return {
             "success": True,
-            "analysis": result["response"],
-            "metrics": result.get("metrics"),
-            "recommendations": result.get("recommendations")
+            "analysis": report["response"],
+            "metrics": report.get("metrics"),
+            "recommendations": report.get("recommendations"),
+            "generated_at": report["generated_at"],
+            "age_seconds": report["age_seconds"],
+            "stale": report["stale"],
+            "refresh_job_id": report["refresh_job_id"]
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/user/{user_id}/analysis/jobs", status_code=202)
+async def submit_analysis_job(user_id: str, request: Optional[AnalysisJobRequest] = None):
+    """
+    Queue a fresh coaching report; poll /api/analysis/jobs/{job_id} or pass a callback_url
+    """
+    job = coaching_service.submit(user_id, callback_url=request.callback_url if request else None)
+    return {"success": True, **job}
+
+
+@router.get("/analysis/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """
+    Status of a coaching report job (the report is included once it is done)
+    """
+    job = coaching_service.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"success": True, **job}
+
+
 @router.get("/user/{user_id}/profile")
 async def get_user_profile(user_id: str):
     """
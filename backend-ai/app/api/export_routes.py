@@ -0,0 +1,74 @@
+"""
+Routes for streaming data exports (NDJSON)
+"""
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.services.export_service import export_ndjson, ExportError
+
+router = APIRouter(prefix="/api/export", tags=["Export"])
+
+
+def _ndjson_response(export: str, fields: Optional[str], **kwargs) -> StreamingResponse:
+    try:
+        body = export_ndjson(
+            export,
+            fields=[field.strip() for field in fields.split(",") if field.strip()] if fields else None,
+            **kwargs
+        )
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+
+@router.get("/trips")
+async def export_trips(
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, gt=0),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    user_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """
+    Stream trips as NDJSON, e.g. ?start=Mumbai&end=Pune&since=2026-01&fields=trip_id,date,efficiency_kwh_per_100km
+    With a limit the last line is {"next_cursor": "..."}; pass it back as ?cursor= to continue
+    """
+    return _ndjson_response("trips", fields, cursor=cursor, limit=limit, start_location=start,
+                            end_location=end, user_id=user_id, since=since, until=until)
+
+
+@router.get("/profiles")
+async def export_profiles(
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, gt=0),
+    user_id: Optional[str] = None
+):
+    """
+    Stream user profiles as NDJSON
+    """
+    return _ndjson_response("profiles", fields, cursor=cursor, limit=limit, user_id=user_id)
+
+
+@router.get("/aggregates/{name}")
+async def export_aggregates(
+    name: str,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, gt=0),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """
+    Stream aggregate tables as NDJSON: routes (per-route totals), daily or monthly (rollup buckets)
+    """
+    if name not in ("routes", "daily", "monthly"):
+        raise HTTPException(status_code=404, detail=f"Unknown aggregate {name}")
+    return _ndjson_response(name, fields, cursor=cursor, limit=limit, start_location=start,
+                            end_location=end, since=since, until=until)
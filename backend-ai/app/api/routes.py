@@ -2,8 +2,10 @@
 Routes for routes and statistics
 """
 
+from typing import Optional
 from fastapi import APIRouter, HTTPException
 from app.services.rag_service import rag_service
+from app.services.trip_store import SEASONS
 
 router = APIRouter(prefix="/api", tags=["Routes & Stats"])
 
@@ -41,6 +43,42 @@ async def get_global_stats():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/trends/efficiency")
+async def get_efficiency_trend(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    granularity: str = "monthly",
+    group_by: str = "period",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    season: Optional[str] = None,
+    weather: Optional[str] = None,
+    traffic: Optional[str] = None
+):
+    """
+    Efficiency trend from precomputed daily / monthly rollups
+    e.g. ?start=Delhi&end=Chandigarh&season=winter or ?group_by=month,weather
+    """
+    if season is not None and season not in SEASONS:
+        raise HTTPException(status_code=400, detail=f"season must be one of {', '.join(SEASONS)}")
+    try:
+        trend = rag_service.get_efficiency_trend(
+            granularity=granularity,
+            group_by=tuple(key.strip() for key in group_by.split(",") if key.strip()),
+            start=start, end=end, since=since, until=until,
+            months=SEASONS.get(season), weather=weather, traffic=traffic
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "success": True,
+        "trend": trend
+    }
+
+
 @router.get("/charging-stations/nearby")
 async def find_nearby_charging_stations(
     lat: float,
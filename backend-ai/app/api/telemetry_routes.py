@@ -0,0 +1,49 @@
+"""
+Routes for vehicle telemetry ingestion
+"""
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from app.services.telemetry_service import telemetry_service, TelemetryError, SAMPLE_DTYPE
+
+router = APIRouter(prefix="/api", tags=["Telemetry"])
+
+@router.post("/telemetry")
+async def ingest_telemetry(request: Request):
+    """
+    Batched samples as NDJSON, one per line:
+    {"user_id": "user_001", "ts": 1760000000.0, "soc": 82.5, "speed_kmh": 64.0,
+     "elevation_m": 550, "temperature_c": 27, "location": "Mumbai"}
+    ("location" and "battery_kwh" are optional)
+    """
+    try:
+        result = telemetry_service.submit_ndjson(await request.body())
+    except TelemetryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **result}
+
+
+@router.post("/telemetry/{user_id}")
+async def ingest_telemetry_binary(user_id: str, request: Request, location: Optional[str] = None,
+                                  battery_kwh: Optional[float] = None):
+    """
+    Compact binary samples for one vehicle (application/octet-stream)
+    Each sample is 24 bytes, little-endian: ts f64, soc f32, speed_kmh f32, elevation_m f32, temperature_c f32
+    """
+    try:
+        result = telemetry_service.submit_binary(user_id, await request.body(), location, battery_kwh)
+    except TelemetryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **result}
+
+
+@router.get("/telemetry/stats")
+async def get_telemetry_stats():
+    """
+    Samples received, vehicles with open trips, trips completed
+    """
+    return {
+        "success": True,
+        "sample_bytes": SAMPLE_DTYPE.itemsize,
+        "stats": telemetry_service.stats()
+    }
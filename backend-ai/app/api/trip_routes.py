@@ -0,0 +1,51 @@
+"""
+Routes for trip ingestion
+"""
+
+from fastapi import APIRouter, HTTPException
+from app.models.schemas import TripRequest, TripBatchRequest, TripIngestResponse
+from app.services.ingest_service import ingest_service, trip_record, IngestQueueFull
+
+router = APIRouter(prefix="/api", tags=["Trips"])
+
+@router.post("/trips/add", response_model=TripIngestResponse, status_code=202)
+async def add_trip(request: TripRequest):
+    """
+    Queue one trip for the global RAG
+    Acknowledged immediately; becomes searchable after the next write-behind batch
+    """
+    return _enqueue([request])
+
+
+@router.post("/trips/batch", response_model=TripIngestResponse, status_code=202)
+async def add_trips(request: TripBatchRequest):
+    """
+    Queue a burst of trips (up to 1000 per request) for the global RAG
+    """
+    return _enqueue(request.trips)
+
+
+@router.get("/trips/ingest/stats")
+async def get_ingest_stats():
+    """
+    Ingest lag metrics: queue depth, oldest pending trip age, batch timings
+    """
+    return {
+        "success": True,
+        "stats": ingest_service.stats()
+    }
+
+
+def _enqueue(requests) -> TripIngestResponse:
+    trips = [trip_record(request) for request in requests]
+    try:
+        queue_depth = ingest_service.submit(trips)
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    return TripIngestResponse(
+        success=True,
+        accepted=len(trips),
+        trip_ids=[trip["trip_id"] for trip in trips],
+        queue_depth=queue_depth
+    )
@@ -3,7 +3,7 @@ Configuration settings for the application
 """
 
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # App
@@ -25,6 +25,59 @@ class Settings(BaseSettings):
     #               "paraphrase-MiniLM-L3-v2" (faster, 384 dims, -3% accuracy)
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     
+    # Embedding compression - fitted by setup_rag.py, applied to queries by RAGService
+    # "none" | "pca" | "truncate" (Matryoshka-style prefix); Chroma stores the reduced vectors as float32
+    EMBEDDING_COMPRESSION: str = "none"
+    EMBEDDING_COMPRESSED_DIM: int = 128
+    EMBEDDING_FIT_SAMPLE: int = 5000
+    EMBEDDING_RECALL_K: int = 10
+    EMBEDDING_MIN_RECALL: float = 0.9  # setup_rag.py fails below this recall@k
+    EMBEDDING_PROJECTION_FILE: str = "embedding_projection.npz"  # inside CHROMA_DB_PATH
+    
+    # Versioned index: setup_rag.py --rebuild writes <collection>__vN, then swaps the manifest
+    INDEX_MANIFEST_FILE: str = "index_manifest.json"  # inside CHROMA_DB_PATH
+    INDEX_POLL_SECONDS: float = 5.0   # how often RAGService checks for a newly published version
+    INDEX_KEEP_VERSIONS: int = 2      # current + previous; older versions are garbage-collected
+    INDEX_PARTITIONS: str = "region"  # "region": one global trip collection per origin region | "none"
+    
+    # Query router: below this cosine similarity to every intent centroid -> "general"
+    ROUTER_MIN_SIMILARITY: float = 0.35
+    
+    # Global retrieval source: "prototypes" (one aggregated doc per route/condition bucket)
+    # or "trips" (raw per-trip documents)
+    RAG_GLOBAL_SOURCE: str = "prototypes"
+    
+    # Concurrent retrieval: a branch that misses its timeout is dropped from the prompt
+    RAG_RETRIEVAL_WORKERS: int = 4
+    RAG_GLOBAL_TIMEOUT_SECONDS: float = 2.0
+    RAG_PERSONAL_TIMEOUT_SECONDS: float = 0.5
+    RAG_ROUTE_CANDIDATES: int = 512  # newest trips of a route re-ranked for a route-filtered trip query
+    RAG_SHARD_WORKERS: int = 4  # parallel partition queries when the origin is unknown (scatter-gather)
+    
+    # Trip ingest: write-behind batches flush every INGEST_BATCH_SIZE trips or INGEST_FLUSH_MS
+    INGEST_BATCH_SIZE: int = 256
+    INGEST_FLUSH_MS: int = 250
+    INGEST_QUEUE_MAX: int = 50000  # beyond this the API answers 503 instead of buffering
+    
+    # Personal profiles: last N trips per user, re-embedded at most once per debounce interval
+    PROFILE_RECENT_TRIPS: int = 10
+    PROFILE_REEMBED_DEBOUNCE_MS: int = 2000
+    
+    # Vehicle telemetry: samples are rolled up into trips; no movement for the gap ends a trip
+    TELEMETRY_TRIP_GAP_SECONDS: float = 300.0
+    TELEMETRY_MAX_CHARGE_MINUTES: float = 90.0  # charging keeps a trip open this long after the last movement
+    TELEMETRY_BUFFER_SAMPLES: int = 1024  # per-vehicle buffer; a full buffer is rolled up at once
+    TELEMETRY_SWEEP_SECONDS: float = 5.0  # idle buffers are rolled up at least this often
+    TELEMETRY_MIN_TRIP_KM: float = 1.0
+    
+    # Coaching reports (/api/user/{id}/analysis): precomputed in the background, refreshed when older
+    COACHING_MAX_AGE_HOURS: float = 24.0
+    COACHING_SWEEP_SECONDS: float = 3600.0  # how often users with missing / old reports are queued (0 = never)
+    COACHING_JOB_HISTORY: int = 1000  # finished jobs kept for polling
+    COACHING_CALLBACK_TIMEOUT: float = 10.0
+    # Hosts job callbacks may be sent to (a JSON list); empty = any host whose addresses are all public
+    COACHING_CALLBACK_ALLOWED_HOSTS: List[str] = []
+    
     # LLM (Using cached Orca Mini 3B model)
     LLM_MODEL: str = "orca-mini-3b-gguf2-q4_0.gguf"
     LLM_MAX_TOKENS: int = 180  # Reduced for concise, focused responses
@@ -34,6 +87,44 @@ class Settings(BaseSettings):
     DATASET_PATH: str = "./data"
     USERS_FILE: str = "dataset_users.json"
     TRIPS_FILE: str = "dataset_trips.json"
+    TRIP_STORE_FILE: str = "trips.db"  # SQLite (WAL) system of record for trips, inside DATASET_PATH
+    TRIP_STORE_POOL_SIZE: int = 4
+    # Columnar copy of the dataset (generate_dataset.py --format columnar); ingested trips are appended
+    COLUMNAR_DATASET: str = "dataset.cols"
+    # Efficiency rollups (route x weather x traffic per day / month): days pruned out are kept in their month
+    ROLLUP_DAILY_RETENTION_DAYS: int = 90
+    ROLLUP_MONTHLY_RETENTION_MONTHS: int = 0  # 0 = keep every month
+    # Streaming exports (/api/export/*): rows read per keyset page / written per chunk
+    EXPORT_PAGE_SIZE: int = 1000
+    # Efficiency percentiles (global / route / EV model / driving style): KLL sketch size, rank error ~1.7/k
+    QUANTILE_SKETCH_K: int = 200
+    # Log-linear energy model (least-squares statistics + coefficients), inside DATASET_PATH
+    ENERGY_MODEL_FILE: str = "energy_model.json"
+    # Ingested trips update the model's statistics at once; it is re-solved and saved every N trips or T seconds
+    ENERGY_MODEL_REFIT_TRIPS: int = 500
+    ENERGY_MODEL_REFIT_SECONDS: float = 60.0
+    # Similar trips for range prediction: weight per standardized feature (0 = ignore), and the
+    # penalty for another route (half for sharing one endpoint); a JSON object in the environment
+    SIMILAR_TRIP_WEIGHTS: Dict[str, float] = {
+        "route": 4.0, "distance_km": 2.0, "elevation_change_m": 1.0, "temperature_c": 1.0,
+        "traffic_delay_mins": 1.0, "avg_speed_kmh": 0.5, "style": 1.0, "start_battery_percent": 0.25,
+    }
+    # Snapshot of derived in-memory indexes (memory-mapped at startup instead of rebuilt), inside
+    # DATASET_PATH; rewritten at shutdown and every SNAPSHOT_INTERVAL_SECONDS if trips changed (0 = shutdown only)
+    SNAPSHOT_DIR: str = "snapshots"
+    SNAPSHOT_INTERVAL_SECONDS: float = 300.0
+    # Usable battery capacity (kWh) per EV model, and for a model not listed (range estimates,
+    # telemetry rollups); a JSON object in the environment
+    EV_BATTERY_KWH: Dict[str, float] = {
+        "Tata Nexon EV": 30.2, "MG ZS EV": 44.5, "Hyundai Kona": 39.2, "BYD Atto 3": 60.5,
+        "Tesla Model 3": 75.0, "Mercedes EQC": 80.0,
+    }
+    DEFAULT_BATTERY_KWH: float = 40.0
+    # Range estimates: battery to arrive with (below it = borderline), level suggested stops charge up to,
+    # LLM narrations per batch
+    RANGE_RESERVE_PERCENT: float = 10.0
+    RANGE_CHARGE_TO_PERCENT: float = 80.0
+    RANGE_BATCH_MAX_NARRATIONS: int = 10
     
     # OpenRouteService
     ORS_API_KEY: Optional[str] = None
@@ -45,5 +136,6 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         case_sensitive = True
+        extra = "ignore"  # a .env copied from an older .env.example may still set removed settings
 
 settings = Settings()
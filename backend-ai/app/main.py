@@ -5,7 +5,11 @@ Main FastAPI application
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.api import ai_routes, routes
+from app.api import ai_routes, routes, trip_routes, telemetry_routes, export_routes
+from app.services.coaching_service import coaching_service
+from app.services.ingest_service import ingest_service
+from app.services.telemetry_service import telemetry_service
+from app.services.rag_service import rag_service
 
 # Initialize FastAPI
 app = FastAPI(
@@ -26,6 +30,9 @@ app.add_middleware(
 # Include routers
 app.include_router(ai_routes.router)
 app.include_router(routes.router)
+app.include_router(trip_routes.router)
+app.include_router(telemetry_routes.router)
+app.include_router(export_routes.router)
 
 @app.get("/")
 async def root():
@@ -57,6 +64,11 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     print("\n👋 Shutting down API...")
+    coaching_service.close()
+    telemetry_service.close()  # finish open trips into the ingest queue
+    ingest_service.close()  # flush queued trips before the RAG service goes away
+    rag_service.save_snapshot()  # derived indexes as of the last ingested trip (next start maps them)
+    rag_service.close()
 
 
 if __name__ == "__main__":
@@ -2,9 +2,10 @@
 Pydantic models for request/response validation
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from app.utils.callback_url import validate_callback_url
 
 class QueryRequest(BaseModel):
     query: str = Field(..., description="User's question")
@@ -19,6 +20,32 @@ class RangePredictionRequest(BaseModel):
     weather: Optional[str] = "pleasant"
     traffic: Optional[str] = "moderate"
 
+class FleetRangeItem(RangePredictionRequest):
+    vehicle_id: Optional[str] = Field(None, description="Echoed back with the result")
+    distance_km: Optional[float] = Field(None, gt=0, description="Defaults to the route's average distance")
+    battery_capacity_kwh: Optional[float] = Field(None, gt=0, description="Defaults to the user's EV")
+
+class BatchRangePredictionRequest(BaseModel):
+    items: List[FleetRangeItem] = Field(..., min_length=1, max_length=1000)
+    narrate: bool = Field(False, description="Add the LLM range analysis to borderline items")
+
+class ChargingStopRequest(BaseModel):
+    network: str
+    power_kw: float = Field(..., gt=0)
+    duration_mins: float = Field(..., ge=0)
+    location: Optional[str] = None
+    cost: Optional[float] = None
+    charge_added: Optional[float] = None
+
+class AnalysisJobRequest(BaseModel):
+    callback_url: Optional[str] = Field(
+        None, description="POSTed the finished job (with its report); http(s) on a public or allowed host")
+
+    @field_validator("callback_url")
+    @classmethod
+    def _check_callback_url(cls, url: Optional[str]) -> Optional[str]:
+        return validate_callback_url(url) if url else url
+
 class TripRequest(BaseModel):
     user_id: str
     start_location: str
@@ -31,6 +58,27 @@ class TripRequest(BaseModel):
     driving_style: str
     start_battery_percent: float = Field(..., ge=0, le=100)
     end_battery_percent: float = Field(..., ge=0, le=100)
+    # Optional detail (same fields as the dataset); missing values get neutral defaults
+    trip_id: Optional[str] = Field(None, description="Generated when omitted")
+    date: Optional[datetime] = Field(None, description="Defaults to the time of ingest")
+    duration_hours: Optional[float] = Field(None, gt=0)
+    avg_speed_kmh: Optional[float] = Field(None, gt=0)
+    elevation_change_m: float = 0
+    temperature_c: float = 25
+    traffic_delay_mins: float = Field(0, ge=0)
+    regen_braking_usage: float = Field(0.0, ge=0, le=1)
+    is_highway: bool = False
+    avg_acceleration: float = 0.0
+    charging_stops: List[ChargingStopRequest] = []
+
+class TripBatchRequest(BaseModel):
+    trips: List[TripRequest] = Field(..., min_length=1, max_length=1000)
+
+class TripIngestResponse(BaseModel):
+    success: bool
+    accepted: int
+    trip_ids: List[str]
+    queue_depth: int
 
 class QueryResponse(BaseModel):
     success: bool
@@ -42,13 +90,22 @@ class QueryResponse(BaseModel):
 
 class RangePredictionResponse(BaseModel):
     success: bool
-    can_reach: bool
+    can_reach: Optional[bool] = Field(None, description="None when the route distance is unknown")
     prediction: str
     recommended_stops: Optional[List[Dict[str, Any]]] = []
     confidence: Optional[float] = None
     energy_estimate: Optional[float] = None
+    energy_interval: Optional[List[float]] = Field(None, description="95% range of energy_estimate (kWh)")
+    verdict: Optional[str] = Field(None, description="reachable / borderline / unreachable / unknown")
+    distance_km: Optional[float] = None
+    arrival_battery_percent: Optional[float] = None
     tips: Optional[List[str]] = []
 
+class BatchRangePredictionResponse(BaseModel):
+    success: bool
+    results: List[Dict[str, Any]]
+    summary: Dict[str, int]
+
 class UserProfile(BaseModel):
     user_id: str
     ev_model: str
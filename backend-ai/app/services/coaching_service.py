@@ -0,0 +1,213 @@
+"""
+Coaching Service - precomputed driver coaching reports behind /api/user/{id}/analysis
+
+A background worker runs the LLM analysis and stores each report in the trip
+store with the time it was generated. Reports are refreshed when a user's profile
+changes, by a periodic sweep over users whose report is missing or too old, and
+on demand through the job API (poll or callback).
+"""
+
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import httpx
+from app.core.config import settings
+from app.services.llm_service import llm_service
+from app.services.rag_service import rag_service
+from app.utils.callback_url import validate_callback_url
+
+# Lower runs first: someone is waiting > a profile changed > periodic refresh
+PRIORITY_ON_DEMAND = 0
+PRIORITY_PROFILE = 1
+PRIORITY_SWEEP = 2
+
+
+class CoachingService:
+    """🚀 OPTIMIZATION: LLM analysis moved out of the request path
+
+    At most one queued job per user (a new request joins it, possibly raising its
+    priority); a report that changes while being generated gets a follow-up job.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CoachingService, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # recent jobs, oldest first
+        self._queued: Dict[str, str] = {}   # user_id -> job waiting in the queue
+        self._running: Dict[str, str] = {}  # user_id -> job being generated
+        self._stop = threading.Event()
+
+        rag_service.profiles.add_listener(self.profiles_changed)
+
+        self._worker = threading.Thread(target=self._run, name="coaching-worker", daemon=True)
+        self._worker.start()
+        self._sweeper = None
+        if settings.COACHING_SWEEP_SECONDS > 0:
+            self._sweeper = threading.Thread(target=self._sweep, name="coaching-sweep", daemon=True)
+            self._sweeper.start()
+
+        self._initialized = True
+
+    # ------------------------------------------------------------------ jobs
+
+    def submit(self, user_id: str, priority: int = PRIORITY_ON_DEMAND,
+               callback_url: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a report refresh for a user; returns the job (joined if one is queued)"""
+        with self._lock:
+            job_id = self._queued.get(user_id)
+            if job_id is not None:
+                job = self._jobs[job_id]
+                if callback_url:
+                    job["callbacks"].append(callback_url)
+                if priority < job["priority"]:
+                    job["priority"] = priority
+                    self._queue.put((priority, next(self._sequence), job_id))  # stale entry is skipped
+                return self._view(job)
+
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "user_id": user_id,
+                "status": "queued",
+                "priority": priority,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "callbacks": [callback_url] if callback_url else [],
+            }
+            self._jobs[job["job_id"]] = job
+            self._queued[user_id] = job["job_id"]
+            while len(self._jobs) > settings.COACHING_JOB_HISTORY:
+                oldest = next(iter(self._jobs.values()))
+                if oldest["status"] in ("queued", "running"):
+                    break  # never forget a job that is still pending
+                self._jobs.popitem(last=False)
+        self._queue.put((priority, next(self._sequence), job["job_id"]))
+        return self._view(job)
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status; a finished job carries the report it produced"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            view = self._view(job)
+        if view["status"] == "done":
+            stored = rag_service.trips.report(view["user_id"])
+            if stored is not None:
+                view["report"] = self._report_view(*stored)
+        return view
+
+    @staticmethod
+    def _view(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in job.items() if key not in ("callbacks", "priority")}
+
+    def profiles_changed(self, user_ids):
+        for user_id in user_ids:
+            self.submit(user_id, PRIORITY_PROFILE)
+
+    # ------------------------------------------------------------------ reports
+
+    @staticmethod
+    def _report_view(report: Dict[str, Any], generated_at: float) -> Dict[str, Any]:
+        age = max(time.time() - generated_at, 0.0)
+        return {
+            **report,
+            "generated_at": generated_at,
+            "age_seconds": round(age, 1),
+            "stale": age > settings.COACHING_MAX_AGE_HOURS * 3600,
+        }
+
+    def report(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Stored report with its freshness (None if there is none yet)
+
+        A stale report is still returned; a refresh is queued behind it.
+        """
+        stored = rag_service.trips.report(user_id)
+        if stored is None:
+            return None
+        report = self._report_view(*stored)
+        with self._lock:
+            refreshing = self._queued.get(user_id) or self._running.get(user_id)
+        if report["stale"] and refreshing is None:
+            refreshing = self.submit(user_id, PRIORITY_PROFILE)["job_id"]
+        report["refresh_job_id"] = refreshing
+        return report
+
+    # ------------------------------------------------------------------ workers
+
+    def _run(self):
+        while True:
+            priority, _, job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] != "queued" or priority != job["priority"]:
+                    continue  # joined / re-prioritized entry already handled
+                user_id = job["user_id"]
+                del self._queued[user_id]
+                self._running[user_id] = job_id
+                job["status"], job["started_at"] = "running", time.time()
+
+            try:
+                result = llm_service.analyze_performance(user_id)
+                rag_service.trips.save_report(user_id, result, generated_at=time.time())
+                status, error = "done", None
+            except Exception as e:
+                status, error = "failed", str(e)
+                print(f"❌ Coaching report for {user_id} failed: {e}")
+
+            with self._lock:
+                job.update(status=status, error=error, finished_at=time.time())
+                if self._running.get(user_id) == job_id:
+                    del self._running[user_id]
+                callbacks = list(job["callbacks"])
+            for url in callbacks:
+                self._notify(url, job_id)
+
+    def _notify(self, url: str, job_id: str):
+        try:
+            validate_callback_url(url)  # again: the host may resolve elsewhere by now
+            # Redirects are not followed (they could point back inside the network)
+            httpx.post(url, json=self.job(job_id), timeout=settings.COACHING_CALLBACK_TIMEOUT,
+                       follow_redirects=False)
+        except Exception as e:
+            print(f"⚠️  Coaching callback to {url} failed: {e}")
+
+    def _sweep(self):
+        """Queue every user whose report is missing or older than COACHING_MAX_AGE_HOURS"""
+        while True:
+            try:
+                cutoff = time.time() - settings.COACHING_MAX_AGE_HOURS * 3600
+                for user_id in rag_service.trips.stale_report_users(cutoff):
+                    self.submit(user_id, PRIORITY_SWEEP)
+            except Exception as e:
+                print(f"⚠️  Coaching sweep failed: {e}")
+            if self._stop.wait(settings.COACHING_SWEEP_SECONDS):
+                return
+
+    def close(self):
+        """Stop the workers (a report being generated is abandoned, not stored)"""
+        self._stop.set()
+        self._queue.put((-1, -1, None))
+
+
+# Singleton instance
+coaching_service = CoachingService()
@@ -0,0 +1,119 @@
+"""
+Efficiency Sketches - streaming percentiles of trip efficiency
+
+One KLL sketch of efficiency_kwh_per_100km for all trips, and one per route, EV
+model and driving style. Ingested trips are folded in as they are stored;
+setup_rag.py rebuilds every sketch from the trip store. Sketches are persisted in
+the trip store, so a restart loads them instead of re-reading the trips.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.utils.quantile_sketch import KLLSketch
+
+GLOBAL = "global"
+
+
+def sketch_names(start: str, end: str, driving_style: Optional[str], ev_model: Optional[str]) -> List[str]:
+    """Every sketch one trip belongs to"""
+    names = [GLOBAL, f"route:{start} → {end}"]
+    if driving_style:
+        names.append(f"driving_style:{driving_style}")
+    if ev_model:
+        names.append(f"ev_model:{ev_model}")
+    return names
+
+
+class EfficiencySketches:
+    """🚀 OPTIMIZATION: Percentile lookups in constant memory and time, however many trips
+
+    Re-uploads of a stored trip are not added again; an edited trip keeps its old
+    value until the next rebuild (sketches only support additions).
+    """
+
+    def __init__(self, store, k: Optional[int] = None):
+        self._store = store
+        self.k = k or settings.QUANTILE_SKETCH_K
+        self._lock = threading.Lock()
+        self._sketches: Optional[Dict[str, KLLSketch]] = None  # loaded on first use
+        self._ev_models: Dict[str, Optional[str]] = {}
+
+    def _loaded(self) -> Dict[str, KLLSketch]:
+        if self._sketches is None:
+            self._sketches = {name: KLLSketch.from_json(payload)
+                              for name, payload in self._store.load_sketches().items()}
+        return self._sketches
+
+    def _ev_model(self, user_id: str) -> Optional[str]:
+        if user_id not in self._ev_models:
+            user = self._store.user(user_id)
+            self._ev_models[user_id] = user.get("ev_model") if user else None
+        return self._ev_models[user_id]
+
+    def _add(self, sketches: Dict[str, KLLSketch], names: Iterable[str], efficiency: float):
+        for name in names:
+            sketch = sketches.get(name)
+            if sketch is None:
+                sketch = sketches[name] = KLLSketch(self.k)
+            sketch.update(efficiency)
+
+    def record_trips(self, trips: List[Dict]):
+        """Fold newly stored trips in and persist the sketches they touched"""
+        if not trips:
+            return
+        touched = set()
+        with self._lock:
+            sketches = self._loaded()
+            for trip in trips:
+                names = sketch_names(trip["start_location"], trip["end_location"],
+                                     trip.get("driving_style"), self._ev_model(trip["user_id"]))
+                self._add(sketches, names, trip["efficiency_kwh_per_100km"])
+                touched.update(names)
+            payload = {name: sketches[name].to_json() for name in touched}
+        self._store.save_sketches(payload)
+
+    def rebuild(self) -> int:
+        """Recompute every sketch from the trip store; returns how many there are"""
+        sketches: Dict[str, KLLSketch] = {}
+        for start, end, driving_style, efficiency, ev_model in self._store.iter_efficiency_rows():
+            self._add(sketches, sketch_names(start, end, driving_style, ev_model), efficiency)
+        self._store.save_sketches({name: sketch.to_json() for name, sketch in sketches.items()}, replace=True)
+        with self._lock:
+            self._sketches = sketches
+            self._ev_models.clear()
+        return len(sketches)
+
+    def reload(self):
+        """Drop the in-memory copies (another process rebuilt them)"""
+        with self._lock:
+            self._sketches = None
+            self._ev_models.clear()
+
+    def percentile(self, name: str, efficiency: float) -> Optional[float]:
+        """Share of the group's trips (percent) that used more energy per 100km"""
+        with self._lock:
+            sketch = self._loaded().get(name)
+            if not sketch:
+                return None
+            return round(100 * (1 - sketch.rank(efficiency)), 1)
+
+    def standing(self, efficiency: float, route: Optional[tuple] = None, ev_model: Optional[str] = None,
+                 driving_style: Optional[str] = None) -> Dict[str, Optional[float]]:
+        """Percentiles against every trip and against the driver's own route, EV model and style"""
+        standing = {"global": self.percentile(GLOBAL, efficiency)}
+        if route:
+            standing["route"] = self.percentile(f"route:{route[0]} → {route[1]}", efficiency)
+        if ev_model:
+            standing["ev_model"] = self.percentile(f"ev_model:{ev_model}", efficiency)
+        if driving_style:
+            standing["driving_style"] = self.percentile(f"driving_style:{driving_style}", efficiency)
+        return standing
+
+    def quantiles(self, name: str, fractions: Iterable[float] = (0.1, 0.5, 0.9)) -> Dict[str, float]:
+        """e.g. {"p10": ..., "p50": ..., "p90": ...} for one sketch"""
+        with self._lock:
+            sketch = self._loaded().get(name)
+            if not sketch:
+                return {}
+            return {f"p{round(q * 100)}": round(sketch.quantile(q), 2) for q in fractions}
@@ -0,0 +1,249 @@
+"""
+Energy Model - log-linear energy consumption fitted on the trip store
+
+log(kWh/100km) = intercept + driving style + weather + traffic + EV model
+                 + b1 * log(1 + |elevation change| / 1000) + b2 * log(battery health / 100)
+
+the multiplicative model generate_dataset.generate_trip draws trips from. The
+categorical terms are one-hot (ridge-regularized). A term the request does not
+know - or a category value the model has not seen - gets its average contribution
+over the fitted trips. Only the least-squares sufficient statistics (X'X,
+X'y, y'y, n) are kept: a new trip is added to them and the coefficients are
+re-solved every ENERGY_MODEL_REFIT_TRIPS trips or ENERGY_MODEL_REFIT_SECONDS
+(and at shutdown), so the model follows ingest without revisiting old trips.
+They are stored as a small JSON file next to the dataset (ENERGY_MODEL_FILE).
+The intercept is not penalized, so few trips do not pull the baseline to zero.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+
+CATEGORIES = ("driving_style", "weather", "traffic", "ev_model")
+RIDGE = 1.0
+Z_95 = 1.96
+
+
+def _group(feature: str) -> str:
+    return feature.split("=", 1)[0]
+
+
+def energy_features(driving_style: Optional[str], weather: Optional[str], traffic: Optional[str],
+                    elevation_change_m: Optional[float], ev_model: Optional[str],
+                    battery_health: Optional[float]) -> Dict[str, float]:
+    """Non-zero features of one trip / request (unknown values are left out)"""
+    features = {"intercept": 1.0}
+    for category, value in zip(CATEGORIES, (driving_style, weather, traffic, ev_model)):
+        if value and value != "unknown":
+            features[f"{category}={str(value).lower()}"] = 1.0
+    if elevation_change_m is not None:
+        features["elevation"] = math.log1p(abs(elevation_change_m) / 1000)
+    if battery_health:
+        features["battery_health"] = math.log(battery_health / 100)
+    return features
+
+
+class EnergyModel:
+    """🚀 OPTIMIZATION: A prediction is a dot product over ~7 non-zero features
+
+    The solved coefficients and their covariance are cached after every update,
+    so predict() is tens of microseconds of plain Python, no NumPy call.
+    """
+
+    def __init__(self, store, path: Optional[str] = None):
+        self._store = store
+        self.path = path or os.path.join(settings.DATASET_PATH, settings.ENERGY_MODEL_FILE)
+        self._lock = threading.Lock()
+        self._ev_models: Dict[str, tuple] = {}
+        self._pending = 0  # trips accumulated since the last solve
+        self._solved_at = time.monotonic()
+        self._reset_statistics()
+        self.reload()
+
+    def _reset_statistics(self):
+        self.features: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._xtx = np.zeros((0, 0))
+        self._xty = np.zeros(0)
+        self._yty = 0.0
+        self.n = 0
+        # (coefficients, covariance, residual std, average term per group), swapped whole
+        self._fit: Optional[tuple] = None
+
+    def _column(self, name: str) -> int:
+        """Feature index, growing the statistics for a category value not seen before"""
+        column = self._index.get(name)
+        if column is None:
+            column = self._index[name] = len(self.features)
+            self.features.append(name)
+            self._xtx = np.pad(self._xtx, ((0, 1), (0, 1)))
+            self._xty = np.pad(self._xty, (0, 1))
+        return column
+
+    def _accumulate(self, rows: Iterable[Tuple[Dict[str, float], float]]):
+        for features, efficiency in rows:
+            if not efficiency or efficiency <= 0:
+                continue
+            columns = [self._column(name) for name in features]
+            values = np.fromiter(features.values(), dtype=np.float64, count=len(features))
+            y = math.log(efficiency)
+            self._xtx[np.ix_(columns, columns)] += np.outer(values, values)
+            self._xty[columns] += values * y
+            self._yty += y * y
+            self.n += 1
+
+    def _solve(self):
+        """Coefficients, residual spread and coefficient covariance from the statistics"""
+        self._pending, self._solved_at = 0, time.monotonic()
+        p = len(self.features)
+        if self.n <= p:
+            self._fit = None
+            return
+        penalty = RIDGE * np.eye(p)
+        penalty[self._index["intercept"], self._index["intercept"]] = 0.0  # shrink the effects, not the baseline
+        inverse = np.linalg.inv(self._xtx + penalty)
+        beta = inverse @ self._xty
+        residual = self._yty - 2 * beta @ self._xty + beta @ self._xtx @ beta
+        variance = max(residual / (self.n - p), 0.0)
+        covariance = variance * inverse
+        averages: Dict[str, float] = {}
+        for i, name in enumerate(self.features):  # the intercept column of X'X sums every feature
+            averages[_group(name)] = averages.get(_group(name), 0.0) + self._xtx[0, i] / self.n * beta[i]
+        self._fit = (
+            dict(zip(self.features, beta.tolist())),
+            {a: dict(zip(self.features, covariance[i].tolist())) for i, a in enumerate(self.features)},
+            math.sqrt(variance),
+            averages,
+        )
+
+    # ------------------------------------------------------------------ persistence
+
+    def _save(self):
+        coefficients, _, residual_std, _ = self._fit or ({}, None, None, None)
+        payload = {
+            "n": self.n,
+            "features": self.features,
+            "coefficients": {name: round(value, 6) for name, value in coefficients.items()},  # for people
+            "residual_std": residual_std,
+            "xtx": self._xtx.tolist(),
+            "xty": self._xty.tolist(),
+            "yty": self._yty,
+        }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp, self.path)  # readers never see a half-written file
+
+    def reload(self):
+        """Load the coefficient file (setup_rag.py or another process refitted it)"""
+        with self._lock:
+            self._ev_models.clear()
+            if not os.path.exists(self.path):
+                return
+            with open(self.path) as f:
+                payload = json.load(f)
+            self._reset_statistics()
+            self.features = payload["features"]
+            self._index = {name: i for i, name in enumerate(self.features)}
+            self._xtx = np.array(payload["xtx"], dtype=np.float64).reshape(len(self.features), len(self.features))
+            self._xty = np.array(payload["xty"], dtype=np.float64)
+            self._yty, self.n = payload["yty"], payload["n"]
+            self._solve()
+
+    # ------------------------------------------------------------------ fitting
+
+    def rebuild(self) -> int:
+        """Fit from every trip in the store and write the coefficient file; returns the trip count"""
+        with self._lock:
+            self._reset_statistics()
+            self._accumulate(
+                (energy_features(style, weather, traffic, elevation, ev_model, health), efficiency)
+                for style, weather, traffic, elevation, efficiency, ev_model, health in self._store.iter_energy_rows()
+            )
+            self._solve()
+            self._save()
+            self._ev_models.clear()
+            return self.n
+
+    def _vehicle(self, user_id: str) -> tuple:
+        if user_id not in self._ev_models:
+            user = self._store.user(user_id)
+            self._ev_models[user_id] = (user.get("ev_model"), user.get("battery_health")) if user else (None, None)
+        return self._ev_models[user_id]
+
+    def record_trips(self, trips: List[Dict]):
+        """Online update with newly stored trips; re-solved and persisted every
+        ENERGY_MODEL_REFIT_TRIPS trips or ENERGY_MODEL_REFIT_SECONDS, whichever comes first"""
+        if not trips:
+            return
+        with self._lock:
+            rows = []
+            for trip in trips:
+                ev_model, health = self._vehicle(trip["user_id"])
+                rows.append((energy_features(trip.get("driving_style"), trip.get("weather"), trip.get("traffic"),
+                                             trip.get("elevation_change_m"), ev_model, health),
+                             trip.get("efficiency_kwh_per_100km")))
+            self._accumulate(rows)
+            self._pending += len(rows)
+            if (self._pending >= settings.ENERGY_MODEL_REFIT_TRIPS
+                    or time.monotonic() - self._solved_at >= settings.ENERGY_MODEL_REFIT_SECONDS):
+                self._solve()
+                self._save()
+
+    def flush(self):
+        """Re-solve and persist trips recorded since the last solve (shutdown)"""
+        with self._lock:
+            if self._pending:
+                self._solve()
+                self._save()
+
+    # ------------------------------------------------------------------ prediction
+
+    def relative(self, weather: Optional[str] = None, traffic: Optional[str] = None,
+                 elevation_change_m: Optional[float] = None) -> float:
+        """Energy multiplier of these conditions against the fitted trips' average conditions
+        (1.0 for anything unknown) - scales a driver's own average efficiency"""
+        fit = self._fit
+        if fit is None:
+            return 1.0
+        coefficients, _, _, averages = fit
+        log_factor = 0.0
+        for name, value in energy_features(None, weather, traffic, elevation_change_m, None, None).items():
+            if name != "intercept" and name in coefficients:
+                log_factor += coefficients[name] * value - averages[_group(name)]
+        return math.exp(log_factor)
+
+    def spread(self) -> Optional[float]:
+        """Half-width of the 95% prediction interval of log(energy) (residuals only)"""
+        fit = self._fit
+        return Z_95 * fit[2] if fit is not None else None
+
+    def predict(self, distance_km: float, driving_style: Optional[str] = None, weather: Optional[str] = None,
+                traffic: Optional[str] = None, elevation_change_m: Optional[float] = None,
+                ev_model: Optional[str] = None, battery_health: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """Energy for a trip with a 95% prediction interval (None until the model is fitted)"""
+        fit = self._fit
+        if fit is None:
+            return None
+        coefficients, covariance, residual_std, averages = fit
+        features = [(name, value) for name, value in energy_features(
+            driving_style, weather, traffic, elevation_change_m, ev_model, battery_health).items()
+            if name in coefficients]
+        known = {_group(name) for name, _ in features}
+        # Missing terms add their average (its own uncertainty is left out of the interval)
+        log_efficiency = (sum(coefficients[name] * value for name, value in features)
+                          + sum(average for group, average in averages.items() if group not in known))
+        parameter_variance = sum(covariance[a][b] * va * vb for a, va in features for b, vb in features)
+        spread = Z_95 * math.sqrt(residual_std ** 2 + max(parameter_variance, 0.0))
+        efficiency = math.exp(log_efficiency)
+        return {
+            "efficiency_kwh_per_100km": round(efficiency, 2),
+            "energy_needed_kwh": round(distance_km * efficiency / 100, 1),
+            "energy_low_kwh": round(distance_km * math.exp(log_efficiency - spread) / 100, 1),
+            "energy_high_kwh": round(distance_km * math.exp(log_efficiency + spread) / 100, 1),
+        }
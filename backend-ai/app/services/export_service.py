@@ -0,0 +1,91 @@
+"""
+Export Service - NDJSON streaming exports of trips, profiles and aggregates
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Dict, Iterator, Optional, Sequence
+from app.core.config import settings
+from app.services.rag_service import rag_service
+from app.services.trip_store import EXPORTS, export_key
+
+# Filters each export understands (route / user equality, since / until on its time column)
+FILTERS = {
+    "trips": ("start_location", "end_location", "user_id", "since", "until"),
+    "profiles": ("user_id",),
+    "routes": ("start_location", "end_location"),
+    "daily": ("start_location", "end_location", "since", "until"),
+    "monthly": ("start_location", "end_location", "since", "until"),
+}
+
+
+class ExportError(ValueError):
+    """Bad export request: unknown field / filter or a foreign cursor (answered with 400)"""
+
+
+def encode_cursor(export: str, key: Sequence) -> str:
+    payload = json.dumps({"export": export, "after": list(key)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(export: str, cursor: str) -> list:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        after = payload["after"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ExportError("Invalid cursor")
+    # Bound as SQL parameters once the response has started - a bad key must fail here
+    if not isinstance(after, list) or not all(isinstance(value, (str, int, float)) for value in after):
+        raise ExportError("Invalid cursor")
+    if payload.get("export") != export:
+        raise ExportError(f"Cursor belongs to another export ({payload.get('export')})")
+    return after
+
+
+def export_ndjson(export: str, fields: Optional[Sequence[str]] = None, cursor: Optional[str] = None,
+                  limit: Optional[int] = None, **filters: Any) -> Iterator[bytes]:
+    """Validate an export request and return its NDJSON body
+
+    Everything that can fail is checked here, before the response starts. With a
+    limit, a final {"next_cursor": ...} line resumes the export where it stopped.
+    """
+    if export not in EXPORTS:
+        raise ExportError(f"Unknown export {export}")
+    columns = EXPORTS[export][1]
+    fields = list(fields or columns)
+    unknown = [field for field in fields if field not in columns]
+    if unknown:
+        raise ExportError(f"Unknown field(s) for {export}: {', '.join(unknown)}")
+    filters = {name: value for name, value in filters.items() if value is not None}
+    unsupported = [name for name in filters if name not in FILTERS[export]]
+    if unsupported:
+        raise ExportError(f"{export} cannot be filtered by {', '.join(unsupported)}")
+    after = decode_cursor(export, cursor) if cursor else None
+    if after is not None and len(after) != len(export_key(export, filters)):
+        raise ExportError("Cursor does not match these filters")
+    return _stream(export, fields, after, limit, filters)
+
+
+def _stream(export: str, fields: Sequence[str], after: Optional[Sequence], limit: Optional[int],
+            filters: Dict[str, Any]) -> Iterator[bytes]:
+    """🚀 OPTIMIZATION: One keyset page in memory at a time, one chunk per page
+
+    The server pulls the next chunk only once the client has taken the previous
+    one, so a slow consumer throttles the reads instead of buffering the export.
+    """
+    since, until = filters.pop("since", None), filters.pop("until", None)
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = settings.EXPORT_PAGE_SIZE if remaining is None else min(settings.EXPORT_PAGE_SIZE, remaining)
+        records, last = rag_service.trips.export_page(
+            export, fields, after=after, limit=page_size, equals=filters, since=since, until=until
+        )
+        if records:
+            yield "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        if len(records) < page_size:
+            return
+        after = last
+        if remaining is not None:
+            remaining -= len(records)
+    yield (json.dumps({"next_cursor": encode_cursor(export, after)}) + "\n").encode("utf-8")
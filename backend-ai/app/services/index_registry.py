@@ -0,0 +1,155 @@
+"""
+Index Registry - versioned ChromaDB collections behind an atomically swapped manifest
+"""
+
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+from app.core.config import settings
+
+# Logical collection names (what the code asks for)
+COLLECTIONS = ("global_trip_knowledge", "personal_driving_patterns", "global_route_prototypes")
+
+# With INDEX_PARTITIONS=region the global trips are split into one collection per
+# origin region (<global>_<region>); an unpartitioned index has the single ALL shard
+PARTITIONED = "global_trip_knowledge"
+ALL_PARTITIONS = "all"
+
+_VERSION_RE = re.compile(r"^(?P<logical>.+)__v(?P<version>\d+)$")
+
+
+def versioned_name(logical: str, version: int) -> str:
+    return f"{logical}__v{version}"
+
+
+def partition_name(partition: str) -> str:
+    return f"{PARTITIONED}_{partition}"
+
+
+def projection_file(version: int) -> str:
+    stem, ext = os.path.splitext(settings.EMBEDDING_PROJECTION_FILE)
+    return f"{stem}__v{version}{ext}"
+
+
+class IndexRegistry:
+    """Maps logical collection names to the physical version currently being served
+
+    Rebuilds write to <name>__vN and only become visible when publish() replaces the
+    manifest (os.replace is atomic), so readers never see a half-built index.
+    Without a manifest the unversioned collections (version 0) are served as before.
+    """
+
+    def __init__(self, client, path: Optional[str] = None):
+        self.client = client
+        self.path = path or os.path.join(settings.CHROMA_DB_PATH, settings.INDEX_MANIFEST_FILE)
+
+    def read(self) -> Dict:
+        """Current manifest: {"version", "collections": {logical: physical}, "projection",
+        "published": [every version published, oldest first]} plus "partitions":
+        {region: physical} for a partitioned global index
+        """
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            legacy_projection = settings.EMBEDDING_PROJECTION_FILE
+            has_projection = os.path.exists(os.path.join(settings.CHROMA_DB_PATH, legacy_projection))
+            return {
+                "version": 0,
+                "collections": {name: name for name in COLLECTIONS},
+                "projection": legacy_projection if has_projection else None,
+            }
+
+    @staticmethod
+    def global_shards(manifest: Dict) -> Dict[str, str]:
+        """Partition -> physical collection of the global trips ({ALL_PARTITIONS: ...} if unpartitioned)"""
+        return manifest.get("partitions") or {ALL_PARTITIONS: manifest["collections"][PARTITIONED]}
+
+    def stamp(self) -> Optional[int]:
+        """Cheap change marker for pollers (manifest mtime)"""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def projection_path(self, manifest: Optional[Dict] = None) -> Optional[str]:
+        projection = (manifest or self.read()).get("projection")
+        return os.path.join(settings.CHROMA_DB_PATH, projection) if projection else None
+
+    def _physical_versions(self) -> Dict[str, int]:
+        """Every versioned physical collection in the store -> its version"""
+        versions = {}
+        for collection in self.client.list_collections():
+            name = getattr(collection, "name", collection)  # Collection (0.5) or str (0.6+)
+            match = _VERSION_RE.match(name)
+            if match and (match.group("logical") in COLLECTIONS or
+                          match.group("logical").startswith(PARTITIONED + "_")):
+                versions[name] = int(match.group("version"))
+            elif name in COLLECTIONS:
+                versions[name] = 0
+        return versions
+
+    def next_version(self) -> int:
+        """A version number no existing (published or abandoned) build uses"""
+        used = list(self._physical_versions().values()) + [self.read()["version"]]
+        return max(used) + 1
+
+    @staticmethod
+    def published_versions(manifest: Dict) -> List[int]:
+        """Versions that have been served, oldest first (a manifest written before the
+        history was recorded only knows its own version)"""
+        return list(manifest.get("published") or [manifest["version"]])
+
+    def publish(self, version: int, projection: Optional[str] = None,
+                partitions: Optional[List[str]] = None):
+        """Atomically point every logical name (and global partition) at version"""
+        previous = self.read()
+        published = [v for v in self.published_versions(previous) if v != version] + [version]
+        manifest = {
+            "version": version,
+            "collections": {name: versioned_name(name, version) for name in COLLECTIONS
+                            if not (partitions and name == PARTITIONED)},
+            "partitions": {partition: versioned_name(partition_name(partition), version)
+                           for partition in partitions or []},
+            "projection": projection,
+            "published": published,
+            "published_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def garbage_collect(self, keep: Optional[int] = None) -> List[str]:
+        """Drop versions other than the newest `keep` published ones
+
+        The previous published version is kept by default so servers that have not
+        polled the manifest yet keep answering. Builds abandoned before publishing are
+        dropped once a newer version is current; unpublished builds newer than current
+        (possibly still running) are left alone.
+        """
+        keep = settings.INDEX_KEEP_VERSIONS if keep is None else keep
+        manifest = self.read()
+        current = manifest["version"]
+        kept = set(sorted(self.published_versions(manifest))[-max(keep, 1):]) | {current}
+
+        def droppable(version: int) -> bool:
+            return version < current and version not in kept
+
+        dropped = []
+        for name, version in sorted(self._physical_versions().items()):
+            if droppable(version):
+                self.client.delete_collection(name)
+                dropped.append(name)
+
+        # Projections belong to their version (legacy unversioned file = version 0)
+        stem, ext = os.path.splitext(settings.EMBEDDING_PROJECTION_FILE)
+        projection_re = re.compile(rf"^{re.escape(stem)}(?:__v(\d+))?{re.escape(ext)}$")
+        for filename in os.listdir(settings.CHROMA_DB_PATH):
+            match = projection_re.match(filename)
+            if match and droppable(int(match.group(1) or 0)):
+                os.remove(os.path.join(settings.CHROMA_DB_PATH, filename))
+
+        return dropped
@@ -0,0 +1,251 @@
+"""
+Ingest Service - write-behind batching of uploaded trips into the global RAG
+"""
+
+import queue
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, List
+from app.core.config import settings
+from app.models.schemas import TripRequest
+from app.services.rag_service import rag_service
+from app.utils.trip_documents import create_trip_text, flatten_metadata, index_metadata
+
+_STOP = object()
+
+
+class IngestQueueFull(Exception):
+    """Raised when the write-behind queue is at INGEST_QUEUE_MAX (caller should retry later)"""
+
+
+def trip_record(request: TripRequest) -> Dict[str, Any]:
+    """Normalize an API trip into the dataset record shape used by the index"""
+    trip = request.model_dump()
+
+    trip["trip_id"] = trip["trip_id"] or f"{trip['user_id']}_trip_{uuid.uuid4().hex[:12]}"
+    trip["date"] = (trip["date"] or datetime.now()).isoformat()
+
+    # Fill speed / duration from each other (60 km/h when neither is known)
+    if trip["avg_speed_kmh"] is None:
+        duration = trip["duration_hours"]
+        trip["avg_speed_kmh"] = round(trip["distance_km"] / duration, 1) if duration else 60.0
+    if trip["duration_hours"] is None:
+        trip["duration_hours"] = round(trip["distance_km"] / trip["avg_speed_kmh"], 2)
+
+    trip["num_charging_stops"] = len(trip["charging_stops"])
+
+    # Whole numbers render like the dataset ("580km", not "580.0km") in trip documents
+    for record in [trip, *trip["charging_stops"]]:
+        for key, value in record.items():
+            if isinstance(value, float) and value.is_integer():
+                record[key] = int(value)
+    return trip
+
+
+class IngestService:
+    """🚀 OPTIMIZATION: Acknowledge uploads immediately, embed + upsert in batches
+
+    A background writer drains the queue and flushes every INGEST_BATCH_SIZE trips
+    or INGEST_FLUSH_MS after the first queued trip, whichever comes first, so a
+    burst of uploads costs a few batched encode() calls instead of one per trip.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(IngestService, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._queue = queue.Queue(maxsize=settings.INGEST_QUEUE_MAX)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "last_batch_ms": 0.0,
+            "last_lag_ms": 0.0,
+            "max_lag_ms": 0.0,
+            "last_error": None,
+            "unindexed": 0,
+        }
+        # Trips taken off the queue but not yet written (current batch)
+        self._buffered = 0
+        self._buffered_since = None
+        self._pruned_on = None  # day the efficiency rollups were last pruned to retention
+        self._unindexed: Dict[str, tuple] = {}  # trip_id -> (trip, text): stored, vector write failed
+
+        self._writer = threading.Thread(target=self._run, name="trip-ingest-writer", daemon=True)
+        self._writer.start()
+
+        self._initialized = True
+
+    def submit(self, trips: List[Dict[str, Any]]) -> int:
+        """Queue normalized trip records; returns the queue depth after enqueueing"""
+        if self._queue.qsize() + len(trips) > settings.INGEST_QUEUE_MAX:
+            # Reject the whole upload rather than accept part of it
+            raise IngestQueueFull(f"Ingest queue full ({settings.INGEST_QUEUE_MAX} trips pending)")
+        now = time.monotonic()
+        for trip in trips:
+            try:
+                self._queue.put_nowait((now, trip))
+            except queue.Full:
+                raise IngestQueueFull(f"Ingest queue full ({settings.INGEST_QUEUE_MAX} trips pending)")
+            with self._stats_lock:
+                self._stats["enqueued"] += 1
+        return self._queue.qsize()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # flush interval elapsed
+
+            if item is _STOP:
+                if batch:
+                    self._flush(batch)
+                return
+
+            if item is not None:
+                batch.append(item)
+                self._buffered, self._buffered_since = len(batch), batch[0][0]
+                if deadline is None:
+                    deadline = time.monotonic() + settings.INGEST_FLUSH_MS / 1000
+
+            if batch and (len(batch) >= settings.INGEST_BATCH_SIZE or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _flush(self, batch: List[tuple]):
+        """Store and embed one batch (one SQLite transaction, one encode() call, one Chroma write)"""
+        started = time.monotonic()
+        trips = [trip for _, trip in batch]
+        stored = indexed = False
+        # Held only for the SQLite write and the in-memory updates (not the embedding), so a
+        # snapshot always sees the trip store and the derived indexes in step
+        with rag_service.derived_lock:
+            try:
+                texts = [create_trip_text(trip) for trip in trips]
+                # The row goes in first: every vector a search can hit is hydratable
+                new_ids = set(rag_service.trips.upsert_trips(trips, texts))
+                stored = True
+            except Exception as e:
+                error = e
+                print(f"❌ Trip ingest batch of {len(batch)} failed: {e}")
+
+            if stored:
+                try:
+                    rag_service.profiles.record_trips(trips)
+                except Exception as e:
+                    print(f"⚠️  Profile update for {len(batch)} trips failed: {e}")
+                try:
+                    rag_service.efficiency.record_trips([trip for trip in trips if trip["trip_id"] in new_ids])
+                except Exception as e:
+                    print(f"⚠️  Efficiency sketch update for {len(batch)} trips failed: {e}")
+                try:
+                    rag_service.energy.record_trips([trip for trip in trips if trip["trip_id"] in new_ids])
+                except Exception as e:
+                    print(f"⚠️  Energy model update for {len(batch)} trips failed: {e}")
+                try:
+                    rag_service.similarity.add(trips)
+                except Exception as e:
+                    print(f"⚠️  Similarity index update for {len(batch)} trips failed: {e}")
+
+        if stored:
+            # Stored trips whose vectors failed in an earlier batch are retried with this one
+            unindexed = {**self._unindexed, **{trip["trip_id"]: (trip, text) for trip, text in zip(trips, texts)}}
+            try:
+                rag_service.upsert_global(
+                    ids=list(unindexed),
+                    documents=[text for _, text in unindexed.values()],
+                    metadatas=[index_metadata(text, flatten_metadata(trip)) for trip, text in unindexed.values()],
+                    start_locations=[trip["start_location"] for trip, _ in unindexed.values()]
+                )
+                self._unindexed = {}
+                indexed = True
+                error = None
+            except Exception as e:
+                self._unindexed = unindexed
+                error = e
+                print(f"❌ Embedding {len(unindexed)} stored trips failed (retried with the next batch): {e}")
+            try:
+                # Default global retrieval reads the prototypes: re-aggregate the buckets this batch touched
+                rag_service.refresh_prototypes(trips)
+            except Exception as e:
+                print(f"⚠️  Route prototype refresh for {len(batch)} trips failed: {e}")
+            if self._pruned_on != date.today():
+                # The rollups themselves were updated by the insert; retention moves once a day
+                try:
+                    rag_service.trips.prune_rollups()
+                    self._pruned_on = date.today()
+                except Exception as e:
+                    print(f"⚠️  Rollup pruning failed: {e}")
+            try:
+                # Keep the columnar dataset (analytics, re-indexing) in step with the index; only new
+                # trips are appended (a re-upload would be a duplicate row, its edit is in the trip store)
+                added = [trip for trip in trips if trip["trip_id"] in new_ids]
+                dataset = rag_service.trip_dataset()
+                if dataset is not None and added:
+                    dataset.append_trips(added)
+            except Exception as e:
+                print(f"⚠️  Columnar append of {len(added)} trips failed: {e}")
+        self._buffered, self._buffered_since = 0, None
+
+        finished = time.monotonic()
+        lag_ms = (finished - batch[0][0]) * 1000  # oldest trip: upload -> searchable
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["last_batch_size"] = len(batch)
+            self._stats["last_batch_ms"] = round((finished - started) * 1000, 1)
+            if indexed:
+                self._stats["written"] += len(unindexed)
+                self._stats["last_lag_ms"] = round(lag_ms, 1)
+                self._stats["max_lag_ms"] = round(max(self._stats["max_lag_ms"], lag_ms), 1)
+            elif not stored:
+                self._stats["failed"] += len(batch)
+            if error is not None:
+                self._stats["last_error"] = str(error)
+            self._stats["unindexed"] = len(self._unindexed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Ingest lag metrics: backlog, age of the oldest pending trip, batch timings"""
+        with self._queue.mutex:
+            head = self._queue.queue[0] if self._queue.queue else None
+            oldest = head[0] if head is not None and head is not _STOP else None
+            queued = len(self._queue.queue)
+        buffered, buffered_since = self._buffered, self._buffered_since
+        if buffered_since is not None:
+            oldest = buffered_since  # the batch being assembled/written is older than the queue head
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            "queue_depth": queued,
+            "in_flight": buffered,
+            "pending": stats["enqueued"] - stats["written"] - stats["failed"],
+            "oldest_pending_ms": round((time.monotonic() - oldest) * 1000, 1) if oldest is not None else 0.0,
+            "batch_size": settings.INGEST_BATCH_SIZE,
+            "flush_ms": settings.INGEST_FLUSH_MS,
+        })
+        return stats
+
+    def close(self, timeout: float = 10.0):
+        """Flush what is queued and stop the writer"""
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+
+# Singleton instance
+ingest_service = IngestService()
@@ -2,10 +2,17 @@
 LLM Service - GPT4All integration for query processing
 """
 
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime
 from gpt4all import GPT4All
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from app.core.config import settings
+from app.services.query_router import QueryRouter, RetrievalPlan
 from app.services.rag_service import rag_service
+from app.services.range_service import describe, estimate_range, estimate_ranges, summarize
+from app.services.trip_store import SEASONS, season_of
 
 class LLMService:
     """Manages LLM (GPT4All) for generating responses"""
@@ -39,6 +46,11 @@ class LLMService:
             print(f"   Model will be cached at: ~/.cache/gpt4all/")
             self.model = None
         
+        self.router = QueryRouter(rag_service.embed_query)
+        # Centroids live in the index's embedding space - recompute after a version swap
+        rag_service.add_index_listener(self.router.reset)
+        self._generate_lock = threading.Lock()
+        
         self._initialized = True
     
     def _ensure_model_loaded(self):
@@ -51,30 +63,42 @@ class LLMService:
                 device='cpu'
             )
     
-    def _classify_query(self, query: str) -> str:
-        """Determine query type"""
-        query_lower = query.lower()
-        
-        if any(word in query_lower for word in ['range', 'reach', 'how far', 'can i go', 'predict']):
-            return "range_prediction"
-        elif any(word in query_lower for word in ['route', 'plan', 'trip to', 'navigate']):
-            return "route_planning"
-        elif any(word in query_lower for word in ['efficiency', 'my driving', 'my trips', 'performance']):
-            return "performance_analysis"
-        elif any(word in query_lower for word in ['compare', 'vs', 'better', 'community']):
-            return "comparison"
-        elif any(word in query_lower for word in ['charging', 'charge', 'station', 'charger']):
-            return "charging_info"
-        else:
-            return "general"
+    def _classify_query(self, query: str, query_embedding: Optional[List[float]] = None) -> str:
+        """Determine query type (keyword rules, then nearest intent centroid)"""
+        return self.router.classify(query, query_embedding)
     
     def process_query(self, query: str, user_id: str) -> Dict[str, Any]:
         """Process general query - OPTIMIZED for speed"""
         self._ensure_model_loaded()
         
-        query_type = self._classify_query(query)
-        rag_results = rag_service.query_both(user_id, query)
+        # 🚀 OPTIMIZATION: One embedding shared by routing and retrieval
+        query_embedding = rag_service.embed_query(query)
+        query_type = self._classify_query(query, query_embedding)
+        plan = self.router.plan_for(query_type)
+        rag_results = rag_service.retrieve(user_id, query, plan, query_embedding)
+        
+        return self._answer(query, user_id, query_type, plan, rag_results)
+    
+    async def aprocess_query(self, query: str, user_id: str) -> Dict[str, Any]:
+        """Async process_query - retrieval branches run concurrently, nothing blocks the event loop"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._ensure_model_loaded)
+        
+        query_embedding = await loop.run_in_executor(None, rag_service.embed_query, query)
+        query_type = await loop.run_in_executor(None, self._classify_query, query, query_embedding)
+        plan = self.router.plan_for(query_type)
+        rag_results = await rag_service.aretrieve(user_id, query, plan, query_embedding)
         
+        return await loop.run_in_executor(None, self._answer, query, user_id, query_type, plan, rag_results)
+    
+    def _generate(self, prompt: str, **kwargs) -> str:
+        """GPT4All models are not re-entrant - serialize generations across threads"""
+        with self._generate_lock:
+            return self.model.generate(prompt, **kwargs)
+    
+    def _answer(self, query: str, user_id: str, query_type: str, plan: RetrievalPlan,
+                rag_results: Dict) -> Dict[str, Any]:
+        """Build the prompt from retrieved context and generate the response"""
         # DEBUG: Print what RAG retrieved
         print(f"\n{'='*60}")
         print(f"🔍 QUERY TYPE: {query_type}")
@@ -98,7 +122,7 @@ class LLMService:
         print(f"{'🔥'*30}\n")
         
         # Generate response with REDUCED tokens for speed
-        response = self.model.generate(
+        response = self._generate(
             context,
             max_tokens=settings.LLM_MAX_TOKENS,  # Now 180
             temp=settings.LLM_TEMPERATURE  # Now 0.1
@@ -115,39 +139,79 @@ class LLMService:
         return {
             "response": response.strip(),
             "query_type": query_type,
-            "sources_used": ["global_rag", "personal_rag"],
+            "sources_used": plan.stores,
             "confidence": 0.85,
             "rag_context_preview": rag_results['global']['documents'][0][:200] if rag_results['global']['documents'] else "No RAG data"
         }
     
     def predict_range(self, user_id: str, start: str, end: str, current_battery: float, 
-                     weather: str, traffic: str) -> Dict[str, Any]:
-        """Dedicated range prediction endpoint - OPTIMIZED"""
+                     weather: str, traffic: str, narrate: bool = False) -> Dict[str, Any]:
+        """Range prediction - OPTIMIZED: computed, not generated
+        
+        The verdict, energy, arrival battery and stops come from range_service in
+        well under a millisecond; the LLM only words them, and only with narrate.
+        """
+        request = {"user_id": user_id, "start_location": start, "end_location": end,
+                   "current_battery_percent": current_battery, "weather": weather, "traffic": traffic}
+        estimate = estimate_range(request)
+        probability = estimate["reach_probability"]
+        return {
+            "response": self.narrate_range(request, estimate) if narrate else describe(estimate),
+            "can_reach": estimate["can_reach"],  # None for an unknown route, not "unreachable"
+            "confidence": (max(probability, 1 - probability) if probability is not None else None),
+            "charging_stops": estimate["charging_stops"],
+            "energy_needed_kwh": estimate["energy_needed_kwh"],
+            "energy_interval_kwh": estimate["energy_interval_kwh"],
+            "personalized_tips": [],
+            "estimate": estimate,
+        }
+    
+    def predict_ranges(self, items: List[Dict[str, Any]], narrate: bool = False) -> Dict[str, Any]:
+        """Batch estimates; with narrate, borderline items are also worded by the LLM
+        (at most RANGE_BATCH_MAX_NARRATIONS, in batch order)"""
+        results = estimate_ranges(items)
+        if narrate:
+            borderline = [result for result in results if result["verdict"] == "borderline"]
+            for result in borderline[:settings.RANGE_BATCH_MAX_NARRATIONS]:
+                try:
+                    result["narration"] = self.narrate_range(items[result["index"]], result)
+                except Exception as e:
+                    print(f"⚠️  Range narration for item {result['index']} failed: {e}")
+        return {"results": results, "summary": summarize(results)}
+    
+    def narrate_range(self, request: Dict[str, Any], estimate: Dict[str, Any]) -> str:
+        """Explain a computed range estimate in plain words (the numbers are not re-derived)"""
         self._ensure_model_loaded()
         
-        similar_trips = rag_service.find_similar_trips(start, end, n_results=3)  # Reduced from 5
-        user_profile = rag_service.get_user_profile(user_id)
+        start, end = request["start_location"], request["end_location"]
+        weather = (request.get("weather") or "pleasant").lower()
+        traffic = (request.get("traffic") or "moderate").lower()
+        user_profile = rag_service.get_user_profile(request["user_id"])
+        # Nearest trips by route *and* conditions, so the examples fit this weather / traffic / driver
+        similar_trips = rag_service.find_similar_trips(
+            start, end, n_results=2, battery_percent=request["current_battery_percent"], weather=weather,
+            traffic=traffic, driving_style=(user_profile or {}).get("driving_style"),
+        )
         
-        # IMPROVED context building with clear instructions
-        context = f"""You are an expert EV range analyst. Analyze this trip request.
+        context = f"""You are an expert EV range analyst. Explain this computed range estimate to the driver.
 
 TRIP REQUEST:
 From: {start}
 To: {end}
-Current Battery: {current_battery}%
+Current Battery: {request['current_battery_percent']}%
 Weather: {weather}
 Traffic: {traffic}
 
+ESTIMATE (computed - do not change these numbers):
+{describe(estimate)}
+Chance of arriving: {round(100 * (estimate['reach_probability'] or 0))}%
+
 COMMUNITY DATA:
 """
-        
-        if similar_trips:
-            # Show top 2 trips only
-            for i, trip in enumerate(similar_trips[:2], 1):
-                context += f"""Trip {i}: {trip['distance_km']}km used {trip['energy_used_kwh']}kWh ({trip['efficiency_kwh_per_100km']}kWh/100km)
+        for i, trip in enumerate(similar_trips, 1):
+            context += f"""Trip {i}: {trip['start_location']} → {trip['end_location']}, {trip['distance_km']}km used {trip['energy_used_kwh']}kWh ({trip['efficiency_kwh_per_100km']}kWh/100km), {trip.get('weather', '?')} weather, {trip.get('traffic', '?')} traffic
 """
-        else:
-            context += "No similar trip data available. Use general estimates.\n"
+        context += self._route_trend_text(start, end, weather)
         
         if user_profile:
             context += f"""
@@ -157,28 +221,23 @@ Style: {user_profile.get('driving_style', 'normal')}
 """
         
         context += """
-PROVIDE ANALYSIS:
-1. Can you complete this trip? (YES/NO with confidence %)
-2. Estimated distance and energy required
-3. Charging recommendation (0-2 stops maximum)
-4. Key factors to consider
+Explain whether the trip works, where to charge (if anywhere) and 1-2 practical tips.
+Keep it under 120 words.
 
-Keep response practical and realistic. Maximum 150 words.
-
-ANALYSIS:"""
-        
-        response = self.model.generate(context, max_tokens=200, temp=0.1)  # Even lower temp for consistency
+EXPLANATION:"""
         
-        can_reach = "yes" in response.lower()[:100]
-        
-        return {
-            "response": response,
-            "can_reach": can_reach,
-            "confidence": 0.85,
-            "charging_stops": [],
-            "energy_needed_kwh": None,
-            "personalized_tips": []
-        }
+        return self._generate(context, max_tokens=200, temp=0.1).strip()
+    
+    def _route_trend_text(self, start: str, end: str, weather: str) -> str:
+        """Route efficiency this season and in this weather (precomputed rollups, no trip scan)"""
+        season = season_of(datetime.now().month)
+        text = ""
+        for label, filters in ((f"This season ({season.replace('_', '-')})", {"months": SEASONS[season]}),
+                               (f"In {weather} weather", {"weather": weather.lower()})):
+            bucket = rag_service.get_efficiency_trend(group_by=(), start=start, end=end, **filters)
+            if bucket:
+                text += f"{label}: {bucket[0]['avg_efficiency']}kWh/100km average over {bucket[0]['trips']} trips\n"
+        return text
     
     def analyze_performance(self, user_id: str) -> Dict[str, Any]:
         """Analyze user's driving performance"""
@@ -194,18 +253,21 @@ ANALYSIS:"""
                 "recommendations": []
             }
         
+        standing = self._efficiency_standing(user_id, user_profile)
+        
         context = f"""You are an EV driving coach. Analyze this driver's performance.
 
 DRIVER'S METRICS:
 - Efficiency: {user_profile['avg_efficiency']} kWh/100km
 - Driving style: {user_profile['driving_style']}
-- Battery health: {user_profile['battery_health']}%
+- Battery health: {user_profile.get('battery_health', 'unknown')}%
 - Trips analyzed: {user_profile['num_trips_analyzed']}
 
 COMMUNITY BENCHMARKS:
 - Average efficiency: {global_stats['avg_efficiency']} kWh/100km
 - Best: {global_stats['most_efficient']} kWh/100km
 - Worst: {global_stats['least_efficient']} kWh/100km
+{self._standing_text(standing)}
 
 INSTRUCTIONS:
 1. Rate performance (Excellent/Good/Average/Needs Improvement)
@@ -216,17 +278,47 @@ INSTRUCTIONS:
 
 COACHING ANALYSIS:"""
         
-        response = self.model.generate(context, max_tokens=200, temp=0.3)
+        response = self._generate(context, max_tokens=200, temp=0.3)
         
         return {
             "response": response.strip(),
             "metrics": {
                 "user_efficiency": user_profile['avg_efficiency'],
-                "community_avg": global_stats['avg_efficiency']
+                "community_avg": global_stats['avg_efficiency'],
+                "percentile": standing["global"],
+                "percentiles": standing
             },
             "recommendations": []
         }
     
+    def _efficiency_standing(self, user_id: str, user_profile: Dict) -> Dict[str, Any]:
+        """Percent of trips the driver is more efficient than: overall, on their most
+        frequent recent route, for their EV model and for their driving style"""
+        standing = rag_service.efficiency.standing(
+            user_profile['avg_efficiency'],
+            ev_model=user_profile.get('ev_model'),
+            driving_style=user_profile.get('driving_style')
+        )
+        recent = rag_service.trips.recent_trips(user_id, settings.PROFILE_RECENT_TRIPS)
+        if recent:
+            route = Counter((t['start_location'], t['end_location']) for t in recent).most_common(1)[0][0]
+            on_route = [t['efficiency_kwh_per_100km'] for t in recent
+                        if (t['start_location'], t['end_location']) == route]
+            standing["route"] = rag_service.efficiency.standing(sum(on_route) / len(on_route), route=route)["route"]
+            standing["route_name"] = f"{route[0]} → {route[1]}"
+        return standing
+    
+    @staticmethod
+    def _standing_text(standing: Dict) -> str:
+        lines = []
+        for key, label in (("global", "all community trips"),
+                           ("route", f"trips on {standing.get('route_name')}"),
+                           ("ev_model", "trips in the same EV model"),
+                           ("driving_style", "trips with the same driving style")):
+            if standing.get(key) is not None:
+                lines.append(f"- More efficient than {standing[key]:g}% of {label}")
+        return "\n".join(lines)
+    
     def _build_context(self, query: str, user_id: str, query_type: str, rag_results: Dict) -> str:
         """Build CONCISE context for LLM based on query type - OPTIMIZED"""
         
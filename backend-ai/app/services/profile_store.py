@@ -0,0 +1,258 @@
+"""
+Profile Store - per-user ring buffer of recent trips with running aggregates
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.utils.trip_documents import with_content_hash
+
+# Profile fields that come from the user record, not from the recent trips
+STATIC_FIELDS = ("ev_model", "driving_style", "battery_health", "avg_efficiency")
+
+
+def profile_id(user_id: str) -> str:
+    return f"profile_{user_id}"
+
+
+def _number(value):
+    """580.0 -> 580 so trips read the same whether they came from JSON or Chroma metadata"""
+    return int(value) if float(value).is_integer() else round(value, 2)
+
+
+class RecentTripWindow:
+    """🚀 OPTIMIZATION: Last N trips with running sums - each push is O(1)
+
+    Trips are kept oldest -> newest; the sums and counters always describe
+    exactly the trips currently in the buffer.
+    """
+
+    def __init__(self, limit: int = 10):
+        self.trips = deque(maxlen=limit)
+        self.sum_efficiency = 0
+        self.sum_speed = 0
+        self.sum_distance = 0
+        self.sum_stops = 0
+        self.style_counts: Dict[str, int] = {}
+        self.route_counts: Dict[str, int] = {}
+
+    @classmethod
+    def from_trips(cls, trips: Iterable[Dict], limit: int = 10) -> "RecentTripWindow":
+        """Build from trips in any order (only the newest `limit` are kept)"""
+        window = cls(limit)
+        for trip in sorted(trips, key=lambda t: t["date"]):
+            window.push(trip)
+        return window
+
+    def __len__(self) -> int:
+        return len(self.trips)
+
+    def _apply(self, trip: Dict, sign: int):
+        self.sum_efficiency += sign * trip["efficiency_kwh_per_100km"]
+        self.sum_speed += sign * trip["avg_speed_kmh"]
+        self.sum_distance += sign * trip["distance_km"]
+        self.sum_stops += sign * trip["num_charging_stops"]
+        for counts, key in ((self.style_counts, trip["driving_style"]),
+                            (self.route_counts, f"{trip['start_location']} to {trip['end_location']}")):
+            counts[key] = counts.get(key, 0) + sign
+            if counts[key] == 0:
+                del counts[key]
+
+    def push(self, trip: Dict) -> bool:
+        """Add a trip; returns False if it is a duplicate or older than the whole window"""
+        if any(t["trip_id"] == trip["trip_id"] for t in self.trips):
+            return False
+        if len(self.trips) == self.trips.maxlen:
+            if trip["date"] < self.trips[0]["date"]:
+                return False  # late upload that would not make the last N anyway
+            self._apply(self.trips.popleft(), -1)
+        # A late upload is inserted in date order (at most N steps), so the oldest trip stays first
+        position = len(self.trips)
+        while position and self.trips[position - 1]["date"] > trip["date"]:
+            position -= 1
+        self.trips.insert(position, trip)
+        self._apply(trip, +1)
+        return True
+
+    def _most_common(self, counts: Dict[str, int], key) -> str:
+        """Highest count; ties go to the most recent trip (scans at most N trips)"""
+        best = max(counts.values())
+        return next(key(t) for t in reversed(self.trips) if counts[key(t)] == best)
+
+    def common_route(self) -> str:
+        return self._most_common(self.route_counts, lambda t: f"{t['start_location']} to {t['end_location']}")
+
+    def dominant_style(self) -> str:
+        return self._most_common(self.style_counts, lambda t: t["driving_style"])
+
+    def pattern_text(self, user_id: str) -> str:
+        """Create text summary of user's driving patterns"""
+        n = len(self.trips)
+        newest = self.trips[-1]
+
+        text = f"""
+User {user_id}'s driving profile based on last {n} trips:
+Average efficiency: {self.sum_efficiency / n:.2f} kWh/100km
+Average speed: {self.sum_speed / n:.1f} km/h
+Total distance: {_number(self.sum_distance)} km
+Most common route: {self.common_route()}
+Dominant driving style: {self.dominant_style()}
+Total charging stops: {self.sum_stops}
+Regenerative braking usage: {newest['regen_braking_usage']*100:.0f}%
+
+Recent trip patterns:
+        """.strip()
+
+        # Add last 3 trips summary (newest first)
+        for trip in list(self.trips)[-1:-4:-1]:
+            text += f"\n- {trip['start_location']} to {trip['end_location']}: {_number(trip['distance_km'])}km, {_number(trip['efficiency_kwh_per_100km'])}kWh/100km"
+
+        return text
+
+    def metadata(self) -> Dict[str, Any]:
+        """Window fields of the profile metadata (flattened for ChromaDB)"""
+        newest_first = list(self.trips)[::-1][:5]
+        return {
+            "num_trips_analyzed": len(self.trips),
+            "recent_avg_efficiency": round(self.sum_efficiency / len(self.trips), 2),
+            # Flatten recent trips as simple strings instead of nested objects
+            "recent_routes": ", ".join(f"{t['start_location']}-{t['end_location']}" for t in newest_first),
+            "recent_dates": ", ".join(t["date"] for t in newest_first),
+        }
+
+
+def profile_metadata(user_id: str, user: Optional[Dict], window: RecentTripWindow) -> Dict[str, Any]:
+    """Metadata includes user profile + trip summaries (flattened for ChromaDB)"""
+    metadata = {
+        "user_id": user_id,
+        # Defaults for a user the dataset does not know: derive what we can from the trips
+        "ev_model": "unknown",
+        "driving_style": window.dominant_style(),
+        "avg_efficiency": round(window.sum_efficiency / len(window), 2),
+    }
+    for field in STATIC_FIELDS:
+        if user and field in user:
+            value = user[field]
+            metadata[field] = float(value) if field in ("battery_health", "avg_efficiency") else value
+    metadata.update(window.metadata())
+    return metadata
+
+
+class ProfileStore:
+    """Live personal profiles: updated per trip, re-embedded in debounced batches
+
+    Windows are hydrated lazily (once per user per process) from the user's
+    trips in the trip store; after that every trip is an O(1) push.
+    """
+
+    def __init__(self, rag, limit: Optional[int] = None):
+        self._rag = rag
+        self.limit = limit or settings.PROFILE_RECENT_TRIPS
+        self._lock = threading.Lock()
+        self._windows: Dict[str, RecentTripWindow] = {}
+        self._users: Dict[str, Optional[Dict]] = {}
+        self._dirty: Dict[str, float] = {}  # user_id -> time of oldest update not yet embedded
+        self._listeners: List[Callable[[List[str]], None]] = []
+
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="profile-reembed", daemon=True)
+        self._worker.start()
+
+    def _hydrate(self, user_id: str):
+        """Load the user's record and newest trips from the index (first touch only)"""
+        stored = self._rag.personal_rag.get(ids=[profile_id(user_id)], include=["metadatas"])
+        user = stored["metadatas"][0] if stored["metadatas"] else None
+        newest = self._rag.trips.recent_trips(user_id, self.limit)  # (user_id, date) index
+        return user, RecentTripWindow.from_trips(newest, self.limit)
+
+    def record_trips(self, trips: List[Dict]):
+        """Fold freshly written trips into their users' windows"""
+        now = time.monotonic()
+        for user_id in {trip["user_id"] for trip in trips}:
+            if user_id not in self._windows:
+                # History is read after the trips were written, so it already holds them
+                user, window = self._hydrate(user_id)
+                with self._lock:
+                    self._users.setdefault(user_id, user)
+                    self._windows.setdefault(user_id, window)
+                    self._dirty.setdefault(user_id, now)
+
+        with self._lock:
+            for trip in trips:
+                window = self._windows.get(trip["user_id"])
+                if window is not None and window.push(trip):
+                    self._dirty.setdefault(trip["user_id"], now)
+
+    def is_live(self, user_id: str) -> bool:
+        """True once this process has updated the user's profile"""
+        return user_id in self._windows
+
+    def document(self, user_id: str) -> Optional[str]:
+        with self._lock:
+            window = self._windows.get(user_id)
+            return window.pattern_text(user_id) if window else None
+
+    def profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            window = self._windows.get(user_id)
+            if not window:
+                return None
+            return profile_metadata(user_id, self._users.get(user_id), window)
+
+    def _run(self):
+        """Re-embed a changed profile once per debounce interval, however many trips arrived"""
+        debounce = settings.PROFILE_REEMBED_DEBOUNCE_MS / 1000
+        while not self._stop.wait(debounce / 2):
+            cutoff = time.monotonic() - debounce
+            with self._lock:
+                ready = [user_id for user_id, updated in self._dirty.items() if updated <= cutoff]
+            if ready:
+                self.flush(ready)
+
+    def flush(self, user_ids: Optional[List[str]] = None):
+        """Write the current profile documents (all dirty users by default) to the personal RAG"""
+        with self._lock:
+            user_ids = list(self._dirty) if user_ids is None else user_ids
+            batch = []
+            for user_id in user_ids:
+                window = self._windows.get(user_id)
+                if self._dirty.pop(user_id, None) is not None and window:
+                    text = window.pattern_text(user_id)
+                    metadata = profile_metadata(user_id, self._users.get(user_id), window)
+                    batch.append((profile_id(user_id), text, with_content_hash(text, metadata)))
+        if not batch:
+            return
+        try:
+            self._rag.upsert_personal(
+                ids=[doc_id for doc_id, _, _ in batch],
+                documents=[text for _, text, _ in batch],
+                metadatas=[metadata for _, _, metadata in batch]
+            )
+        except Exception as e:
+            print(f"❌ Re-embedding {len(batch)} profiles failed: {e}")
+            with self._lock:
+                for _, _, metadata in batch:
+                    self._dirty.setdefault(metadata["user_id"], time.monotonic())  # retry next round
+            return
+        for listener in self._listeners:
+            try:
+                listener([metadata["user_id"] for _, _, metadata in batch])
+            except Exception as e:
+                print(f"⚠️  Profile listener failed: {e}")
+
+    def add_listener(self, callback: Callable[[List[str]], None]):
+        """Call back with the user ids whose profiles were just re-embedded"""
+        self._listeners.append(callback)
+
+    def reset(self):
+        """Forget all windows (a new index version was published)"""
+        with self._lock:
+            self._windows.clear()
+            self._users.clear()
+            self._dirty.clear()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
@@ -0,0 +1,131 @@
+"""
+Query Router - intent classification and per-intent retrieval plans
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class RetrievalPlan:
+    """Declarative description of what an intent needs from the RAG stores"""
+    intent: str
+    global_results: int = 0      # 0 = skip the global store entirely
+    personal_results: int = 0    # 0 = skip the personal store entirely
+    global_include: Tuple[str, ...] = ("documents", "metadatas")
+    personal_include: Tuple[str, ...] = ("documents", "metadatas")
+    global_source: Optional[str] = None  # None = settings.RAG_GLOBAL_SOURCE
+
+    @property
+    def stores(self) -> List[str]:
+        stores = []
+        if self.global_results:
+            stores.append("global_rag")
+        if self.personal_results:
+            stores.append("personal_rag")
+        return stores
+
+
+# 🚀 OPTIMIZATION: Each intent fetches only what LLMService._build_context uses
+RETRIEVAL_PLANS: Dict[str, RetrievalPlan] = {
+    "range_prediction": RetrievalPlan("range_prediction", global_results=1, personal_results=1,
+                                      personal_include=("documents",)),
+    "route_planning": RetrievalPlan("route_planning", global_results=1),
+    "charging_info": RetrievalPlan("charging_info", global_results=1),
+    "performance_analysis": RetrievalPlan("performance_analysis", global_results=1, personal_results=1,
+                                          global_include=("documents",), personal_include=("documents",)),
+    "comparison": RetrievalPlan("comparison", global_results=1, global_include=("documents",)),
+    "general": RetrievalPlan("general", global_results=1, global_include=("documents",)),
+}
+
+# Keyword rules (checked first, in order) - cheap and precise when they fire
+INTENT_KEYWORDS: List[Tuple[str, Sequence[str]]] = [
+    ("range_prediction", ['range', 'reach', 'how far', 'can i go', 'predict']),
+    ("route_planning", ['route', 'plan', 'trip to', 'navigate']),
+    ("performance_analysis", ['efficiency', 'my driving', 'my trips', 'performance']),
+    ("comparison", ['compare', 'vs', 'better', 'community']),
+    ("charging_info", ['charging', 'charge', 'station', 'charger']),
+]
+
+# Exemplar queries whose mean embedding is each intent's centroid
+INTENT_EXEMPLARS: Dict[str, List[str]] = {
+    "range_prediction": [
+        "Can I make it to Goa from Mumbai with 60% battery?",
+        "Will my battery last until Pune?",
+        "How many kilometres will I get on a full battery?",
+    ],
+    "route_planning": [
+        "Best way to drive from Delhi to Jaipur",
+        "Which highway should I take to Mysore?",
+        "Suggest stops for a drive to Chennai",
+    ],
+    "performance_analysis": [
+        "How economical is my driving?",
+        "Am I using too much energy per kilometre?",
+        "Review my recent driving habits",
+    ],
+    "comparison": [
+        "How do I stack up against other EV owners?",
+        "Am I driving worse than average?",
+        "Do other drivers use less energy than me?",
+    ],
+    "charging_info": [
+        "Where can I plug in between Bangalore and Chennai?",
+        "How long does a fast top-up take?",
+        "Which networks have 150kW chargers?",
+    ],
+    "general": [
+        "What affects EV battery life in summer?",
+        "Does air conditioning reduce how far an EV goes?",
+        "Tips for driving an electric car in the rain",
+    ],
+}
+
+
+class QueryRouter:
+    """Keyword rules first, then nearest-centroid over the (shared) query embedding"""
+
+    def __init__(self, embed: Callable[[str], List[float]]):
+        self._embed = embed
+        self._intents: Optional[List[str]] = None
+        self._centroids: Optional[np.ndarray] = None
+
+    def _ensure_centroids(self) -> Tuple[List[str], np.ndarray]:
+        """Embed exemplars once, lazily (first query that needs the fallback)"""
+        if self._centroids is not None:
+            return self._intents, self._centroids
+        intents, centroids = [], []
+        for intent, examples in INTENT_EXEMPLARS.items():
+            vectors = np.array([self._embed(example) for example in examples], dtype=np.float32)
+            centroid = vectors.mean(axis=0)
+            centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+            intents.append(intent)
+        self._intents = intents
+        self._centroids = np.vstack(centroids)
+        return self._intents, self._centroids
+
+    def reset(self):
+        """Forget the centroids (the query embedding space may have changed)"""
+        self._centroids = None
+
+    def classify(self, query: str, query_embedding: Optional[List[float]] = None) -> str:
+        """Return the intent for query, reusing query_embedding when given"""
+        query_lower = query.lower()
+        for intent, words in INTENT_KEYWORDS:
+            if any(word in query_lower for word in words):
+                return intent
+
+        intents, centroids = self._ensure_centroids()
+        vector = np.asarray(query_embedding if query_embedding is not None else self._embed(query),
+                            dtype=np.float32)
+        similarities = centroids @ (vector / (np.linalg.norm(vector) or 1.0))
+        best = int(np.argmax(similarities))
+        if similarities[best] < settings.ROUTER_MIN_SIMILARITY:
+            return "general"
+        return intents[best]
+
+    @staticmethod
+    def plan_for(intent: str) -> RetrievalPlan:
+        return RETRIEVAL_PLANS.get(intent, RETRIEVAL_PLANS["general"])
@@ -4,11 +4,29 @@ RAG Service - Manages dual RAG system queries (OPTIMIZED)
 
 import chromadb
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable, Sequence
+import asyncio
 import json
-import re
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from functools import lru_cache
+import numpy as np
 from app.core.config import settings
+from app.services.efficiency_sketches import EfficiencySketches
+from app.services.energy_model import EnergyModel
+from app.services.index_registry import ALL_PARTITIONS, IndexRegistry
+from app.services.profile_store import ProfileStore
+from app.services.query_router import RetrievalPlan
+from app.services.similarity_index import TripSimilarityIndex
+from app.services.trip_store import TripStore
+from app.utils.columnar import ColumnarDataset
+from app.utils.embedding_compression import EmbeddingCompressor
+from app.utils.gazetteer import OTHER_REGION, LocationGazetteer, region_of
+from app.utils.route_prototypes import RoutePrototypeBuilder, create_prototype_text, prototype_key
+from app.utils.snapshot import read_snapshot, write_snapshot
+from app.utils.trip_documents import with_content_hash
 
 class RAGService:
     """Manages queries to dual RAG system (OPTIMIZED for speed & accuracy)"""
@@ -36,58 +54,403 @@ class RAGService:
         )
         print(f"   ✅ Embedding model loaded: {settings.EMBEDDING_MODEL}")
         
+        # 🚀 OPTIMIZATION: Query cache (last 50 queries)
+        self._query_cache = {}
+        self._cache_max_size = 50
+        self._cache_lock = threading.Lock()
+        self._embed_cached = lru_cache(maxsize=256)(self._encode_query)
+        
+        # 🚀 OPTIMIZATION: Global and personal branches run side by side
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.RAG_RETRIEVAL_WORKERS,
+            thread_name_prefix="rag-retrieval"
+        )
+        # Separate pool for per-partition queries (a branch waiting on its own pool could deadlock)
+        self._shard_executor = ThreadPoolExecutor(
+            max_workers=settings.RAG_SHARD_WORKERS,
+            thread_name_prefix="rag-shard"
+        )
+        
         # Connect to ChromaDB
         self.client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
         
-        # Get collections
+        # 🚀 OPTIMIZATION: Trips live in SQLite (indexed analytics, primary-key hydration);
+        # the global collection only holds their vectors
+        self.trips = TripStore(os.path.join(settings.DATASET_PATH, settings.TRIP_STORE_FILE))
+        
+        # 🚀 OPTIMIZATION: Collections are resolved through the versioned index manifest,
+        # so `setup_rag.py --rebuild` can publish a new index while this one keeps serving
+        self.registry = IndexRegistry(self.client)
+        self._index_listeners: List[Callable[[], None]] = []
+        self._index_stamp = self.registry.stamp()
         try:
-            self.global_rag = self.client.get_collection("global_trip_knowledge")
-            self.personal_rag = self.client.get_collection("personal_driving_patterns")
-            
-            print(f"   Global RAG: {self.global_rag.count()} trips")
-            print(f"   Personal RAG: {self.personal_rag.count()} users")
+            self._activate(self._load_index(self.registry.read()))
             print("✅ RAG Service ready!")
         except Exception as e:
             print(f"⚠️  RAG collections not found. Run setup_rag.py first!")
             raise e
         
-        # 🚀 OPTIMIZATION: Query cache (last 50 queries)
-        self._query_cache = {}
-        self._cache_max_size = 50
+        # 🚀 OPTIMIZATION: Live personal profiles (O(1) per uploaded trip, debounced re-embed)
+        self.profiles = ProfileStore(self)
+        self.add_index_listener(self.profiles.reset)
+        # Efficiency percentiles; setup_rag.py rebuilds them before it publishes a version
+        self.efficiency = EfficiencySketches(self.trips)
+        self.add_index_listener(self.efficiency.reload)
+        # Energy consumption model (energy needed + error bars for range predictions)
+        self.energy = EnergyModel(self.trips)
+        self.add_index_listener(self.energy.reload)
+        # Nearest trips by conditions (distance, climb, weather, traffic, style), built on first use
+        self.similarity = TripSimilarityIndex(self.trips)
+        self.add_index_listener(self.similarity.reset)
+        
+        # 🚀 OPTIMIZATION: Derived indexes are memory-mapped from the last snapshot when it still
+        # matches the index version and trip store (startup does not grow with the dataset)
+        self.derived_lock = threading.RLock()  # ingest holds it from store write to derived updates
+        self._snapshot_path = os.path.join(settings.DATASET_PATH, settings.SNAPSHOT_DIR)
+        self._snapshot_saved = None
+        self._restore_snapshot()
+        
+        # Columnar copy of the trips (if generated) - analytics read only the columns they need
+        self._dataset_path = os.path.join(settings.DATASET_PATH, settings.COLUMNAR_DATASET)
+        self.dataset = ColumnarDataset.open(self._dataset_path)
+        
+        self._stop_watching = threading.Event()
+        self._watcher = threading.Thread(target=self._watch_index, name="rag-index-watcher", daemon=True)
+        self._watcher.start()
+        if settings.SNAPSHOT_INTERVAL_SECONDS > 0:
+            self._snapshotter = threading.Thread(target=self._snapshot_periodically, name="rag-snapshot",
+                                                 daemon=True)
+            self._snapshotter.start()
         
         self._initialized = True
     
-    def _extract_locations(self, query: str) -> tuple[Optional[str], Optional[str]]:
-        """🚀 OPTIMIZATION: Extract start/end locations from query for precise filtering"""
-        query_lower = query.lower()
-        
-        # Common patterns: "from X to Y", "X to Y", "reach Y from X"
-        patterns = [
-            r'from\s+([a-z\s]+?)\s+to\s+([a-z\s]+)',
-            r'reach\s+([a-z\s]+?)\s+from\s+([a-z\s]+)',
-            r'([a-z\s]+?)\s+to\s+([a-z\s]+)',
-        ]
+    def _load_index(self, manifest: Dict) -> Dict[str, Any]:
+        """Open and warm one index version (collections, projection, gazetteer)"""
+        version = manifest["version"]
+        collections = manifest["collections"]
+        
+        # 🚀 OPTIMIZATION: Queries go through the same projection the index was built with
+        projection_path = self.registry.projection_path(manifest)
+        if projection_path and os.path.exists(projection_path):
+            compressor = EmbeddingCompressor.load(projection_path)
+            print(f"   Embedding compression: {compressor.method} → {compressor.dim} dims")
+        else:
+            compressor = EmbeddingCompressor()
+        
+        # Get collections (the global trips are one collection per origin region when partitioned)
+        global_shards = {partition: self.client.get_collection(name)
+                         for partition, name in self.registry.global_shards(manifest).items()}
+        personal_rag = self.client.get_collection(collections["personal_driving_patterns"])
+        partitioned = "" if ALL_PARTITIONS in global_shards else f" in {len(global_shards)} partitions"
+        # Totals from the trip store aggregates (O(1)); collection.count() scans the segment
+        stats = self.trips.global_stats()
+        print(f"   Index v{version} - Global RAG: {stats['total_trips']} trips{partitioned}")
+        print(f"   Index v{version} - Personal RAG: {stats.get('total_users', 0)} users")
+        
+        # 🚀 OPTIMIZATION: Route prototypes - one compact doc per route/condition bucket
+        try:
+            prototype_rag = self.client.get_collection(collections["global_route_prototypes"])
+            print(f"   Route prototypes: {prototype_rag.name}")
+        except Exception:
+            prototype_rag = None
+            print("   ⚠️ Route prototypes not built, global queries use raw trips (re-run setup_rag.py)")
+        
+        # Warm the vector segments before the version takes traffic (no cold first query)
+        warm_embedding = self.embedder.encode("trips from Mumbai to Goa")
+        if compressor.enabled:
+            warm_embedding = compressor.transform(warm_embedding)[0]
+        for collection in (*global_shards.values(), personal_rag, prototype_rag):
+            if collection is not None:
+                try:
+                    collection.query(query_embeddings=[warm_embedding.tolist()], n_results=1, include=[])
+                except Exception as e:
+                    print(f"   ⚠️ Warm-up query on {collection.name} failed: {e}")
+        
+        # 🚀 OPTIMIZATION: Gazetteer of known cities (no regex backtracking, no bogus filters)
+        gazetteer = LocationGazetteer(self._distinct_locations(global_shards))
+        print(f"   Gazetteer: {len(gazetteer)} known locations")
         
-        for pattern in patterns:
-            match = re.search(pattern, query_lower)
-            if match:
-                start = match.group(1).strip().title()
-                end = match.group(2).strip().title()
-                # Handle reversed order for "reach Y from X"
-                if "reach" in pattern:
-                    return end, start
-                return start, end
+        return {
+            "index_version": version,
+            "compressor": compressor,
+            "global_shards": global_shards,
+            "personal_rag": personal_rag,
+            "prototype_rag": prototype_rag,
+            "gazetteer": gazetteer,
+        }
+    
+    def _activate(self, index: Dict[str, Any]):
+        """Swap a loaded index in and drop everything cached against the previous one"""
+        with self._cache_lock:
+            self.__dict__.update(index)  # single dict update: no half-swapped attribute set
+            self._query_cache.clear()
+        self._embed_cached.cache_clear()
+        for listener in self._index_listeners:
+            listener()
+    
+    def add_index_listener(self, callback: Callable[[], None]):
+        """Call back after a new index version is activated (e.g. to reset derived caches)"""
+        self._index_listeners.append(callback)
+    
+    def _watch_index(self):
+        """Pick up a newly published index version without a restart"""
+        while not self._stop_watching.wait(settings.INDEX_POLL_SECONDS):
+            stamp = self.registry.stamp()
+            if stamp == self._index_stamp:
+                continue
+            self._index_stamp = stamp
+            manifest = self.registry.read()
+            if manifest["version"] == self.index_version:
+                continue
+            try:
+                # Built and warmed off the request path; the old version serves meanwhile
+                index = self._load_index(manifest)
+            except Exception as e:
+                print(f"⚠️  Index v{manifest['version']} could not be loaded, "
+                      f"still serving v{self.index_version}: {e}")
+                continue
+            self._activate(index)
+            print(f"🔄 RAG Service switched to index v{self.index_version}")
+    
+    def _snapshot_stamp(self) -> Dict[str, Any]:
+        """What a snapshot was derived from: index version + trip store write counter and totals"""
+        return {"index_version": self.index_version, "trips": self.trips.content_stamp()}
+    
+    def _restore_snapshot(self):
+        started = time.perf_counter()
+        with self.derived_lock:
+            stamp = self._snapshot_stamp()
+            components, reason = read_snapshot(self._snapshot_path, stamp)
+            if components is None:
+                print(f"   Derived indexes: {reason}, built on first use")
+                return
+            if "similarity" in components:
+                self.similarity.restore(*components["similarity"])
+            self._snapshot_saved = stamp
+        print(f"   Derived indexes mapped from snapshot in {(time.perf_counter() - started) * 1000:.1f}ms")
+    
+    def save_snapshot(self):
+        """Write the built derived indexes (skipped if nothing changed since the last snapshot)"""
+        try:
+            with self.derived_lock:  # no ingest between reading the stamp and copying the index
+                stamp = self._snapshot_stamp()
+                if stamp == self._snapshot_saved:
+                    return
+                similarity = self.similarity.snapshot()
+            if similarity is None:
+                return
+            started = time.perf_counter()
+            write_snapshot(self._snapshot_path, stamp, {"similarity": similarity})
+            self._snapshot_saved = stamp
+            print(f"💾 Derived index snapshot written in {(time.perf_counter() - started) * 1000:.1f}ms")
+        except Exception as e:
+            print(f"⚠️  Derived index snapshot failed: {e}")
+    
+    def _snapshot_periodically(self):
+        while not self._stop_watching.wait(settings.SNAPSHOT_INTERVAL_SECONDS):
+            self.save_snapshot()
+    
+    def _distinct_locations(self, shards: Dict[str, Any], page_size: int = 5000) -> List[str]:
+        """Distinct start/end locations: from the trip store, else paged out of the global collection"""
+        if self.trips.has_trips():
+            return self.trips.distinct_locations()
+        locations = set()
+        for collection in shards.values():
+            offset = 0
+            while True:
+                page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                for metadata in page["metadatas"]:
+                    if metadata and "start_location" in metadata:  # index built before the trip store
+                        locations.add(metadata["start_location"])
+                        locations.add(metadata["end_location"])
+                if len(page["metadatas"]) < page_size:
+                    break
+                offset += page_size
+        return sorted(locations)
+    
+    def _extract_locations(self, query: str) -> tuple[Optional[str], Optional[str]]:
+        """🚀 OPTIMIZATION: Extract start/end locations from query for precise filtering
         
-        return None, None
+        Single linear pass over the query tokens; only cities that exist in the
+        index are returned (canonical names), so "how to charge" yields nothing.
+        """
+        return self.gazetteer.extract_route(query)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """🚀 OPTIMIZATION: Embed a query once; shared by the router and every retrieval"""
+        return self._embed_cached(query)
+    
+    def _encode_query(self, query: str) -> List[float]:
+        embedding = self.embedder.encode(query)
+        if self.compressor.enabled:
+            embedding = self.compressor.transform(embedding)[0]
+        return embedding.tolist()
+    
+    def upsert_global(self, ids: List[str], documents: List[str], metadatas: List[Dict],
+                      start_locations: Sequence[str]):
+        """Batch-embed trip documents and upsert their vectors into the served global
+        collection - the origin region's partition when the index is partitioned
+        
+        The documents themselves are not stored there - they are in the trip store.
+        """
+        with self._cache_lock:
+            # Projection and collections of the same index version, even mid-swap
+            compressor, shards = self.compressor, self.global_shards
+        embeddings = self._embed_documents(compressor, documents)
+        rows_by_partition: Dict[str, List[int]] = {}
+        for i, start in enumerate(start_locations):
+            rows_by_partition.setdefault(self._partition(shards, start), []).append(i)
+        for partition, rows in rows_by_partition.items():
+            shards[partition].upsert(ids=[ids[i] for i in rows], embeddings=[embeddings[i] for i in rows],
+                                     metadatas=[metadatas[i] for i in rows])
+    
+    def upsert_personal(self, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        """Batch-embed profile documents and upsert them into the served personal collection"""
+        with self._cache_lock:
+            compressor, collection = self.compressor, self.personal_rag
+        collection.upsert(ids=ids, documents=documents, embeddings=self._embed_documents(compressor, documents),
+                          metadatas=metadatas)
+    
+    def refresh_prototypes(self, trips: Sequence[Dict]):
+        """Rebuild the route prototypes these trips fall into from the trip store and upsert them
+        (default global retrieval reads prototypes: ingested trips count without a re-index)"""
+        with self._cache_lock:
+            compressor, collection = self.compressor, self.prototype_rag
+        if collection is None:
+            return
+        builder = RoutePrototypeBuilder()
+        for key in {prototype_key(trip) for trip in trips}:
+            for trip in self.trips.prototype_trips(*key):
+                builder.add(trip)
+        prototypes = builder.build()
+        if not prototypes:
+            return
+        texts = [create_prototype_text(proto) for proto in prototypes]
+        collection.upsert(
+            ids=[proto["prototype_id"] for proto in prototypes],
+            documents=texts,
+            embeddings=self._embed_documents(compressor, texts),
+            metadatas=[with_content_hash(text, {k: v for k, v in proto.items() if k != "prototype_id"})
+                       for text, proto in zip(texts, prototypes)]
+        )
+    
+    def _embed_documents(self, compressor: EmbeddingCompressor, documents: List[str]) -> List[List[float]]:
+        embeddings = self.embedder.encode(documents, show_progress_bar=False)
+        if compressor.enabled:
+            embeddings = compressor.transform(embeddings)
+        return embeddings.tolist()
+    
+    @staticmethod
+    def _partition(shards: Dict[str, Any], start_location: Optional[str]) -> str:
+        """Partition holding the trips that start at start_location"""
+        if ALL_PARTITIONS in shards:
+            return ALL_PARTITIONS
+        region = region_of(start_location)
+        return region if region in shards else OTHER_REGION
+    
+    @staticmethod
+    def _unpack(results: Dict, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Flatten a single-query Chroma result; fields that were not included become []"""
+        unpacked = {}
+        for field in ("documents", "metadatas", "distances"):
+            values = results.get(field)
+            values = values[0] if values and values[0] else []
+            unpacked[field] = values[:limit] if limit is not None else values
+        return unpacked
+    
+    def _hydrate(self, results: Dict, include: Sequence[str]) -> Dict:
+        """Fill trip hits' documents / metadata from the trip store (primary-key lookups)
+        
+        Hits the store does not know keep whatever Chroma returned (an index built
+        before the trip store still carries its own documents and metadata).
+        """
+        ids = results["ids"][0] if results.get("ids") else []
+        if not ids or not {"documents", "metadatas"} & set(include):
+            return results
+        stored = self.trips.get_trips(ids)
+        for position, field in enumerate(("documents", "metadatas")):
+            if field in include:
+                returned = (results.get(field) or [None])[0] or [None] * len(ids)
+                results[field] = [[stored[trip_id][position] if trip_id in stored else returned[i]
+                                   for i, trip_id in enumerate(ids)]]
+        return results
+    
+    def _query_route_trips(self, collection, start: str, end: str,
+                           query_embedding: List[float], n_results: int) -> Dict:
+        """🚀 OPTIMIZATION: Route filter as indexed SQL - the newest RAG_ROUTE_CANDIDATES trips
+        of the route are fetched by id and ranked by (squared L2) distance in NumPy"""
+        ids = self.trips.route_trip_ids(start, end, settings.RAG_ROUTE_CANDIDATES)
+        if not ids:
+            return {"ids": [[]], "distances": [[]]}
+        candidates = collection.get(ids=ids, include=["embeddings"])
+        vectors = np.asarray(candidates["embeddings"], dtype=np.float32)
+        distances = ((vectors - np.asarray(query_embedding, dtype=np.float32)) ** 2).sum(axis=1)
+        order = np.argsort(distances, kind="stable")[:n_results]
+        return {
+            "ids": [[candidates["ids"][i] for i in order]],
+            "distances": [[float(distances[i]) for i in order]],
+        }
+    
+    def _global_source(self, source: Optional[str] = None) -> str:
+        """Resolve the global source ("prototypes" | "trips")"""
+        source = source or settings.RAG_GLOBAL_SOURCE
+        if source == "prototypes" and self.prototype_rag is not None:
+            return "prototypes"
+        return "trips"
+    
+    def _query_trips(self, query: str, query_embedding: List[float], n_results: int,
+                     include: Sequence[str]) -> Dict:
+        """🚀 OPTIMIZATION: Semantic trip search routed by origin
+        
+        With a known origin only that region's partition is searched; otherwise every
+        partition is queried in parallel and the nearest hits are merged (scatter-gather).
+        """
+        shards = self.global_shards
+        if len(shards) == 1:
+            collection = next(iter(shards.values()))
+            return collection.query(query_embeddings=[query_embedding], n_results=n_results, include=include)
+        
+        origin = self.gazetteer.extract_origin(query)
+        if origin is not None:
+            partition = self._partition(shards, origin)
+            print(f"🧭 Routing to partition '{partition}' (origin {origin})")
+            return shards[partition].query(query_embeddings=[query_embedding], n_results=n_results, include=include)
+        
+        futures = [
+            self._shard_executor.submit(shard.query, query_embeddings=[query_embedding],
+                                        n_results=n_results, include=include)
+            for shard in shards.values()
+        ]
+        merged = {field: [] for field in ("ids", *include)}
+        for future in futures:
+            results = future.result()
+            hits = len(results["ids"][0])
+            for field in merged:
+                merged[field] += (results.get(field) or [None])[0] or [None] * hits
+        order = np.argsort(merged["distances"], kind="stable")[:n_results]
+        return {field: [[values[i] for i in order]] for field, values in merged.items()}
     
-    def query_global(self, query: str, n_results: int = 3) -> Dict[str, Any]:
-        """🚀 OPTIMIZED: Query global trip knowledge with metadata filtering & caching"""
+    def query_global(self, query: str, n_results: int = 3,
+                     query_embedding: Optional[List[float]] = None,
+                     include: Sequence[str] = ("documents", "metadatas"),
+                     source: Optional[str] = None) -> Dict[str, Any]:
+        """🚀 OPTIMIZED: Query global trip knowledge with metadata filtering & caching
+        
+        Defaults to route prototypes, so one document already summarises a route
+        under the matching conditions; pass source="trips" for individual trips.
+        """
+        source = self._global_source(source)
         
         # 🚀 OPTIMIZATION 1: Check cache first
-        cache_key = f"global:{query}:{n_results}"
-        if cache_key in self._query_cache:
+        include = sorted(set(include) | {"distances"})  # distances drive the quality filter
+        cache_key = f"v{self.index_version}:global:{source}:{query}:{n_results}:{','.join(include)}"
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
             print(f"💨 Cache hit for: '{query}'")
-            return self._query_cache[cache_key]
+            return cached
+        
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         
         # 🚀 OPTIMIZATION 2: Try metadata filtering first (MUCH faster than semantic search)
         start, end = self._extract_locations(query)
@@ -95,152 +458,232 @@ class RAGService:
         if start and end:
             print(f"🎯 Using metadata filter: {start} → {end}")
             
-            # Direct metadata query (instant, no embeddings needed)
+            # Filtered query: only this route's documents are candidates
             try:
-                results = self.global_rag.query(
-                    query_embeddings=[self.embedder.encode(query).tolist()],
-                    n_results=n_results,
-                    where={
-                        "$and": [
-                            {"start_location": {"$eq": start}},
-                            {"end_location": {"$eq": end}}
-                        ]
-                    }
-                )
+                if source == "trips" and self.trips.has_trips():
+                    shard = self.global_shards[self._partition(self.global_shards, start)]
+                    results = self._hydrate(
+                        self._query_route_trips(shard, start, end, query_embedding, n_results), include
+                    )
+                else:
+                    collection = self.prototype_rag if source == "prototypes" else \
+                        self.global_shards[self._partition(self.global_shards, start)]
+                    results = collection.query(
+                        query_embeddings=[query_embedding],
+                        n_results=n_results,
+                        where={
+                            "$and": [
+                                {"start_location": {"$eq": start}},
+                                {"end_location": {"$eq": end}}
+                            ]
+                        },
+                        include=include
+                    )
                 
                 # If exact match found, return immediately
-                if results['documents'][0]:
-                    print(f"   ✅ Found {len(results['documents'][0])} exact matches")
-                    result_dict = {
-                        "documents": results["documents"][0],
-                        "metadatas": results["metadatas"][0],
-                        "distances": results["distances"][0]
-                    }
+                if results['ids'][0]:
+                    print(f"   ✅ Found {len(results['ids'][0])} exact matches")
+                    result_dict = self._unpack(results)
                     self._cache_result(cache_key, result_dict)
-                    self._print_results(query, results)
+                    self._print_results(query, result_dict)
                     return result_dict
             except Exception as e:
                 print(f"   ⚠️ Metadata filter failed, falling back to semantic search: {e}")
         
         # 🚀 OPTIMIZATION 3: Fallback to semantic search with similarity threshold
-        query_embedding = self.embedder.encode(query)
-        
-        results = self.global_rag.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=n_results * 2  # Get more, then filter by quality
-        )
+        if source == "trips":
+            results = self._hydrate(self._query_trips(query, query_embedding, n_results * 2, include), include)
+        else:
+            results = self.prototype_rag.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results * 2,  # Get more, then filter by quality
+                include=include
+            )
+        candidates = self._unpack(results)
         
         # 🚀 OPTIMIZATION 4: Filter by similarity threshold (0.3 = 70% similar)
         SIMILARITY_THRESHOLD = 0.3
-        filtered_docs = []
-        filtered_meta = []
-        filtered_dist = []
-        
-        if results['distances'] and results['distances'][0]:
-            for doc, meta, dist in zip(
-                results['documents'][0],
-                results['metadatas'][0],
-                results['distances'][0]
-            ):
-                if dist <= SIMILARITY_THRESHOLD:  # Lower distance = more similar
-                    filtered_docs.append(doc)
-                    filtered_meta.append(meta)
-                    filtered_dist.append(dist)
-                
-                if len(filtered_docs) >= n_results:
-                    break
+        keep = [i for i, dist in enumerate(candidates["distances"])
+                if dist <= SIMILARITY_THRESHOLD][:n_results]  # Lower distance = more similar
+        if not keep:
+            keep = list(range(min(n_results, len(candidates["distances"]))))
         
         result_dict = {
-            "documents": filtered_docs or results["documents"][0][:n_results],
-            "metadatas": filtered_meta or results["metadatas"][0][:n_results],
-            "distances": filtered_dist or results["distances"][0][:n_results]
+            field: [values[i] for i in keep] if values else []
+            for field, values in candidates.items()
         }
         
         self._cache_result(cache_key, result_dict)
-        self._print_results(query, {"documents": [result_dict["documents"]], "distances": [result_dict["distances"]]})
+        self._print_results(query, result_dict)
         
         return result_dict
     
     def _cache_result(self, key: str, result: Dict):
         """Cache query result with LRU eviction"""
-        if len(self._query_cache) >= self._cache_max_size:
-            # Remove oldest entry
-            self._query_cache.pop(next(iter(self._query_cache)))
-        self._query_cache[key] = result
+        with self._cache_lock:
+            if len(self._query_cache) >= self._cache_max_size:
+                # Remove oldest entry
+                self._query_cache.pop(next(iter(self._query_cache)))
+            self._query_cache[key] = result
     
     def _print_results(self, query: str, results: Dict):
         """Print search results with similarity scores"""
         print(f"🔎 RAG Search for: '{query}'")
-        if results['distances'] and results['distances'][0]:
-            for i, (doc, dist) in enumerate(zip(results['documents'][0][:3], results['distances'][0][:3])):
-                similarity = 1 - dist  # Convert distance to similarity
-                print(f"   Result {i+1}: Similarity={similarity:.3f}, Preview={doc[:100]}...")
-        
-        return {
-            "documents": results["documents"][0],
-            "metadatas": results["metadatas"][0],
-            "distances": results["distances"][0]
-        }
+        documents = results['documents'] or [""] * len(results['distances'])
+        for i, (doc, dist) in enumerate(zip(documents[:3], results['distances'][:3])):
+            similarity = 1 - dist  # Convert distance to similarity
+            print(f"   Result {i+1}: Similarity={similarity:.3f}, Preview={doc[:100]}...")
     
-    def query_personal(self, user_id: str, query: str, n_results: int = 1) -> Dict[str, Any]:
+    def query_personal(self, user_id: str, query: str, n_results: int = 1,
+                       query_embedding: Optional[List[float]] = None,
+                       include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, Any]:
         """🚀 OPTIMIZED: Query personal patterns - reduced to 1 result (only need efficiency)"""
         
+        # 🚀 OPTIMIZATION: A profile updated by an upload is served from memory (one
+        # document per user, so there is nothing to rank and nothing stale to embed)
+        live_document = self.profiles.document(user_id)
+        if live_document is not None:
+            return {
+                "documents": [live_document] if "documents" in include else [],
+                "metadatas": [self.profiles.profile(user_id)] if "metadatas" in include else [],
+                "distances": [0.0] if "distances" in include else [],
+            }
+        
         # 🚀 OPTIMIZATION: Cache personal queries too
-        cache_key = f"personal:{user_id}:{query}:{n_results}"
-        if cache_key in self._query_cache:
-            return self._query_cache[cache_key]
+        include = sorted(include)
+        cache_key = f"v{self.index_version}:personal:{user_id}:{query}:{n_results}:{','.join(include)}"
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        query_embedding = self.embedder.encode(query)
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         
         results = self.personal_rag.query(
-            query_embeddings=[query_embedding.tolist()],
+            query_embeddings=[query_embedding],
             n_results=n_results,
-            where={"user_id": user_id}
+            where={"user_id": user_id},
+            include=include
         )
         
-        result_dict = {
-            "documents": results["documents"][0] if results["documents"][0] else [],
-            "metadatas": results["metadatas"][0] if results["metadatas"][0] else [],
-            "distances": results["distances"][0] if results["distances"][0] else []
-        }
+        result_dict = self._unpack(results)
         
         self._cache_result(cache_key, result_dict)
         return result_dict
     
     def query_both(self, user_id: str, query: str) -> Dict[str, Any]:
         """🚀 OPTIMIZED: Query both RAG systems - reduced personal to 1 result"""
-        global_results = self.query_global(query, n_results=3)
-        personal_results = self.query_personal(user_id, query, n_results=1)  # Only need user efficiency
+        return self.retrieve(user_id, query, RetrievalPlan("both", global_results=3, personal_results=1))
+    
+    async def aquery_both(self, user_id: str, query: str) -> Dict[str, Any]:
+        """Async query_both - both branches run concurrently"""
+        return await self.aretrieve(user_id, query, RetrievalPlan("both", global_results=3, personal_results=1))
+    
+    def _submit_branches(self, user_id: str, query: str, plan: RetrievalPlan,
+                         query_embedding: List[float]) -> Dict[str, tuple]:
+        """🚀 OPTIMIZATION: Start every planned branch on the pool -> {name: (future, timeout)}"""
+        branches = {}
+        if plan.global_results:
+            branches["global"] = (
+                self._executor.submit(self.query_global, query, plan.global_results, query_embedding,
+                                      plan.global_include, plan.global_source),
+                settings.RAG_GLOBAL_TIMEOUT_SECONDS
+            )
+        if plan.personal_results:
+            branches["personal"] = (
+                self._executor.submit(self.query_personal, user_id, query, plan.personal_results,
+                                      query_embedding, plan.personal_include),
+                settings.RAG_PERSONAL_TIMEOUT_SECONDS
+            )
+        return branches
+    
+    @staticmethod
+    def _empty_result() -> Dict[str, Any]:
+        return {"documents": [], "metadatas": [], "distances": []}
+    
+    def retrieve(self, user_id: str, query: str, plan: RetrievalPlan,
+                 query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """🚀 OPTIMIZED: Run only the retrievals the plan asks for, concurrently
+        
+        Skipped stores come back empty; a branch that misses its timeout also
+        comes back empty (the prompt then says "No personal history").
+        """
+        if query_embedding is None and plan.stores:
+            query_embedding = self.embed_query(query)
+        
+        results = {"global": self._empty_result(), "personal": self._empty_result()}
+        started = time.monotonic()
+        for name, (future, timeout) in self._submit_branches(user_id, query, plan, query_embedding).items():
+            try:
+                results[name] = future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+            except FutureTimeoutError:
+                print(f"   ⏱️ {name} retrieval exceeded {timeout}s, continuing without it")
         
-        return {
-            "global": global_results,
-            "personal": personal_results
-        }
+        return results
+    
+    async def aretrieve(self, user_id: str, query: str, plan: RetrievalPlan,
+                        query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Async retrieve - does not block the event loop while Chroma / the embedder work"""
+        if query_embedding is None and plan.stores:
+            loop = asyncio.get_running_loop()
+            query_embedding = await loop.run_in_executor(self._executor, self.embed_query, query)
+        
+        async def _await_branch(name: str, future, timeout: float):
+            try:
+                return name, await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            except asyncio.TimeoutError:
+                # The worker keeps running and still fills the cache for next time
+                print(f"   ⏱️ {name} retrieval exceeded {timeout}s, continuing without it")
+                return name, self._empty_result()
+        
+        branches = self._submit_branches(user_id, query, plan, query_embedding)
+        results = {"global": self._empty_result(), "personal": self._empty_result()}
+        results.update(await asyncio.gather(
+            *(_await_branch(name, future, timeout) for name, (future, timeout) in branches.items())
+        ))
+        return results
+    
+    def close(self):
+        """Release the retrieval thread pool and stop watching the index manifest"""
+        self._stop_watching.set()
+        self.profiles.close()  # write pending profile updates
+        self.energy.flush()  # re-solve with trips recorded since the last refit
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._shard_executor.shutdown(wait=False, cancel_futures=True)
+        self.trips.close()
     
-    def find_similar_trips(self, start: str, end: str, n_results: int = 5) -> List[Dict]:
-        """🚀 OPTIMIZED: Find similar trips using metadata filter (much faster)"""
+    def find_similar_trips(self, start: str, end: str, n_results: int = 5,
+                           battery_percent: Optional[float] = None, weather: Optional[str] = None,
+                           traffic: Optional[str] = None, driving_style: Optional[str] = None) -> List[Dict]:
+        """🚀 OPTIMIZED: Nearest trips by route and driving conditions (numeric feature index)
+        
+        Conditions that are not given are not compared. Trips on the same route rank
+        first when conditions are alike; a route nobody has driven still gets the
+        trips closest in conditions (same origin / destination preferred).
+        """
+        
+        # Accept aliases / typos ("Bengaluru", "Mumbia") from the request
+        start = self.gazetteer.canonical(start) or start
+        end = self.gazetteer.canonical(end) or end
         
-        # 🚀 OPTIMIZATION: Use metadata filter instead of semantic search
         try:
-            results = self.global_rag.get(
-                where={
-                    "$and": [
-                        {"start_location": {"$eq": start}},
-                        {"end_location": {"$eq": end}}
-                    ]
-                },
-                limit=n_results
+            nearest = self.similarity.nearest(
+                n_results, start=start, end=end, weather=weather, traffic=traffic,
+                driving_style=driving_style, battery_percent=battery_percent,
             )
-            
-            if results["metadatas"]:
-                print(f"🎯 Found {len(results['metadatas'])} exact trips: {start} → {end}")
-                return results["metadatas"][:n_results]
+            stored = self.trips.get_trips([trip_id for trip_id, _ in nearest])
+            trips = [{**stored[trip_id][1], "similarity_distance": round(distance, 3)}
+                     for trip_id, distance in nearest if trip_id in stored]
+            if trips:
+                exact = sum(1 for trip in trips if (trip["start_location"], trip["end_location"]) == (start, end))
+                print(f"🎯 Found {len(trips)} similar trips ({exact} on {start} → {end})")
+                return trips
         except Exception as e:
-            print(f"   ⚠️ Metadata query failed: {e}")
+            print(f"   ⚠️ Similarity index query failed: {e}")
         
         # Fallback to semantic search
         query = f"trip from {start} to {end}"
-        results = self.query_global(query, n_results)
+        results = self.query_global(query, n_results, source="trips")
         
         similar_trips = []
         for metadata in results["metadatas"]:
@@ -252,73 +695,89 @@ class RAGService:
     
     def get_user_profile(self, user_id: str) -> Optional[Dict]:
         """Get user's driving profile from personal RAG"""
+        live_profile = self.profiles.profile(user_id)
+        if live_profile is not None:
+            return live_profile
         try:
             results = self.personal_rag.get(ids=[f"profile_{user_id}"])
             
             if results["metadatas"]:
-                return results["metadatas"][0]
+                # content_hash / embedding_model are index bookkeeping, not profile data
+                return {k: v for k, v in results["metadatas"][0].items()
+                        if k not in ("content_hash", "embedding_model")}
             return None
         except Exception as e:
             print(f"Error getting user profile: {e}")
             return None
     
+    def trip_dataset(self) -> Optional[ColumnarDataset]:
+        """Columnar trip dataset, picked up or reloaded if another process (re)generated it"""
+        if self.dataset is None:
+            self.dataset = ColumnarDataset.open(self._dataset_path)
+        elif ColumnarDataset.exists(self._dataset_path):
+            self.dataset.refresh()
+        return self.dataset
+    
     def get_popular_routes(self, limit: int = 10) -> List[Dict]:
-        """Get most popular routes from global data"""
-        results = self.global_rag.get(limit=1000)
-        
-        route_counts = {}
-        for metadata in results["metadatas"]:
-            route_key = f"{metadata['start_location']} → {metadata['end_location']}"
-            
-            if route_key not in route_counts:
-                route_counts[route_key] = {
-                    "route": route_key,
-                    "from": metadata["start_location"],
-                    "to": metadata["end_location"],
-                    "count": 0,
-                    "avg_distance": 0,
-                    "avg_efficiency": 0,
-                    "distances": [],
-                    "efficiencies": []
-                }
-            
-            route_counts[route_key]["count"] += 1
-            route_counts[route_key]["distances"].append(metadata["distance_km"])
-            route_counts[route_key]["efficiencies"].append(metadata["efficiency_kwh_per_100km"])
-        
-        for route in route_counts.values():
-            route["avg_distance"] = round(sum(route["distances"]) / len(route["distances"]), 1)
-            route["avg_efficiency"] = round(sum(route["efficiencies"]) / len(route["efficiencies"]), 2)
-            del route["distances"]
-            del route["efficiencies"]
-        
-        popular_routes = sorted(
-            route_counts.values(),
-            key=lambda x: x["count"],
-            reverse=True
-        )[:limit]
-        
+        """Get most popular routes from global data (materialized route aggregates)"""
+        routes = self.trips.popular_routes(limit)
+        if routes:
+            return routes
+        
+        dataset = self.trip_dataset()
+        if dataset is not None and dataset.rows("trips"):
+            return self._popular_routes_columnar(dataset, limit)
+        return []
+    
+    @staticmethod
+    def _popular_routes_columnar(dataset: ColumnarDataset, limit: int) -> List[Dict]:
+        """🚀 OPTIMIZATION: All trips, four memory-mapped columns, one bincount per aggregate"""
+        starts = dataset.vocab("trips", "start_location")
+        ends = dataset.vocab("trips", "end_location")
+        keys = dataset.column("trips", "start_location").astype(np.int64) * len(ends) \
+            + dataset.column("trips", "end_location")
+        counts = np.bincount(keys)
+        distances = np.bincount(keys, weights=dataset.column("trips", "distance_km"))
+        efficiencies = np.bincount(keys, weights=dataset.column("trips", "efficiency_kwh_per_100km"))
+        
+        popular_routes = []
+        for key in np.argsort(-counts, kind="stable")[:limit]:
+            if counts[key] == 0:
+                break
+            start, end = starts[key // len(ends)], ends[key % len(ends)]
+            popular_routes.append({
+                "route": f"{start} → {end}",
+                "from": start,
+                "to": end,
+                "count": int(counts[key]),
+                "avg_distance": round(float(distances[key] / counts[key]), 1),
+                "avg_efficiency": round(float(efficiencies[key] / counts[key]), 2)
+            })
         return popular_routes
     
+    def get_efficiency_trend(self, **filters) -> List[Dict]:
+        """Efficiency by period / route / conditions, summed from the rollup buckets
+        (see TripStore.efficiency_rollup for the filters)"""
+        return self.trips.efficiency_rollup(**filters)
+    
     def get_global_stats(self) -> Dict:
-        """Get statistics from global RAG"""
-        total_trips = self.global_rag.count()
-        sample = self.global_rag.get(limit=500)
-        
-        if not sample["metadatas"]:
-            return {"total_trips": 0}
-        
-        efficiencies = [m["efficiency_kwh_per_100km"] for m in sample["metadatas"]]
-        distances = [m["distance_km"] for m in sample["metadatas"]]
-        
-        return {
-            "total_trips": total_trips,
-            "total_users": self.personal_rag.count(),
-            "avg_efficiency": round(sum(efficiencies) / len(efficiencies), 2),
-            "avg_distance": round(sum(distances) / len(distances), 1),
-            "most_efficient": round(min(efficiencies), 2),
-            "least_efficient": round(max(efficiencies), 2)
-        }
+        """Get statistics over all global trips (materialized global aggregates)"""
+        stats = self.trips.global_stats()
+        if stats["total_trips"]:
+            return stats
+        
+        dataset = self.trip_dataset()
+        if dataset is not None and dataset.rows("trips"):
+            efficiencies = dataset.column("trips", "efficiency_kwh_per_100km")
+            return {
+                "total_trips": dataset.rows("trips"),
+                "total_users": self.personal_rag.count(),
+                "avg_efficiency": round(float(np.nanmean(efficiencies)), 2),
+                "avg_distance": round(float(np.nanmean(dataset.column("trips", "distance_km"))), 1),
+                "most_efficient": round(float(np.nanmin(efficiencies)), 2),
+                "least_efficient": round(float(np.nanmax(efficiencies)), 2)
+            }
+        return {"total_trips": 0}
 
 # Singleton instance
 rag_service = RAGService()
@@ -0,0 +1,280 @@
+"""
+Similarity Index - k nearest trips on numeric trip features
+
+Trips are compared on distance, elevation change, temperature, traffic delay,
+average speed, driving style and starting battery, each standardized over the
+indexed trips and weighted by SIMILAR_TRIP_WEIGHTS. A request condition the
+caller cannot know (e.g. the distance of a route nobody has driven) is left out
+of the comparison instead of guessed. Trips on other routes are penalized
+(half for sharing one endpoint), so an exact route wins when conditions match.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+
+FEATURES = ("distance_km", "elevation_change_m", "temperature_c", "traffic_delay_mins",
+            "avg_speed_kmh", "style", "start_battery_percent")
+# Driving styles from most to least efficient (generate_dataset.DRIVING_STYLES)
+STYLE_ORDER = {"eco": 0.0, "normal": 1.0, "sporty": 2.0, "aggressive": 3.0}
+_FIELDS = ("trip_id", "start_location", "end_location", "weather", "traffic", "driving_style",
+           *(feature for feature in FEATURES if feature != "style"))
+
+
+def trip_features(trip: Dict) -> List[float]:
+    """Raw feature vector of a trip record / row (NaN = unknown)"""
+    return [
+        *(float(trip[feature]) if trip.get(feature) is not None else np.nan for feature in FEATURES[:5]),
+        STYLE_ORDER.get(trip.get("driving_style"), np.nan),
+        float(trip["start_battery_percent"]) if trip.get("start_battery_percent") is not None else np.nan,
+    ]
+
+
+class _GroupMeans:
+    """Running means of some features per key (route, weather, traffic)"""
+
+    def __init__(self, columns: Sequence[int]):
+        self.columns = list(columns)
+        self.sums: Dict[tuple, np.ndarray] = {}
+        self.counts: Dict[tuple, np.ndarray] = {}
+
+    def add(self, key: tuple, features: np.ndarray, sign: int = 1):
+        values = features[self.columns]
+        known = ~np.isnan(values)
+        self.sums.setdefault(key, np.zeros(len(self.columns)))[known] += sign * values[known]
+        self.counts.setdefault(key, np.zeros(len(self.columns)))[known] += sign
+
+    def mean(self, key: tuple) -> Optional[np.ndarray]:
+        counts = self.counts.get(key)
+        if counts is None:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, self.sums[key] / counts, np.nan)
+
+    def to_json(self) -> List[list]:
+        return [[list(key), self.sums[key].tolist(), counts.tolist()] for key, counts in self.counts.items()]
+
+    def load_json(self, groups: List[list]):
+        self.sums = {tuple(key): np.array(sums) for key, sums, _ in groups}
+        self.counts = {tuple(key): np.array(counts) for key, _, counts in groups}
+
+
+class TripSimilarityIndex:
+    """🚀 OPTIMIZATION: Vectorized brute force over a standardized float32 matrix
+
+    The weighted squared distance is expanded (x·x)w - 2x·(wq) + q·(wq), so a
+    query is two matrix-vector products over precomputed x and x*x plus an
+    argpartition - no per-query N x F temporaries. Built lazily from the trip
+    store; ingested trips are appended (or overwrite their row if re-uploaded).
+    All per-trip state is in flat arrays, so the index can be written as a
+    snapshot and memory-mapped back at startup (snapshot() / restore()).
+    """
+
+    _ARRAYS = ("_x", "_x2", "_raw", "_codes", "_ids")
+
+    def __init__(self, store, weights: Optional[Dict[str, float]] = None):
+        self._store = store
+        self.weights = dict(settings.SIMILAR_TRIP_WEIGHTS if weights is None else weights)
+        self._lock = threading.Lock()
+        self._built = False
+
+    def reset(self):
+        """Rebuild from the trip store on next use (a new index version was published)"""
+        with self._lock:
+            self._built = False
+
+    def _allocate(self, capacity: int):
+        self._x = np.zeros((capacity, len(FEATURES)), dtype=np.float32)
+        self._x2 = np.zeros_like(self._x)
+        self._raw = np.zeros((capacity, len(FEATURES)), dtype=np.float64)  # unscaled features
+        self._codes = np.zeros((capacity, 4), dtype=np.int32)  # word codes: start, end, weather, traffic
+        self._ids = np.zeros(capacity, dtype="<U32")
+        self._size = 0
+        self._positions: Optional[Dict[str, int]] = {}
+        self._words: List[Optional[str]] = []
+        self._vocab: Dict[Optional[str], int] = {}
+        self._new_groups()
+
+    def _new_groups(self):
+        self._routes = _GroupMeans([FEATURES.index("distance_km"), FEATURES.index("elevation_change_m")])
+        self._weather = _GroupMeans([FEATURES.index("temperature_c")])
+        self._traffic = _GroupMeans([FEATURES.index("traffic_delay_mins"), FEATURES.index("avg_speed_kmh")])
+
+    def _build(self):
+        rows, after = [], None
+        while True:
+            page, after = self._store.export_page("trips", _FIELDS, after=after, limit=10000)
+            rows.extend(page)
+            if len(page) < 10000:
+                break
+        raw = np.array([trip_features(row) for row in rows], dtype=np.float64).reshape(-1, len(FEATURES))
+        self._mean = np.nan_to_num(np.nanmean(raw, axis=0)) if len(raw) else np.zeros(len(FEATURES))
+        std = np.nan_to_num(np.nanstd(raw, axis=0)) if len(raw) else np.ones(len(FEATURES))
+        self._std = np.where(std > 0, std, 1.0)
+        self._allocate(max(1024, len(rows) * 2))
+        self._append(rows, raw)
+        self._built = True
+        print(f"🧭 Trip similarity index: {self._size:,} trips x {len(FEATURES)} features")
+
+    def _code(self, word: Optional[str]) -> int:
+        code = self._vocab.get(word)
+        if code is None:
+            code = self._vocab[word] = len(self._words)
+            self._words.append(word)
+        return code
+
+    def _append(self, trips: Sequence[Dict], raw: np.ndarray):
+        if self._positions is None:  # restored from a snapshot: id lookup built on first ingest
+            self._positions = {str(trip_id): i for i, trip_id in enumerate(self._ids[:self._size])}
+        for trip, features in zip(trips, raw):
+            position = self._positions.get(trip["trip_id"])
+            if position is None:
+                if self._size == len(self._x):
+                    self._grow()
+                if len(trip["trip_id"]) > self._ids.dtype.itemsize // 4:
+                    self._ids = self._ids.astype(f"<U{len(trip['trip_id'])}")
+                position = self._size
+                self._size += 1
+                self._positions[trip["trip_id"]] = position
+                self._ids[position] = trip["trip_id"]
+            else:
+                self._group_stats(position, -1)  # re-upload replaces
+            scaled = np.nan_to_num((features - self._mean) / self._std)  # unknown = average
+            self._x[position] = scaled
+            self._x2[position] = scaled * scaled
+            self._raw[position] = features
+            self._codes[position] = [self._code(trip["start_location"]), self._code(trip["end_location"]),
+                                     self._code(trip.get("weather")), self._code(trip.get("traffic"))]
+            self._group_stats(position, 1)
+
+    def _grow(self):
+        capacity = max(len(self._x) * 2, 1024)
+        for name in self._ARRAYS:
+            old = getattr(self, name)
+            new = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)  # queries keep reading their snapshot of the old array
+
+    def _group_stats(self, position: int, sign: int):
+        start, end, weather, traffic = (self._words[code] for code in self._codes[position])
+        features = self._raw[position]
+        self._routes.add((start, end), features, sign)
+        self._weather.add((weather,), features, sign)
+        self._traffic.add((traffic,), features, sign)
+
+    def add(self, trips: Sequence[Dict]):
+        """Index freshly stored trips (no-op until the index is first built)"""
+        with self._lock:
+            if self._built and trips:
+                self._append(trips, np.array([trip_features(trip) for trip in trips], dtype=np.float64))
+
+    # ------------------------------------------------------------------ snapshots
+
+    def snapshot(self) -> Optional[Tuple[Dict[str, np.ndarray], Dict]]:
+        """(arrays, metadata) for utils.snapshot, or None while the index is not built (or empty)"""
+        with self._lock:
+            if not self._built or self._size == 0:
+                return None
+            n = self._size
+            arrays = {name.lstrip("_"): getattr(self, name)[:n].copy() for name in self._ARRAYS}
+            arrays["mean"], arrays["std"] = self._mean.copy(), self._std.copy()
+            metadata = {
+                "size": n,
+                "words": list(self._words),
+                "routes": self._routes.to_json(),
+                "weather": self._weather.to_json(),
+                "traffic": self._traffic.to_json(),
+            }
+        return arrays, metadata
+
+    def restore(self, arrays: Dict[str, np.ndarray], metadata: Dict):
+        """Adopt a snapshot (arrays may be copy-on-write memory maps; appends copy them on grow)"""
+        with self._lock:
+            for name in self._ARRAYS:
+                setattr(self, name, arrays[name.lstrip("_")])
+            self._mean, self._std = np.asarray(arrays["mean"]), np.asarray(arrays["std"])
+            self._size = metadata["size"]
+            self._positions = None
+            self._words = list(metadata["words"])
+            self._vocab = {word: code for code, word in enumerate(self._words)}
+            self._new_groups()
+            self._routes.load_json(metadata["routes"])
+            self._weather.load_json(metadata["weather"])
+            self._traffic.load_json(metadata["traffic"])
+            self._built = True
+
+    def route_profile(self, start: str, end: str) -> Optional[Tuple[float, float, str]]:
+        """(mean distance km, mean elevation change m, "route" / "reverse_route") of a route's trips"""
+        return self.route_profiles([(start, end)])[start, end]
+
+    def route_profiles(self, routes: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[Tuple]]:
+        """route_profile of each distinct (start, end) pair, under one lock acquisition"""
+        with self._lock:
+            if not self._built:
+                self._build()
+            means = {(start, end): (self._routes.mean((start, end)), self._routes.mean((end, start)))
+                     for start, end in set(routes)}
+        profiles = {}
+        for key, (route, reverse) in means.items():
+            profiles[key] = None
+            for mean, sign, source in ((route, 1, "route"), (reverse, -1, "reverse_route")):
+                if mean is not None and not np.isnan(mean[0]):
+                    profiles[key] = float(mean[0]), (0.0 if np.isnan(mean[1]) else sign * float(mean[1])), source
+                    break
+        return profiles
+
+    def _query_vector(self, start: Optional[str], end: Optional[str], weather: Optional[str],
+                      traffic: Optional[str], driving_style: Optional[str],
+                      battery_percent: Optional[float]) -> np.ndarray:
+        """Raw query features from the request and the indexed trips (NaN = unknown)"""
+        query = np.full(len(FEATURES), np.nan)
+        route = self._routes.mean((start, end))
+        reverse = self._routes.mean((end, start))
+        if route is not None:
+            query[[0, 1]] = route
+        elif reverse is not None:
+            query[[0, 1]] = reverse[0], -reverse[1]  # same road, climb reversed
+        temperature = self._weather.mean((weather,))
+        if temperature is not None:
+            query[2] = temperature[0]
+        delay_speed = self._traffic.mean((traffic,))
+        if delay_speed is not None:
+            query[[3, 4]] = delay_speed
+        query[5] = STYLE_ORDER.get(driving_style, np.nan)
+        if battery_percent is not None:
+            query[6] = battery_percent
+        return query
+
+    def nearest(self, k: int, start: Optional[str] = None, end: Optional[str] = None,
+                weather: Optional[str] = None, traffic: Optional[str] = None,
+                driving_style: Optional[str] = None, battery_percent: Optional[float] = None,
+                weights: Optional[Dict[str, float]] = None) -> List[Tuple[str, float]]:
+        """The k most similar trips as (trip_id, weighted distance), nearest first"""
+        with self._lock:
+            if not self._built:
+                self._build()
+            n = self._size
+            if n == 0 or k <= 0:
+                return []
+            x, x2, codes, ids = self._x[:n], self._x2[:n], self._codes[:n], self._ids
+            raw = self._query_vector(start, end, weather, traffic, driving_style, battery_percent)
+            start_code, end_code = self._vocab.get(start, -1), self._vocab.get(end, -1)
+            mean, std = self._mean, self._std
+
+        weights = {**self.weights, **(weights or {})}
+        w = np.array([weights.get(feature, 0.0) for feature in FEATURES])
+        q = (raw - mean) / std
+        w[np.isnan(q)] = 0.0  # unknown request conditions do not count
+        q = np.nan_to_num(q)
+        wq = (w * q).astype(np.float32)
+        distances = x2 @ w.astype(np.float32) - 2 * (x @ wq) + float(wq @ q)
+        route_weight = weights.get("route", 0.0)
+        if route_weight and (start is not None or end is not None):
+            distances += route_weight / 2 * ((codes[:, 0] != start_code).astype(np.float32)
+                                             + (codes[:, 1] != end_code).astype(np.float32))
+
+        k = min(k, n)
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return [(str(ids[i]), max(float(distances[i]), 0.0)) for i in nearest]
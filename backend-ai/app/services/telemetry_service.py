@@ -0,0 +1,473 @@
+"""
+Telemetry Service - rolls streamed vehicle samples up into trips online
+"""
+
+import json
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.ingest_service import ingest_service, IngestQueueFull
+from app.services.rag_service import rag_service
+
+# One sample = 24 bytes; the binary endpoint accepts exactly this little-endian layout
+SAMPLE_DTYPE = np.dtype([
+    ("ts", "<f8"),             # unix seconds
+    ("soc", "<f4"),            # state of charge, %
+    ("speed_kmh", "<f4"),
+    ("elevation_m", "<f4"),
+    ("temperature_c", "<f4"),
+])
+SAMPLE_FIELDS = SAMPLE_DTYPE.names
+
+MOVING_KMH = 1.0   # below this the vehicle is stationary (charging / parked)
+CRAWL_KMH = 20.0   # moving slower than this counts as traffic delay
+
+
+class TelemetryError(ValueError):
+    """Malformed telemetry payload (answered with 400)"""
+
+
+def _check_battery(battery_kwh: Optional[float]):
+    if battery_kwh is not None and not (math.isfinite(battery_kwh) and battery_kwh > 0):
+        raise TelemetryError("battery_kwh must be a positive number")
+
+
+def _weather(temperature_c: float) -> str:
+    """Closest dataset weather bucket for a mean temperature"""
+    if temperature_c < 15:
+        return "cold"
+    if temperature_c < 25:
+        return "pleasant"
+    if temperature_c < 33:
+        return "sunny"
+    return "hot"
+
+
+def _traffic(moving_speed_kmh: float) -> str:
+    if moving_speed_kmh >= 60:
+        return "light"
+    if moving_speed_kmh >= 35:
+        return "moderate"
+    return "heavy"
+
+
+class OpenTrip:
+    """Running sums of the trip in progress - O(1) to extend with a rolled-up segment"""
+
+    def __init__(self, first):
+        self.start_ts = float(first["ts"])
+        self.start_soc = float(first["soc"])
+        self.start_elevation = float(first["elevation_m"])
+        self.end_ts = self.start_ts
+        self.end_soc = self.start_soc
+        self.end_elevation = self.start_elevation
+        self.distance_km = 0.0
+        self.moving_s = 0.0
+        self.crawl_s = 0.0
+        self.consumed = 0.0        # SoC % drawn while driving
+        self.regen = 0.0           # SoC % recovered while moving
+        self.accel_sum = 0.0
+        self.accel_n = 0
+        self.temp_sum = 0.0
+        self.temp_n = 0
+        self.charging_stops: List[Dict[str, float]] = []
+
+
+class Vehicle:
+    """Per-vehicle sample buffer plus the state carried between rollups"""
+
+    def __init__(self, user_id: str, capacity: int):
+        self.user_id = user_id
+        self.buffer = np.empty(capacity, dtype=SAMPLE_DTYPE)
+        self.count = 0                     # buffered samples (carried idle tail first)
+        self.last = None                   # last rolled-up sample (always a moving one)
+        self.trip: Optional[OpenTrip] = None
+        self.locations: List[Tuple[float, str]] = []
+        self.battery_kwh: Optional[float] = None
+        self.driving_style: Optional[str] = None
+        self.last_seen = time.monotonic()
+
+    def append(self, samples: np.ndarray):
+        needed = self.count + len(samples)
+        if needed > len(self.buffer):
+            grown = np.empty(max(needed, 2 * len(self.buffer)), dtype=SAMPLE_DTYPE)
+            grown[:self.count] = self.buffer[:self.count]
+            self.buffer = grown
+        self.buffer[self.count:needed] = samples
+        self.count = needed
+
+
+class TelemetryService:
+    """🚀 OPTIMIZATION: Samples land in per-vehicle NumPy buffers; each rollup turns a
+    whole buffer into trip segments with vectorized diffs / bincounts
+
+    A trip starts with the first moving sample and ends once the vehicle has not
+    moved for TELEMETRY_TRIP_GAP_SECONDS. Stationary samples after the last movement
+    are carried to the next rollup, so a charging stop stays inside its trip while a
+    long park (or an overnight charge) splits two trips. Finished trips go through the ingest queue to the
+    global RAG, the live personal profiles and the columnar dataset.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TelemetryService, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._lock = threading.Lock()
+        self._vehicles: Dict[str, Vehicle] = {}
+        self._stats = {
+            "samples": 0,
+            "late_samples": 0,
+            "rollups": 0,
+            "last_rollup_ms": 0.0,
+            "trips_completed": 0,
+            "trips_too_short": 0,
+            "trips_unlocated": 0,
+            "trips_dropped": 0,
+        }
+
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep, name="telemetry-sweeper", daemon=True)
+        self._sweeper.start()
+
+        self._initialized = True
+
+    # ------------------------------------------------------------------ input
+
+    def submit_ndjson(self, body: bytes) -> Dict[str, int]:
+        """One JSON sample per line: {"user_id", "ts", "soc", "speed_kmh", "elevation_m", "temperature_c"}
+        plus optional "location" and "battery_kwh"
+        """
+        rows: Dict[str, List[tuple]] = {}
+        locations: Dict[str, List[Tuple[float, str]]] = {}
+        capacities: Dict[str, float] = {}
+        for number, line in enumerate(body.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                sample = json.loads(line)
+                user_id = str(sample["user_id"])
+                row = tuple(float(sample[field]) for field in SAMPLE_FIELDS)
+                battery_kwh = float(sample["battery_kwh"]) if sample.get("battery_kwh") else None
+                _check_battery(battery_kwh)
+            except (ValueError, KeyError, TypeError) as e:
+                raise TelemetryError(f"Line {number}: invalid sample ({e})")
+            if not all(map(math.isfinite, row)):  # json.loads accepts NaN / Infinity
+                raise TelemetryError(f"Line {number}: sample values must be finite numbers")
+            rows.setdefault(user_id, []).append(row)
+            if sample.get("location"):
+                locations.setdefault(user_id, []).append((row[0], str(sample["location"])))
+            if battery_kwh:
+                capacities[user_id] = battery_kwh
+
+        accepted = 0
+        trips = []
+        for user_id, samples in rows.items():
+            accepted += len(samples)
+            trips += self._add(user_id, np.array(samples, dtype=SAMPLE_DTYPE),
+                               locations.get(user_id, []), capacities.get(user_id))
+        return self._finish(accepted, trips)
+
+    def submit_binary(self, user_id: str, body: bytes, location: Optional[str] = None,
+                      battery_kwh: Optional[float] = None) -> Dict[str, int]:
+        """Packed SAMPLE_DTYPE records for one vehicle (zero-copy np.frombuffer)"""
+        if len(body) % SAMPLE_DTYPE.itemsize:
+            raise TelemetryError(f"Body length {len(body)} is not a multiple of {SAMPLE_DTYPE.itemsize} bytes")
+        samples = np.frombuffer(body, dtype=SAMPLE_DTYPE)
+        invalid = [field for field in SAMPLE_FIELDS if not np.isfinite(samples[field]).all()]
+        if invalid:
+            raise TelemetryError(f"Sample {', '.join(invalid)} values must be finite numbers")
+        _check_battery(battery_kwh)
+        locations = [(float(samples["ts"].min()), location)] if location and len(samples) else []
+        trips = self._add(user_id, samples, locations, battery_kwh)
+        return self._finish(len(samples), trips)
+
+    def _finish(self, accepted: int, trips: List[Dict]) -> Dict[str, int]:
+        self._emit(trips)
+        return {"accepted": accepted, "trips_completed": len(trips)}
+
+    def _add(self, user_id: str, samples: np.ndarray, locations: List[Tuple[float, str]],
+             battery_kwh: Optional[float]) -> List[Dict]:
+        samples = samples[np.argsort(samples["ts"], kind="stable")]
+        with self._lock:
+            vehicle = self._vehicles.get(user_id)
+            if vehicle is None:
+                vehicle = self._vehicles[user_id] = Vehicle(user_id, settings.TELEMETRY_BUFFER_SAMPLES)
+            if battery_kwh:
+                vehicle.battery_kwh = battery_kwh
+
+            # Samples older than what was already rolled up cannot be merged any more
+            newest = vehicle.buffer["ts"][vehicle.count - 1] if vehicle.count else \
+                (vehicle.last["ts"] if vehicle.last is not None else -np.inf)
+            fresh = samples["ts"] > newest
+            self._stats["late_samples"] += int(len(samples) - fresh.sum())
+            self._stats["samples"] += int(fresh.sum())
+
+            vehicle.append(samples[fresh])
+            vehicle.locations.extend(locations)
+            vehicle.last_seen = time.monotonic()
+
+            if vehicle.count >= settings.TELEMETRY_BUFFER_SAMPLES:
+                return self._rollup(vehicle)
+        return []
+
+    # ------------------------------------------------------------------ rollup
+
+    def _rollup(self, vehicle: Vehicle, closing: bool = False) -> List[Dict]:
+        """Fold the buffered samples into the open trip; returns trips that finished"""
+        started = time.monotonic()
+        gap = settings.TELEMETRY_TRIP_GAP_SECONDS
+        buf = vehicle.buffer[:vehicle.count]
+        finished = []
+
+        # Charging (stationary, SoC rising) keeps a trip alive for up to
+        # TELEMETRY_MAX_CHARGE_MINUTES after the last movement, so a fast-charge stop
+        # longer than the gap does not split the trip but an overnight charge does
+        moving = buf["speed_kmh"] >= MOVING_KMH
+        seed = vehicle.last["ts"] if vehicle.trip is not None else -np.inf
+        ts = buf["ts"]
+        last_moving = np.maximum(np.maximum.accumulate(np.where(moving, ts, -np.inf)), seed)
+        previous_soc = np.concatenate(([vehicle.last["soc"] if vehicle.last is not None else np.inf], buf["soc"][:-1]))
+        charging_sample = ~moving & (buf["soc"] > previous_soc) & \
+            (ts - last_moving <= settings.TELEMETRY_MAX_CHARGE_MINUTES * 60)
+        last_active = np.maximum(np.maximum.accumulate(np.where(moving | charging_sample, ts, -np.inf)), seed)
+
+        if not moving.any():
+            # Only stationary samples: the trip is over once they idle past the gap
+            if vehicle.trip is not None and (closing or (len(buf) and ts[-1] - last_active[-1] > gap)):
+                finished.append(self._close(vehicle))
+            if vehicle.trip is None or closing:
+                vehicle.count = 0
+            return finished
+
+        # Process up to the last moving sample; the idle tail waits for the next rollup
+        end = int(np.flatnonzero(moving)[-1]) + 1
+        s = buf[:end].copy()
+        moving = moving[:end]
+        ts = s["ts"]
+
+        # A moving sample more than `gap` after the previous activity starts a new trip
+        previous_active = np.concatenate(([seed], last_active[:end - 1]))
+        starts = moving & (ts - previous_active > gap)
+        seg = np.cumsum(starts)  # 0 = continues the open trip; leading idle with no open trip is dropped
+        n_seg = int(seg[-1]) + 1
+
+        # Last moving sample of each segment: idle samples after it belong to the gap
+        idx = np.arange(end)
+        seg_end = np.full(n_seg, -1)
+        np.maximum.at(seg_end, seg[moving], idx[moving])
+        in_trip = (idx <= seg_end[seg]) & ((seg > 0) | (vehicle.trip is not None))
+
+        # Pairs (i-1 -> i), prefixed with the last rolled-up sample when a trip is open
+        if vehicle.trip is not None:
+            full = np.concatenate((np.array([vehicle.last], dtype=SAMPLE_DTYPE), s))
+            full_seg = np.concatenate(([0], seg))
+            full_in = np.concatenate(([True], in_trip))
+        else:
+            full, full_seg, full_in = s, seg, in_trip
+        pair_seg = full_seg[1:]
+        valid = (full_seg[:-1] == pair_seg) & full_in[1:] & full_in[:-1]
+        dt = np.diff(full["ts"])
+        v0, v1 = full["speed_kmh"][:-1].astype(np.float64), full["speed_kmh"][1:].astype(np.float64)
+        dsoc = np.diff(full["soc"].astype(np.float64))
+        pair_moving = (v0 >= MOVING_KMH) | (v1 >= MOVING_KMH)
+        charging = valid & ~pair_moving & (dsoc > 0)
+        accelerating = valid & pair_moving & (v1 > v0) & (dt > 0)
+
+        def per_segment(weights: np.ndarray, mask: np.ndarray) -> np.ndarray:
+            return np.bincount(pair_seg[mask], weights=weights[mask], minlength=n_seg)
+
+        pair_km = np.where(valid, (v0 + v1) / 2 * dt / 3600, 0.0)
+        distance = np.bincount(pair_seg, weights=pair_km, minlength=n_seg)
+        moving_s = per_segment(dt, valid & pair_moving)
+        crawl_s = per_segment(dt, valid & pair_moving & ((v0 + v1) / 2 < CRAWL_KMH))
+        consumed = per_segment(-dsoc, valid & pair_moving & (dsoc < 0))
+        regen = per_segment(dsoc, valid & pair_moving & (dsoc > 0))
+        accel = per_segment((v1 - v0) / 3.6 / np.where(dt > 0, dt, 1), accelerating)
+        accel_n = np.bincount(pair_seg[accelerating], minlength=n_seg)
+        temp_sum = np.bincount(seg[in_trip], weights=s["temperature_c"][in_trip], minlength=n_seg)
+        temp_n = np.bincount(seg[in_trip], minlength=n_seg)
+
+        # Charging stops: runs of stationary pairs with rising SoC
+        run_start = charging & ~np.concatenate(([False], charging[:-1]))
+        run_id = np.cumsum(run_start) - 1
+        stops = []
+        if charging.any():
+            charge_added = np.bincount(run_id[charging], weights=dsoc[charging])
+            charge_s = np.bincount(run_id[charging], weights=dt[charging])
+            # Position of a stop = distance driven in its segment before it
+            km_before = np.cumsum(pair_km) - pair_km - np.concatenate(([0.0], np.cumsum(distance)))[pair_seg]
+            stops = list(zip(pair_seg[run_start], km_before[run_start], charge_added, charge_s))
+
+        for k in range(n_seg):
+            if seg_end[k] < 0 or (k == 0 and vehicle.trip is None):
+                continue
+            if k > 0:
+                if vehicle.trip is not None:
+                    finished.append(self._close(vehicle))
+                first = int(np.flatnonzero(seg == k)[0])
+                vehicle.trip = OpenTrip(s[first])
+            trip = vehicle.trip
+            for stop_seg, km, added, seconds in stops:
+                if stop_seg == k:
+                    trip.charging_stops.append({"km": trip.distance_km + float(km),
+                                                "charge_added": float(added), "seconds": float(seconds)})
+            last = s[seg_end[k]]
+            trip.end_ts = float(last["ts"])
+            trip.end_soc = float(last["soc"])
+            trip.end_elevation = float(last["elevation_m"])
+            trip.distance_km += float(distance[k])
+            trip.moving_s += float(moving_s[k])
+            trip.crawl_s += float(crawl_s[k])
+            trip.consumed += float(consumed[k])
+            trip.regen += float(regen[k])
+            trip.accel_sum += float(accel[k])
+            trip.accel_n += int(accel_n[k])
+            trip.temp_sum += float(temp_sum[k])
+            trip.temp_n += int(temp_n[k])
+
+        vehicle.last = s[end - 1].copy()
+        tail = vehicle.buffer[end:vehicle.count].copy()
+        vehicle.count = 0
+        if closing:
+            finished.append(self._close(vehicle))
+        else:
+            vehicle.append(tail)
+
+        self._stats["rollups"] += 1
+        self._stats["last_rollup_ms"] = round((time.monotonic() - started) * 1000, 2)
+        return [trip for trip in finished if trip is not None]
+
+    def _vehicle_profile(self, vehicle: Vehicle):
+        """Battery capacity and driving style from the user's record (looked up once)"""
+        if vehicle.driving_style is not None:
+            return
+        try:
+            profile = rag_service.trips.user(vehicle.user_id) or {}
+        except Exception:
+            profile = {}
+        if vehicle.battery_kwh is None:
+            vehicle.battery_kwh = settings.EV_BATTERY_KWH.get(profile.get("ev_model"), settings.DEFAULT_BATTERY_KWH)
+        vehicle.driving_style = profile.get("driving_style", "normal")
+
+    def _close(self, vehicle: Vehicle) -> Optional[Dict]:
+        """Turn the open trip into a dataset-shaped trip record
+
+        None if it is too short, or if no location was reported at its start and
+        another at its end: a trip without a route would otherwise be stored on an
+        "Unknown" route and skew the route aggregates, rollups and prototypes.
+        """
+        trip, vehicle.trip = vehicle.trip, None
+        if trip is None:
+            return None
+        markers = [name for ts, name in vehicle.locations
+                   if trip.start_ts - settings.TELEMETRY_TRIP_GAP_SECONDS <= ts <= trip.end_ts]
+        vehicle.locations = [(ts, name) for ts, name in vehicle.locations if ts > trip.end_ts]
+        if trip.distance_km < settings.TELEMETRY_MIN_TRIP_KM:
+            self._stats["trips_too_short"] += 1
+            return None
+        if len(markers) < 2:
+            self._stats["trips_unlocated"] += 1
+            return None
+
+        self._vehicle_profile(vehicle)
+        capacity = vehicle.battery_kwh
+        duration_hours = max(trip.end_ts - trip.start_ts, 1.0) / 3600
+        moving_speed = trip.distance_km / max(trip.moving_s / 3600, 1e-9)
+        energy = round((trip.consumed - trip.regen) * capacity / 100, 2)
+        temperature = trip.temp_sum / max(trip.temp_n, 1)
+        started = datetime.fromtimestamp(trip.start_ts)
+
+        charging_stops = [{
+            "location": f"Station at {stop['km']:.0f}km",
+            "network": "Unknown",
+            "power_kw": round(stop["charge_added"] * capacity / 100 / max(stop["seconds"] / 3600, 1e-9), 1),
+            "duration_mins": round(stop["seconds"] / 60),
+            "charge_added": round(stop["charge_added"], 1),
+        } for stop in trip.charging_stops]
+
+        self._stats["trips_completed"] += 1
+        return {
+            "trip_id": f"{vehicle.user_id}_tel_{int(trip.start_ts)}",
+            "user_id": vehicle.user_id,
+            "date": started.isoformat(timespec="seconds"),
+            "start_location": markers[0],
+            "end_location": markers[-1],
+            "distance_km": round(trip.distance_km, 1),
+            "elevation_change_m": int(round(trip.end_elevation - trip.start_elevation)),
+            "is_highway": moving_speed >= 70,
+            "start_battery_percent": round(trip.start_soc, 1),
+            "end_battery_percent": round(trip.end_soc, 1),
+            "energy_used_kwh": energy,
+            "efficiency_kwh_per_100km": round(energy / trip.distance_km * 100, 2),
+            "weather": _weather(temperature),
+            "temperature_c": int(round(temperature)),
+            "traffic": _traffic(moving_speed),
+            "traffic_delay_mins": int(round(trip.crawl_s / 60)),
+            "duration_hours": round(duration_hours, 2),
+            "avg_speed_kmh": round(trip.distance_km / duration_hours, 1),
+            "charging_stops": charging_stops,
+            "num_charging_stops": len(charging_stops),
+            "avg_acceleration": round(trip.accel_sum / max(trip.accel_n, 1), 2),
+            # Share of the energy drawn while driving that regenerative braking put back
+            "regen_braking_usage": round(trip.regen / trip.consumed, 2) if trip.consumed else 0.0,
+            "driving_style": vehicle.driving_style,
+        }
+
+    def _emit(self, trips: List[Dict]):
+        """Hand finished trips to the write-behind ingest queue (global + personal RAG)"""
+        if not trips:
+            return
+        try:
+            ingest_service.submit(trips)
+        except IngestQueueFull as e:
+            self._stats["trips_dropped"] += len(trips)
+            print(f"⚠️  Dropped {len(trips)} telemetry trips: {e}")
+
+    # ------------------------------------------------------------------ background
+
+    def _sweep(self):
+        """Roll up idle buffers and close trips of vehicles that stopped reporting"""
+        while not self._stop.wait(settings.TELEMETRY_SWEEP_SECONDS):
+            self.flush()
+
+    def flush(self, close_all: bool = False):
+        """Roll up every buffer now (close_all also finishes all open trips)"""
+        now = time.monotonic()
+        finished = []
+        with self._lock:
+            for vehicle in self._vehicles.values():
+                silent = now - vehicle.last_seen > settings.TELEMETRY_TRIP_GAP_SECONDS
+                if vehicle.count or (vehicle.trip is not None and (silent or close_all)):
+                    finished += self._rollup(vehicle, closing=silent or close_all)
+            # Forget vehicles with nothing in flight
+            for user_id in [u for u, v in self._vehicles.items()
+                            if v.trip is None and not v.count and now - v.last_seen > settings.TELEMETRY_TRIP_GAP_SECONDS]:
+                del self._vehicles[user_id]
+        self._emit(finished)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["vehicles"] = len(self._vehicles)
+            stats["open_trips"] = sum(1 for v in self._vehicles.values() if v.trip is not None)
+            stats["buffered_samples"] = sum(v.count for v in self._vehicles.values())
+        return stats
+
+    def close(self):
+        self._stop.set()
+        self.flush(close_all=True)
+
+# Singleton instance
+telemetry_service = TelemetryService()
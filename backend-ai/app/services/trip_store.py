@@ -0,0 +1,838 @@
+"""
+Trip Store - durable relational copy of trips, charging stops and users (SQLite, WAL)
+
+The system of record for trip data: ChromaDB keeps only the vectors (plus ids and
+the content hash they were built from) and search hits are hydrated from here.
+Analytics run as indexed SQL instead of paging metadata out of Chroma; the route and
+global aggregates behind /api/routes/popular and /api/stats/global are materialized
+tables kept exact by triggers, so those endpoints read a handful of rows.
+"""
+
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+from app.core.config import settings
+from app.utils.trip_documents import content_hash, create_trip_text, flatten_metadata
+
+# Trip columns = the flattened trip metadata (what search results and analytics return)
+TRIP_FIELDS = (
+    "trip_id", "user_id", "date", "start_location", "end_location", "distance_km",
+    "duration_hours", "start_battery_percent", "end_battery_percent", "energy_used_kwh",
+    "efficiency_kwh_per_100km", "weather", "temperature_c", "traffic", "traffic_delay_mins",
+    "driving_style", "avg_speed_kmh", "elevation_change_m", "regen_braking_usage",
+    "num_charging_stops", "charging_networks", "is_highway", "avg_acceleration",
+)
+STOP_FIELDS = ("location", "network", "power_kw", "duration_mins", "cost", "charge_added")
+USER_FIELDS = (
+    "user_id", "name", "ev_model", "battery_capacity", "base_efficiency", "home_city",
+    "driving_style", "battery_health", "age_months", "total_trips", "total_distance",
+    "preferred_charge_level", "avg_efficiency", "total_energy_used",
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS trips (
+    trip_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    start_location TEXT NOT NULL,
+    end_location TEXT NOT NULL,
+    distance_km REAL,
+    duration_hours REAL,
+    start_battery_percent INTEGER,
+    end_battery_percent INTEGER,
+    energy_used_kwh REAL,
+    efficiency_kwh_per_100km REAL,
+    weather TEXT,
+    temperature_c INTEGER,
+    traffic TEXT,
+    traffic_delay_mins INTEGER,
+    driving_style TEXT,
+    avg_speed_kmh INTEGER,
+    elevation_change_m INTEGER,
+    regen_braking_usage REAL,
+    num_charging_stops INTEGER,
+    charging_networks TEXT,
+    is_highway INTEGER,
+    avg_acceleration REAL,
+    document TEXT NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trips_route ON trips (start_location, end_location, date);
+CREATE INDEX IF NOT EXISTS trips_user_date ON trips (user_id, date);
+CREATE INDEX IF NOT EXISTS trips_conditions ON trips (weather, traffic);
+
+CREATE TABLE IF NOT EXISTS charging_stops (
+    trip_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    {", ".join(f"{field} {'TEXT' if field in ('location', 'network') else 'REAL'}" for field in STOP_FIELDS)},
+    PRIMARY KEY (trip_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    {", ".join(f"{field} TEXT" if field in ("name", "ev_model", "home_city", "driving_style")
+               else field for field in USER_FIELDS[1:])},  -- untyped: numbers keep int / float
+    driving_stats TEXT
+);
+
+CREATE TABLE IF NOT EXISTS route_aggregates (
+    start_location TEXT NOT NULL,
+    end_location TEXT NOT NULL,
+    trips INTEGER NOT NULL,
+    sum_distance REAL NOT NULL,
+    sum_efficiency REAL NOT NULL,
+    min_efficiency REAL,
+    max_efficiency REAL,
+    PRIMARY KEY (start_location, end_location)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS route_aggregates_trips ON route_aggregates (trips);
+
+CREATE TABLE IF NOT EXISTS user_aggregates (
+    user_id TEXT PRIMARY KEY,
+    trips INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS global_aggregates (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    trips INTEGER NOT NULL,
+    users INTEGER NOT NULL,
+    sum_distance REAL NOT NULL,
+    sum_efficiency REAL NOT NULL,
+    min_efficiency REAL,
+    max_efficiency REAL
+);
+
+-- Bumped by every insert, update and delete on trips (triggers): stamps state derived from them
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO data_version VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS rollup_retention (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    daily_from TEXT NOT NULL,
+    monthly_from TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS coaching_reports (
+    user_id TEXT PRIMARY KEY,
+    report TEXT NOT NULL,
+    generated_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sketches (
+    name TEXT PRIMARY KEY,
+    sketch TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+# Time-bucketed rollups: granularity -> period = that many leading characters of the trip date
+ROLLUPS = {"daily": 10, "monthly": 7}
+ROLLUP_DIMENSIONS = ("start_location", "end_location", "period", "weather", "traffic")
+ROLLUP_SCHEMA = "".join(f"""
+CREATE TABLE IF NOT EXISTS rollup_{granularity} (
+    start_location TEXT NOT NULL,
+    end_location TEXT NOT NULL,
+    period TEXT NOT NULL,
+    weather TEXT NOT NULL,
+    traffic TEXT NOT NULL,
+    trips INTEGER NOT NULL,
+    sum_distance REAL NOT NULL,
+    sum_efficiency REAL NOT NULL,
+    sumsq_efficiency REAL NOT NULL,
+    sum_temperature REAL NOT NULL,
+    PRIMARY KEY ({", ".join(ROLLUP_DIMENSIONS)})
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollup_{granularity}_period ON rollup_{granularity} (period);
+""" for granularity in ROLLUPS)
+
+ROLLUP_MEASURES = ("trips", "sum_distance", "sum_efficiency", "sumsq_efficiency", "sum_temperature")
+
+# Exportable tables: name -> (table, columns, time column for since / until, keyset orderings).
+# An ordering (equality filters it needs, key columns) is usable when all its filters
+# are given; the first usable one is picked so every page is an index range scan.
+EXPORTS = {
+    "trips": ("trips", TRIP_FIELDS, "date", (
+        (("user_id",), ("date", "rowid")),
+        (("start_location", "end_location"), ("date", "rowid")),
+        ((), ("rowid",)),
+    )),
+    "profiles": ("users", (*USER_FIELDS, "driving_stats"), None, (((), ("user_id",)),)),
+    "routes": ("route_aggregates", ("start_location", "end_location", "trips", "sum_distance", "sum_efficiency",
+                                    "min_efficiency", "max_efficiency"), None,
+               (((), ("start_location", "end_location")),)),
+    **{granularity: (f"rollup_{granularity}", (*ROLLUP_DIMENSIONS, *ROLLUP_MEASURES), "period",
+                     (((), ROLLUP_DIMENSIONS),))
+       for granularity in ROLLUPS},
+}
+
+# Seasons of the Indian Meteorological Department, by month
+SEASONS = {
+    "winter": (12, 1, 2),
+    "summer": (3, 4, 5),
+    "monsoon": (6, 7, 8, 9),
+    "post_monsoon": (10, 11),
+}
+
+
+def export_key(export: str, equals: Dict[str, Any]) -> tuple:
+    """Keyset columns an export pages by, given its equality filters"""
+    return next(key for required, key in EXPORTS[export][3]
+                if all(equals.get(column) is not None for column in required))
+
+
+def season_of(month: int) -> str:
+    return next(season for season, months in SEASONS.items() if month in months)
+
+
+def _add_trip(row: str) -> str:
+    """Trigger body folding one trips row (NEW / OLD) into the aggregates"""
+    return f"""
+    INSERT INTO route_aggregates VALUES (
+        {row}.start_location, {row}.end_location, 1, {row}.distance_km,
+        {row}.efficiency_kwh_per_100km, {row}.efficiency_kwh_per_100km, {row}.efficiency_kwh_per_100km
+    ) ON CONFLICT (start_location, end_location) DO UPDATE SET
+        trips = trips + 1,
+        sum_distance = sum_distance + excluded.sum_distance,
+        sum_efficiency = sum_efficiency + excluded.sum_efficiency,
+        min_efficiency = MIN(min_efficiency, excluded.min_efficiency),
+        max_efficiency = MAX(max_efficiency, excluded.max_efficiency);
+    INSERT INTO user_aggregates VALUES ({row}.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET trips = trips + 1;
+    UPDATE global_aggregates SET
+        trips = trips + 1,
+        users = users + (SELECT trips = 1 FROM user_aggregates WHERE user_id = {row}.user_id),
+        sum_distance = sum_distance + {row}.distance_km,
+        sum_efficiency = sum_efficiency + {row}.efficiency_kwh_per_100km,
+        min_efficiency = MIN(COALESCE(min_efficiency, {row}.efficiency_kwh_per_100km), {row}.efficiency_kwh_per_100km),
+        max_efficiency = MAX(COALESCE(max_efficiency, {row}.efficiency_kwh_per_100km), {row}.efficiency_kwh_per_100km)
+    WHERE id = 1;"""
+
+
+def _remove_trip(row: str) -> str:
+    """Trigger body taking one trips row back out of the aggregates
+
+    Counts and sums are decremented; a min / max is only recomputed when the removed
+    trip held it (one route via the trips_route index, then the route table).
+    """
+    route = f"start_location = {row}.start_location AND end_location = {row}.end_location"
+    return f"""
+    UPDATE route_aggregates SET
+        trips = trips - 1,
+        sum_distance = sum_distance - {row}.distance_km,
+        sum_efficiency = sum_efficiency - {row}.efficiency_kwh_per_100km
+    WHERE {route};
+    UPDATE route_aggregates SET
+        min_efficiency = (SELECT MIN(efficiency_kwh_per_100km) FROM trips WHERE {route}),
+        max_efficiency = (SELECT MAX(efficiency_kwh_per_100km) FROM trips WHERE {route})
+    WHERE {route} AND trips > 0 AND ({row}.efficiency_kwh_per_100km <= min_efficiency
+                                     OR {row}.efficiency_kwh_per_100km >= max_efficiency);
+    DELETE FROM route_aggregates WHERE {route} AND trips <= 0;
+    UPDATE user_aggregates SET trips = trips - 1 WHERE user_id = {row}.user_id;
+    UPDATE global_aggregates SET
+        trips = trips - 1,
+        users = users - (SELECT trips <= 0 FROM user_aggregates WHERE user_id = {row}.user_id),
+        sum_distance = sum_distance - {row}.distance_km,
+        sum_efficiency = sum_efficiency - {row}.efficiency_kwh_per_100km
+    WHERE id = 1;
+    DELETE FROM user_aggregates WHERE user_id = {row}.user_id AND trips <= 0;
+    UPDATE global_aggregates SET
+        min_efficiency = (SELECT MIN(min_efficiency) FROM route_aggregates),
+        max_efficiency = (SELECT MAX(max_efficiency) FROM route_aggregates)
+    WHERE id = 1 AND ({row}.efficiency_kwh_per_100km <= min_efficiency
+                      OR {row}.efficiency_kwh_per_100km >= max_efficiency);"""
+
+
+def _add_rollup(row: str) -> str:
+    """Trigger body adding one trips row to its daily and monthly buckets
+
+    Periods older than the retention cutoff are skipped (they were pruned).
+    """
+    return "".join(f"""
+    INSERT INTO rollup_{granularity}
+    SELECT {row}.start_location, {row}.end_location, substr({row}.date, 1, {length}), {row}.weather,
+           {row}.traffic, 1, {row}.distance_km, {row}.efficiency_kwh_per_100km,
+           {row}.efficiency_kwh_per_100km * {row}.efficiency_kwh_per_100km, {row}.temperature_c
+    WHERE substr({row}.date, 1, {length}) >= COALESCE((SELECT {granularity}_from FROM rollup_retention), '')
+    ON CONFLICT ({", ".join(ROLLUP_DIMENSIONS)}) DO UPDATE SET
+        trips = trips + 1,
+        sum_distance = sum_distance + excluded.sum_distance,
+        sum_efficiency = sum_efficiency + excluded.sum_efficiency,
+        sumsq_efficiency = sumsq_efficiency + excluded.sumsq_efficiency,
+        sum_temperature = sum_temperature + excluded.sum_temperature;""" for granularity, length in ROLLUPS.items())
+
+
+def _remove_rollup(row: str) -> str:
+    """Trigger body taking one trips row back out of its buckets (empty buckets are dropped)"""
+    return "".join(f"""
+    UPDATE rollup_{granularity} SET
+        trips = trips - 1,
+        sum_distance = sum_distance - {row}.distance_km,
+        sum_efficiency = sum_efficiency - {row}.efficiency_kwh_per_100km,
+        sumsq_efficiency = sumsq_efficiency - {row}.efficiency_kwh_per_100km * {row}.efficiency_kwh_per_100km,
+        sum_temperature = sum_temperature - {row}.temperature_c
+    WHERE start_location = {row}.start_location AND end_location = {row}.end_location
+      AND period = substr({row}.date, 1, {length}) AND weather = {row}.weather AND traffic = {row}.traffic;
+    DELETE FROM rollup_{granularity}
+    WHERE start_location = {row}.start_location AND end_location = {row}.end_location
+      AND period = substr({row}.date, 1, {length}) AND weather = {row}.weather AND traffic = {row}.traffic
+      AND trips <= 0;""" for granularity, length in ROLLUPS.items())
+
+
+# 🚀 OPTIMIZATION: every write path (ingest, setup_rag.py, deletes) keeps the aggregates
+# exact inside its own transaction - no endpoint ever scans trips
+AGGREGATE_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS trips_aggregate_insert AFTER INSERT ON trips BEGIN
+    {_add_trip("NEW")}
+END;
+CREATE TRIGGER IF NOT EXISTS trips_aggregate_delete AFTER DELETE ON trips BEGIN
+    {_remove_trip("OLD")}
+END;
+CREATE TRIGGER IF NOT EXISTS trips_aggregate_update
+AFTER UPDATE OF user_id, start_location, end_location, distance_km, efficiency_kwh_per_100km ON trips BEGIN
+    {_remove_trip("OLD")}
+    {_add_trip("NEW")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trips_version_insert AFTER INSERT ON trips BEGIN
+    UPDATE data_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trips_version_delete AFTER DELETE ON trips BEGIN
+    UPDATE data_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trips_version_update AFTER UPDATE ON trips BEGIN
+    UPDATE data_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trips_rollup_insert AFTER INSERT ON trips BEGIN
+    {_add_rollup("NEW")}
+END;
+CREATE TRIGGER IF NOT EXISTS trips_rollup_delete AFTER DELETE ON trips BEGIN
+    {_remove_rollup("OLD")}
+END;
+CREATE TRIGGER IF NOT EXISTS trips_rollup_update
+AFTER UPDATE OF date, start_location, end_location, weather, traffic, distance_km,
+                efficiency_kwh_per_100km, temperature_c ON trips BEGIN
+    {_remove_rollup("OLD")}
+    {_add_rollup("NEW")}
+END;
+"""
+
+_UPSERT_TRIP = (
+    f"INSERT INTO trips ({', '.join(TRIP_FIELDS)}, document, content_hash) "
+    f"VALUES ({', '.join('?' * (len(TRIP_FIELDS) + 2))}) "
+    f"ON CONFLICT (trip_id) DO UPDATE SET "
+    + ", ".join(f"{field} = excluded.{field}" for field in (*TRIP_FIELDS[1:], "document", "content_hash"))
+    + " WHERE trips.content_hash IS NOT excluded.content_hash"
+)
+_INSERT_STOP = (
+    f"INSERT INTO charging_stops (trip_id, seq, {', '.join(STOP_FIELDS)}) "
+    f"VALUES ({', '.join('?' * (len(STOP_FIELDS) + 2))})"
+)
+_UPSERT_USER = (
+    f"INSERT OR REPLACE INTO users ({', '.join(USER_FIELDS)}, driving_stats) "
+    f"VALUES ({', '.join('?' * (len(USER_FIELDS) + 1))})"
+)
+
+
+def _trip_metadata(row: sqlite3.Row) -> Dict[str, Any]:
+    """A trips row as the flattened metadata dict Chroma used to return"""
+    metadata = {field: row[field] for field in TRIP_FIELDS}
+    metadata["is_highway"] = bool(metadata["is_highway"])
+    return metadata
+
+
+def _retention_cutoffs(daily_days: Optional[int], monthly_months: Optional[int]) -> tuple:
+    """Oldest daily and monthly period to keep ("" = keep everything)"""
+    daily_days = settings.ROLLUP_DAILY_RETENTION_DAYS if daily_days is None else daily_days
+    monthly_months = settings.ROLLUP_MONTHLY_RETENTION_MONTHS if monthly_months is None else monthly_months
+    today = date.today()
+    daily_from = (today - timedelta(days=daily_days)).isoformat() if daily_days > 0 else ""
+    monthly_from = ""
+    if monthly_months > 0:
+        months = today.year * 12 + today.month - 1 - monthly_months
+        monthly_from = f"{months // 12:04d}-{months % 12 + 1:02d}"
+    return daily_from, monthly_from
+
+
+class TripStore:
+    """🚀 OPTIMIZATION: WAL mode (readers never wait for the ingest writer) and a small
+    pool of long-lived connections shared by the request threads
+
+    Writes are serialized in-process; each batch is one transaction.
+    """
+
+    def __init__(self, path: str, pool_size: Optional[int] = None):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._pool_size = pool_size or settings.TRIP_STORE_POOL_SIZE
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        with self.connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # persistent: stored in the database file
+            conn.executescript(SCHEMA + ROLLUP_SCHEMA + AGGREGATE_TRIGGERS)
+            initialized = conn.execute("SELECT 1 FROM global_aggregates").fetchone()
+            rolled_up = conn.execute("SELECT 1 FROM rollup_retention").fetchone()
+        # New database, or one written before the aggregates / rollups existed
+        if not initialized:
+            self.rebuild_aggregates()
+        if not rolled_up:
+            self.rebuild_rollups()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; safe with WAL
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled connection (opens up to TRIP_STORE_POOL_SIZE, then waits)"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                opened = self._opened < self._pool_size
+                if opened:
+                    self._opened += 1
+            conn = self._connect() if opened else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._write_lock, self.connection() as conn, conn:
+            yield conn
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    # ------------------------------------------------------------------ writes
+
+    def upsert_trips(self, trips: Sequence[Dict], documents: Optional[Sequence[str]] = None) -> List[str]:
+        """Bulk insert/update dataset-shaped trip records (one transaction)
+
+        Rows whose content hash is unchanged are left alone; charging stops are
+        rewritten for every trip in the batch. Returns the ids that were not stored before.
+        """
+        if not trips:
+            return []
+        if documents is None:
+            documents = [create_trip_text(trip) for trip in trips]
+        # The same trip twice in one batch (re-upload): the last version wins
+        latest = {trip["trip_id"]: (trip, document) for trip, document in zip(trips, documents)}
+        rows = []
+        stops = []
+        for trip, document in latest.values():
+            metadata = flatten_metadata(trip)
+            rows.append((*(metadata[field] for field in TRIP_FIELDS), document,
+                         content_hash(document, metadata)))
+            for seq, stop in enumerate(trip.get("charging_stops") or []):
+                stops.append((trip["trip_id"], seq, *(stop.get(field) for field in STOP_FIELDS)))
+
+        with self._transaction() as conn:
+            existing = set()
+            ids = list(latest)
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                existing.update(row[0] for row in conn.execute(
+                    f"SELECT trip_id FROM trips WHERE trip_id IN ({', '.join('?' * len(batch))})", batch))
+            conn.executemany(_UPSERT_TRIP, rows)
+            conn.executemany("DELETE FROM charging_stops WHERE trip_id = ?", [(trip_id,) for trip_id in latest])
+            conn.executemany(_INSERT_STOP, stops)
+        return [trip_id for trip_id in ids if trip_id not in existing]
+
+    def delete_trips(self, trip_ids: Sequence[str], batch_size: int = 5000):
+        with self._transaction() as conn:
+            for i in range(0, len(trip_ids), batch_size):
+                batch = [(trip_id,) for trip_id in trip_ids[i:i + batch_size]]
+                conn.executemany("DELETE FROM charging_stops WHERE trip_id = ?", batch)
+                conn.executemany("DELETE FROM trips WHERE trip_id = ?", batch)
+
+    def upsert_users(self, users: Iterable[Dict]):
+        rows = [(*(user.get(field) for field in USER_FIELDS), json.dumps(user.get("driving_stats")))
+                for user in users]
+        with self._transaction() as conn:
+            conn.executemany(_UPSERT_USER, rows)
+
+    def rebuild_aggregates(self):
+        """Recompute every aggregate from the trips table (setup_rag.py, migrations)
+
+        The triggers keep them exact between rebuilds; this also squeezes out the
+        floating-point drift that long runs of add / subtract accumulate in the sums.
+        """
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM route_aggregates")
+            conn.execute("DELETE FROM user_aggregates")
+            conn.execute("DELETE FROM global_aggregates")
+            conn.execute(
+                "INSERT INTO route_aggregates SELECT start_location, end_location, COUNT(*), "
+                "SUM(distance_km), SUM(efficiency_kwh_per_100km), MIN(efficiency_kwh_per_100km), "
+                "MAX(efficiency_kwh_per_100km) FROM trips GROUP BY start_location, end_location")
+            conn.execute("INSERT INTO user_aggregates SELECT user_id, COUNT(*) FROM trips GROUP BY user_id")
+            conn.execute(
+                "INSERT INTO global_aggregates SELECT 1, COALESCE(SUM(trips), 0), "
+                "(SELECT COUNT(*) FROM user_aggregates), COALESCE(SUM(sum_distance), 0), "
+                "COALESCE(SUM(sum_efficiency), 0), MIN(min_efficiency), MAX(max_efficiency) "
+                "FROM route_aggregates")
+
+    def rebuild_rollups(self, daily_days: Optional[int] = None, monthly_months: Optional[int] = None):
+        """Recompute the daily / monthly buckets from the trips table, within retention"""
+        daily_from, monthly_from = _retention_cutoffs(daily_days, monthly_months)
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM rollup_retention")
+            conn.execute("INSERT INTO rollup_retention VALUES (1, ?, ?)", (daily_from, monthly_from))
+            for granularity, length in ROLLUPS.items():
+                conn.execute(f"DELETE FROM rollup_{granularity}")
+                conn.execute(
+                    f"INSERT INTO rollup_{granularity} SELECT start_location, end_location, "
+                    f"substr(date, 1, {length}) AS period, weather, traffic, COUNT(*), SUM(distance_km), "
+                    f"SUM(efficiency_kwh_per_100km), SUM(efficiency_kwh_per_100km * efficiency_kwh_per_100km), "
+                    f"SUM(temperature_c) FROM trips WHERE substr(date, 1, {length}) >= ? "
+                    f"GROUP BY {', '.join(ROLLUP_DIMENSIONS)}",
+                    (daily_from if granularity == "daily" else monthly_from,))
+
+    def prune_rollups(self, daily_days: Optional[int] = None, monthly_months: Optional[int] = None) -> int:
+        """Drop buckets that fell out of retention; returns how many were dropped
+
+        Old days are already counted in their month, so pruning daily buckets
+        downsamples them rather than losing them.
+        """
+        daily_from, monthly_from = _retention_cutoffs(daily_days, monthly_months)
+        with self._transaction() as conn:
+            conn.execute("UPDATE rollup_retention SET daily_from = MAX(daily_from, ?), "
+                         "monthly_from = MAX(monthly_from, ?)", (daily_from, monthly_from))
+            return sum(conn.execute(f"DELETE FROM rollup_{granularity} WHERE period < "
+                                    f"(SELECT {granularity}_from FROM rollup_retention)").rowcount
+                       for granularity in ROLLUPS)
+
+    def save_sketches(self, sketches: Dict[str, str], replace: bool = False):
+        """Persist serialized sketches by name (replace=True drops every other sketch)"""
+        with self._transaction() as conn:
+            if replace:
+                conn.execute("DELETE FROM sketches")
+            conn.executemany("INSERT OR REPLACE INTO sketches VALUES (?, ?)", sketches.items())
+
+    def save_report(self, user_id: str, report: Dict[str, Any], generated_at: float):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO coaching_reports VALUES (?, ?, ?)",
+                         (user_id, json.dumps(report), generated_at))
+
+    # ------------------------------------------------------------------ lookups
+
+    def has_trips(self) -> bool:
+        with self.connection() as conn:
+            return conn.execute("SELECT EXISTS (SELECT 1 FROM trips)").fetchone()[0] == 1
+
+    def iter_trip_ids(self, page_size: int = 10000) -> Iterator[str]:
+        """All trip ids in key order (keyset-paged, constant memory)"""
+        last = ""
+        while True:
+            with self.connection() as conn:
+                page = [row[0] for row in conn.execute(
+                    "SELECT trip_id FROM trips WHERE trip_id > ? ORDER BY trip_id LIMIT ?", (last, page_size))]
+            yield from page
+            if len(page) < page_size:
+                return
+            last = page[-1]
+
+    def iter_content_hashes(self, page_size: int = 10000) -> Iterator[tuple]:
+        """(trip_id, content hash) in key order - the hash the global index stores with each vector"""
+        last = ""
+        while True:
+            with self.connection() as conn:
+                page = conn.execute("SELECT trip_id, content_hash FROM trips WHERE trip_id > ? "
+                                    "ORDER BY trip_id LIMIT ?", (last, page_size)).fetchall()
+            yield from (tuple(row) for row in page)
+            if len(page) < page_size:
+                return
+            last = page[-1][0]
+
+    def get_trips(self, trip_ids: Sequence[str]) -> Dict[str, tuple]:
+        """trip_id -> (document, metadata) for the ids that exist (primary-key lookups)"""
+        found = {}
+        with self.connection() as conn:
+            for i in range(0, len(trip_ids), 500):  # stay under SQLite's variable limit
+                batch = list(trip_ids[i:i + 500])
+                for row in conn.execute(
+                    f"SELECT * FROM trips WHERE trip_id IN ({', '.join('?' * len(batch))})", batch
+                ):
+                    found[row["trip_id"]] = (row["document"], _trip_metadata(row))
+        return found
+
+    def route_trip_ids(self, start: str, end: str, limit: int) -> List[str]:
+        """Newest trips of one route (trips_route index, no table scan)"""
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT trip_id FROM trips WHERE start_location = ? AND end_location = ? "
+                "ORDER BY date DESC LIMIT ?", (start, end, limit))]
+
+    def route_trips(self, start: str, end: str, limit: int) -> List[Dict[str, Any]]:
+        with self.connection() as conn:
+            return [_trip_metadata(row) for row in conn.execute(
+                "SELECT * FROM trips WHERE start_location = ? AND end_location = ? "
+                "ORDER BY date DESC LIMIT ?", (start, end, limit))]
+
+    def prototype_trips(self, start: str, end: str, weather: Optional[str], traffic: Optional[str],
+                        driving_style: Optional[str]) -> List[Dict[str, Any]]:
+        """Every trip of one route + condition bucket with its charging stop networks (trips_route index)"""
+        with self.connection() as conn:
+            trips = [_trip_metadata(row) for row in conn.execute(
+                "SELECT * FROM trips WHERE start_location = ? AND end_location = ? AND weather IS ? "
+                "AND traffic IS ? AND driving_style IS ?", (start, end, weather, traffic, driving_style))]
+        networks = self.charging_networks([trip["trip_id"] for trip in trips])
+        for trip in trips:
+            trip["charging_stops"] = [{"network": network} for network in networks.get(trip["trip_id"], [])]
+        return trips
+
+    def charging_networks(self, trip_ids: Sequence[str]) -> Dict[str, List[str]]:
+        """trip_id -> network of each charging stop, in stop order (trips without stops are left out)"""
+        networks: Dict[str, List[str]] = {}
+        with self.connection() as conn:
+            for i in range(0, len(trip_ids), 500):
+                batch = list(trip_ids[i:i + 500])
+                for trip_id, network in conn.execute(
+                    f"SELECT trip_id, network FROM charging_stops WHERE trip_id IN ({', '.join('?' * len(batch))}) "
+                    "ORDER BY trip_id, seq", batch
+                ):
+                    networks.setdefault(trip_id, []).append(network)
+        return networks
+
+    def recent_trips(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """A user's newest trips, newest first (trips_user_date index)"""
+        with self.connection() as conn:
+            return [_trip_metadata(row) for row in conn.execute(
+                "SELECT * FROM trips WHERE user_id = ? ORDER BY date DESC LIMIT ?", (user_id, limit))]
+
+    def user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self.connection() as conn:
+            row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = {field: row[field] for field in USER_FIELDS}
+        user["driving_stats"] = json.loads(row["driving_stats"]) if row["driving_stats"] else None
+        return user
+
+    def users(self, user_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """user_id -> user for the ids that exist (primary-key lookups)"""
+        found = {}
+        with self.connection() as conn:
+            for i in range(0, len(user_ids), 500):
+                batch = list(user_ids[i:i + 500])
+                for row in conn.execute(
+                    f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE user_id IN ({', '.join('?' * len(batch))})",
+                    batch
+                ):
+                    found[row["user_id"]] = {field: row[field] for field in USER_FIELDS}
+        return found
+
+    def report(self, user_id: str) -> Optional[tuple]:
+        """(stored coaching report, unix time it was generated) or None"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT report, generated_at FROM coaching_reports WHERE user_id = ?",
+                               (user_id,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def stale_report_users(self, generated_before: float, limit: int = 10000) -> List[str]:
+        """Users with trips whose coaching report is missing or older than the cutoff"""
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT a.user_id FROM user_aggregates a LEFT JOIN coaching_reports r ON r.user_id = a.user_id "
+                "WHERE r.generated_at IS NULL OR r.generated_at < ? ORDER BY r.generated_at IS NOT NULL, "
+                "r.generated_at LIMIT ?", (generated_before, limit))]
+
+    def distinct_locations(self) -> List[str]:
+        """Start/end locations off route_aggregates (one row per route, not per trip)"""
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT start_location FROM route_aggregates UNION "
+                "SELECT end_location FROM route_aggregates ORDER BY 1")]
+
+    def load_sketches(self) -> Dict[str, str]:
+        with self.connection() as conn:
+            return dict(conn.execute("SELECT name, sketch FROM sketches").fetchall())
+
+    # ------------------------------------------------------------------ analytics
+
+    def efficiency_rollup(self, granularity: str = "monthly", group_by: Sequence[str] = ("period",),
+                          start: Optional[str] = None, end: Optional[str] = None,
+                          since: Optional[str] = None, until: Optional[str] = None,
+                          months: Optional[Sequence[int]] = None, weather: Optional[str] = None,
+                          traffic: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Efficiency statistics summed from precomputed buckets
+
+        group_by: any of start_location, end_location, period, weather, traffic and
+        month (month of year, 1-12). since / until bound the period (inclusive);
+        months keeps only those months of the year (e.g. SEASONS["winter"]).
+        A route filter reads one primary-key range.
+        """
+        if granularity not in ROLLUPS:
+            raise ValueError(f"granularity must be one of {', '.join(ROLLUPS)}")
+        keys = []
+        for dimension in group_by:
+            if dimension == "month":
+                keys.append("CAST(substr(period, 6, 2) AS INTEGER) AS month")
+            elif dimension in ROLLUP_DIMENSIONS:
+                keys.append(dimension)
+            else:
+                raise ValueError(f"cannot group by {dimension}")
+        where, params = [], []
+        for column, value in (("start_location", start), ("end_location", end),
+                              ("weather", weather), ("traffic", traffic)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        length = ROLLUPS[granularity]
+        if since:
+            where.append("period >= ?")
+            params.append(since[:length])
+        if until:
+            where.append("period <= ?")
+            params.append(until[:length])
+        if months:
+            where.append(f"CAST(substr(period, 6, 2) AS INTEGER) IN ({', '.join('?' * len(months))})")
+            params.extend(int(month) for month in months)
+
+        sql = (f"SELECT {''.join(key + ', ' for key in keys)}SUM(trips), SUM(sum_distance), SUM(sum_efficiency), "
+               f"SUM(sumsq_efficiency), SUM(sum_temperature) FROM rollup_{granularity}")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if keys:
+            positions = ", ".join(str(position) for position in range(1, len(keys) + 1))
+            sql += f" GROUP BY {positions} ORDER BY {positions}"
+        with self.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        buckets = []
+        for row in rows:
+            trips, sum_distance, sum_efficiency, sumsq_efficiency, sum_temperature = row[len(keys):]
+            if not trips:
+                continue
+            mean = sum_efficiency / trips
+            variance = (sumsq_efficiency - trips * mean * mean) / (trips - 1) if trips > 1 else 0.0
+            buckets.append({
+                **dict(zip(group_by, row[:len(keys)])),
+                "trips": trips,
+                "avg_efficiency": round(mean, 2),
+                "std_efficiency": round(math.sqrt(max(variance, 0.0)), 2),
+                "avg_distance": round(sum_distance / trips, 1),
+                "avg_temperature": round(sum_temperature / trips, 1)
+            })
+        return buckets
+
+    def export_page(self, export: str, fields: Sequence[str], after: Optional[Sequence] = None,
+                    limit: int = 1000, equals: Optional[Dict[str, Any]] = None,
+                    since: Optional[str] = None, until: Optional[str] = None) -> tuple:
+        """One keyset page of an export: (rows as dicts, key of the last row)
+
+        The key is passed back as `after` for the next page; each page is a fresh
+        index range scan on a briefly borrowed connection.
+        """
+        table, _, time_column, _ = EXPORTS[export]
+        equals = {column: value for column, value in (equals or {}).items() if value is not None}
+        key = export_key(export, equals)
+        where, params = [], []
+        for column, value in equals.items():
+            where.append(f"{column} = ?")
+            params.append(value)
+        # Dates bound by prefix: until="2026-10-01" includes that whole day, and a
+        # monthly bucket is inside since="2026-10-15" ("~" sorts after any ISO timestamp)
+        if since:
+            where.append(f"{time_column} >= ?")
+            params.append(since[:ROLLUPS.get(export, len(since))])
+        if until:
+            where.append(f"{time_column} <= ?")
+            params.append(until + "~")
+        if after is not None:
+            where.append(f"({', '.join(key)}) > ({', '.join('?' * len(key))})")
+            params.extend(after)
+
+        sql = f"SELECT {', '.join(key)}, {', '.join(fields)} FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {', '.join(key)} LIMIT ?"
+        with self.connection() as conn:
+            rows = conn.execute(sql, (*params, limit)).fetchall()
+
+        records = []
+        for row in rows:
+            record = dict(zip(fields, row[len(key):]))
+            if table == "trips" and "is_highway" in record:
+                record["is_highway"] = bool(record["is_highway"])
+            if table == "users" and record.get("driving_stats"):
+                record["driving_stats"] = json.loads(record["driving_stats"])
+            records.append(record)
+        return records, (tuple(rows[-1][:len(key)]) if rows else None)
+
+    def iter_efficiency_rows(self) -> Iterator[tuple]:
+        """(start, end, driving_style, efficiency, ev_model) for every trip, streamed"""
+        with self.connection() as conn:
+            yield from conn.execute(
+                "SELECT t.start_location, t.end_location, t.driving_style, t.efficiency_kwh_per_100km, "
+                "u.ev_model FROM trips t LEFT JOIN users u ON u.user_id = t.user_id")
+
+    def iter_energy_rows(self) -> Iterator[tuple]:
+        """(driving_style, weather, traffic, elevation_change_m, efficiency, ev_model, battery_health)
+        for every trip, streamed"""
+        with self.connection() as conn:
+            yield from conn.execute(
+                "SELECT t.driving_style, t.weather, t.traffic, t.elevation_change_m, t.efficiency_kwh_per_100km, "
+                "u.ev_model, u.battery_health FROM trips t LEFT JOIN users u ON u.user_id = t.user_id")
+
+    def popular_routes(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Busiest routes, read off the route_aggregates_trips index"""
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT start_location, end_location, trips, sum_distance, sum_efficiency "
+                "FROM route_aggregates ORDER BY trips DESC LIMIT ?", (limit,)).fetchall()
+        return [{
+            "route": f"{start} → {end}",
+            "from": start,
+            "to": end,
+            "count": count,
+            "avg_distance": round(sum_distance / count, 1),
+            "avg_efficiency": round(sum_efficiency / count, 2)
+        } for start, end, count, sum_distance, sum_efficiency in rows]
+
+    def content_stamp(self) -> List[Any]:
+        """Write counter (bumped by a trigger on every insert, update and delete of a trip)
+        plus the trip count and totals - changes with any change to the trips table"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT v.version, g.trips, g.sum_distance, g.sum_efficiency FROM data_version v "
+                "LEFT JOIN global_aggregates g ON g.id = 1 WHERE v.id = 1").fetchone()
+        return list(row) if row is not None else [0, 0, 0.0, 0.0]
+
+    def global_stats(self) -> Dict[str, Any]:
+        """Community totals (the single global_aggregates row)"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT * FROM global_aggregates WHERE id = 1").fetchone()
+        if row is None or not row["trips"]:
+            return {"total_trips": 0}
+        total = row["trips"]
+        return {
+            "total_trips": total,
+            "total_users": row["users"],
+            "avg_efficiency": round(row["sum_efficiency"] / total, 2),
+            "avg_distance": round(row["sum_distance"] / total, 1),
+            "most_efficient": round(row["min_efficiency"], 2),
+            "least_efficient": round(row["max_efficiency"], 2)
+        }
@@ -0,0 +1,48 @@
+"""
+Callback URLs - client-supplied webhooks may only reach public HTTP(S) hosts
+
+Without a check, a callback_url turns the server into a proxy into its own
+network (loopback services, cloud metadata endpoints, private hosts). A URL is
+accepted when its scheme is http / https and either its host is listed in
+COACHING_CALLBACK_ALLOWED_HOSTS or - with no list configured - every address
+the host resolves to is public.
+"""
+
+import ipaddress
+import socket
+from urllib.parse import urlsplit
+from app.core.config import settings
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])  # drop an IPv6 zone id
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    # is_global excludes loopback, private, link-local, shared (CGNAT), reserved and unspecified ranges
+    return ip.is_global and not ip.is_multicast
+
+
+def validate_callback_url(url: str) -> str:
+    """The URL unchanged, or ValueError saying why it may not be called"""
+    parts = urlsplit(url.strip())
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an absolute http:// or https:// URL")
+    host = parts.hostname.lower()
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise ValueError("callback_url has an invalid port")
+
+    if settings.COACHING_CALLBACK_ALLOWED_HOSTS:
+        if host not in {allowed.lower() for allowed in settings.COACHING_CALLBACK_ALLOWED_HOSTS}:
+            raise ValueError(f"callback host {host} is not in COACHING_CALLBACK_ALLOWED_HOSTS")
+        return url
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    except (OSError, UnicodeError):
+        raise ValueError(f"callback host {host} does not resolve")
+    blocked = sorted(address for address in addresses if not _is_public(address))
+    if blocked:
+        raise ValueError(f"callback host {host} resolves to a non-public address ({blocked[0]})")
+    return url
@@ -0,0 +1,452 @@
+"""
+Columnar dataset - one binary file per column, memory-mapped on read
+
+Layout of a dataset directory:
+    manifest.json             committed row counts per table (written last, atomically)
+    trips/<column>.bin        raw little-endian values, opened with np.memmap (zero copy)
+    trips/<column>.offsets    text columns: int64 end offset of each row in <column>.bin (UTF-8)
+    trips/<column>.vocab      dict columns: one JSON string per line, row values are uint32 codes
+    trips/<column>.int        number columns: 1 where the source value was an int (580 vs 580.0)
+    charging_stops/...        one row per stop, in trip order (split by trips.num_charging_stops)
+    users/...                 nested dicts become dotted columns ("driving_stats.accel")
+
+Readers only look at the first `rows` values of each file, so an append that
+crashes half way is invisible (and truncated by the next writer).
+"""
+
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+# kind -> on-disk dtype ("text" stores its offsets as int64)
+DTYPES = {
+    "int": np.dtype("<i8"),
+    "number": np.dtype("<f8"),   # NaN = missing; a uint8 flag file remembers int vs float
+    "bool": np.dtype("u1"),
+    "dict": np.dtype("<u4"),
+    "text": np.dtype("<i8"),
+}
+
+TRIP_COLUMNS = {
+    "trip_id": "text",
+    "user_id": "dict",
+    "date": "text",
+    "start_location": "dict",
+    "end_location": "dict",
+    "distance_km": "number",
+    "elevation_change_m": "number",
+    "is_highway": "bool",
+    "start_battery_percent": "number",
+    "end_battery_percent": "number",
+    "energy_used_kwh": "number",
+    "efficiency_kwh_per_100km": "number",
+    "weather": "dict",
+    "temperature_c": "number",
+    "traffic": "dict",
+    "traffic_delay_mins": "number",
+    "start_time": "dict",
+    "duration_hours": "number",
+    "avg_speed_kmh": "number",
+    "num_charging_stops": "int",
+    "avg_acceleration": "number",
+    "regen_braking_usage": "number",
+    "driving_style": "dict",
+    "electricity_cost": "number",
+}
+
+STOP_COLUMNS = {
+    "location": "dict",
+    "network": "dict",
+    "power_kw": "number",
+    "duration_mins": "number",
+    "cost": "number",
+    "charge_added": "number",
+}
+
+USER_COLUMNS = {
+    "user_id": "text",
+    "name": "text",
+    "ev_model": "dict",
+    "battery_capacity": "number",
+    "base_efficiency": "number",
+    "home_city": "dict",
+    "driving_style": "dict",
+    "driving_stats.accel": "number",
+    "driving_stats.speed_factor": "number",
+    "driving_stats.regen_usage": "number",
+    "driving_stats.efficiency_bonus": "number",
+    "battery_health": "number",
+    "age_months": "int",
+    "total_trips": "int",
+    "total_distance": "number",
+    "preferred_charge_level": "int",
+    "avg_efficiency": "number",
+    "total_energy_used": "number",
+}
+
+SCHEMAS = {"trips": TRIP_COLUMNS, "charging_stops": STOP_COLUMNS, "users": USER_COLUMNS}
+
+
+class Categorical(NamedTuple):
+    """Pre-encoded dict column: codes index into vocab (remapped on append)"""
+    codes: np.ndarray
+    vocab: Sequence[Optional[str]]
+
+
+class Number(NamedTuple):
+    """Pre-encoded number column: float64 values plus the int flag of each row"""
+    values: np.ndarray
+    is_int: np.ndarray
+
+
+class Text(NamedTuple):
+    """Pre-encoded text column: UTF-8 byte length of each row plus the concatenated bytes"""
+    lengths: np.ndarray
+    data: bytes
+
+
+def _get(record: Dict, name: str):
+    for part in name.split("."):
+        if record is None:
+            return None
+        record = record.get(part)
+    return record
+
+
+def _decode_number(value: float, is_int: int):
+    if value != value:
+        return None
+    return int(value) if is_int else value
+
+
+class ColumnarDataset:
+    """🚀 OPTIMIZATION: Column files instead of JSON - analytics touch only the columns they use
+
+    Single writer per dataset (the ingest writer thread or the generator);
+    any number of readers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._manifest = None
+        self._maps: Dict[str, np.ndarray] = {}
+        self._vocabs: Dict[tuple, List[Optional[str]]] = {}
+        self._vocab_index: Dict[tuple, Dict[Optional[str], int]] = {}
+        self._prepared = set()
+        self.refresh()
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, MANIFEST))
+
+    @classmethod
+    def open(cls, path: str) -> Optional["ColumnarDataset"]:
+        """The dataset at `path`, or None if there is none"""
+        return cls(path) if cls.exists(path) else None
+
+    @classmethod
+    def create(cls, path: str, overwrite: bool = False) -> "ColumnarDataset":
+        """New empty dataset with the trip, charging stop and user tables"""
+        if os.path.exists(path):
+            if not overwrite:
+                raise FileExistsError(f"Columnar dataset already exists: {path}")
+            shutil.rmtree(path)
+        for table in SCHEMAS:
+            os.makedirs(os.path.join(path, table))
+        manifest = {
+            "format": FORMAT_VERSION,
+            "tables": {
+                table: {
+                    "rows": 0,
+                    "columns": {name: {"kind": kind, "bytes": 0, "vocab": 0} for name, kind in schema.items()},
+                }
+                for table, schema in SCHEMAS.items()
+            },
+        }
+        cls._write_manifest(path, manifest)
+        return cls(path)
+
+    @staticmethod
+    def _write_manifest(path: str, manifest: Dict):
+        tmp_path = os.path.join(path, MANIFEST + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(path, MANIFEST))
+
+    def refresh(self) -> bool:
+        """Re-read the manifest if another process replaced it; True if it changed"""
+        stamp = os.stat(os.path.join(self.path, MANIFEST)).st_mtime_ns
+        if stamp == self._stamp:
+            return False
+        with open(os.path.join(self.path, MANIFEST), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format {manifest.get('format')} in {self.path}")
+        with self._lock:
+            self._manifest, self._stamp = manifest, stamp
+            self._maps.clear()
+            self._vocabs.clear()
+            self._vocab_index.clear()
+            self._prepared.clear()
+        return True
+
+    def _file(self, table: str, name: str, suffix: str) -> str:
+        return os.path.join(self.path, table, f"{name}.{suffix}")
+
+    def _meta(self, table: str, name: str) -> Dict:
+        return self._manifest["tables"][table]["columns"][name]
+
+    # ------------------------------------------------------------------ reading
+
+    def rows(self, table: str) -> int:
+        return self._manifest["tables"][table]["rows"]
+
+    def columns(self, table: str) -> List[str]:
+        return list(self._manifest["tables"][table]["columns"])
+
+    def _memmap(self, path: str, dtype: np.dtype, count: int) -> np.ndarray:
+        cached = self._maps.get(path)
+        if cached is None or len(cached) != count:
+            # Files only grow, so a map of the committed length stays valid while a writer appends
+            cached = np.memmap(path, dtype=dtype, mode="r", shape=(count,)) if count else np.empty(0, dtype)
+            self._maps[path] = cached
+        return cached
+
+    def column(self, table: str, name: str) -> np.ndarray:
+        """Raw committed values as a read-only memmap (codes for dict columns, end offsets for text)"""
+        meta = self._meta(table, name)
+        suffix = "offsets" if meta["kind"] == "text" else "bin"
+        return self._memmap(self._file(table, name, suffix), DTYPES[meta["kind"]], self.rows(table))
+
+    def vocab(self, table: str, name: str) -> List[Optional[str]]:
+        """Dictionary of a dict column (code -> string)"""
+        size = self._meta(table, name)["vocab"]
+        vocab = self._vocabs.get((table, name))
+        if vocab is None or len(vocab) < size:
+            vocab = []
+            if size:
+                with open(self._file(table, name, "vocab"), "r") as f:
+                    for line in f:
+                        vocab.append(json.loads(line))
+                        if len(vocab) == size:
+                            break
+            self._vocabs[(table, name)] = vocab
+        return vocab[:size]
+
+    def _text_slice(self, table: str, name: str, start: int, stop: int) -> List[str]:
+        offsets = self.column(table, name)
+        data = self._memmap(self._file(table, name, "bin"), np.dtype("u1"), self._meta(table, name)["bytes"])
+        begin = int(offsets[start - 1]) if start else 0
+        blob = data[begin:int(offsets[stop - 1]) if stop > start else begin].tobytes()
+        ends = offsets[start:stop] - begin
+        values, prev = [], 0
+        for end in ends.tolist():
+            values.append(blob[prev:end].decode("utf-8"))
+            prev = end
+        return values
+
+    def values(self, table: str, name: str, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        """Decoded Python values of one column for rows [start, stop)"""
+        stop = self.rows(table) if stop is None else min(stop, self.rows(table))
+        kind = self._meta(table, name)["kind"]
+        if kind == "text":
+            return self._text_slice(table, name, start, stop)
+        raw = self.column(table, name)[start:stop]
+        if kind == "dict":
+            vocab = self.vocab(table, name)
+            return [vocab[code] for code in raw.tolist()]
+        if kind == "number":
+            # Ints must come back as ints: "580km" and "580.0km" are different documents
+            flags = self._memmap(self._file(table, name, "int"), np.dtype("u1"), self.rows(table))
+            return [_decode_number(value, is_int) for value, is_int in zip(raw.tolist(), flags[start:stop].tolist())]
+        if kind == "bool":
+            return [bool(value) for value in raw.tolist()]
+        return raw.tolist()
+
+    def iter_records(self, table: str, columns: Optional[List[str]] = None,
+                     chunk_rows: int = 65536) -> Iterator[Dict[str, Any]]:
+        """Stream rows as dicts, decoding `chunk_rows` rows of the requested columns at a time"""
+        names = columns or self.columns(table)
+        total = self.rows(table)
+        with_stops = table == "trips" and (columns is None or "charging_stops" in columns)
+        if with_stops:
+            names = [name for name in names if name != "charging_stops"]
+            stop_ends = np.cumsum(self.column("trips", "num_charging_stops"))
+
+        for start in range(0, total, chunk_rows):
+            stop = min(start + chunk_rows, total)
+            chunk = {name: self.values(table, name, start, stop) for name in names}
+            if with_stops:
+                first_stop = int(stop_ends[start - 1]) if start else 0
+                stops = list(self._iter_range("charging_stops", first_stop, int(stop_ends[stop - 1])))
+                stop_cursor = 0
+
+            for i in range(stop - start):
+                record = {}
+                for name in names:
+                    if with_stops and name == "num_charging_stops":
+                        count = chunk[name][i]
+                        record["charging_stops"] = stops[stop_cursor:stop_cursor + count]
+                        stop_cursor += count
+                    value = chunk[name][i]
+                    if value is None:
+                        continue  # missing fields are omitted, as in the source record
+                    if "." in name:
+                        parent, child = name.split(".", 1)
+                        record.setdefault(parent, {})[child] = value
+                    else:
+                        record[name] = value
+                yield record
+
+    def _iter_range(self, table: str, start: int, stop: int) -> Iterator[Dict[str, Any]]:
+        chunk = {name: self.values(table, name, start, stop) for name in self.columns(table)}
+        for i in range(stop - start):
+            yield {name: values[i] for name, values in chunk.items() if values[i] is not None}
+
+    # ------------------------------------------------------------------ writing
+
+    def _prepare(self, table: str):
+        """Truncate column files to the committed length (drops a crashed append)"""
+        if table in self._prepared:
+            return
+        rows = self.rows(table)
+        for name, meta in self._manifest["tables"][table]["columns"].items():
+            kind = meta["kind"]
+            suffix = "offsets" if kind == "text" else "bin"
+            self._truncate(self._file(table, name, suffix), rows * DTYPES[kind].itemsize)
+            if kind == "text":
+                self._truncate(self._file(table, name, "bin"), meta["bytes"])
+            if kind == "number":
+                self._truncate(self._file(table, name, "int"), rows)
+            if kind == "dict":
+                vocab = self.vocab(table, name)
+                self._vocab_index[(table, name)] = {value: code for code, value in enumerate(vocab)}
+                with open(self._file(table, name, "vocab"), "w") as f:
+                    f.writelines(json.dumps(value) + "\n" for value in vocab)
+        self._prepared.add(table)
+
+    @staticmethod
+    def _truncate(path: str, size: int):
+        with open(path, "ab") as f:
+            f.truncate(size)
+
+    def _encode_dict(self, table: str, name: str, values) -> np.ndarray:
+        index = self._vocab_index[(table, name)]
+        vocab = self._vocabs[(table, name)]
+        added = []
+
+        def code(value):
+            if value not in index:
+                index[value] = len(vocab)
+                vocab.append(value)
+                added.append(value)
+            return index[value]
+
+        if isinstance(values, Categorical):
+            remap = np.array([code(value) for value in values.vocab], dtype=DTYPES["dict"])
+            codes = remap[np.asarray(values.codes)] if len(remap) else np.empty(0, DTYPES["dict"])
+        else:
+            codes = np.fromiter((code(value) for value in values), dtype=DTYPES["dict"], count=len(values))
+        if added:
+            with open(self._file(table, name, "vocab"), "a") as f:
+                f.writelines(json.dumps(value) + "\n" for value in added)
+        return codes
+
+    def append(self, table: str, columns: Dict[str, Any], count: int, commit: bool = True):
+        """Append `count` rows given per-column values (sequences, arrays, Categorical or Text)
+
+        Columns missing from `columns` are written as missing values.
+        """
+        with self._lock:
+            self._prepare(table)
+            table_meta = self._manifest["tables"][table]
+            for name, meta in table_meta["columns"].items():
+                kind = meta["kind"]
+                values = columns.get(name)
+                if kind == "text":
+                    if not isinstance(values, Text):
+                        encoded = [("" if value is None else str(value)).encode("utf-8")
+                                   for value in (values if values is not None else [None] * count)]
+                        values = Text(np.fromiter(map(len, encoded), dtype=np.int64, count=count), b"".join(encoded))
+                    ends = np.cumsum(values.lengths, dtype=np.int64) + meta["bytes"]
+                    with open(self._file(table, name, "bin"), "ab") as f:
+                        f.write(values.data)
+                    with open(self._file(table, name, "offsets"), "ab") as f:
+                        f.write(ends.astype(DTYPES["text"]).tobytes())
+                    meta["bytes"] += len(values.data)
+                    continue
+
+                if values is None:
+                    values = [None] * count
+                if kind == "dict":
+                    data = self._encode_dict(table, name, values)
+                    meta["vocab"] = len(self._vocabs[(table, name)])
+                elif kind == "number":
+                    if isinstance(values, np.ndarray):
+                        values = Number(values, np.full(len(values), values.dtype.kind in "iub", dtype=np.uint8))
+                    elif not isinstance(values, Number):
+                        values = Number(np.array([np.nan if v is None else v for v in values], dtype=np.float64),
+                                        np.array([isinstance(v, int) for v in values], dtype=np.uint8))
+                    with open(self._file(table, name, "int"), "ab") as f:
+                        f.write(np.asarray(values.is_int, dtype=np.uint8).tobytes())
+                    data = np.asarray(values.values, dtype=np.float64)
+                else:
+                    data = np.asarray([0 if v is None else v for v in values] if not isinstance(values, np.ndarray)
+                                      else values).astype(DTYPES[kind])
+                if len(data) != count:
+                    raise ValueError(f"Column {table}.{name} has {len(data)} values, expected {count}")
+                with open(self._file(table, name, "bin"), "ab") as f:
+                    f.write(data.astype(DTYPES[kind]).tobytes())
+            table_meta["rows"] += count
+            if commit:
+                self.commit()
+
+    def commit(self):
+        """Publish appended rows to readers (atomic manifest replace)"""
+        self._write_manifest(self.path, self._manifest)
+        self._stamp = os.stat(os.path.join(self.path, MANIFEST)).st_mtime_ns
+
+    def append_records(self, table: str, records: List[Dict], commit: bool = True):
+        columns = {name: [_get(record, name) for record in records] for name in SCHEMAS[table]}
+        self.append(table, columns, len(records), commit=commit)
+
+    def append_trips(self, trips: List[Dict]):
+        """Append trip records (with nested charging_stops) as one committed batch"""
+        self.refresh()
+        trips = [dict(trip, num_charging_stops=len(trip.get("charging_stops", []))) for trip in trips]
+        stops = [stop for trip in trips for stop in trip.get("charging_stops", [])]
+        self.append_records("charging_stops", stops, commit=False)
+        self.append_records("trips", trips)
+
+    def extend(self, other: "ColumnarDataset"):
+        """Append every table of another dataset (e.g. a generator shard) without decoding rows"""
+        self.refresh()
+        for table in SCHEMAS:
+            count = other.rows(table)
+            if not count:
+                continue
+            columns = {}
+            for name in other.columns(table):
+                kind = other._meta(table, name)["kind"]
+                raw = other.column(table, name)
+                if kind == "dict":
+                    columns[name] = Categorical(raw, other.vocab(table, name))
+                elif kind == "number":
+                    columns[name] = Number(raw, other._memmap(other._file(table, name, "int"),
+                                                              np.dtype("u1"), count))
+                elif kind == "text":
+                    data = other._memmap(other._file(table, name, "bin"), np.dtype("u1"),
+                                         other._meta(table, name)["bytes"])
+                    columns[name] = Text(np.diff(raw, prepend=0), data.tobytes())
+                else:
+                    columns[name] = raw
+            self.append(table, columns, count, commit=False)
+        self.commit()
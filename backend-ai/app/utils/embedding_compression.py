@@ -0,0 +1,111 @@
+"""
+Embedding compression - PCA / Matryoshka-style truncation of the stored vectors
+
+Chroma keeps float32 vectors, so the saving is in dimensions only.
+"""
+
+from typing import Optional
+import numpy as np
+
+METHODS = ("none", "pca", "truncate")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class EmbeddingCompressor:
+    """Projection fitted at index time; queries go through the exact same transform"""
+
+    def __init__(self, method: str = "none",
+                 mean: Optional[np.ndarray] = None,
+                 components: Optional[np.ndarray] = None,
+                 dim: Optional[int] = None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown compression method '{method}' (expected one of {METHODS})")
+        self.method = method
+        self.mean = mean
+        self.components = components  # (dim, input_dim) for PCA
+        self.dim = dim
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, method: str, dim: int) -> "EmbeddingCompressor":
+        """Fit the projection on a sample of full-size embeddings"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = min(dim, vectors.shape[1])
+        compressor = cls(method=method, dim=dim)
+
+        if method == "pca":
+            compressor.mean = vectors.mean(axis=0)
+            # Rows of vt are principal directions, strongest first
+            _, _, vt = np.linalg.svd(vectors - compressor.mean, full_matrices=False)
+            compressor.components = vt[:dim].astype(np.float32)
+            compressor.dim = len(compressor.components)
+
+        return compressor
+
+    @property
+    def enabled(self) -> bool:
+        return self.method != "none"
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        """Reduce dimensionality and re-normalize (distances stay on the cosine scale)"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.method == "pca":
+            vectors = (vectors - self.mean) @ self.components.T
+        elif self.method == "truncate":
+            vectors = vectors[:, :self.dim]
+        else:
+            return vectors
+        return _normalize(vectors).astype(np.float32)
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """What the index sees (documents and queries alike)"""
+        return self.project(vectors)
+
+    def bytes_per_vector(self, input_dim: int) -> int:
+        """float32 bytes Chroma stores per vector"""
+        return (self.dim if self.method != "none" else input_dim) * 4
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            method=self.method,
+            dim=-1 if self.dim is None else self.dim,
+            mean=self.mean if self.mean is not None else np.zeros(0, np.float32),
+            components=self.components if self.components is not None else np.zeros((0, 0), np.float32),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingCompressor":
+        data = np.load(path)  # files from older builds may also hold a storage dtype / scale: unused
+        return cls(
+            method=str(data["method"]),
+            dim=None if int(data["dim"]) < 0 else int(data["dim"]),
+            mean=data["mean"] if data["mean"].size else None,
+            components=data["components"] if data["components"].size else None,
+        )
+
+
+def recall_at_k(reference: np.ndarray, compressed: np.ndarray, k: int, num_queries: int = 200,
+                seed: int = 0) -> float:
+    """Share of true top-k neighbours (full vectors) still found with compressed vectors"""
+    n = len(reference)
+    k = min(k, n - 1)
+    if k <= 0:
+        return 1.0
+    queries = np.random.default_rng(seed).choice(n, size=min(num_queries, n), replace=False)
+
+    reference = _normalize(np.asarray(reference, dtype=np.float32))
+    compressed = _normalize(np.asarray(compressed, dtype=np.float32))
+
+    hits = 0
+    for q in queries:
+        true_sim = reference @ reference[q]
+        approx_sim = compressed @ compressed[q]
+        true_sim[q] = approx_sim[q] = -np.inf  # a vector is not its own neighbour
+        true_top = np.argpartition(-true_sim, k)[:k]
+        approx_top = np.argpartition(-approx_sim, k)[:k]
+        hits += len(np.intersect1d(true_top, approx_top))
+    return hits / (len(queries) * k)
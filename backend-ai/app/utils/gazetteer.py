@@ -0,0 +1,201 @@
+"""
+Location gazetteer - linear-time extraction of known cities from free text
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Alternate / historical spellings -> canonical dataset names
+# (only registered when the canonical city actually exists in the index)
+DEFAULT_ALIASES = {
+    "bengaluru": "Bangalore",
+    "bombay": "Mumbai",
+    "madras": "Chennai",
+    "calcutta": "Kolkata",
+    "cochin": "Kochi",
+    "mysuru": "Mysore",
+    "poona": "Pune",
+    "gauhati": "Guwahati",
+    "amdavad": "Ahmedabad",
+    "panaji": "Goa",
+    "new delhi": "Delhi",
+}
+
+# Origin regions the global index is partitioned by (INDEX_PARTITIONS=region);
+# cities not listed here go to OTHER_REGION
+REGIONS = {
+    "north": ("Delhi", "Jaipur", "Chandigarh", "Agra", "Lucknow"),
+    "west": ("Mumbai", "Pune", "Goa", "Ahmedabad", "Surat", "Nashik"),
+    "south": ("Bangalore", "Mysore", "Chennai", "Hyderabad", "Kochi", "Coimbatore"),
+    "east": ("Kolkata", "Bhubaneswar", "Guwahati", "Patna"),
+}
+OTHER_REGION = "other"
+_CITY_REGION = {city: region for region, cities in REGIONS.items() for city in cities}
+
+
+def region_of(city: Optional[str]) -> str:
+    """Partition a trip starting in `city` belongs to"""
+    return _CITY_REGION.get(city, OTHER_REGION)
+
+
+# Words that mark the role of the city that follows them
+START_MARKERS = {"from", "leaving", "departing"}
+END_MARKERS = {"to", "reach", "towards", "till", "until", "into"}
+
+# Shorter tokens are too ambiguous for typo matching ("tune" -> "Pune")
+FUZZY_MIN_LENGTH = 5
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+_END = "$"
+
+
+def _deletes(word: str) -> Set[str]:
+    """All strings reachable from word with a single deletion"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by one insert, delete, substitution or transposition"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diff = [i for i in range(la) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return (len(diff) == 2 and diff[1] == diff[0] + 1
+                and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if la > lb:
+        a, b = b, a
+    # b is one char longer: skipping one char of b must give a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class LocationGazetteer:
+    """Word-level trie over known locations with alias and single-typo support"""
+
+    def __init__(self, locations: Iterable[str], aliases: Optional[Dict[str, str]] = None):
+        self._trie: Dict = {}
+        self._canonical: Dict[str, str] = {}
+        # deletion neighbourhood -> single-word names (SymSpell-style typo lookup)
+        self._fuzzy: Dict[str, Set[str]] = {}
+
+        for name in locations:
+            if name:
+                self._add(name.lower(), name)
+
+        for alias, target in (DEFAULT_ALIASES if aliases is None else aliases).items():
+            canonical = self._canonical.get(target.lower())
+            if canonical:
+                self._add(alias.lower(), canonical)
+
+    def _add(self, key: str, canonical: str):
+        words = _TOKEN_RE.findall(key)
+        if not words:
+            return
+        node = self._trie
+        for word in words:
+            node = node.setdefault(word, {})
+        node[_END] = canonical
+        self._canonical[" ".join(words)] = canonical
+
+        if len(words) == 1 and len(words[0]) >= FUZZY_MIN_LENGTH:
+            for variant in _deletes(words[0]) | {words[0]}:
+                self._fuzzy.setdefault(variant, set()).add(words[0])
+
+    def __len__(self) -> int:
+        return len(set(self._canonical.values()))
+
+    @property
+    def locations(self) -> List[str]:
+        return sorted(set(self._canonical.values()))
+
+    def _fuzzy_lookup(self, token: str) -> Optional[str]:
+        if len(token) < FUZZY_MIN_LENGTH:
+            return None
+        candidates = set()
+        for variant in _deletes(token) | {token}:
+            candidates |= self._fuzzy.get(variant, set())
+        matches = {self._canonical[c] for c in candidates if _within_one_edit(token, c)}
+        # Ambiguous typos are dropped rather than guessed
+        return matches.pop() if len(matches) == 1 else None
+
+    def canonical(self, name: str) -> Optional[str]:
+        """Resolve a user-supplied city name (alias or typo) to its canonical form"""
+        words = _TOKEN_RE.findall(name.lower())
+        key = " ".join(words)
+        if key in self._canonical:
+            return self._canonical[key]
+        return self._fuzzy_lookup(key) if len(words) == 1 else None
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        """Return (token_index, canonical_name) for every location mentioned in text"""
+        return self._scan(_TOKEN_RE.findall(text.lower()))
+
+    def _scan(self, tokens: List[str]) -> List[Tuple[int, str]]:
+        found = []
+        i = 0
+        while i < len(tokens):
+            # Longest match starting at token i (bounded by the longest name)
+            node = self._trie
+            match, match_end = None, i
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if _END in node:
+                    match, match_end = node[_END], j
+
+            if match is None:
+                match = self._fuzzy_lookup(tokens[i])
+                match_end = i + 1
+
+            if match is not None:
+                found.append((i, match))
+                i = match_end
+            else:
+                i += 1
+
+        return found
+
+    def extract_route(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        """Extract (start, end) using "from"/"to"/"reach" markers, falling back to mention order"""
+        tokens = _TOKEN_RE.findall(text.lower())
+        matches = self._scan(tokens)
+
+        start, end = None, None
+        unassigned = []
+        for index, name in matches:
+            marker = tokens[index - 1] if index > 0 else ""
+            if marker in START_MARKERS and start is None:
+                start = name
+            elif marker in END_MARKERS and end is None:
+                end = name
+            else:
+                unassigned.append(name)
+
+        for name in unassigned:
+            if start is None and name != end:
+                start = name
+            elif end is None and name != start:
+                end = name
+
+        if start and end and start != end:
+            return start, end
+        return None, None
+
+    def extract_origin(self, text: str) -> Optional[str]:
+        """Origin city of a query: the start of a full route, else a city right after a start marker"""
+        start, _ = self.extract_route(text)
+        if start:
+            return start
+        tokens = _TOKEN_RE.findall(text.lower())
+        for index, name in self._scan(tokens):
+            if index > 0 and tokens[index - 1] in START_MARKERS:
+                return name
+        return None
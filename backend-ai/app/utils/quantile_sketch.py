@@ -0,0 +1,133 @@
+"""
+Quantile sketch - KLL (Karnin, Lang, Liberty) streaming quantiles
+
+Keeps O(k) values however many are added: level h holds values that each stand
+for 2**h originals, and a full level is sorted and every other value promoted.
+Rank error is about 1.7 / k (k=200: well under 1 percentile point). Sketches of
+the same k merge losslessly, and serialize to a small JSON document.
+"""
+
+import bisect
+import json
+import math
+import random
+from typing import Dict, Iterable, List, Optional
+
+
+class KLLSketch:
+    """🚀 OPTIMIZATION: Constant memory per group, O(log k) rank / quantile queries"""
+
+    def __init__(self, k: int = 200):
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels: List[List[float]] = [[]]
+        self._size = 0
+        self._max_size = self._capacity(0)
+        self._rng = random.Random()
+        self._cdf: Optional[tuple] = None  # (sorted values, cumulative weights), rebuilt lazily
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _grow(self):
+        self.levels.append([])
+        self._max_size = sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def _compress(self):
+        for level in range(len(self.levels)):
+            items = self.levels[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self._grow()
+            items.sort()
+            # An odd value out stays behind at this level
+            keep = [items.pop()] if len(items) % 2 else []
+            self.levels[level + 1].extend(items[self._rng.random() < 0.5::2])
+            self.levels[level] = keep
+            self._size = sum(len(items) for items in self.levels)
+            if self._size < self._max_size:
+                break
+
+    def update(self, value: float):
+        value = float(value)
+        self.levels[0].append(value)
+        self.n += 1
+        self._size += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self._cdf = None
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update_many(self, values: Iterable[float]):
+        for value in values:
+            self.update(value)
+
+    def merge(self, other: "KLLSketch"):
+        """Fold another sketch (same k) into this one"""
+        while len(self.levels) < len(other.levels):
+            self._grow()
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._size = sum(len(items) for items in self.levels)
+        self._cdf = None
+        while self._size >= self._max_size:
+            self._compress()
+
+    def _sorted(self) -> tuple:
+        if self._cdf is None:
+            weighted = sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+            values, cumulative, total = [], [], 0
+            for value, weight in weighted:
+                total += weight
+                values.append(value)
+                cumulative.append(total)
+            self._cdf = (values, cumulative)
+        return self._cdf
+
+    def rank(self, value: float) -> float:
+        """Estimated fraction of added values <= value (0.0 - 1.0)"""
+        if not self.n:
+            return 0.0
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        values, cumulative = self._sorted()
+        position = bisect.bisect_right(values, value)
+        return cumulative[position - 1] / cumulative[-1] if position else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at fraction q (0 = min, 1 = max)"""
+        if not self.n:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        values, cumulative = self._sorted()
+        position = bisect.bisect_left(cumulative, q * cumulative[-1])
+        return values[min(position, len(values) - 1)]
+
+    def to_json(self) -> str:
+        return json.dumps({"k": self.k, "n": self.n, "min": self.min, "max": self.max, "levels": self.levels})
+
+    @classmethod
+    def from_json(cls, payload: str) -> "KLLSketch":
+        data: Dict = json.loads(payload)
+        sketch = cls(data["k"])
+        sketch.n, sketch.min, sketch.max = data["n"], data["min"], data["max"]
+        sketch.levels = data["levels"] or [[]]
+        sketch._size = sum(len(items) for items in sketch.levels)
+        sketch._max_size = sum(sketch._capacity(level) for level in range(len(sketch.levels)))
+        return sketch
@@ -0,0 +1,111 @@
+"""
+Route prototypes - one aggregated document per route + condition bucket
+
+Built in one streaming pass by setup_rag.py; the ingest writer rebuilds the
+buckets a batch touched from the trip store, so both produce identical documents.
+"""
+
+from typing import Dict, Iterable, List
+import numpy as np
+
+
+def prototype_key(trip: Dict) -> tuple:
+    """Route + condition bucket a trip belongs to"""
+    return (
+        trip["start_location"],
+        trip["end_location"],
+        trip["weather"],
+        trip["traffic"],
+        trip["driving_style"],
+    )
+
+
+class RoutePrototypeBuilder:
+    """🚀 OPTIMIZATION: Streaming aggregation of trips into route/condition buckets
+    
+    Keeps only the handful of numbers each prototype needs, never the trips themselves.
+    """
+    
+    FIELDS = ("efficiency_kwh_per_100km", "energy_used_kwh", "num_charging_stops", "distance_km",
+              "elevation_change_m", "duration_hours", "avg_speed_kmh", "temperature_c", "traffic_delay_mins")
+    
+    def __init__(self):
+        self.buckets = {}
+        self.trip_count = 0
+    
+    def add(self, trip: Dict):
+        values, networks = self.buckets.setdefault(prototype_key(trip), ([], {}))
+        values.append(tuple(float(trip[field]) for field in self.FIELDS))
+        for stop in trip.get("charging_stops", []):
+            networks[stop["network"]] = networks.get(stop["network"], 0) + 1
+        self.trip_count += 1
+    
+    def build(self) -> List[Dict]:
+        """Collapse near-identical trips into one profile per route/condition bucket"""
+        
+        prototypes = []
+        for (start, end, weather, traffic, style), (values, networks) in self.buckets.items():
+            columns = dict(zip(self.FIELDS, np.array(values, dtype=float).T))
+            efficiency = columns["efficiency_kwh_per_100km"]
+            energy = columns["energy_used_kwh"]
+            stops = columns["num_charging_stops"]
+            # Ties by name: trips arrive in file order here and in index order from the trip store
+            top_networks = [n for n, _ in sorted(networks.items(), key=lambda x: (-x[1], x[0]))[:3]]
+            
+            prototypes.append({
+                "prototype_id": "proto_" + "_".join(
+                    part.lower().replace(" ", "-") for part in (start, end, weather, traffic, style)
+                ),
+                "start_location": start,
+                "end_location": end,
+                "weather": weather,
+                "traffic": traffic,
+                "driving_style": style,
+                "trip_count": len(values),
+                "distance_km": float(np.median(columns["distance_km"])),
+                "elevation_change_m": int(np.median(columns["elevation_change_m"])),
+                "efficiency_kwh_per_100km": round(float(np.median(efficiency)), 2),
+                "efficiency_p10": round(float(np.percentile(efficiency, 10)), 2),
+                "efficiency_p90": round(float(np.percentile(efficiency, 90)), 2),
+                "energy_used_kwh": round(float(np.median(energy)), 2),
+                "energy_p90_kwh": round(float(np.percentile(energy, 90)), 2),
+                "num_charging_stops": int(round(float(np.median(stops)))),
+                "charging_stop_rate": round(float((stops > 0).mean()), 2),
+                "charging_networks": ", ".join(top_networks),
+                "duration_hours": round(float(np.median(columns["duration_hours"])), 2),
+                "avg_speed_kmh": round(float(np.median(columns["avg_speed_kmh"])), 1),
+                "temperature_c": int(np.median(columns["temperature_c"])),
+                "traffic_delay_mins": int(np.median(columns["traffic_delay_mins"])),
+            })
+        
+        return prototypes
+
+
+def build_route_prototypes(trips: Iterable[Dict]) -> List[Dict]:
+    """Prototype documents for an iterable of trips"""
+    builder = RoutePrototypeBuilder()
+    for trip in trips:
+        builder.add(trip)
+    return builder.build()
+
+
+def create_prototype_text(proto: Dict) -> str:
+    """Convert a route prototype to searchable text (same vocabulary as trip documents)"""
+    
+    charging_info = f"Charging stops: typically {proto['num_charging_stops']} ({proto['charging_stop_rate']*100:.0f}% of trips stopped)."
+    if proto["charging_networks"]:
+        charging_info += f" Networks used: {proto['charging_networks']}."
+    
+    text = f"""
+Trips from {proto['start_location']} to {proto['end_location']} ({proto['trip_count']} trip{'s' if proto['trip_count'] != 1 else ''}).
+Distance: {proto['distance_km']}km, Elevation: {proto['elevation_change_m']}m.
+Energy used: median {proto['energy_used_kwh']}kWh, p90 {proto['energy_p90_kwh']}kWh.
+Efficiency: median {proto['efficiency_kwh_per_100km']}kWh/100km (p10-p90: {proto['efficiency_p10']}-{proto['efficiency_p90']}).
+Weather: {proto['weather']}, Temperature: {proto['temperature_c']}°C.
+Traffic: {proto['traffic']}, Delay: {proto['traffic_delay_mins']} minutes.
+Driving style: {proto['driving_style']}, Average speed: {proto['avg_speed_kmh']}km/h.
+{charging_info}
+Trip duration: {proto['duration_hours']} hours.
+    """.strip()
+    
+    return text
@@ -0,0 +1,86 @@
+"""
+Snapshots - derived in-memory state saved as memory-mappable .npy arrays
+
+Layout of a snapshot directory:
+    manifest.json             current generation, validation stamp, per-component metadata
+    <generation>/<component>.<array>.npy
+
+Every write goes to a new generation directory; the manifest is replaced last
+(atomically), so a reader sees either the old snapshot or the new one, never a
+mix. A snapshot is only used when its stamp equals the caller's current stamp
+(e.g. index version + trip store totals); anything else means rebuild.
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+# component -> (arrays, JSON-serializable metadata)
+Components = Dict[str, Tuple[Dict[str, np.ndarray], Dict[str, Any]]]
+
+
+def write_snapshot(path: str, stamp: Dict[str, Any], components: Components):
+    """Write a new generation and make it current; older generations are removed"""
+    os.makedirs(path, exist_ok=True)
+    generation = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    directory = os.path.join(path, generation)
+    os.makedirs(directory)
+    manifest = {
+        "format": FORMAT_VERSION,
+        "generation": generation,
+        "stamp": stamp,
+        "created_at": time.time(),
+        "components": {},
+    }
+    for component, (arrays, metadata) in components.items():
+        files = {}
+        for name, array in arrays.items():
+            filename = f"{component}.{name}.npy"
+            np.save(os.path.join(directory, filename), np.ascontiguousarray(array), allow_pickle=False)
+            files[name] = {"file": filename, "dtype": array.dtype.str, "shape": list(array.shape)}
+        manifest["components"][component] = {"arrays": files, "metadata": metadata}
+
+    tmp_path = os.path.join(path, MANIFEST + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(path, MANIFEST))
+
+    for entry in os.listdir(path):  # a reader mid-load keeps its open maps (POSIX unlink semantics)
+        if entry not in (generation, MANIFEST) and os.path.isdir(os.path.join(path, entry)):
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+
+def read_snapshot(path: str, stamp: Dict[str, Any]) -> Tuple[Optional[Components], str]:
+    """(components with arrays memory-mapped copy-on-write, "") or (None, why it cannot be used)"""
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None, "no snapshot"
+    if manifest.get("format") != FORMAT_VERSION:
+        return None, f"snapshot format {manifest.get('format')} (expected {FORMAT_VERSION})"
+    if manifest.get("stamp") != json.loads(json.dumps(stamp)):  # compare as stored (tuples -> lists)
+        return None, "snapshot is stale"
+
+    directory = os.path.join(path, manifest["generation"])
+    components: Components = {}
+    try:
+        for component, entry in manifest["components"].items():
+            arrays = {}
+            for name, spec in entry["arrays"].items():
+                # mmap_mode="c": pages load on first touch; writes stay private to this process
+                array = np.load(os.path.join(directory, spec["file"]), mmap_mode="c", allow_pickle=False)
+                if array.dtype.str != spec["dtype"] or list(array.shape) != spec["shape"]:
+                    return None, f"snapshot array {component}.{name} does not match its manifest"
+                arrays[name] = array
+            components[component] = (arrays, entry["metadata"])
+    except (OSError, ValueError) as e:
+        return None, f"snapshot unreadable ({e})"
+    return components, ""
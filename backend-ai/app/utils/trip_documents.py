@@ -0,0 +1,101 @@
+"""
+Trip documents - searchable text and metadata for a trip record
+
+Shared by setup_rag.py (bulk index) and the ingest service (live trips) so both
+produce byte-identical documents and content hashes.
+"""
+
+import hashlib
+import json
+from typing import Dict
+from app.core.config import settings
+
+
+def create_trip_text(trip: Dict) -> str:
+    """Convert trip data to searchable text"""
+    
+    charging_info = ""
+    if trip["num_charging_stops"] > 0:
+        stops = trip["charging_stops"]
+        charging_info = f"Charging stops: {len(stops)}. "
+        for stop in stops:
+            charging_info += f"{stop['network']} {stop['power_kw']}kW for {stop['duration_mins']}min, "
+    
+    text = f"""
+Trip from {trip['start_location']} to {trip['end_location']}.
+Distance: {trip['distance_km']}km, Elevation: {trip['elevation_change_m']}m.
+Energy used: {trip['energy_used_kwh']}kWh, Efficiency: {trip['efficiency_kwh_per_100km']}kWh/100km.
+Weather: {trip['weather']}, Temperature: {trip['temperature_c']}°C.
+Traffic: {trip['traffic']}, Delay: {trip['traffic_delay_mins']} minutes.
+Driving style: {trip['driving_style']}, Average speed: {trip['avg_speed_kmh']}km/h.
+Battery: Started at {trip['start_battery_percent']}%, ended at {trip['end_battery_percent']}%.
+{charging_info}
+Trip duration: {trip['duration_hours']} hours.
+    """.strip()
+    
+    return text
+
+
+def flatten_metadata(trip: Dict) -> Dict:
+    """Convert trip metadata to ChromaDB-compatible format (no nested objects/lists)"""
+    
+    # Convert charging_stops list to simple fields
+    num_stops = trip.get("num_charging_stops", 0)
+    charging_info = ""
+    if num_stops > 0 and "charging_stops" in trip:
+        stops = trip["charging_stops"]
+        networks = [s.get("network", "") for s in stops]
+        charging_info = ", ".join(networks[:3])  # First 3 networks as string
+    
+    return {
+        "trip_id": trip["trip_id"],
+        "user_id": trip["user_id"],
+        "date": trip["date"],
+        "start_location": trip["start_location"],
+        "end_location": trip["end_location"],
+        "distance_km": float(trip["distance_km"]),
+        "duration_hours": float(trip["duration_hours"]),
+        "start_battery_percent": int(trip["start_battery_percent"]),
+        "end_battery_percent": int(trip["end_battery_percent"]),
+        "energy_used_kwh": float(trip["energy_used_kwh"]),
+        "efficiency_kwh_per_100km": float(trip["efficiency_kwh_per_100km"]),
+        "weather": trip["weather"],
+        "temperature_c": int(trip["temperature_c"]),
+        "traffic": trip["traffic"],
+        "traffic_delay_mins": int(trip["traffic_delay_mins"]),
+        "driving_style": trip["driving_style"],
+        "avg_speed_kmh": int(trip["avg_speed_kmh"]),
+        "elevation_change_m": int(trip["elevation_change_m"]),
+        "regen_braking_usage": float(trip["regen_braking_usage"]),
+        "num_charging_stops": int(num_stops),
+        "charging_networks": charging_info,  # Flattened as string
+        "is_highway": bool(trip.get("is_highway", False)),
+        "avg_acceleration": float(trip.get("avg_acceleration", 0.0))
+    }
+
+
+def content_hash(text: str, metadata: Dict) -> str:
+    """Fingerprint of everything that determines a stored document and its embedding"""
+    payload = json.dumps(
+        {"text": text, "metadata": metadata, "embedding_model": settings.EMBEDDING_MODEL},
+        sort_keys=True
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def with_content_hash(text: str, metadata: Dict) -> Dict:
+    """Metadata as stored: the original fields plus content hash and model name"""
+    return {
+        **metadata,
+        "content_hash": content_hash(text, metadata),
+        "embedding_model": settings.EMBEDDING_MODEL,
+    }
+
+
+def index_metadata(text: str, metadata: Dict) -> Dict:
+    """What the global collection stores next to a trip vector: only the bookkeeping
+    needed to skip unchanged trips (the trip itself lives in the trip store)"""
+    return {
+        "content_hash": content_hash(text, metadata),
+        "embedding_model": settings.EMBEDDING_MODEL,
+    }
@@ -3,11 +3,17 @@ Generate realistic synthetic EV trip dataset for 100 users
 This will create comprehensive trip data to feed into the Global RAG system
 """
 
+import argparse
 import json
+import os
 import random
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
 import numpy as np
+from app.utils.columnar import ColumnarDataset, Categorical
 
 # Indian cities and popular EV routes
 CITIES = [
@@ -314,6 +320,506 @@ def generate_complete_dataset():
     return all_users, all_trips
 
 
+# ---------------------------------------------------------------------------
+# 🚀 OPTIMIZATION: Vectorized, sharded generation for scale testing
+#
+# Same physics as generate_trip(), but every field of a shard is drawn as a
+# NumPy array in one call. Users are split into fixed-size shards; shard i
+# always uses the random stream (seed, i), so output depends only on the
+# seed and --as-of date - not on the number of worker processes.
+# ---------------------------------------------------------------------------
+
+STYLE_NAMES = list(DRIVING_STYLES.keys())
+STYLE_WEIGHTS = [0.25, 0.50, 0.15, 0.10]
+MODEL_WEIGHTS = [0.25, 0.20, 0.20, 0.15, 0.15, 0.05]
+TRAFFIC_NAMES = list(TRAFFIC_PATTERNS.keys())
+POWER_OPTIONS = np.array([50, 120, 150, 240])
+CHARGE_LEVELS = np.array([80, 85, 90, 100])
+MAX_STOPS = 2
+COLUMNAR_DATASET = "dataset.cols"  # settings.COLUMNAR_DATASET
+
+# Column lookup tables (indexed by route / style / model / weather / traffic code)
+ROUTE_FROM = np.array([CITIES.index(r["from"]) for r in ROUTES])
+ROUTE_TO = np.array([CITIES.index(r["to"]) for r in ROUTES])
+ROUTE_DISTANCE = np.array([r["distance"] for r in ROUTES])
+ROUTE_ELEVATION = np.array([r["elevation"] for r in ROUTES])
+ROUTE_HIGHWAY = np.array([r["highway"] for r in ROUTES])
+STYLE_ACCEL = np.array([DRIVING_STYLES[s]["accel"] for s in STYLE_NAMES])
+STYLE_SPEED = np.array([DRIVING_STYLES[s]["speed_factor"] for s in STYLE_NAMES])
+STYLE_REGEN = np.array([DRIVING_STYLES[s]["regen_usage"] for s in STYLE_NAMES])
+STYLE_BONUS = np.array([DRIVING_STYLES[s]["efficiency_bonus"] for s in STYLE_NAMES])
+MODEL_CAPACITY = np.array([m["battery_capacity"] for m in EV_MODELS])
+MODEL_EFFICIENCY = np.array([m["efficiency"] for m in EV_MODELS])
+WEATHER_TEMP = np.array([w["temp"] for w in WEATHER_CONDITIONS])
+WEATHER_IMPACT = np.array([w["impact"] for w in WEATHER_CONDITIONS])
+TRAFFIC_DELAY = np.array([TRAFFIC_PATTERNS[t]["delay_mins"] for t in TRAFFIC_NAMES])
+TRAFFIC_IMPACT = np.array([TRAFFIC_PATTERNS[t]["impact"] for t in TRAFFIC_NAMES])
+WINTER_WEATHER = np.flatnonzero(WEATHER_TEMP < 20)
+SUMMER_WEATHER = np.flatnonzero(WEATHER_TEMP > 25)
+
+
+def route_weights(skew: float) -> np.ndarray:
+    """Zipf-like popularity over ROUTES (skew=0 is uniform, like generate_trip)"""
+    weights = 1.0 / np.arange(1, len(ROUTES) + 1) ** skew
+    return weights / weights.sum()
+
+
+def route_index(name: str) -> int:
+    """'Mumbai-Pune' -> index into ROUTES"""
+    start, _, end = name.partition("-")
+    for i, route in enumerate(ROUTES):
+        if (route["from"], route["to"]) == (start.strip(), end.strip()):
+            return i
+    raise ValueError(f"Unknown route '{name}' (expected one of: "
+                     + ", ".join(f"{r['from']}-{r['to']}" for r in ROUTES) + ")")
+
+
+def _pick(rng: np.random.Generator, cdf: np.ndarray) -> np.ndarray:
+    """Row-wise categorical draw from a (n, k) matrix of cumulative probabilities"""
+    u = rng.random(len(cdf))
+    return np.minimum((u[:, None] >= cdf).sum(axis=1), cdf.shape[1] - 1)
+
+
+def generate_shard_arrays(shard: int, first_user: int, num_users: int, seed: int,
+                          as_of: datetime, min_trips: int = 5, max_trips: int = 50,
+                          route_skew: float = 0.0, hot_route: Optional[int] = None,
+                          hot_share: float = 0.0) -> Dict[str, np.ndarray]:
+    """Generate one shard of users and their trips as column arrays"""
+    rng = np.random.default_rng([seed, shard])
+    weights = route_weights(route_skew)
+
+    # Users
+    model = rng.choice(len(EV_MODELS), size=num_users, p=MODEL_WEIGHTS)
+    style = rng.choice(len(STYLE_NAMES), size=num_users, p=STYLE_WEIGHTS)
+    home_city = rng.integers(0, len(CITIES), size=num_users)
+    age_months = rng.integers(1, 61, size=num_users)
+    battery_health = np.round(np.maximum(75, 100 - age_months * 0.4 + rng.uniform(-5, 5, num_users)), 1)
+    charge_level = rng.choice(CHARGE_LEVELS, size=num_users)
+    trips_per_user = rng.integers(min_trips, max_trips + 1, size=num_users)
+
+    # Trips: one row per trip, `owner` maps each row back to its user
+    owner = np.repeat(np.arange(num_users), trips_per_user)
+    n = len(owner)
+    trip_num = np.arange(n) - np.repeat(np.cumsum(trips_per_user) - trips_per_user, trips_per_user)
+
+    # Route: 60% from the home city (when it has routes), otherwise any route
+    home_weights = np.where(ROUTE_FROM[None, :] == np.arange(len(CITIES))[:, None], weights, 0.0)
+    has_home = home_weights.sum(axis=1) > 0
+    home_weights[~has_home] = weights
+    home_cdf = np.cumsum(home_weights / home_weights.sum(axis=1, keepdims=True), axis=1)
+    from_home = rng.random(n) < 0.6
+    route = np.where(from_home,
+                     _pick(rng, home_cdf[home_city[owner]]),
+                     _pick(rng, np.broadcast_to(np.cumsum(weights), (n, len(ROUTES)))))
+    if hot_route is not None and hot_share > 0:
+        route = np.where(rng.random(n) < hot_share, hot_route, route)
+
+    reverse = rng.random(n) < 0.3
+    start = np.where(reverse, ROUTE_TO[route], ROUTE_FROM[route])
+    end = np.where(reverse, ROUTE_FROM[route], ROUTE_TO[route])
+    distance = ROUTE_DISTANCE[route]
+    elevation = np.where(reverse, -ROUTE_ELEVATION[route], ROUTE_ELEVATION[route])
+
+    # Date in the last 6 months; weather follows the season
+    days_ago = rng.integers(0, 181, size=n)
+    date = np.datetime64(as_of, "us") - days_ago.astype("timedelta64[D]")
+    month = date.astype("datetime64[M]").astype(int) % 12 + 1
+    weather = np.where(np.isin(month, [12, 1, 2]), WINTER_WEATHER[rng.integers(0, len(WINTER_WEATHER), n)],
+              np.where(np.isin(month, [4, 5, 6]), SUMMER_WEATHER[rng.integers(0, len(SUMMER_WEATHER), n)],
+                       rng.integers(0, len(WEATHER_CONDITIONS), n)))
+
+    # Traffic depends on the hour (codes: 0 light, 1 moderate, 2 heavy)
+    hour = rng.integers(6, 23, size=n)
+    u = rng.random(n)
+    traffic = np.where(np.isin(hour, [8, 9, 18, 19]), np.where(u < 0.4, 1, 2),
+              np.where((hour >= 10) & (hour <= 17), np.where(u < 0.3, 0, 1), 0))
+
+    # Energy consumption (same factors as generate_trip)
+    user_style = style[owner]
+    energy = (MODEL_EFFICIENCY[model[owner]] * (distance / 100) * STYLE_BONUS[user_style]
+              * WEATHER_IMPACT[weather] * TRAFFIC_IMPACT[traffic] * (1 + np.abs(elevation) / 1000))
+    energy = np.round(energy * rng.uniform(0.95, 1.05, n), 2)
+    efficiency = np.round(energy / distance * 100, 2)
+
+    start_battery = rng.integers(60, 101, size=n)
+    end_battery = np.maximum(5, start_battery - energy / MODEL_CAPACITY[model[owner]] * 100)
+
+    # Charging stops: 1-2 when arriving below 20%, stored as (n, MAX_STOPS) slots
+    num_stops = np.where(end_battery < 20, rng.integers(1, MAX_STOPS + 1, n), 0)
+    active = np.arange(MAX_STOPS)[None, :] < num_stops[:, None]
+    stop_duration = rng.integers(20, 46, (n, MAX_STOPS))
+
+    duration = (distance / (90 * STYLE_SPEED[user_style]) + TRAFFIC_DELAY[traffic] / 60
+                + (stop_duration * active).sum(axis=1) / 60)
+
+    return {
+        "user_id": first_user + np.arange(num_users),
+        "model": model, "style": style, "home_city": home_city, "age_months": age_months,
+        "battery_health": battery_health, "charge_level": charge_level,
+        "owner": owner, "trip_num": trip_num, "date": date, "hour": hour,
+        "start": start, "end": end, "distance": distance, "elevation": elevation,
+        "is_highway": ROUTE_HIGHWAY[route], "weather": weather, "traffic": traffic,
+        "start_battery": start_battery, "end_battery": np.round(end_battery, 1),
+        "energy": energy, "efficiency": efficiency,
+        "duration": np.round(duration, 2), "avg_speed": np.round(distance / duration, 1),
+        "num_stops": num_stops,
+        "stop_distance": rng.integers(150, 301, (n, MAX_STOPS)),
+        "stop_network": rng.integers(0, len(CHARGING_NETWORKS), (n, MAX_STOPS)),
+        "stop_power": rng.choice(POWER_OPTIONS, (n, MAX_STOPS)),
+        "stop_duration": stop_duration,
+        "stop_cost": rng.integers(300, 801, (n, MAX_STOPS)),
+        "stop_charge": rng.integers(30, 61, (n, MAX_STOPS)),
+    }
+
+
+def user_totals(a: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Per-user trip count, distance, energy and mean efficiency of a shard"""
+    n_users = len(a["user_id"])
+    trips_per_user = np.bincount(a["owner"], minlength=n_users)
+    return {
+        "total_trips": trips_per_user,
+        "total_distance": np.bincount(a["owner"], weights=a["distance"], minlength=n_users).astype(np.int64),
+        "total_energy_used": np.round(np.bincount(a["owner"], weights=a["energy"], minlength=n_users), 2),
+        "avg_efficiency": np.round(np.bincount(a["owner"], weights=a["efficiency"], minlength=n_users)
+                                   / trips_per_user, 2),
+    }
+
+
+def shard_records(a: Dict[str, np.ndarray], as_of: datetime):
+    """Column arrays -> (users, trips) in the same record shape as generate_complete_dataset"""
+    totals = {key: value.tolist() for key, value in user_totals(a).items()}
+    user_ids = [f"user_{i:03d}" for i in a["user_id"].tolist()]
+    users = []
+    for i, user_id in enumerate(user_ids):
+        model, style = EV_MODELS[a["model"][i]], STYLE_NAMES[a["style"][i]]
+        users.append({
+            "user_id": user_id,
+            "name": f"User {a['user_id'][i]}",
+            "ev_model": model["name"],
+            "battery_capacity": model["battery_capacity"],
+            "base_efficiency": model["efficiency"],
+            "home_city": CITIES[a["home_city"][i]],
+            "driving_style": style,
+            "driving_stats": DRIVING_STYLES[style],
+            "battery_health": float(a["battery_health"][i]),
+            "age_months": int(a["age_months"][i]),
+            "total_trips": totals["total_trips"][i],
+            "total_distance": totals["total_distance"][i],
+            "preferred_charge_level": int(a["charge_level"][i]),
+            "avg_efficiency": totals["avg_efficiency"][i],
+            "total_energy_used": totals["total_energy_used"][i],
+        })
+
+    # .tolist() once per column - Python scalars are much faster to serialize
+    unit = "us" if as_of.microsecond else "s"
+    col = {key: value.tolist() for key, value in a.items() if key not in ("user_id", "date")}
+    col["date"] = np.datetime_as_string(a["date"], unit=unit).tolist()
+
+    def trips():
+        for t in range(len(col["owner"])):
+            user = col["owner"][t]
+            style = DRIVING_STYLES[STYLE_NAMES[col["style"][user]]]
+            traffic = TRAFFIC_NAMES[col["traffic"][t]]
+            charging_stops = [{
+                "location": f"Station at {col['stop_distance'][t][s]}km",
+                "network": CHARGING_NETWORKS[col["stop_network"][t][s]],
+                "power_kw": col["stop_power"][t][s],
+                "duration_mins": col["stop_duration"][t][s],
+                "cost": col["stop_cost"][t][s],
+                "charge_added": col["stop_charge"][t][s],
+            } for s in range(col["num_stops"][t])]
+            yield {
+                "trip_id": f"{user_ids[user]}_trip_{col['trip_num'][t]:04d}",
+                "user_id": user_ids[user],
+                "date": col["date"][t],
+                "start_location": CITIES[col["start"][t]],
+                "end_location": CITIES[col["end"][t]],
+                "distance_km": col["distance"][t],
+                "elevation_change_m": col["elevation"][t],
+                "is_highway": col["is_highway"][t],
+                "start_battery_percent": col["start_battery"][t],
+                "end_battery_percent": col["end_battery"][t],
+                "energy_used_kwh": col["energy"][t],
+                "efficiency_kwh_per_100km": col["efficiency"][t],
+                "weather": WEATHER_CONDITIONS[col["weather"][t]]["type"],
+                "temperature_c": WEATHER_CONDITIONS[col["weather"][t]]["temp"],
+                "traffic": traffic,
+                "traffic_delay_mins": TRAFFIC_PATTERNS[traffic]["delay_mins"],
+                "start_time": f"{col['hour'][t]:02d}:00",
+                "duration_hours": col["duration"][t],
+                "avg_speed_kmh": col["avg_speed"][t],
+                "charging_stops": charging_stops,
+                "num_charging_stops": col["num_stops"][t],
+                "avg_acceleration": style["accel"],
+                "regen_braking_usage": style["regen_usage"],
+                "driving_style": STYLE_NAMES[col["style"][user]],
+                "electricity_cost": round(col["energy"][t] * 10, 2),
+            }
+
+    return users, trips()
+
+
+def write_columnar_shard(a: Dict[str, np.ndarray], path: str, as_of: datetime):
+    """Column arrays -> columnar dataset, straight from the codes (no per-trip dicts)"""
+    dataset = ColumnarDataset.create(path)
+    unit = "us" if as_of.microsecond else "s"
+    user_ids = [f"user_{i:03d}" for i in a["user_id"].tolist()]
+    user_style = a["style"][a["owner"]]
+
+    active = np.arange(MAX_STOPS)[None, :] < a["num_stops"][:, None]  # row-major = trip order
+    dataset.append("charging_stops", {
+        "location": Categorical(a["stop_distance"][active] - 150,
+                                [f"Station at {d}km" for d in range(150, 301)]),
+        "network": Categorical(a["stop_network"][active], CHARGING_NETWORKS),
+        "power_kw": a["stop_power"][active],
+        "duration_mins": a["stop_duration"][active],
+        "cost": a["stop_cost"][active],
+        "charge_added": a["stop_charge"][active],
+    }, int(active.sum()), commit=False)
+
+    dataset.append("trips", {
+        "trip_id": [f"{user_ids[user]}_trip_{num:04d}"
+                    for user, num in zip(a["owner"].tolist(), a["trip_num"].tolist())],
+        "user_id": Categorical(a["owner"], user_ids),
+        "date": np.datetime_as_string(a["date"], unit=unit).tolist(),
+        "start_location": Categorical(a["start"], CITIES),
+        "end_location": Categorical(a["end"], CITIES),
+        "distance_km": a["distance"],
+        "elevation_change_m": a["elevation"],
+        "is_highway": a["is_highway"],
+        "start_battery_percent": a["start_battery"],
+        "end_battery_percent": a["end_battery"],
+        "energy_used_kwh": a["energy"],
+        "efficiency_kwh_per_100km": a["efficiency"],
+        "weather": Categorical(a["weather"], [w["type"] for w in WEATHER_CONDITIONS]),
+        "temperature_c": WEATHER_TEMP[a["weather"]],
+        "traffic": Categorical(a["traffic"], TRAFFIC_NAMES),
+        "traffic_delay_mins": TRAFFIC_DELAY[a["traffic"]],
+        "start_time": Categorical(a["hour"], [f"{hour:02d}:00" for hour in range(24)]),
+        "duration_hours": a["duration"],
+        "avg_speed_kmh": a["avg_speed"],
+        "num_charging_stops": a["num_stops"],
+        "avg_acceleration": STYLE_ACCEL[user_style],
+        "regen_braking_usage": STYLE_REGEN[user_style],
+        "driving_style": Categorical(user_style, STYLE_NAMES),
+        "electricity_cost": np.round(a["energy"] * 10, 2),
+    }, len(a["owner"]), commit=False)
+
+    totals = user_totals(a)
+    dataset.append("users", {
+        "user_id": user_ids,
+        "name": [f"User {i}" for i in a["user_id"].tolist()],
+        "ev_model": Categorical(a["model"], [m["name"] for m in EV_MODELS]),
+        "battery_capacity": MODEL_CAPACITY[a["model"]],
+        "base_efficiency": MODEL_EFFICIENCY[a["model"]],
+        "home_city": Categorical(a["home_city"], CITIES),
+        "driving_style": Categorical(a["style"], STYLE_NAMES),
+        "driving_stats.accel": STYLE_ACCEL[a["style"]],
+        "driving_stats.speed_factor": STYLE_SPEED[a["style"]],
+        "driving_stats.regen_usage": STYLE_REGEN[a["style"]],
+        "driving_stats.efficiency_bonus": STYLE_BONUS[a["style"]],
+        "battery_health": a["battery_health"],
+        "age_months": a["age_months"],
+        "preferred_charge_level": a["charge_level"],
+        **totals,
+    }, len(user_ids))
+
+
+def write_shard(job: Dict) -> Dict:
+    """Worker: generate one shard and write its part files; returns summary counts"""
+    a = generate_shard_arrays(job["shard"], job["first_user"], job["num_users"], job["seed"],
+                              job["as_of"], job["min_trips"], job["max_trips"],
+                              job["route_skew"], job["hot_route"], job["hot_share"])
+    prefix = os.path.join(job["tmp_dir"], f"shard-{job['shard']:05d}")
+
+    if job["format"] == "columnar":
+        trips_path = users_path = prefix + ".cols"
+        write_columnar_shard(a, trips_path, job["as_of"])
+    else:
+        users, trips = shard_records(a, job["as_of"])
+        # JSON arrays are written as comma-joined parts, JSONL as plain lines
+        separator = ",\n" if job["format"] == "json" else "\n"
+        trips_path, users_path = prefix + ".trips", prefix + ".users"
+        with open(trips_path, "w") as f:
+            f.write(separator.join(json.dumps(trip) for trip in trips))
+        with open(users_path, "w") as f:
+            f.write(separator.join(json.dumps(user) for user in users))
+
+    route_keys = a["start"] * len(CITIES) + a["end"]
+    return {
+        "shard": job["shard"], "trips_path": trips_path, "users_path": users_path,
+        "users": int(len(a["user_id"])), "trips": int(len(a["owner"])), "distance": int(a["distance"].sum()),
+        "models": np.bincount(a["model"], minlength=len(EV_MODELS)),
+        "styles": np.bincount(a["style"], minlength=len(STYLE_NAMES)),
+        "routes": np.bincount(route_keys, minlength=len(CITIES) ** 2),
+    }
+
+
+def _concatenate(parts: List[str], path: str, fmt: str):
+    """Stream shard part files into one output file, in shard order"""
+    separator = ",\n" if fmt == "json" else "\n"
+    with open(path, "w") as out:
+        if fmt == "json":
+            out.write("[\n")
+        first = True
+        for part in parts:
+            if os.path.getsize(part) == 0:
+                continue
+            if not first:
+                out.write(separator)
+            with open(part, "r") as f:
+                shutil.copyfileobj(f, out, 1 << 20)
+            first = False
+        out.write("\n]\n" if fmt == "json" else "\n")
+
+
+def generate_vectorized_dataset(num_users: int = 100, seed: int = 42, as_of: Optional[datetime] = None,
+                                fmt: str = "jsonl", out_dir: str = "data", workers: int = 1,
+                                shard_users: int = 5000, min_trips: int = 5, max_trips: int = 50,
+                                route_skew: float = 0.0, hot_route: Optional[str] = None,
+                                hot_share: float = 0.0):
+    """Generate a dataset of any size across processes; deterministic for (seed, as_of)"""
+    as_of = as_of or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    hot_index = route_index(hot_route) if hot_route else None
+    os.makedirs(out_dir, exist_ok=True)
+
+    print(f"🚗 Generating EV Dataset for {num_users:,} Users (vectorized, seed={seed})...")
+    print("=" * 60)
+
+    tmp_dir = tempfile.mkdtemp(prefix=".generate-", dir=out_dir)
+    jobs = [{
+        "shard": shard, "first_user": first + 1, "num_users": min(shard_users, num_users - first),
+        "seed": seed, "as_of": as_of, "min_trips": min_trips, "max_trips": max_trips,
+        "route_skew": route_skew, "hot_route": hot_index, "hot_share": hot_share,
+        "format": fmt, "tmp_dir": tmp_dir,
+    } for shard, first in enumerate(range(0, num_users, shard_users))]
+
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(write_shard, jobs):
+                results.append(result)
+                users_so_far = sum(r["users"] for r in results)
+                trips_so_far = sum(r["trips"] for r in results)
+                print(f"✅ Generated {users_so_far:,} users with {trips_so_far:,} total trips")
+
+        if fmt == "columnar":
+            # Shards are merged column by column (codes remapped, rows never decoded)
+            users_path = trips_path = os.path.join(out_dir, COLUMNAR_DATASET)
+            dataset = ColumnarDataset.create(trips_path, overwrite=True)
+            for r in results:
+                dataset.extend(ColumnarDataset(r["trips_path"]))
+        else:
+            ext = "json" if fmt == "json" else "jsonl"
+            users_path = os.path.join(out_dir, f"dataset_users.{ext}")
+            trips_path = os.path.join(out_dir, f"dataset_trips.{ext}")
+            _concatenate([r["users_path"] for r in results], users_path, fmt)
+            _concatenate([r["trips_path"] for r in results], trips_path, fmt)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    total_users = sum(r["users"] for r in results)
+    total_trips = sum(r["trips"] for r in results)
+    print("\n" + "=" * 60)
+    print(f"📊 Dataset Summary:")
+    print(f"   Total Users: {total_users:,}")
+    print(f"   Total Trips: {total_trips:,}")
+    print(f"   Avg Trips/User: {total_trips / total_users:.1f}")
+    print(f"   Total Distance: {sum(r['distance'] for r in results):,.0f} km")
+    print("=" * 60)
+    print("\n✅ Saved to:")
+    for path in dict.fromkeys([users_path, trips_path]):
+        print(f"   - {path}")
+
+    print("\n📈 Dataset Statistics:")
+    print(f"   EV Models:")
+    for model, count in zip(EV_MODELS, sum(r["models"] for r in results)):
+        print(f"      {model['name']}: {count:,} users")
+    print(f"\n   Driving Styles:")
+    for style, count in zip(STYLE_NAMES, sum(r["styles"] for r in results)):
+        print(f"      {style.capitalize()}: {count:,} users")
+    print(f"\n   Popular Routes:")
+    route_counts = sum(r["routes"] for r in results)
+    for key in np.argsort(route_counts)[::-1][:5]:
+        start, end = divmod(int(key), len(CITIES))
+        print(f"      {CITIES[start]} → {CITIES[end]}: {route_counts[key]:,} trips")
+
+    return users_path, trips_path
+
+
+def _read_records(path: str):
+    if path.endswith(".jsonl"):
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r") as f:
+            yield from json.load(f)
+
+
+def convert_to_columnar(trips_path: str, users_path: str, out_dir: str = "data", chunk: int = 50000) -> str:
+    """Write an existing JSON / JSONL dataset as a columnar dataset"""
+    path = os.path.join(out_dir, COLUMNAR_DATASET)
+    dataset = ColumnarDataset.create(path, overwrite=True)
+    print(f"🔄 Converting {trips_path} + {users_path} -> {path}")
+
+    batch = []
+    for trip in _read_records(trips_path):
+        batch.append(trip)
+        if len(batch) >= chunk:
+            dataset.append_trips(batch)
+            batch = []
+    if batch:
+        dataset.append_trips(batch)
+    dataset.append_records("users", list(_read_records(users_path)))
+
+    print(f"✅ {dataset.rows('trips'):,} trips, {dataset.rows('charging_stops'):,} charging stops, "
+          f"{dataset.rows('users'):,} users")
+    return path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate the synthetic EV trip dataset")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="NumPy generator for large datasets (implied by the options below)")
+    parser.add_argument("--users", type=int, default=100, help="Number of users")
+    parser.add_argument("--min-trips", type=int, default=5, help="Minimum trips per user")
+    parser.add_argument("--max-trips", type=int, default=50, help="Maximum trips per user")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (vectorized mode)")
+    parser.add_argument("--as-of", type=lambda s: datetime.fromisoformat(s), default=None,
+                        help="Newest trip date, YYYY-MM-DD (default: today)")
+    parser.add_argument("--format", choices=["json", "jsonl", "columnar"], default=None,
+                        help="Output format (default: json, or jsonl in vectorized mode)")
+    parser.add_argument("--out-dir", default="data", help="Output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Generator processes (output does not depend on this)")
+    parser.add_argument("--shard-users", type=int, default=5000, help="Users per shard")
+    parser.add_argument("--route-skew", type=float, default=0.0,
+                        help="Zipf exponent for route popularity (0 = uniform)")
+    parser.add_argument("--hot-route", default=None,
+                        help="Route forced onto --hot-share of all trips, e.g. Mumbai-Pune")
+    parser.add_argument("--hot-share", type=float, default=0.0,
+                        help="Fraction of trips on --hot-route")
+    parser.add_argument("--convert", nargs=2, metavar=("TRIPS", "USERS"), default=None,
+                        help="Convert existing JSON/JSONL files to the columnar format instead of generating")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    users, trips = generate_complete_dataset()
+    args = parse_args()
+    if args.convert:
+        convert_to_columnar(*args.convert, out_dir=args.out_dir)
+        raise SystemExit(0)
+    vectorized = (args.vectorized or args.format in ("jsonl", "columnar") or args.users != 100
+                  or (args.min_trips, args.max_trips) != (5, 50) or args.route_skew or args.hot_route)
+    if vectorized:
+        generate_vectorized_dataset(
+            num_users=args.users, seed=args.seed, as_of=args.as_of, fmt=args.format or "jsonl",
+            out_dir=args.out_dir, workers=args.workers, shard_users=args.shard_users,
+            min_trips=args.min_trips, max_trips=args.max_trips, route_skew=args.route_skew,
+            hot_route=args.hot_route, hot_share=args.hot_share
+        )
+    else:
+        users, trips = generate_complete_dataset()
     print("\n🎉 Dataset generation complete!")
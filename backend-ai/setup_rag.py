@@ -2,260 +2,629 @@
 Dual RAG System Setup
 - RAG 1: Global knowledge from 100 users (2917 trips)
 - RAG 2: Personal driving patterns (last 10 trips per user)
+
+Usage: python setup_rag.py [--rebuild] [--prune] [--workers N] [--batch-size N] [--trips PATH] [--users PATH]
 """
 
+import argparse
+import heapq
+import itertools
 import json
+import queue
+import threading
+import time
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
+import numpy as np
 import os
+from app.core.config import settings
+from app.services.efficiency_sketches import EfficiencySketches
+from app.services.energy_model import EnergyModel
+from app.services.index_registry import (ALL_PARTITIONS, COLLECTIONS, PARTITIONED, IndexRegistry,
+                                         partition_name, projection_file, versioned_name)
+from app.services.profile_store import RecentTripWindow, profile_id, profile_metadata
+from app.services.trip_store import TripStore
+from app.utils.embedding_compression import EmbeddingCompressor, recall_at_k
+from app.utils.columnar import ColumnarDataset, MANIFEST
+from app.utils.gazetteer import OTHER_REGION, REGIONS, region_of
+from app.utils.route_prototypes import RoutePrototypeBuilder, create_prototype_text
+from app.utils.trip_documents import create_trip_text, flatten_metadata, index_metadata, with_content_hash
 
 # Initialize embedding model (local, no API needed)
 print("📦 Loading embedding model from cache...")
 embedder = SentenceTransformer(
-    'all-MiniLM-L6-v2',  # 384 dimensions, fast
+    settings.EMBEDDING_MODEL,  # all-MiniLM-L6-v2: 384 dimensions, fast
     cache_folder=None  # Uses default cache: ~/.cache/torch/sentence_transformers/
 )
 print("✅ Embedding model loaded from cache!")
 print(f"   Cache location: ~/.cache/torch/sentence_transformers/")
 
 # Initialize ChromaDB client
-client = chromadb.PersistentClient(path="./chroma_db")
+client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
+
+# System of record for trips / users (the global collection keeps only vectors + ids)
+trip_store = TripStore(os.path.join(settings.DATASET_PATH, settings.TRIP_STORE_FILE))
+
+# Identity until fit_embedding_compressor() runs with EMBEDDING_COMPRESSION enabled
+compressor = EmbeddingCompressor()
+
+# Logical collection name -> physical (versioned) collection currently being served
+registry = IndexRegistry(client)
+
+COLLECTION_DESCRIPTIONS = {
+    # RAG 1: Global Trip Knowledge (all users)
+    "global_trip_knowledge": "Trip data from 100 users for community insights",
+    # RAG 2: Personal Driving Patterns (per user, last 10 trips)
+    "personal_driving_patterns": "Individual user's last 10 trips for personalization",
+    # RAG 1b: Route prototypes (one compact document per route + condition bucket)
+    "global_route_prototypes": "Aggregated route/condition profiles built from global trips",
+}
+
+
+def bind_collections(version: Optional[int] = None):
+    """Open (or create) the collections of one index version; None = the published one
+    
+    A new version is partitioned per INDEX_PARTITIONS; the published one keeps its layout.
+    """
+    
+    global global_shards, personal_collection, prototype_collection
+    
+    if version is None:
+        manifest = registry.read()
+        names = manifest["collections"]
+        shard_names = registry.global_shards(manifest)
+    else:
+        names = {name: versioned_name(name, version) for name in COLLECTIONS}
+        if settings.INDEX_PARTITIONS == "region":
+            shard_names = {partition: versioned_name(partition_name(partition), version)
+                           for partition in (*REGIONS, OTHER_REGION)}
+        else:
+            shard_names = {ALL_PARTITIONS: names[PARTITIONED]}
+    
+    def open_collection(name: str, logical: str):
+        return client.get_or_create_collection(
+            name=name,
+            metadata={"description": COLLECTION_DESCRIPTIONS[logical]}
+        )
+    
+    global_shards = {partition: open_collection(name, PARTITIONED) for partition, name in shard_names.items()}
+    personal_collection = open_collection(names["personal_driving_patterns"], "personal_driving_patterns")
+    prototype_collection = open_collection(names["global_route_prototypes"], "global_route_prototypes")
+
+
+def trip_partition(trip: Dict) -> str:
+    """Global partition a trip is stored in (its origin region)"""
+    if ALL_PARTITIONS in global_shards:
+        return ALL_PARTITIONS
+    region = region_of(trip["start_location"])
+    return region if region in global_shards else OTHER_REGION
+
+
+def global_count() -> int:
+    return sum(collection.count() for collection in global_shards.values())
+
 
 # Create collections
 print("\n🗄️  Creating vector databases...")
+bind_collections()
+print("✅ Collections created!")
 
-# RAG 1: Global Trip Knowledge (all users)
-global_collection = client.get_or_create_collection(
-    name="global_trip_knowledge",
-    metadata={"description": "Trip data from 100 users for community insights"}
-)
 
-# RAG 2: Personal Driving Patterns (per user, last 10 trips)
-personal_collection = client.get_or_create_collection(
-    name="personal_driving_patterns",
-    metadata={"description": "Individual user's last 10 trips for personalization"}
-)
+def iter_json_array(path: str, chunk_size: int = 1 << 20) -> Iterator[Dict]:
+    """Stream objects out of a (possibly pretty-printed) JSON array without loading it whole"""
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buffer = f.read(chunk_size)
+        while "[" not in buffer:  # leading whitespace can be longer than a chunk
+            more = f.read(chunk_size)
+            if not more:
+                raise ValueError(f"{path} does not contain a JSON array")
+            buffer += more
+        pos = buffer.index("[") + 1
+        while True:
+            # Skip separators, refilling the buffer as needed
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                more = f.read(chunk_size)
+                if not more:
+                    return
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Object straddles the chunk boundary
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield record
+            if pos > chunk_size:
+                buffer, pos = buffer[pos:], 0
 
-print("✅ Collections created!")
+
+def iter_records(path: str, table: str = "trips") -> Iterator[Dict]:
+    """Stream records from a columnar dataset directory, .jsonl (one object per line) or a JSON array file"""
+    if os.path.isdir(path):
+        # 🚀 OPTIMIZATION: column files are memory-mapped and decoded in chunks - no JSON parsing
+        yield from ColumnarDataset(path).iter_records(table)
+    elif path.endswith(".jsonl"):
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from iter_json_array(path)
 
 
-def load_datasets():
-    """Load generated datasets"""
-    print("\n📂 Loading datasets...")
-    
-    with open("data/dataset_users.json", "r") as f:
-        users = json.load(f)
-    
-    with open("data/dataset_trips.json", "r") as f:
-        trips = json.load(f)
-    
-    print(f"   Loaded {len(users)} users and {len(trips)} trips")
-    return users, trips
-
-
-def create_trip_text(trip: Dict) -> str:
-    """Convert trip data to searchable text"""
-    
-    charging_info = ""
-    if trip["num_charging_stops"] > 0:
-        stops = trip["charging_stops"]
-        charging_info = f"Charging stops: {len(stops)}. "
-        for stop in stops:
-            charging_info += f"{stop['network']} {stop['power_kw']}kW for {stop['duration_mins']}min, "
-    
-    text = f"""
-Trip from {trip['start_location']} to {trip['end_location']}.
-Distance: {trip['distance_km']}km, Elevation: {trip['elevation_change_m']}m.
-Energy used: {trip['energy_used_kwh']}kWh, Efficiency: {trip['efficiency_kwh_per_100km']}kWh/100km.
-Weather: {trip['weather']}, Temperature: {trip['temperature_c']}°C.
-Traffic: {trip['traffic']}, Delay: {trip['traffic_delay_mins']} minutes.
-Driving style: {trip['driving_style']}, Average speed: {trip['avg_speed_kmh']}km/h.
-Battery: Started at {trip['start_battery_percent']}%, ended at {trip['end_battery_percent']}%.
-{charging_info}
-Trip duration: {trip['duration_hours']} hours.
-    """.strip()
-    
-    return text
-
-
-def flatten_metadata(trip: Dict) -> Dict:
-    """Convert trip metadata to ChromaDB-compatible format (no nested objects/lists)"""
-    
-    # Convert charging_stops list to simple fields
-    num_stops = trip.get("num_charging_stops", 0)
-    charging_info = ""
-    if num_stops > 0 and "charging_stops" in trip:
-        stops = trip["charging_stops"]
-        networks = [s.get("network", "") for s in stops]
-        charging_info = ", ".join(networks[:3])  # First 3 networks as string
-    
-    return {
-        "trip_id": trip["trip_id"],
-        "user_id": trip["user_id"],
-        "date": trip["date"],
-        "start_location": trip["start_location"],
-        "end_location": trip["end_location"],
-        "distance_km": float(trip["distance_km"]),
-        "duration_hours": float(trip["duration_hours"]),
-        "start_battery_percent": int(trip["start_battery_percent"]),
-        "end_battery_percent": int(trip["end_battery_percent"]),
-        "energy_used_kwh": float(trip["energy_used_kwh"]),
-        "efficiency_kwh_per_100km": float(trip["efficiency_kwh_per_100km"]),
-        "weather": trip["weather"],
-        "temperature_c": int(trip["temperature_c"]),
-        "traffic": trip["traffic"],
-        "traffic_delay_mins": int(trip["traffic_delay_mins"]),
-        "driving_style": trip["driving_style"],
-        "avg_speed_kmh": int(trip["avg_speed_kmh"]),
-        "elevation_change_m": int(trip["elevation_change_m"]),
-        "regen_braking_usage": float(trip["regen_braking_usage"]),
-        "num_charging_stops": int(num_stops),
-        "charging_networks": charging_info,  # Flattened as string
-        "is_highway": bool(trip.get("is_highway", False)),
-        "avg_acceleration": float(trip.get("avg_acceleration", 0.0))
-    }
-
-
-def populate_global_rag(trips: List[Dict]):
-    """Populate RAG 1 with all trip data"""
+def load_users(path: str) -> Dict[str, Dict]:
+    """Users are small (one record per driver) - keep them in memory by id"""
+    print(f"\n📂 Loading users from {path}...")
+    users = {user["user_id"]: user for user in iter_records(path, table="users")}
+    print(f"   Loaded {len(users)} users")
+    return users
+
+
+class IngestCheckpoint:
+    """Progress marker for the global ingest; lets a crashed run resume where it stopped"""
+    
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.version = None  # index version a --rebuild is writing to (None = published index)
+        # A columnar dataset changes whenever its manifest is replaced
+        stat = os.stat(os.path.join(source, MANIFEST) if os.path.isdir(source) else source)
+        self.fingerprint = {
+            "source": os.path.abspath(source),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "embedding_model": settings.EMBEDDING_MODEL,
+        }
+    
+    def records_done(self) -> int:
+        """Records already upserted for this exact source file (0 if none / stale)"""
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get("fingerprint") != self.fingerprint:
+            return 0
+        self.version = state.get("version")
+        return int(state.get("records_done", 0))
+    
+    def save(self, records_done: int):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "records_done": records_done,
+                       "version": self.version}, f)
+        os.replace(tmp_path, self.path)  # atomic: a crash never leaves a torn checkpoint
+    
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ChromaWriter(threading.Thread):
+    """Background writer: stores trip rows and upserts vectors while the next batch is being embedded"""
+    
+    def __init__(self, shards: Dict, checkpoint: IngestCheckpoint, max_pending: int = 4):
+        super().__init__(name="chroma-writer", daemon=True)
+        self.shards = shards
+        self.checkpoint = checkpoint
+        self.queue = queue.Queue(maxsize=max_pending)  # bounded: embedding can't run away from writes
+        self.error = None
+        self.written = 0
+    
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # drain without writing after a failure
+            records_done, trips, documents, ids, partitions, embeddings, metadatas = item
+            try:
+                # upserts keep a resumed run idempotent for the batch that was in flight
+                trip_store.upsert_trips(trips, documents)
+                for partition in sorted(set(partitions)):
+                    rows = [i for i, p in enumerate(partitions) if p == partition]
+                    self.shards[partition].upsert(ids=[ids[i] for i in rows],
+                                                  embeddings=[embeddings[i] for i in rows],
+                                                  metadatas=[metadatas[i] for i in rows])
+                self.checkpoint.save(records_done)
+                self.written += len(ids)
+            except Exception as e:
+                self.error = e
+    
+    def submit(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+    
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def embed_texts(texts: List[str], show_progress_bar: bool = False, pool=None) -> List[List[float]]:
+    """Embed texts and apply the fitted compression (exactly what the index stores)"""
+    if pool is not None:
+        embeddings = embedder.encode_multi_process(texts, pool)
+    else:
+        embeddings = embedder.encode(texts, show_progress_bar=show_progress_bar)
+    if compressor.enabled:
+        embeddings = compressor.transform(embeddings)
+    return embeddings.tolist()
+
+
+def load_embedding_compressor(version: Optional[int] = None):
+    """Reuse the projection an index version was built with (None = the published one)"""
+    global compressor
+    if version is None:
+        path = registry.projection_path()
+    else:
+        path = os.path.join(settings.CHROMA_DB_PATH, projection_file(version))
+    compressor = EmbeddingCompressor.load(path) if path and os.path.exists(path) else EmbeddingCompressor()
+
+
+def fit_embedding_compressor(trips: List[Dict], version: int) -> Optional[str]:
+    """Fit the optional PCA / truncation projection and refuse it if recall drops
     
-    print("\n🌍 Populating Global RAG (RAG 1)...")
-    print("   This may take a few minutes...")
+    Returns the projection file name for the index manifest (None = no compression).
+    """
     
-    batch_size = 100
-    total_batches = (len(trips) + batch_size - 1) // batch_size
+    global compressor
     
-    for i in range(0, len(trips), batch_size):
-        batch = trips[i:i + batch_size]
-        
-        # Convert trips to text
-        texts = [create_trip_text(trip) for trip in batch]
-        
-        # Generate embeddings
-        embeddings = embedder.encode(texts, show_progress_bar=False)
-        
-        # Flatten metadata (ChromaDB doesn't support nested objects/lists)
-        metadatas = [flatten_metadata(trip) for trip in batch]
-        
-        # Add to collection
-        global_collection.add(
-            documents=texts,
-            embeddings=embeddings.tolist(),
-            metadatas=metadatas,
-            ids=[trip["trip_id"] for trip in batch]
+    filename = projection_file(version)
+    path = os.path.join(settings.CHROMA_DB_PATH, filename)
+    method, dim = settings.EMBEDDING_COMPRESSION, settings.EMBEDDING_COMPRESSED_DIM
+    
+    if method == "none":
+        compressor = EmbeddingCompressor()
+        return None
+    
+    print(f"\n🗜️  Fitting embedding compression ({method}, {dim} dims)...")
+    
+    rng = np.random.default_rng(42)
+    sample = rng.choice(len(trips), size=min(len(trips), settings.EMBEDDING_FIT_SAMPLE), replace=False)
+    full = embedder.encode([create_trip_text(trips[i]) for i in sample], show_progress_bar=False)
+    
+    # Fit on 80%, validate neighbour recall on the held-out 20%
+    split = int(len(full) * 0.8)
+    train, validation = full[:split], full[split:]
+    candidate = EmbeddingCompressor.fit(train, method, dim)
+    recall = recall_at_k(validation, candidate.transform(validation), k=settings.EMBEDDING_RECALL_K)
+    
+    full_bytes = full.shape[1] * 4
+    compressed_bytes = candidate.bytes_per_vector(full.shape[1])
+    print(f"   {full.shape[1]} → {candidate.dim} dims: {full_bytes} → {compressed_bytes} bytes/vector in Chroma "
+          f"({full_bytes / compressed_bytes:.1f}x smaller)")
+    print(f"   recall@{settings.EMBEDDING_RECALL_K} on {len(validation)} held-out trips: "
+          f"{recall:.3f} (minimum {settings.EMBEDDING_MIN_RECALL})")
+    
+    if recall < settings.EMBEDDING_MIN_RECALL:
+        raise SystemExit(
+            f"❌ Compression rejected: recall {recall:.3f} < {settings.EMBEDDING_MIN_RECALL}. "
+            f"Increase EMBEDDING_COMPRESSED_DIM."
         )
-        
-        current_batch = i // batch_size + 1
-        print(f"   Batch {current_batch}/{total_batches} complete ({len(batch)} trips)")
     
-    print(f"✅ Global RAG populated with {len(trips)} trips!")
+    candidate.save(path)
+    compressor = candidate
+    print(f"✅ Projection saved to {path}")
+    return filename
+
+
+def index_hashes(collection, page_size: int = 5000) -> Dict[str, str]:
+    """id -> content hash for everything already in a collection (paged)"""
+    hashes = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+            hashes[doc_id] = (metadata or {}).get("content_hash")
+        if len(page["ids"]) < page_size:
+            break
+        offset += page_size
+    return hashes
+
+
+def partition_hashes(shards: Dict) -> Dict[str, tuple]:
+    """id -> (partition, content hash) across the global partitions"""
+    return {doc_id: (partition, content)
+            for partition, collection in shards.items()
+            for doc_id, content in index_hashes(collection).items()}
+
 
+def delete_ids(collection, ids: List[str], batch_size: int = 5000):
+    for i in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[i:i + batch_size])
 
-def create_user_pattern_text(user_id: str, trips: List[Dict]) -> str:
-    """Create text summary of user's driving patterns"""
+
+def sync_documents(collection, ids: List[str], texts: List[str], metadatas: List[Dict],
+                   batch_size: int = 500) -> tuple:
+    """🚀 OPTIMIZATION: Embed and upsert only new/changed documents, delete removed ids
+    
+    Returns (changed, unchanged, deleted) counts.
+    """
+    existing = index_hashes(collection)
+    stored = [with_content_hash(text, metadata) for text, metadata in zip(texts, metadatas)]
+    changed = [i for i, doc_id in enumerate(ids) if existing.get(doc_id) != stored[i]["content_hash"]]
+    
+    for start in range(0, len(changed), batch_size):
+        batch = changed[start:start + batch_size]
+        collection.upsert(
+            ids=[ids[i] for i in batch],
+            documents=[texts[i] for i in batch],
+            embeddings=embed_texts([texts[i] for i in batch]),
+            metadatas=[stored[i] for i in batch]
+        )
     
-    avg_efficiency = sum(t["efficiency_kwh_per_100km"] for t in trips) / len(trips)
-    avg_speed = sum(t["avg_speed_kmh"] for t in trips) / len(trips)
-    total_distance = sum(t["distance_km"] for t in trips)
+    removed = sorted(set(existing) - set(ids))
+    delete_ids(collection, removed)
     
-    # Common routes
-    routes = {}
-    for trip in trips:
-        route_key = f"{trip['start_location']} to {trip['end_location']}"
-        routes[route_key] = routes.get(route_key, 0) + 1
+    return len(changed), len(ids) - len(changed), len(removed)
+
+
+def populate_global_rag(trips_path: str, checkpoint: IngestCheckpoint, resume_from: int = 0,
+                        workers: int = 1, batch_size: int = 512,
+                        existing_hashes: Optional[Dict[str, tuple]] = None, prune: bool = False):
+    """Stream trips into the trip store and RAG 1 with parallel embedding and overlapped writes
+    
+    Every trip is written to the trip store; with existing_hashes (id -> (partition,
+    content hash) of the current index) only new or changed trips are embedded, each
+    into its origin region's partition. Trips the store has but the file does not
+    (uploaded through the API) are kept and indexed from their stored document;
+    with prune they are deleted from both instead.
+    Returns the prototype builder and per-user recent trips gathered in the same pass.
+    """
     
-    common_route = max(routes.items(), key=lambda x: x[1])[0] if routes else "Various"
+    print("\n🌍 Populating Global RAG (RAG 1)...")
+    if resume_from:
+        print(f"   Resuming after {resume_from:,} already indexed trips")
+    
+    batch_size = min(batch_size, client.get_max_batch_size())
+    prototypes = RoutePrototypeBuilder()
+    recent = RecentTrips(limit=settings.PROFILE_RECENT_TRIPS)
+    
+    pool = embedder.start_multi_process_pool(target_devices=["cpu"] * workers) if workers > 1 else None
+    writer = ChromaWriter(global_shards, checkpoint)
+    writer.start()
+    
+    existing_hashes = existing_hashes or {}
+    started = time.monotonic()
+    seen = 0
+    embedded = 0
+    unchanged = 0
+    seen_ids = set()
+    moved = []  # (old partition, id) of trips whose origin region changed
+    rows = []   # (trip, text) for the trip store - changed or not
+    batch = []  # (trip, text, metadata, partition) to embed
+    
+    def flush(rows: List[tuple], batch: List[tuple], records_done: int):
+        texts = [text for _, text, _, _ in batch]
+        writer.submit((
+            records_done,
+            [trip for trip, _ in rows],
+            [text for _, text in rows],
+            [trip["trip_id"] for trip, _, _, _ in batch],
+            [partition for _, _, _, partition in batch],
+            embed_texts(texts, pool=pool) if texts else [],
+            [metadata for _, _, metadata, _ in batch],
+        ))
+    
+    try:
+        for trip in iter_records(trips_path):
+            seen += 1
+            seen_ids.add(trip["trip_id"])
+            prototypes.add(trip)
+            recent.add(trip)
+            
+            if seen <= resume_from:
+                continue  # already in the index - only feed the aggregators
+            
+            text = create_trip_text(trip)
+            # The vector is stored with its content hash only; the trip row carries the rest
+            metadata = index_metadata(text, flatten_metadata(trip))
+            partition = trip_partition(trip)
+            rows.append((trip, text))
+            existing = existing_hashes.get(trip["trip_id"])
+            if existing == (partition, metadata["content_hash"]):
+                unchanged += 1  # same text, metadata and model - keep the stored vector
+            else:
+                batch.append((trip, text, metadata, partition))
+                if existing is not None and existing[0] != partition:
+                    moved.append((existing[0], trip["trip_id"]))
+            
+            if len(batch) >= batch_size or len(rows) >= 8 * batch_size:
+                flush(rows, batch, seen)
+                embedded += len(batch)
+                rows, batch = [], []
+                elapsed = time.monotonic() - started
+                print(f"   {seen:,} trips ({embedded / elapsed:,.0f} records/s)")
+        
+        if rows:
+            flush(rows, batch, seen)
+            embedded += len(batch)
+        
+        kept = 0
+        if not prune:
+            # The trip store is the system of record: a re-index never drops trips it holds
+            store_only = [trip_id for trip_id in trip_store.iter_trip_ids() if trip_id not in seen_ids]
+            for i in range(0, len(store_only), batch_size):
+                batch = []
+                ids = store_only[i:i + batch_size]
+                networks = trip_store.charging_networks(ids)
+                for trip_id, (text, trip) in trip_store.get_trips(ids).items():
+                    seen_ids.add(trip_id)
+                    metadata = index_metadata(text, trip)
+                    trip["charging_stops"] = [{"network": network} for network in networks.get(trip_id, [])]
+                    prototypes.add(trip)
+                    recent.add(trip)
+                    partition = trip_partition(trip)
+                    existing = existing_hashes.get(trip_id)
+                    if existing == (partition, metadata["content_hash"]):
+                        unchanged += 1
+                        continue
+                    batch.append((trip, text, metadata, partition))
+                    if existing is not None and existing[0] != partition:
+                        moved.append((existing[0], trip_id))
+                if batch:
+                    flush([], batch, seen)  # rows are already stored
+                    embedded += len(batch)
+                kept += len(store_only[i:i + batch_size])
+    finally:
+        writer.close()
+        if pool is not None:
+            embedder.stop_multi_process_pool(pool)
+    
+    # Trips that disappeared from the source file (or left their old partition)
+    removed = [(partition, trip_id) for trip_id, (partition, _) in existing_hashes.items()
+               if trip_id not in seen_ids]
+    for partition, collection in global_shards.items():
+        delete_ids(collection, [trip_id for p, trip_id in removed + moved if p == partition])
+    if prune:
+        trip_store.delete_trips([trip_id for trip_id in trip_store.iter_trip_ids() if trip_id not in seen_ids])
+    # Aggregates, rollups and sketches were kept current by live ingest; rebuild them from the final table
+    trip_store.rebuild_aggregates()
+    trip_store.rebuild_rollups()
+    sketches = EfficiencySketches(trip_store).rebuild()
+    energy_model = EnergyModel(trip_store)
+    energy_model.rebuild()
+    
+    elapsed = max(time.monotonic() - started, 1e-9)
+    print(f"✅ Global RAG populated with {seen:,} trips "
+          f"({embedded:,} embedded in {elapsed:.1f}s, {embedded / elapsed:,.0f} records/s)")
+    if existing_hashes:
+        print(f"   {unchanged:,} unchanged, {len(removed):,} removed")
+    if kept:
+        print(f"   {kept:,} trips kept from the trip store (not in {trips_path}; --prune deletes them)")
+    print(f"   {sketches:,} efficiency sketches (global, per route, EV model and driving style)")
+    print(f"   Energy model fitted on {energy_model.n:,} trips -> {energy_model.path}")
+    
+    return prototypes, recent
+
+
+def catch_up_global_rag(stamp: List, batch_size: int = 512) -> List:
+    """Index what the API changed in the trip store after `stamp` was taken
+    
+    populate_global_rag reads the trip store once; trips ingested (or deleted)
+    after that pass only reached the index that was serving at the time. Their
+    stored content hashes are compared with the bound collections and the
+    difference is embedded / deleted, until the store stops changing.
+    Returns the stamp the bound collections are current with (stamp=None always compares).
+    """
+    
+    batch_size = min(batch_size, client.get_max_batch_size())
+    while True:
+        current = trip_store.content_stamp()
+        if current == stamp:
+            return stamp
+        stamp = current
+        
+        indexed = partition_hashes(global_shards)
+        stale = {}  # trip_id -> (content hash, partition it is indexed in or None)
+        for trip_id, content in trip_store.iter_content_hashes():
+            previous = indexed.pop(trip_id, None)
+            if previous is None or previous[1] != content:
+                stale[trip_id] = (content, previous and previous[0])
+        gone = [(partition, trip_id) for trip_id, (partition, _) in indexed.items()]  # deleted from the store
+        
+        ids = list(stale)
+        for i in range(0, len(ids), batch_size):
+            batch = [(trip_id, text, trip_partition(trip))
+                     for trip_id, (text, trip) in trip_store.get_trips(ids[i:i + batch_size]).items()]
+            for partition in sorted({partition for _, _, partition in batch}):
+                rows = [(trip_id, text) for trip_id, text, p in batch if p == partition]
+                global_shards[partition].upsert(
+                    ids=[trip_id for trip_id, _ in rows],
+                    embeddings=embed_texts([text for _, text in rows]),
+                    metadatas=[{"content_hash": stale[trip_id][0], "embedding_model": settings.EMBEDDING_MODEL}
+                               for trip_id, _ in rows])
+            # An edit can move a trip to another origin region
+            gone += [(stale[trip_id][1], trip_id) for trip_id, _, partition in batch
+                     if stale[trip_id][1] not in (None, partition)]
+        for partition, collection in global_shards.items():
+            delete_ids(collection, [trip_id for p, trip_id in gone if p == partition])
+        if stale or indexed:
+            print(f"   Caught up with {len(stale):,} trips changed and "
+                  f"{len(indexed):,} deleted through the API during the build")
+
+
+def populate_route_prototypes(prototypes: List[Dict]):
+    """Populate the prototype collection (stored alongside the raw trips)"""
     
-    # Driving style
-    styles = [t["driving_style"] for t in trips]
-    dominant_style = max(set(styles), key=styles.count)
+    print("\n🧩 Indexing route prototypes...")
     
-    # Charging behavior
-    total_stops = sum(t["num_charging_stops"] for t in trips)
+    changed, unchanged, removed = sync_documents(
+        prototype_collection,
+        ids=[proto["prototype_id"] for proto in prototypes],
+        texts=[create_prototype_text(proto) for proto in prototypes],
+        metadatas=[{k: v for k, v in proto.items() if k != "prototype_id"} for proto in prototypes],
+        batch_size=100
+    )
     
-    text = f"""
-User {user_id}'s driving profile based on last {len(trips)} trips:
-Average efficiency: {avg_efficiency:.2f} kWh/100km
-Average speed: {avg_speed:.1f} km/h
-Total distance: {total_distance} km
-Most common route: {common_route}
-Dominant driving style: {dominant_style}
-Total charging stops: {total_stops}
-Regenerative braking usage: {trips[0]['regen_braking_usage']*100:.0f}%
+    trip_count = sum(proto["trip_count"] for proto in prototypes)
+    print(f"✅ {len(prototypes)} route prototypes summarise {trip_count} trips "
+          f"({trip_count / max(len(prototypes), 1):.1f} trips per document)")
+    print(f"   {changed} embedded, {unchanged} unchanged, {removed} removed")
 
-Recent trip patterns:
-    """.strip()
-    
-    # Add last 3 trips summary
-    for trip in trips[-3:]:
-        text += f"\n- {trip['start_location']} to {trip['end_location']}: {trip['distance_km']}km, {trip['efficiency_kwh_per_100km']}kWh/100km"
-    
-    return text
+
+class RecentTrips:
+    """Bounded per-user min-heaps: each user's latest trips without sorting the full history"""
+    
+    def __init__(self, limit: int = 10):
+        self.limit = limit
+        self.heaps = {}
+        self._seq = 0  # tie-breaker so equal dates never compare dicts
+    
+    def add(self, trip: Dict):
+        heap = self.heaps.setdefault(trip["user_id"], [])
+        self._seq += 1
+        entry = (trip["date"], -self._seq, trip)  # earlier file order wins date ties
+        if len(heap) < self.limit:
+            heapq.heappush(heap, entry)
+        elif entry[0] > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+    
+    def latest(self, user_id: str) -> List[Dict]:
+        """Newest first"""
+        return [trip for _, _, trip in sorted(self.heaps.get(user_id, []), reverse=True)]
 
 
-def populate_personal_rag(users: List[Dict], all_trips: List[Dict]):
+def populate_personal_rag(users: Dict[str, Dict], recent: RecentTrips, batch_size: int = 500):
     """Populate RAG 2 with each user's last 10 trips"""
     
     print("\n👤 Populating Personal RAG (RAG 2)...")
     
-    # Group trips by user
-    user_trips = {}
-    for trip in all_trips:
-        user_id = trip["user_id"]
-        if user_id not in user_trips:
-            user_trips[user_id] = []
-        user_trips[user_id].append(trip)
-    
-    # Sort trips by date and take last 10
-    for user_id in user_trips:
-        user_trips[user_id].sort(key=lambda x: x["date"], reverse=True)
-        user_trips[user_id] = user_trips[user_id][:10]  # Last 10 trips
-    
     # Add to personal RAG
     texts = []
     metadatas = []
     ids = []
     
-    for user in users:
-        user_id = user["user_id"]
+    for user_id, user in users.items():
+        trips = recent.latest(user_id)  # Last 10 trips, newest first
         
-        if user_id in user_trips and len(user_trips[user_id]) > 0:
-            trips = user_trips[user_id]
-            
-            # Create pattern text
-            pattern_text = create_user_pattern_text(user_id, trips)
-            
-            # Metadata includes user profile + trip summaries (flattened for ChromaDB)
-            metadata = {
-                "user_id": user_id,
-                "ev_model": user["ev_model"],
-                "driving_style": user["driving_style"],
-                "battery_health": float(user["battery_health"]),
-                "avg_efficiency": float(user["avg_efficiency"]),
-                "num_trips_analyzed": len(trips),
-                # Flatten recent trips as simple strings instead of nested objects
-                "recent_routes": ", ".join([f"{t['start_location']}-{t['end_location']}" for t in trips[:5]]),
-                "recent_dates": ", ".join([t["date"] for t in trips[:5]])
-            }
+        if trips:
+            # Same ring buffer + running sums the API uses for live profile updates
+            window = RecentTripWindow.from_trips(trips, limit=recent.limit)
             
-            texts.append(pattern_text)
-            metadatas.append(metadata)
-            ids.append(f"profile_{user_id}")
-    
-    # Generate embeddings and add to collection
-    print(f"   Generating embeddings for {len(texts)} user profiles...")
-    embeddings = embedder.encode(texts, show_progress_bar=True)
-    
-    personal_collection.add(
-        documents=texts,
-        embeddings=embeddings.tolist(),
-        metadatas=metadatas,
-        ids=ids
-    )
+            texts.append(window.pattern_text(user_id))
+            metadatas.append(profile_metadata(user_id, user, window))
+            ids.append(profile_id(user_id))
+    
+    # Generate embeddings only for profiles whose text/metadata changed
+    changed, unchanged, removed = sync_documents(personal_collection, ids, texts, metadatas, batch_size)
     
     print(f"✅ Personal RAG populated with {len(texts)} user profiles!")
+    print(f"   {changed} embedded, {unchanged} unchanged, {removed} removed")
 
 
 def verify_rag_systems():
@@ -267,22 +636,24 @@ def verify_rag_systems():
     test_query = "trips from Mumbai to Goa with good efficiency"
     print(f"\n   Test query for Global RAG: '{test_query}'")
     
-    query_embedding = embedder.encode(test_query)
-    results = global_collection.query(
-        query_embeddings=[query_embedding.tolist()],
-        n_results=3
-    )
+    query_embedding = embed_texts([test_query])
+    hits = []
+    for collection in global_shards.values():  # every partition, nearest 3 overall
+        results = collection.query(query_embeddings=query_embedding, n_results=3, include=["distances"])
+        hits += zip(results["distances"][0], results["ids"][0])
+    ids = [trip_id for _, trip_id in sorted(hits)[:3]]
+    trips = trip_store.get_trips(ids)  # hits are hydrated from the trip store
     
-    print(f"   ✅ Found {len(results['documents'][0])} similar trips")
-    print(f"   Example: {results['metadatas'][0][0]['start_location']} → {results['metadatas'][0][0]['end_location']}")
+    print(f"   ✅ Found {len(trips)} similar trips")
+    _, example = trips[ids[0]]
+    print(f"   Example: {example['start_location']} → {example['end_location']}")
     
     # Test Personal RAG
     test_user_query = "user with eco driving style"
     print(f"\n   Test query for Personal RAG: '{test_user_query}'")
     
-    query_embedding = embedder.encode(test_user_query)
     results = personal_collection.query(
-        query_embeddings=[query_embedding.tolist()],
+        query_embeddings=embed_texts([test_user_query]),
         n_results=3
     )
     
@@ -291,46 +662,114 @@ def verify_rag_systems():
     
     # Print statistics
     print(f"\n📊 RAG System Statistics:")
-    print(f"   Global RAG: {global_collection.count()} trip records")
+    print(f"   Global RAG: {global_count()} trip records")
+    if ALL_PARTITIONS not in global_shards:
+        print("   Partitions: " + ", ".join(f"{partition} {collection.count()}"
+                                           for partition, collection in global_shards.items()))
+    print(f"   Route prototypes: {prototype_collection.count()} documents")
     print(f"   Personal RAG: {personal_collection.count()} user profiles")
 
 
+def default_source(filename: str) -> str:
+    """The columnar dataset when one exists, otherwise the JSON file"""
+    columnar = os.path.join(settings.DATASET_PATH, settings.COLUMNAR_DATASET)
+    return columnar if ColumnarDataset.exists(columnar) else os.path.join(settings.DATASET_PATH, filename)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the dual RAG index (non-interactive)")
+    parser.add_argument("--trips", default=default_source(settings.TRIPS_FILE),
+                        help="Trips source (columnar dataset directory, .json array or .jsonl)")
+    parser.add_argument("--users", default=default_source(settings.USERS_FILE),
+                        help="Users source (columnar dataset directory, .json array or .jsonl)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Clear existing collections and re-index everything")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete trips that are not in the trips source, including trips added through the API")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Embedding worker processes (sentence-transformers multi-process pool)")
+    parser.add_argument("--batch-size", type=int, default=512,
+                        help="Trips per embed/upsert batch")
+    return parser.parse_args()
+
+
 def main():
     """Main setup function"""
     
-    global global_collection, personal_collection
+    args = parse_args()
     
     print("=" * 70)
     print("🚀 EV Range Prediction - Dual RAG System Setup")
     print("=" * 70)
     
-    # Load datasets
-    users, trips = load_datasets()
-    
-    # Check if already populated
-    global_count = global_collection.count()
-    personal_count = personal_collection.count()
-    
-    if global_count > 0:
-        print(f"\n⚠️  Global RAG already has {global_count} records")
-        response = input("   Clear and repopulate? (y/n): ")
-        if response.lower() == 'y':
-            client.delete_collection("global_trip_knowledge")
-            client.delete_collection("personal_driving_patterns")
-            global_collection = client.get_or_create_collection(name="global_trip_knowledge")
-            personal_collection = client.get_or_create_collection(name="personal_driving_patterns")
-        else:
-            print("   Skipping population...")
-            verify_rag_systems()
-            return
+    users = load_users(args.users)
+    trip_store.upsert_users(users.values())
+    checkpoint = IngestCheckpoint(os.path.join(settings.CHROMA_DB_PATH, "ingest_checkpoint.json"), args.trips)
+    resume_from = 0 if args.rebuild else checkpoint.records_done()
+    
+    building = None  # new index version being built (None = update the published index in place)
+    projection = None
+    
+    if resume_from:
+        print(f"\n♻️  Found checkpoint: {resume_from:,} trips already indexed, resuming")
+        building = checkpoint.version
+        if building is not None:
+            bind_collections(building)
+            projection = projection_file(building)
+            if not os.path.exists(os.path.join(settings.CHROMA_DB_PATH, projection)):
+                projection = None
+        load_embedding_compressor(building)
+    elif args.rebuild or global_count() == 0:
+        # 🚀 OPTIMIZATION: Build into a fresh versioned collection set while the
+        # published index keeps serving; the manifest swap at the end is atomic
+        building = registry.next_version()
+        print(f"\n🏗️  Building index v{building} (serving v{registry.read()['version']} meanwhile)")
+        # Optional compression is fitted (and possibly rejected) before anything is embedded
+        projection = fit_embedding_compressor(
+            list(itertools.islice(iter_records(args.trips), settings.EMBEDDING_FIT_SAMPLE)), building
+        )
+        checkpoint.clear()
+        checkpoint.version = building
+        bind_collections(building)
+    else:
+        print(f"\n♻️  Global RAG already has {global_count()} records: incremental re-index "
+              f"(pass --rebuild to build a fresh index version)")
+        # Keep the projection the stored vectors were built with
+        load_embedding_compressor()
+    
+    # 🚀 OPTIMIZATION: Unchanged trips (same content hash) are never re-embedded
+    existing_hashes = partition_hashes(global_shards)
+    
+    # Populate both RAG systems (prototypes + personal profiles come from the same pass)
+    prototypes, recent = populate_global_rag(
+        args.trips, checkpoint, resume_from=resume_from,
+        workers=args.workers, batch_size=args.batch_size,
+        existing_hashes=existing_hashes, prune=args.prune
+    )
+    populate_route_prototypes(prototypes.build())
+    populate_personal_rag(users, recent)
     
-    # Populate both RAG systems
-    populate_global_rag(trips)
-    populate_personal_rag(users, trips)
+    if building is not None:
+        # The API kept writing trips into the serving version while this one was built
+        print("\n🔁 Catching up with trips changed through the API during the build...")
+        stamp = catch_up_global_rag(None, args.batch_size)
     
-    # Verify everything works
+    # Verify everything works (a new version is checked before it is published)
     verify_rag_systems()
     
+    if building is not None:
+        registry.publish(building, projection,
+                         partitions=[p for p in global_shards if p != ALL_PARTITIONS] or None)
+        print(f"\n🔄 Published index v{building} (running servers switch within "
+              f"{settings.INDEX_POLL_SECONDS:g}s)")
+        # Until they do, their ingest still writes to the previous version
+        time.sleep(settings.INDEX_POLL_SECONDS + settings.INGEST_FLUSH_MS / 1000)
+        catch_up_global_rag(stamp, args.batch_size)
+        dropped = registry.garbage_collect()
+        if dropped:
+            print(f"   Garbage-collected: {', '.join(dropped)}")
+    checkpoint.clear()
+    
     print("\n" + "=" * 70)
     print("🎉 RAG System Setup Complete!")
     print("=" * 70)
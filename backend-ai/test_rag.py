@@ -21,29 +21,32 @@ print("🧪 RAG RETRIEVAL TEST")
 print("="*70)
 
 for query in test_queries:
-    print(f"\n📝 Query: '{query}'")
-    print("-"*70)
-    
-    # Get RAG results
-    results = rag_service.query_global(query, n_results=3)
-    
-    print(f"\n📊 Retrieved {len(results['documents'])} documents:\n")
-    
-    for i, (doc, meta, dist) in enumerate(zip(
-        results['documents'], 
-        results['metadatas'], 
-        results['distances']
-    ), 1):
-        similarity = 1 - dist
-        print(f"Result {i} (Similarity: {similarity:.3f}):")
-        print(f"  Document: {doc[:200]}...")
-        print(f"  Route: {meta.get('start_location', '?')} → {meta.get('end_location', '?')}")
-        print(f"  Distance: {meta.get('distance_km', '?')} km")
-        print(f"  Charging stops: {meta.get('num_charging_stops', '?')}")
-        print(f"  Energy: {meta.get('energy_used_kwh', '?')} kWh")
-        print()
-    
-    print("="*70)
+    for source in ("prototypes", "trips"):
+        print(f"\n📝 Query: '{query}' ({source})")
+        print("-"*70)
+        
+        # Trip hits carry only bookkeeping metadata in Chroma; rag_service fills them from the trip store
+        results = rag_service.query_global(query, n_results=3, source=source)
+        
+        print(f"\n📊 Retrieved {len(results['documents'])} documents:\n")
+        
+        for i, (doc, meta, dist) in enumerate(zip(
+            results['documents'], 
+            results['metadatas'], 
+            results['distances']
+        ), 1):
+            if not meta or 'start_location' not in meta:
+                sys.exit(f"❌ Result {i} has no trip fields - is the trip store populated? (python setup_rag.py)")
+            similarity = 1 - dist
+            print(f"Result {i} (Similarity: {similarity:.3f}):")
+            print(f"  Document: {doc[:200]}...")
+            print(f"  Route: {meta['start_location']} → {meta['end_location']}")
+            print(f"  Distance: {meta.get('distance_km', '?')} km")
+            print(f"  Charging stops: {meta.get('num_charging_stops', '?')}")
+            print(f"  Energy: {meta.get('energy_used_kwh', '?')} kWh")
+            print()
+        
+        print("="*70)
 
 print("\n✅ RAG test complete!")
 print("\nIf results look good, the RAG is working correctly.")
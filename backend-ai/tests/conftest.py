@@ -0,0 +1,159 @@
+"""
+Shared fixtures: a throwaway trip store, dataset-shaped trip records and an
+index directory served with a stand-in embedding model
+"""
+
+import hashlib
+import importlib
+import os
+import random
+import re
+import sys
+import types
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings  # noqa: E402
+from app.services.trip_store import TripStore  # noqa: E402
+
+
+class FakeEmbedder:
+    """Hashed bag of words, normalized - texts sharing words are close, no model download"""
+
+    DIM = 64
+    calls = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.DIM, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.DIM] += 1.0
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def encode(self, texts, **kwargs):
+        FakeEmbedder.calls += 1
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.array([self._vector(text) for text in texts], dtype=np.float32).reshape(-1, self.DIM)
+
+
+@pytest.fixture
+def index_env(tmp_path, monkeypatch):
+    """Chroma directory and dataset path under tmp_path, embedded by FakeEmbedder"""
+    monkeypatch.setattr(settings, "CHROMA_DB_PATH", str(tmp_path / "chroma_db"))
+    monkeypatch.setattr(settings, "DATASET_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "INDEX_PARTITIONS", "region")
+    monkeypatch.setitem(sys.modules, "sentence_transformers",
+                        types.SimpleNamespace(SentenceTransformer=FakeEmbedder))
+    return tmp_path
+
+
+@pytest.fixture
+def setup_rag(index_env):
+    """setup_rag.py as a module (importing it creates the published collections)"""
+    sys.modules.pop("setup_rag", None)
+    module = importlib.import_module("setup_rag")
+    yield module
+    module.trip_store.close()
+    sys.modules.pop("setup_rag", None)
+
+
+@pytest.fixture
+def rag_service(setup_rag, monkeypatch):
+    """A live RAGService over the index setup_rag created"""
+    monkeypatch.setattr(settings, "SNAPSHOT_INTERVAL_SECONDS", 0.0)
+    sys.modules.pop("app.services.rag_service", None)
+    module = importlib.import_module("app.services.rag_service")
+    yield module.rag_service
+    module.rag_service.close()
+    sys.modules.pop("app.services.rag_service", None)
+
+
+@pytest.fixture
+def load_service(monkeypatch):
+    """Import app.services.<name> fresh against stand-ins for the services it imports,
+    e.g. load_service("telemetry_service", rag_service=fake_module, ...) - the real
+    RAG service would load the embedding model and open the vector store"""
+    loaded = []
+
+    def load(name: str, **services):
+        for service, fake in services.items():
+            monkeypatch.setitem(sys.modules, f"app.services.{service}", fake)
+        module_name = f"app.services.{name}"
+        sys.modules.pop(module_name, None)
+        loaded.append(module_name)
+        return importlib.import_module(module_name)
+
+    yield load
+    for module_name in loaded:  # later imports must not see the stand-ins
+        sys.modules.pop(module_name, None)
+
+
+@pytest.fixture
+def store(tmp_path):
+    trip_store = TripStore(str(tmp_path / "trips.db"))
+    yield trip_store
+    trip_store.close()
+
+
+@pytest.fixture
+def make_trip():
+    """Trip record in the dataset / ingest shape; any field can be overridden"""
+    counter = iter(range(1_000_000))
+
+    def make(**fields):
+        number = next(counter)
+        trip = {
+            "trip_id": f"trip_{number:05d}",
+            "user_id": "user_001",
+            "date": (datetime.now() - timedelta(days=number % 30)).isoformat(),
+            "start_location": "Mumbai",
+            "end_location": "Pune",
+            "distance_km": 150.0,
+            "duration_hours": 3.0,
+            "start_battery_percent": 90,
+            "end_battery_percent": 50,
+            "energy_used_kwh": 24.0,
+            "efficiency_kwh_per_100km": 16.0,
+            "weather": "pleasant",
+            "temperature_c": 25,
+            "traffic": "moderate",
+            "traffic_delay_mins": 10,
+            "driving_style": "normal",
+            "avg_speed_kmh": 60,
+            "elevation_change_m": 500,
+            "regen_braking_usage": 0.3,
+            "num_charging_stops": 0,
+            "charging_stops": [],
+            "is_highway": True,
+            "avg_acceleration": 1.2,
+        }
+        trip.update(fields)
+        return trip
+
+    return make
+
+
+@pytest.fixture
+def random_trip(make_trip):
+    """Trip on a random route / user / conditions: random_trip(rng, **overrides)"""
+    def make(rng: random.Random, **fields):
+        start, end = rng.sample(("Mumbai", "Pune", "Goa", "Bangalore"), 2)
+        return make_trip(**{
+            "user_id": f"user_{rng.randint(1, 5):03d}",
+            "start_location": start,
+            "end_location": end,
+            "distance_km": round(rng.uniform(50, 600), 1),
+            "efficiency_kwh_per_100km": round(rng.uniform(10, 30), 2),
+            "weather": rng.choice(("hot", "cold", "pleasant")),
+            "traffic": rng.choice(("light", "moderate", "heavy")),
+            "temperature_c": rng.randint(5, 40),
+            **fields,
+        })
+
+    return make
@@ -0,0 +1,96 @@
+"""
+Bulk ingest (setup_rag.py): streaming JSON parse, checkpoints and resumable population
+"""
+
+import json
+import os
+from collections import Counter
+import random
+import pytest
+
+
+@pytest.fixture
+def trips_file(tmp_path, random_trip):
+    rng = random.Random(3)
+    trips = [random_trip(rng) for _ in range(120)]
+    path = tmp_path / "trips.json"
+    path.write_text(json.dumps(trips, indent=2))
+    return str(path), trips
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_json_array_streams_across_chunk_boundaries(setup_rag, tmp_path, chunk_size):
+    records = [{"id": i, "text": "a, ] [ {tricky}" * i, "nested": {"list": [1, 2, {"x": "}"}]}} for i in range(25)]
+    path = tmp_path / "array.json"
+    path.write_text(" \n[\n" + ",\n   ".join(json.dumps(record, indent=1) for record in records) + "\n]\n")
+    assert list(setup_rag.iter_json_array(str(path), chunk_size=chunk_size)) == records
+
+    path.write_text("[ ]")
+    assert list(setup_rag.iter_json_array(str(path), chunk_size=chunk_size)) == []
+    path.write_text('{"not": "an array"}')
+    with pytest.raises(ValueError, match="JSON array"):
+        list(setup_rag.iter_json_array(str(path), chunk_size=chunk_size))
+
+
+def test_records_come_from_json_lines_too(setup_rag, tmp_path):
+    path = tmp_path / "trips.jsonl"
+    path.write_text('{"trip_id": "a"}\n\n{"trip_id": "b"}\n')
+    assert [record["trip_id"] for record in setup_rag.iter_records(str(path))] == ["a", "b"]
+
+
+def test_checkpoint_is_tied_to_the_source_file(setup_rag, tmp_path, trips_file):
+    source, _ = trips_file
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = setup_rag.IngestCheckpoint(path, source)
+    assert checkpoint.records_done() == 0
+
+    checkpoint.version = 3
+    checkpoint.save(40)
+    resumed = setup_rag.IngestCheckpoint(path, source)
+    assert (resumed.records_done(), resumed.version) == (40, 3)
+
+    os.utime(source, (0, 0))  # the source changed: start over
+    assert setup_rag.IngestCheckpoint(path, source).records_done() == 0
+
+    with open(path, "w") as f:
+        f.write('{"fingerprint": ')  # torn write of an older version
+    assert setup_rag.IngestCheckpoint(path, source).records_done() == 0
+    checkpoint.clear()
+    assert not os.path.exists(path)
+
+
+def test_populate_stores_indexes_and_checkpoints_every_trip(setup_rag, tmp_path, trips_file):
+    source, trips = trips_file
+    checkpoint = setup_rag.IngestCheckpoint(str(tmp_path / "checkpoint.json"), source)
+    prototypes, recent = setup_rag.populate_global_rag(source, checkpoint, batch_size=16)
+
+    ids = sorted(trip["trip_id"] for trip in trips)
+    assert list(setup_rag.trip_store.iter_trip_ids()) == ids
+    assert sorted(setup_rag.partition_hashes(setup_rag.global_shards)) == ids
+    assert checkpoint.records_done() == len(trips)
+    assert prototypes.trip_count == len(trips)
+    for user_id, count in Counter(trip["user_id"] for trip in trips).items():
+        assert len(recent.latest(user_id)) == min(count, recent.limit)
+
+
+def test_a_resumed_run_only_indexes_the_rest(setup_rag, tmp_path, trips_file):
+    source, trips = trips_file
+    checkpoint = setup_rag.IngestCheckpoint(str(tmp_path / "checkpoint.json"), source)
+    prototypes, _ = setup_rag.populate_global_rag(source, checkpoint, resume_from=100, batch_size=16)
+
+    assert sorted(setup_rag.partition_hashes(setup_rag.global_shards)) == \
+        sorted(trip["trip_id"] for trip in trips[100:])
+    assert prototypes.trip_count == len(trips)  # skipped trips still feed the aggregators
+
+
+def test_a_failed_write_stops_the_run(setup_rag, tmp_path, trips_file, monkeypatch):
+    source, _ = trips_file
+    checkpoint = setup_rag.IngestCheckpoint(str(tmp_path / "checkpoint.json"), source)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(setup_rag.trip_store, "upsert_trips", fail)
+    with pytest.raises(RuntimeError, match="disk full"):
+        setup_rag.populate_global_rag(source, checkpoint, batch_size=16)
+    assert checkpoint.records_done() == 0  # nothing was marked done
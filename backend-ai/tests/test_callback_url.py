@@ -0,0 +1,78 @@
+"""
+Callback URLs: only http(s) to public (or explicitly allowed) hosts; bad URLs are a 422
+"""
+
+import socket
+import pytest
+from pydantic import ValidationError
+from app.core.config import settings
+from app.models.schemas import AnalysisJobRequest
+from app.utils.callback_url import validate_callback_url
+
+
+@pytest.fixture
+def dns(monkeypatch):
+    """Resolve hostnames from a table instead of the network"""
+    table = {}
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host not in table:
+            raise socket.gaierror(f"unknown host {host}")
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port)) for address in table[host]]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    return table
+
+
+@pytest.mark.parametrize("url", [
+    "https://8.8.8.8/hook",
+    "http://[2001:4860:4860::8888]:8080/hook",
+])
+def test_public_addresses_are_accepted(url):
+    assert validate_callback_url(url) == url
+
+
+@pytest.mark.parametrize("url, reason", [
+    ("ftp://8.8.8.8/hook", "http"),
+    ("file:///etc/passwd", "http"),
+    ("gopher://8.8.8.8:70/", "http"),
+    ("/relative/hook", "http"),
+    ("http://127.0.0.1:8000/api/stats/global", "non-public"),
+    ("http://[::1]/", "non-public"),
+    ("http://[::ffff:10.0.0.1]/", "non-public"),
+    ("http://169.254.169.254/latest/meta-data/", "non-public"),   # cloud metadata
+    ("http://10.1.2.3/", "non-public"),
+    ("http://192.168.0.10/", "non-public"),
+    ("http://100.64.0.1/", "non-public"),                         # carrier-grade NAT
+    ("http://0.0.0.0/", "non-public"),
+    ("http://8.8.8.8:99999/", "port"),
+])
+def test_internal_and_non_http_targets_are_rejected(url, reason):
+    with pytest.raises(ValueError, match=reason):
+        validate_callback_url(url)
+
+
+def test_hostnames_are_checked_by_every_address(dns):
+    dns["hooks.example.com"] = ["93.184.216.34"]
+    dns["sneaky.example.com"] = ["93.184.216.34", "10.0.0.5"]
+    assert validate_callback_url("https://hooks.example.com/done")
+    with pytest.raises(ValueError, match="10.0.0.5"):
+        validate_callback_url("https://sneaky.example.com/done")
+    with pytest.raises(ValueError, match="does not resolve"):
+        validate_callback_url("https://nowhere.example.com/done")
+
+
+def test_allowed_hosts_replace_the_address_check(dns, monkeypatch):
+    monkeypatch.setattr(settings, "COACHING_CALLBACK_ALLOWED_HOSTS", ["Relay.internal"])
+    assert validate_callback_url("http://relay.internal:9000/coaching")  # trusted, not resolved
+    with pytest.raises(ValueError, match="not in COACHING_CALLBACK_ALLOWED_HOSTS"):
+        validate_callback_url("https://8.8.8.8/hook")
+    with pytest.raises(ValueError, match="http"):
+        validate_callback_url("ftp://relay.internal/coaching")
+
+
+def test_schema_rejects_bad_callbacks():
+    assert AnalysisJobRequest().callback_url is None
+    assert AnalysisJobRequest(callback_url="https://8.8.8.8/hook").callback_url == "https://8.8.8.8/hook"
+    with pytest.raises(ValidationError):
+        AnalysisJobRequest(callback_url="http://169.254.169.254/")
@@ -0,0 +1,158 @@
+"""
+Coaching job queue: one pending job per user, on-demand work first, follow-ups for
+profiles that change mid-report, callbacks only to allowed hosts
+"""
+
+import threading
+import time
+import types
+import pytest
+from app.core.config import settings
+
+
+class FakeLLM:
+    """analyze_performance stand-in: records the order users ran in, can hold the worker"""
+
+    def __init__(self):
+        self.order = []
+        self.hold = threading.Event()
+        self.hold.set()
+        self.started = threading.Event()
+        self.fail = set()
+
+    def analyze_performance(self, user_id: str):
+        self.order.append(user_id)
+        self.started.set()
+        assert self.hold.wait(5)
+        if user_id in self.fail:
+            raise RuntimeError("model unavailable")
+        return {"user_id": user_id, "insights": [f"report {len(self.order)}"]}
+
+
+@pytest.fixture
+def coaching(load_service, store, monkeypatch):
+    monkeypatch.setattr(settings, "COACHING_SWEEP_SECONDS", 0.0)
+    llm = FakeLLM()
+    listeners = []
+    rag = types.SimpleNamespace(trips=store, profiles=types.SimpleNamespace(add_listener=listeners.append))
+    module = load_service("coaching_service",
+                          llm_service=types.SimpleNamespace(llm_service=llm),
+                          rag_service=types.SimpleNamespace(rag_service=rag))
+    yield module, module.coaching_service, llm, listeners
+    llm.hold.set()
+    module.coaching_service.close()
+
+
+def wait_for(service, job_id: str, status: str = "done") -> dict:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = service.job(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {service.job(job_id)['status']}, not {status}")
+
+
+def block_worker(service, llm) -> str:
+    """Keep the worker busy on a throwaway user while jobs are queued behind it"""
+    llm.hold.clear()
+    llm.started.clear()
+    job_id = service.submit("blocker")["job_id"]
+    assert llm.started.wait(5)
+    return job_id
+
+
+def test_a_finished_job_carries_the_stored_report(coaching):
+    _, service, _, _ = coaching
+    job = service.submit("user_001")
+    assert job["status"] == "queued" and "callbacks" not in job
+
+    done = wait_for(service, job["job_id"])
+    assert done["report"]["insights"] == ["report 1"]
+    report = service.report("user_001")
+    assert not report["stale"] and report["refresh_job_id"] is None
+    assert service.job("no-such-job") is None
+
+
+def test_requests_for_a_queued_user_join_its_job(coaching):
+    _, service, llm, _ = coaching
+    blocker = block_worker(service, llm)
+    first = service.submit("user_001", callback_url="https://8.8.8.8/a")
+    second = service.submit("user_001", callback_url="https://8.8.8.8/b")
+    assert first["job_id"] == second["job_id"]
+
+    llm.hold.set()
+    wait_for(service, blocker)
+    wait_for(service, first["job_id"])
+    assert llm.order == ["blocker", "user_001"]
+
+
+def test_on_demand_jobs_overtake_background_ones(coaching):
+    module, service, llm, _ = coaching
+    blocker = block_worker(service, llm)
+    jobs = [service.submit("swept", module.PRIORITY_SWEEP),
+            service.submit("changed", module.PRIORITY_PROFILE),
+            service.submit("raised", module.PRIORITY_SWEEP),
+            service.submit("waiting", module.PRIORITY_ON_DEMAND)]
+    assert service.submit("raised", module.PRIORITY_ON_DEMAND)["job_id"] == jobs[2]["job_id"]
+
+    llm.hold.set()
+    for job in (blocker, *(job["job_id"] for job in jobs)):
+        wait_for(service, job)
+    assert llm.order == ["blocker", "waiting", "raised", "changed", "swept"]  # FIFO within a priority
+
+
+def test_a_profile_change_mid_report_queues_a_follow_up(coaching):
+    _, service, llm, listeners = coaching
+    running = block_worker(service, llm)
+    listeners[0](["blocker"])  # the profile changed while its report was being generated
+    follow_up = service.submit("blocker")  # joins the follow-up
+    assert follow_up["job_id"] != running
+
+    llm.hold.set()
+    wait_for(service, running)
+    wait_for(service, follow_up["job_id"])
+    assert llm.order == ["blocker", "blocker"]
+
+
+def test_failures_are_reported_on_the_job(coaching):
+    _, service, llm, _ = coaching
+    llm.fail.add("user_001")
+    job = wait_for(service, service.submit("user_001")["job_id"], status="failed")
+    assert job["error"] == "model unavailable" and "report" not in job
+    assert service.report("user_001") is None
+
+
+def test_a_stale_report_is_served_while_it_refreshes(coaching, store):
+    _, service, llm, _ = coaching
+    store.save_report("user_001", {"insights": ["old"]},
+                      generated_at=time.time() - settings.COACHING_MAX_AGE_HOURS * 3600 - 60)
+    llm.hold.clear()
+    report = service.report("user_001")
+    assert report["stale"] and report["insights"] == ["old"]
+    assert service.report("user_001")["refresh_job_id"] == report["refresh_job_id"]  # not queued twice
+
+    llm.hold.set()
+    wait_for(service, report["refresh_job_id"])
+    assert not service.report("user_001")["stale"]
+
+
+def test_callbacks_are_posted_to_allowed_hosts_only(coaching, monkeypatch):
+    module, service, llm, _ = coaching
+    posted = []
+    monkeypatch.setattr(module.httpx, "post", lambda url, **kwargs: posted.append((url, kwargs)))
+    blocker = block_worker(service, llm)
+    job = service.submit("user_001", callback_url="https://8.8.8.8/hook")
+    service.submit("user_001", callback_url="http://127.0.0.1:8000/api/stats/global")
+
+    llm.hold.set()
+    wait_for(service, blocker)
+    wait_for(service, job["job_id"])
+    deadline = time.monotonic() + 5
+    while not posted and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert [url for url, _ in posted] == ["https://8.8.8.8/hook"]
+    _, kwargs = posted[0]
+    assert kwargs["follow_redirects"] is False
+    assert kwargs["json"]["status"] == "done" and kwargs["json"]["user_id"] == "user_001"
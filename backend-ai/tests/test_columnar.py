@@ -0,0 +1,87 @@
+"""
+Columnar dataset: appends round-trip exactly, uncommitted rows stay invisible, shards merge
+"""
+
+import json
+import os
+import random
+import pytest
+from app.utils.columnar import MANIFEST, ColumnarDataset
+
+
+def stops(rng, count):
+    return [{"location": f"Station at {rng.randint(150, 300)}km", "network": rng.choice(("Tata Power", "Fortum")),
+             "power_kw": rng.choice((50, 60.5)), "duration_mins": 30, "cost": 450, "charge_added": 40}
+            for _ in range(count)]
+
+
+@pytest.fixture
+def trips(random_trip):
+    rng = random.Random(1)
+    records = []
+    for _ in range(50):
+        charging = stops(rng, rng.randint(0, 3))
+        trip = random_trip(rng, charging_stops=charging, num_charging_stops=len(charging),
+                           distance_km=rng.choice((580, 580.0, 123.4)), start_time="08:00",
+                           avg_acceleration=2.2, electricity_cost=310.5)
+        records.append(trip)
+    records[3]["start_location"] = "Bengaluru – Électrique"  # non-ASCII text survives
+    del records[4]["avg_acceleration"]                          # missing fields stay missing
+    return records
+
+
+def test_appended_trips_read_back_exactly(tmp_path, trips):
+    dataset = ColumnarDataset.create(str(tmp_path / "ds"))
+    dataset.append_trips(trips[:20])
+    dataset.append_trips(trips[20:])
+
+    for chunk_rows in (7, 65536):  # chunks split between a trip's charging stops
+        decoded = list(ColumnarDataset(str(tmp_path / "ds")).iter_records("trips", chunk_rows=chunk_rows))
+        assert decoded == trips
+    assert type(decoded[0]["distance_km"]) is type(trips[0]["distance_km"])  # 580 stays 580, 580.0 stays 580.0
+
+    only = list(dataset.iter_records("trips", columns=["trip_id", "weather"]))
+    assert only[0] == {"trip_id": trips[0]["trip_id"], "weather": trips[0]["weather"]}
+    assert dataset.rows("charging_stops") == sum(len(trip["charging_stops"]) for trip in trips)
+
+
+def test_uncommitted_rows_are_invisible_and_truncated(tmp_path, trips):
+    path = str(tmp_path / "ds")
+    writer = ColumnarDataset.create(path)
+    writer.append_trips(trips[:10])
+    reader = ColumnarDataset(path)
+
+    writer.append_records("trips", trips[10:20], commit=False)  # crash before the manifest is replaced
+    assert not reader.refresh()
+    assert reader.rows("trips") == ColumnarDataset(path).rows("trips") == 10
+
+    ColumnarDataset(path).append_trips(trips[20:30])  # the next writer drops the torn rows
+    assert reader.refresh()
+    assert list(reader.iter_records("trips")) == trips[:10] + trips[20:30]
+
+
+def test_extend_remaps_dictionary_codes(tmp_path, trips):
+    first, second = ColumnarDataset.create(str(tmp_path / "a")), ColumnarDataset.create(str(tmp_path / "b"))
+    first.append_trips([trip for trip in trips if trip["weather"] == "hot"])
+    second.append_trips([trip for trip in trips if trip["weather"] != "hot"])
+    first.extend(second)
+    decoded = list(first.iter_records("trips"))
+    assert decoded == [trip for trip in trips if trip["weather"] == "hot"] + \
+        [trip for trip in trips if trip["weather"] != "hot"]
+
+
+def test_existing_and_foreign_datasets(tmp_path):
+    path = str(tmp_path / "ds")
+    ColumnarDataset.create(path)
+    with pytest.raises(FileExistsError):
+        ColumnarDataset.create(path)
+    assert ColumnarDataset.create(path, overwrite=True).rows("trips") == 0
+    assert ColumnarDataset.open(str(tmp_path / "missing")) is None
+
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    manifest["format"] = 99
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError, match="Unsupported columnar format"):
+        ColumnarDataset(path)
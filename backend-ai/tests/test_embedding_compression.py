@@ -0,0 +1,51 @@
+"""
+Embedding compression: dimension reduction that keeps neighbours, saved and reloaded unchanged
+"""
+
+import numpy as np
+import pytest
+from app.utils.embedding_compression import EmbeddingCompressor, recall_at_k
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    # 384-dim vectors that really live in 32 dimensions (plus a little noise), like sentence embeddings
+    rng = np.random.default_rng(0)
+    basis = rng.normal(size=(32, 384))
+    return (rng.normal(size=(1000, 32)) @ basis + 0.05 * rng.normal(size=(1000, 384))).astype(np.float32)
+
+
+def test_pca_keeps_neighbours_in_fewer_dimensions(vectors):
+    compressor = EmbeddingCompressor.fit(vectors[:800], "pca", 64)
+    reduced = compressor.transform(vectors[800:])
+    assert reduced.shape == (200, 64) and reduced.dtype == np.float32
+    assert np.allclose(np.linalg.norm(reduced, axis=1), 1.0, atol=1e-5)
+    assert recall_at_k(vectors[800:], reduced, k=10) >= 0.9
+    assert compressor.bytes_per_vector(384) == 64 * 4
+
+
+def test_truncation_keeps_a_prefix(vectors):
+    compressor = EmbeddingCompressor.fit(vectors, "truncate", 16)
+    reduced = compressor.transform(vectors[:3])
+    expected = vectors[:3, :16] / np.linalg.norm(vectors[:3, :16], axis=1, keepdims=True)
+    assert np.allclose(reduced, expected, atol=1e-6)
+
+
+def test_disabled_compressor_is_the_identity(vectors):
+    compressor = EmbeddingCompressor()
+    assert not compressor.enabled
+    assert np.array_equal(compressor.transform(vectors[:5]), vectors[:5])
+    assert compressor.bytes_per_vector(384) == 384 * 4
+
+
+def test_save_and_load_round_trip(vectors, tmp_path):
+    compressor = EmbeddingCompressor.fit(vectors, "pca", 48)
+    compressor.save(str(tmp_path / "projection.npz"))
+    loaded = EmbeddingCompressor.load(str(tmp_path / "projection.npz"))
+    assert (loaded.method, loaded.dim) == ("pca", 48)
+    assert np.allclose(loaded.transform(vectors[:10]), compressor.transform(vectors[:10]))
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError, match="Unknown compression method"):
+        EmbeddingCompressor("zstd")
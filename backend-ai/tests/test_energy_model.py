@@ -0,0 +1,144 @@
+"""
+Energy model: recovers the multiplicative effects trips are drawn from; online updates equal a refit
+"""
+
+import math
+import os
+import random
+import pytest
+from app.core.config import settings
+from app.services.energy_model import EnergyModel
+
+BASE = 15.0
+EFFECTS = {
+    "driving_style": {"eco": 0.90, "normal": 1.0, "aggressive": 1.25},
+    "weather": {"pleasant": 1.0, "hot": 1.10, "cold": 1.20},
+    "traffic": {"light": 0.95, "moderate": 1.0, "heavy": 1.15},
+    "ev_model": {"Tata Nexon EV": 1.0, "MG ZS EV": 1.08},
+}
+ELEVATION = 0.3  # exponent of (1 + |elevation| / 1000)
+USERS = {
+    "user_001": {"ev_model": "Tata Nexon EV", "battery_health": 100},
+    "user_002": {"ev_model": "MG ZS EV", "battery_health": 95},
+    "user_003": {"ev_model": "MG ZS EV", "battery_health": 100},
+}
+
+
+class FakeStore:
+    """The two trip store reads the energy model makes"""
+
+    def __init__(self, trips):
+        self.trips = trips
+
+    def user(self, user_id):
+        return USERS.get(user_id)
+
+    def iter_energy_rows(self):
+        for trip in self.trips:
+            user = USERS[trip["user_id"]]
+            yield (trip["driving_style"], trip["weather"], trip["traffic"], trip["elevation_change_m"],
+                   trip["efficiency_kwh_per_100km"], user["ev_model"], user["battery_health"])
+
+
+def true_efficiency(driving_style, weather, traffic, elevation_change_m, ev_model, battery_health=100):
+    return (BASE * EFFECTS["driving_style"][driving_style] * EFFECTS["weather"][weather]
+            * EFFECTS["traffic"][traffic] * EFFECTS["ev_model"][ev_model]
+            * (1 + abs(elevation_change_m) / 1000) ** ELEVATION * (battery_health / 100))
+
+
+def synthetic_trips(count, seed=0, noise=0.03):
+    rng = random.Random(seed)
+    trips = []
+    for _ in range(count):
+        user_id = rng.choice(list(USERS))
+        trip = {
+            "user_id": user_id,
+            "driving_style": rng.choice(list(EFFECTS["driving_style"])),
+            "weather": rng.choice(list(EFFECTS["weather"])),
+            "traffic": rng.choice(list(EFFECTS["traffic"])),
+            "elevation_change_m": rng.uniform(-1500, 1500),
+        }
+        efficiency = true_efficiency(trip["driving_style"], trip["weather"], trip["traffic"],
+                                     trip["elevation_change_m"], **USERS[user_id])
+        trip["efficiency_kwh_per_100km"] = efficiency * math.exp(rng.gauss(0, noise))
+        trips.append(trip)
+    return trips
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    return str(tmp_path / "energy_model.json")
+
+
+def test_unfitted_model_is_neutral(model_path):
+    model = EnergyModel(FakeStore([]), path=model_path)
+    assert model.rebuild() == 0
+    assert model.predict(100.0) is None
+    assert model.spread() is None
+    assert model.relative(weather="cold", traffic="heavy") == 1.0
+
+
+def test_rebuild_recovers_the_generating_effects(model_path):
+    model = EnergyModel(FakeStore(synthetic_trips(3000)), path=model_path)
+    assert model.rebuild() == 3000
+
+    for style in EFFECTS["driving_style"]:
+        for ev_model in EFFECTS["ev_model"]:
+            expected = true_efficiency(style, "cold", "heavy", 800, ev_model)
+            prediction = model.predict(100.0, style, "cold", "heavy", 800, ev_model, 100)
+            assert prediction["efficiency_kwh_per_100km"] == pytest.approx(expected, rel=0.02)
+            assert prediction["energy_low_kwh"] < prediction["energy_needed_kwh"] < prediction["energy_high_kwh"]
+
+    # Condition multipliers relative to each other (the average conditions cancel out)
+    assert model.relative(weather="cold") / model.relative(weather="pleasant") == pytest.approx(1.20, rel=0.02)
+    assert model.relative(traffic="heavy") / model.relative(traffic="light") == pytest.approx(1.15 / 0.95, rel=0.02)
+    assert model.relative(weather="snow") == pytest.approx(1.0)  # unseen value: average conditions
+    assert model.spread() == pytest.approx(1.96 * 0.03, rel=0.1)
+
+
+def test_intercept_is_not_shrunk_on_a_small_sample(model_path):
+    trips = [{"user_id": "unknown", "driving_style": None, "weather": None, "traffic": None,
+              "elevation_change_m": None, "efficiency_kwh_per_100km": 15.0} for _ in range(3)]
+    model = EnergyModel(FakeStore([]), path=model_path)
+    model.record_trips(trips)
+    model.flush()
+    assert model.predict(100.0)["efficiency_kwh_per_100km"] == 15.0
+
+
+def test_online_updates_match_a_rebuild(model_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ENERGY_MODEL_REFIT_TRIPS", 10 ** 6)
+    monkeypatch.setattr(settings, "ENERGY_MODEL_REFIT_SECONDS", 10 ** 6)
+    trips = synthetic_trips(1200, seed=1)
+    online = EnergyModel(FakeStore([]), path=model_path)
+    for i in range(0, len(trips), 100):
+        online.record_trips(trips[i:i + 100])
+    online.flush()
+
+    batch = EnergyModel(FakeStore(trips), path=str(tmp_path / "batch.json"))
+    batch.rebuild()
+    reloaded = EnergyModel(FakeStore([]), path=model_path)
+
+    assert online.n == batch.n == reloaded.n == len(trips)
+    for model in (online, reloaded):
+        for style in EFFECTS["driving_style"]:
+            assert (model.predict(250.0, style, "hot", "moderate", 300, "MG ZS EV", 95)
+                    == batch.predict(250.0, style, "hot", "moderate", 300, "MG ZS EV", 95))
+
+
+def test_refits_are_batched_until_enough_trips_or_shutdown(model_path, monkeypatch):
+    monkeypatch.setattr(settings, "ENERGY_MODEL_REFIT_TRIPS", 100)
+    monkeypatch.setattr(settings, "ENERGY_MODEL_REFIT_SECONDS", 10 ** 6)
+    trips = synthetic_trips(200, seed=2)
+    model = EnergyModel(FakeStore([]), path=model_path)
+
+    model.record_trips(trips[:60])
+    assert model.predict(100.0) is None and not os.path.exists(model_path)
+
+    model.record_trips(trips[60:120])  # 120 pending: solved and saved
+    assert model.predict(100.0) is not None
+    assert EnergyModel(FakeStore([]), path=model_path).n == 120
+
+    model.record_trips(trips[120:])  # 80 pending, below the threshold
+    assert EnergyModel(FakeStore([]), path=model_path).n == 120
+    model.flush()
+    assert EnergyModel(FakeStore([]), path=model_path).n == 200
@@ -0,0 +1,57 @@
+"""
+Export cursors: opaque, URL-safe, bound to their export and validated before a response starts
+"""
+
+import base64
+import json
+import types
+import pytest
+
+
+@pytest.fixture
+def export(load_service):
+    return load_service("export_service", rag_service=types.SimpleNamespace(rag_service=None))
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("key", [("2026-01-05T08:00:00", 17), ("Goa", "Pune", "2026-01", "hot", "heavy"), (42,)])
+def test_round_trip(export, key):
+    cursor = export.encode_cursor("trips", key)
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+    assert export.decode_cursor("trips", cursor) == list(key)
+
+
+def test_a_cursor_only_resumes_its_own_export(export):
+    cursor = export.encode_cursor("trips", ("2026-01-05", 17))
+    with pytest.raises(export.ExportError, match="another export"):
+        export.decode_cursor("profiles", cursor)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    raw_cursor([1, 2]),
+    raw_cursor({"export": "trips"}),
+    raw_cursor({"export": "trips", "after": 5}),
+    raw_cursor({"export": "trips", "after": [["nested"], 1]}),
+    raw_cursor({"export": "trips", "after": [None, 1]}),
+])
+def test_malformed_cursors_are_rejected(export, cursor):
+    with pytest.raises(export.ExportError, match="Invalid cursor"):
+        export.decode_cursor("trips", cursor)
+
+
+def test_requests_are_validated_before_streaming(export):
+    with pytest.raises(export.ExportError, match="Unknown export"):
+        export.export_ndjson("vehicles")
+    with pytest.raises(export.ExportError, match="Unknown field"):
+        export.export_ndjson("trips", fields=["trip_id", "password"])
+    with pytest.raises(export.ExportError, match="cannot be filtered"):
+        export.export_ndjson("profiles", start_location="Goa")
+    # A (date, rowid) key of a user export cannot resume the (rowid) key of an unfiltered one
+    cursor = export.encode_cursor("trips", ("2026-01-05", 17))
+    with pytest.raises(export.ExportError, match="does not match"):
+        export.export_ndjson("trips", cursor=cursor)
+    export.export_ndjson("trips", cursor=cursor, user_id="user_001")
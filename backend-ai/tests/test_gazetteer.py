@@ -0,0 +1,72 @@
+"""
+Gazetteer: aliases, single typos and from/to route extraction
+"""
+
+import pytest
+from app.utils.gazetteer import LocationGazetteer, region_of
+
+CITIES = ["Mumbai", "Pune", "Bangalore", "Mysore", "Delhi", "Goa", "Navi Mumbai", "Nashik"]
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return LocationGazetteer(CITIES)
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("mumbai", "Mumbai"),
+    ("  NAVI   mumbai ", "Navi Mumbai"),
+    ("Bombay", "Mumbai"),          # alias
+    ("Bengaluru", "Bangalore"),
+    ("New Delhi", "Delhi"),        # multi-word alias
+    ("Poona", "Pune"),
+    ("Bangalor", "Bangalore"),     # deletion
+    ("Mumbaai", "Mumbai"),         # insertion
+    ("Mysuru", "Mysore"),
+    ("Mysors", "Mysore"),          # substitution
+    ("Nahsik", "Nashik"),          # transposition
+    ("Pnue", None),                # too short to guess
+    ("Bnglore", None),             # two edits
+    ("Chennai", None),
+])
+def test_canonical(gazetteer, name, expected):
+    assert gazetteer.canonical(name) == expected
+
+
+def test_aliases_need_their_city():
+    gazetteer = LocationGazetteer(["Pune"])
+    assert gazetteer.canonical("bombay") is None
+    assert gazetteer.locations == ["Pune"] and len(gazetteer) == 1
+    assert LocationGazetteer(["Pune"], aliases={"punekar": "Pune"}).canonical("punekar") == "Pune"
+
+
+def test_ambiguous_typos_are_dropped():
+    gazetteer = LocationGazetteer(["Karur", "Karud"])
+    assert gazetteer.canonical("Karux") is None
+    assert gazetteer.canonical("Karud") == "Karud"
+
+
+@pytest.mark.parametrize("text, route", [
+    ("How much charge from Mumbai to Pune?", ("Mumbai", "Pune")),
+    ("to Pune from Mumbai in the rain", ("Mumbai", "Pune")),
+    ("bombay to bengaluru tomorrow", ("Mumbai", "Bangalore")),
+    ("Planning Navi Mumbai to Goa", ("Navi Mumbai", "Goa")),   # longest match wins
+    ("leaving Bangalor, want to reach Mysuru", ("Bangalore", "Mysore")),
+    ("Delhi, then New Delhi", (None, None)),                    # same city twice
+    ("just Pune", (None, None)),
+    ("tune up the car in Chennai", (None, None)),
+])
+def test_extract_route(gazetteer, text, route):
+    assert gazetteer.extract_route(text) == route
+
+
+def test_extract_origin(gazetteer):
+    assert gazetteer.extract_origin("Mumbai to Goa via the coast") == "Mumbai"
+    assert gazetteer.extract_origin("any chargers when departing Nashik?") == "Nashik"
+    assert gazetteer.extract_origin("chargers in Pune") is None
+    assert gazetteer.find("from Goa to Pune") == [(1, "Goa"), (3, "Pune")]
+
+
+def test_regions():
+    assert region_of("Pune") == "west"
+    assert region_of("Atlantis") == region_of(None) == "other"
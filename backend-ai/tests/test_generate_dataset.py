@@ -0,0 +1,80 @@
+"""
+Vectorized dataset generator: deterministic per (seed, as_of), consistent records in every format
+"""
+
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+import pytest
+import generate_dataset as gen
+from app.services.trip_store import TRIP_FIELDS
+from app.utils.columnar import ColumnarDataset
+
+AS_OF = datetime(2025, 6, 30)
+RECORD_FIELDS = [field for field in TRIP_FIELDS if field != "charging_networks"]  # flattened from the stops
+
+
+def generate(tmp_path, name, **options):
+    options = {"num_users": 30, "seed": 7, "as_of": AS_OF, "shard_users": 10, "workers": 1,
+               "min_trips": 2, "max_trips": 9, **options}
+    return gen.generate_vectorized_dataset(out_dir=str(tmp_path / name), **options)
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_output_does_not_depend_on_the_worker_count(tmp_path):
+    one = generate(tmp_path, "one", workers=1)
+    two = generate(tmp_path, "two", workers=2)
+    for a, b in zip(one, two):
+        with open(a) as fa, open(b) as fb:
+            assert fa.read() == fb.read()
+
+
+def test_records_are_consistent(tmp_path):
+    users_path, trips_path = generate(tmp_path, "jsonl")
+    users, trips = read_lines(users_path), read_lines(trips_path)
+    assert [user["user_id"] for user in users] == [f"user_{i:03d}" for i in range(1, 31)]
+    assert len({trip["trip_id"] for trip in trips}) == len(trips)
+
+    per_user = Counter(trip["user_id"] for trip in trips)
+    routes = {(r["from"], r["to"]) for r in gen.ROUTES}
+    for user in users:
+        mine = [trip for trip in trips if trip["user_id"] == user["user_id"]]
+        assert 2 <= user["total_trips"] == per_user[user["user_id"]] <= 9
+        assert user["total_distance"] == sum(trip["distance_km"] for trip in mine)
+        assert {trip["driving_style"] for trip in mine} == {user["driving_style"]}
+    for trip in trips:
+        assert set(RECORD_FIELDS) <= set(trip)
+        assert trip["num_charging_stops"] == len(trip["charging_stops"])
+        assert AS_OF - timedelta(days=180) <= datetime.fromisoformat(trip["date"]) <= AS_OF
+        assert (trip["start_location"], trip["end_location"]) in routes | {(b, a) for a, b in routes}
+        assert trip["efficiency_kwh_per_100km"] == pytest.approx(
+            trip["energy_used_kwh"] / trip["distance_km"] * 100, abs=0.01)
+
+
+def test_hot_route_share(tmp_path):
+    _, trips_path = generate(tmp_path, "hot", num_users=60, hot_route="Mumbai-Pune", hot_share=0.5)
+    trips = read_lines(trips_path)
+    hot = sum({trip["start_location"], trip["end_location"]} == {"Mumbai", "Pune"} for trip in trips)
+    assert 0.45 < hot / len(trips) < 0.65
+    with pytest.raises(ValueError, match="Unknown route"):
+        gen.route_index("Mumbai-Paris")
+
+
+def test_every_format_holds_the_same_dataset(tmp_path):
+    _, jsonl = generate(tmp_path, "jsonl")
+    _, array = generate(tmp_path, "json", fmt="json")
+    columnar, _ = generate(tmp_path, "columnar", fmt="columnar")
+    expected = read_lines(jsonl)
+    with open(array) as f:
+        assert json.load(f) == expected
+    decoded = list(ColumnarDataset(columnar).iter_records("trips"))
+    assert len(decoded) == len(expected)
+    for got, want in zip(decoded, expected):
+        assert {field: got[field] for field in RECORD_FIELDS} == \
+            pytest.approx({field: want[field] for field in RECORD_FIELDS})
+        assert [stop["network"] for stop in got["charging_stops"]] == \
+            [stop["network"] for stop in want["charging_stops"]]
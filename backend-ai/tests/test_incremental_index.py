@@ -0,0 +1,76 @@
+"""
+Incremental re-indexing: only documents whose content hash changed are embedded again
+"""
+
+import json
+import random
+import pytest
+from conftest import FakeEmbedder
+from app.core.config import settings
+from app.utils.trip_documents import content_hash, create_trip_text, flatten_metadata
+
+
+def test_content_hash_covers_text_metadata_and_model(make_trip, monkeypatch):
+    trip = make_trip()
+    text, metadata = create_trip_text(trip), flatten_metadata(trip)
+    digest = content_hash(text, metadata)
+    assert content_hash(text, dict(reversed(list(metadata.items())))) == digest  # key order is irrelevant
+    assert content_hash(text + " ", metadata) != digest
+    assert content_hash(text, {**metadata, "weather": "cold"}) != digest
+    monkeypatch.setattr(settings, "EMBEDDING_MODEL", "all-mpnet-base-v2")
+    assert content_hash(text, metadata) != digest
+
+
+def test_sync_documents_embeds_only_changes(setup_rag):
+    collection = setup_rag.personal_collection
+    ids = [f"user_{i}" for i in range(5)]
+    texts = [f"profile {i}" for i in range(5)]
+    metadatas = [{"user_id": doc_id} for doc_id in ids]
+    assert setup_rag.sync_documents(collection, ids, texts, metadatas) == (5, 0, 0)
+
+    calls = FakeEmbedder.calls
+    assert setup_rag.sync_documents(collection, ids, texts, metadatas) == (0, 5, 0)
+    assert FakeEmbedder.calls == calls
+
+    texts[1] = "profile 1, now an eco driver"
+    assert setup_rag.sync_documents(collection, ids[:4], texts[:4], metadatas[:4]) == (1, 3, 1)
+    assert sorted(collection.get()["ids"]) == ids[:4]
+
+
+@pytest.fixture
+def reindex(setup_rag, tmp_path):
+    """Write trips to a source file and run the global pass against the current index"""
+    def run(trips, prune=False):
+        path = tmp_path / "trips.json"
+        path.write_text(json.dumps(trips))
+        checkpoint = setup_rag.IngestCheckpoint(str(tmp_path / "checkpoint.json"), str(path))
+        calls = FakeEmbedder.calls
+        setup_rag.populate_global_rag(str(path), checkpoint, batch_size=16,
+                                      existing_hashes=setup_rag.partition_hashes(setup_rag.global_shards),
+                                      prune=prune)
+        return FakeEmbedder.calls - calls
+
+    return run
+
+
+def test_rerun_reembeds_only_changed_trips(setup_rag, reindex, random_trip):
+    setup_rag.bind_collections(setup_rag.registry.next_version())  # region partitions
+    rng = random.Random(9)
+    trips = [random_trip(rng, start_location=rng.choice(("Mumbai", "Bangalore"))) for _ in range(40)]
+    assert reindex(trips) > 0
+    assert reindex(trips) == 0  # nothing changed: not a single encode() call
+
+    edited = [{**trips[0], "distance_km": 321.0},
+              {**trips[1], "start_location": "Bangalore" if trips[1]["start_location"] == "Mumbai" else "Mumbai"},
+              *trips[2:39]]  # the last trip is gone from the file
+    assert reindex(edited) == 1  # the two edited trips, in one batch
+    index = setup_rag.partition_hashes(setup_rag.global_shards)
+    assert len(index) == 40 == sum(shard.count() for shard in setup_rag.global_shards.values())
+    assert index[trips[1]["trip_id"]][0] == setup_rag.trip_partition(edited[1])  # moved, not duplicated
+    stored = dict(setup_rag.trip_store.iter_content_hashes())
+    assert {trip_id: content for trip_id, (_, content) in index.items()} == stored
+
+    # The trip missing from the file is kept (it may have come through the API) unless pruned
+    assert reindex(edited, prune=True) == 0
+    assert trips[39]["trip_id"] not in setup_rag.partition_hashes(setup_rag.global_shards)
+    assert trips[39]["trip_id"] not in dict(setup_rag.trip_store.iter_content_hashes())
@@ -0,0 +1,87 @@
+"""
+Index registry: publishing swaps the manifest; garbage collection keeps the newest published versions
+"""
+
+import os
+import pytest
+from app.core.config import settings
+from app.services.index_registry import COLLECTIONS, IndexRegistry, projection_file, versioned_name
+
+
+class FakeClient:
+    """The two Chroma client calls the registry makes"""
+
+    def __init__(self):
+        self.names = set()
+
+    def list_collections(self):
+        return sorted(self.names)
+
+    def delete_collection(self, name):
+        self.names.remove(name)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHROMA_DB_PATH", str(tmp_path))
+    return IndexRegistry(FakeClient(), path=str(tmp_path / "index_manifest.json"))
+
+
+def build(registry, version):
+    """A finished (not yet published) build: its collections and projection file"""
+    registry.client.names.update(versioned_name(name, version) for name in COLLECTIONS)
+    open(f"{settings.CHROMA_DB_PATH}/{projection_file(version)}", "w").close()
+
+
+def versions_left(registry):
+    return sorted({int(name.rsplit("__v", 1)[1]) for name in registry.client.names})
+
+
+def test_without_manifest_the_unversioned_collections_are_served(registry):
+    manifest = registry.read()
+    assert manifest["version"] == 0 and manifest["collections"]["global_trip_knowledge"] == "global_trip_knowledge"
+    assert registry.next_version() == 1
+
+
+def test_publish_points_every_name_at_the_version(registry):
+    build(registry, 1)
+    registry.publish(1, projection=projection_file(1), partitions=["north", "south"])
+    manifest = registry.read()
+    assert manifest["version"] == 1
+    assert manifest["collections"]["personal_driving_patterns"] == "personal_driving_patterns__v1"
+    assert "global_trip_knowledge" not in manifest["collections"]
+    assert registry.global_shards(manifest) == {"north": "global_trip_knowledge_north__v1",
+                                                "south": "global_trip_knowledge_south__v1"}
+    assert manifest["published"] == [0, 1]
+    assert registry.next_version() == 2
+
+
+def test_gc_keeps_the_newest_published_versions(registry):
+    for version in (1, 2, 3):
+        build(registry, version)
+        registry.publish(version)
+    assert registry.garbage_collect(keep=2) and versions_left(registry) == [2, 3]
+
+
+def test_gc_skips_version_gaps_left_by_abandoned_builds(registry):
+    for version in (3, 4):
+        build(registry, version)
+        registry.publish(version)
+    build(registry, 5)  # abandoned mid-build, never published
+    build(registry, 6)
+    registry.publish(6)
+
+    registry.garbage_collect(keep=2)
+    # v4 was served until v6 went live: it stays; the abandoned v5 goes
+    assert versions_left(registry) == [4, 6]
+    assert sorted(os.listdir(settings.CHROMA_DB_PATH)) == ["embedding_projection__v4.npz",
+                                                          "embedding_projection__v6.npz", "index_manifest.json"]
+
+
+def test_gc_leaves_builds_newer_than_current(registry):
+    for version in (1, 2):
+        build(registry, version)
+        registry.publish(version)
+    build(registry, 3)  # still being built
+    registry.garbage_collect(keep=1)
+    assert versions_left(registry) == [2, 3]
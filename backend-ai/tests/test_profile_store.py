@@ -0,0 +1,80 @@
+"""
+Live profiles: hydrated once from the trip store, then O(1) pushes and debounced re-embeds
+"""
+
+import types
+import pytest
+from app.core.config import settings
+from app.services.profile_store import ProfileStore, profile_id
+
+
+@pytest.fixture
+def profiles(store, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_REEMBED_DEBOUNCE_MS", 3_600_000)  # flushed by the tests only
+    upserts = []
+    users = {profile_id("user_001"): {"user_id": "user_001", "ev_model": "MG ZS EV", "avg_efficiency": 15}}
+
+    def upsert_personal(ids, documents, metadatas):
+        if rag.fail:
+            raise RuntimeError("chroma down")
+        upserts.append(dict(zip(ids, metadatas)))
+
+    def get(ids, include):
+        return {"metadatas": [users[doc_id] for doc_id in ids if doc_id in users]}
+
+    rag = types.SimpleNamespace(trips=store, personal_rag=types.SimpleNamespace(get=get),
+                                upsert_personal=upsert_personal, fail=False)
+    profile_store = ProfileStore(rag, limit=3)
+    profile_store.rag, profile_store.upserts = rag, upserts
+    yield profile_store
+    profile_store._stop.set()
+
+
+def test_first_trip_hydrates_the_window_from_the_store(profiles, store, make_trip):
+    history = [make_trip(date=f"2025-01-0{day}") for day in range(1, 5)]
+    store.upsert_trips(history)
+    assert not profiles.is_live("user_001") and profiles.document("user_001") is None
+
+    new = make_trip(date="2025-01-09", start_location="Goa")
+    store.upsert_trips([new])  # the ingest writer stores before it records
+    profiles.record_trips([new])
+
+    assert profiles.is_live("user_001")
+    profile = profiles.profile("user_001")
+    assert profile["num_trips_analyzed"] == 3
+    assert profile["recent_dates"] == "2025-01-09, 2025-01-04, 2025-01-03"
+    assert (profile["ev_model"], profile["avg_efficiency"]) == ("MG ZS EV", 15.0)  # from the user record
+    assert "Goa to Pune" in profiles.document("user_001")
+
+
+def test_updates_are_re_embedded_once_per_flush(profiles, store, make_trip):
+    for day in range(1, 4):
+        trip = make_trip(date=f"2025-02-0{day}", user_id="user_002")
+        store.upsert_trips([trip])
+        profiles.record_trips([trip])
+    profiles.flush()
+    profiles.flush()  # nothing new
+    [batch] = profiles.upserts
+    assert batch[profile_id("user_002")]["num_trips_analyzed"] == 3
+    assert batch[profile_id("user_002")]["ev_model"] == "unknown"  # no user record
+    assert "content_hash" in batch[profile_id("user_002")]
+
+
+def test_a_failed_re_embed_is_retried_and_listeners_hear_of_success(profiles, store, make_trip):
+    heard = []
+    profiles.add_listener(heard.append)
+    trip = make_trip()
+    store.upsert_trips([trip])
+    profiles.record_trips([trip])
+
+    profiles.rag.fail = True
+    profiles.flush()
+    assert profiles.upserts == [] and heard == []
+
+    profiles.rag.fail = False
+    profiles.flush()
+    assert list(profiles.upserts[0]) == [profile_id("user_001")]
+    assert heard == [["user_001"]]
+
+    profiles.reset()  # new index version: windows are hydrated again
+    assert not profiles.is_live("user_001")
@@ -0,0 +1,101 @@
+"""
+KLL sketch: rank error stays within the documented bound, merges and round-trips
+"""
+
+import random
+import pytest
+from app.utils.quantile_sketch import KLLSketch
+
+K = 200
+# Rank error is about 1.7 / k; allow some slack for the randomized compaction
+RANK_ERROR = 4 / K
+QUANTILES = [i / 100 for i in range(1, 100)]
+
+
+def _true_rank(ordered, value) -> float:
+    lo, hi = 0, len(ordered)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if ordered[mid] <= value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo / len(ordered)
+
+
+def _max_rank_error(sketch: KLLSketch, values) -> float:
+    ordered = sorted(values)
+    return max(abs(_true_rank(ordered, sketch.quantile(q)) - q) for q in QUANTILES)
+
+
+def _values(seed: int, count: int):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(2.8, 0.3) for _ in range(count)]
+
+
+def test_empty_sketch():
+    sketch = KLLSketch(K)
+    assert len(sketch) == 0
+    assert sketch.quantile(0.5) is None
+    assert sketch.rank(1.0) == 0.0
+
+
+def test_small_inputs_are_exact():
+    sketch = KLLSketch(K)
+    sketch.update_many(range(1, 101))
+    assert sketch.quantile(0.5) == 50
+    assert sketch.rank(25) == pytest.approx(0.25)
+    assert (sketch.quantile(0), sketch.quantile(1)) == (1, 100)
+
+
+def test_rank_error_within_bound_in_constant_memory():
+    values = _values(1, 100_000)
+    sketch = KLLSketch(K)
+    sketch.update_many(values)
+
+    assert len(sketch) == len(values)
+    assert (sketch.min, sketch.max) == (min(values), max(values))
+    assert sum(len(items) for items in sketch.levels) < 4 * K
+    assert _max_rank_error(sketch, values) <= RANK_ERROR
+
+    ordered = sorted(values)
+    for q in (0.1, 0.5, 0.9):
+        value = ordered[int(q * len(ordered))]
+        assert sketch.rank(value) == pytest.approx(q, abs=RANK_ERROR)
+
+
+def test_merge_matches_the_combined_stream():
+    parts = [_values(seed, 30_000) for seed in (2, 3, 4)]
+    merged = KLLSketch(K)
+    for part in parts:
+        sketch = KLLSketch(K)
+        sketch.update_many(part)
+        merged.merge(sketch)
+
+    combined = [value for part in parts for value in part]
+    assert len(merged) == len(combined)
+    assert (merged.min, merged.max) == (min(combined), max(combined))
+    assert sum(len(items) for items in merged.levels) < 4 * K
+    assert _max_rank_error(merged, combined) <= RANK_ERROR
+
+
+def test_merge_into_empty_sketch():
+    sketch = KLLSketch(K)
+    sketch.update_many(_values(5, 5000))
+    empty = KLLSketch(K)
+    empty.merge(sketch)
+    assert [empty.quantile(q) for q in QUANTILES] == [sketch.quantile(q) for q in QUANTILES]
+
+
+def test_json_round_trip_keeps_quantiles_and_accepts_updates():
+    values = _values(6, 20_000)
+    sketch = KLLSketch(K)
+    sketch.update_many(values)
+
+    restored = KLLSketch.from_json(sketch.to_json())
+    assert len(restored) == len(sketch)
+    assert [restored.quantile(q) for q in QUANTILES] == [sketch.quantile(q) for q in QUANTILES]
+
+    more = _values(7, 20_000)
+    restored.update_many(more)
+    assert _max_rank_error(restored, values + more) <= RANK_ERROR
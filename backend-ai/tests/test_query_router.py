@@ -0,0 +1,74 @@
+"""
+Query router: keyword rules, nearest-centroid fallback and per-intent retrieval plans
+"""
+
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.query_router import INTENT_EXEMPLARS, RETRIEVAL_PLANS, QueryRouter
+
+INTENTS = list(INTENT_EXEMPLARS)
+
+
+class AxisEmbedder:
+    """Exemplars of intent i embed onto axis i; anything else must be passed in"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        for i, examples in enumerate(INTENT_EXEMPLARS.values()):
+            if text in examples:
+                return np.eye(len(INTENTS))[i].tolist()
+        raise AssertionError(f"unexpected embed({text!r})")
+
+
+@pytest.fixture
+def embed():
+    return AxisEmbedder()
+
+
+@pytest.mark.parametrize("query, intent", [
+    ("Can I reach Goa?", "range_prediction"),
+    ("Plan a route with enough range", "range_prediction"),  # rules are checked in order
+    ("Navigate me to Pune", "route_planning"),
+    ("How is my efficiency lately", "performance_analysis"),
+    ("Compare me with the community", "comparison"),
+    ("Nearest charger please", "charging_info"),
+])
+def test_keyword_rules_need_no_embedding(embed, query, intent):
+    assert QueryRouter(embed).classify(query) == intent
+    assert embed.calls == []
+
+
+def test_fallback_picks_the_nearest_intent_centroid(embed):
+    router = QueryRouter(embed)
+    vector = np.full(len(INTENTS), 0.1)
+    vector[INTENTS.index("comparison")] = 1.0
+    assert router.classify("Am I worse than my neighbours?", query_embedding=vector.tolist()) == "comparison"
+    assert len(embed.calls) == sum(map(len, INTENT_EXEMPLARS.values()))  # exemplars only, not the query
+
+    # Centroids are embedded once, until reset()
+    router.classify("Anything else?", query_embedding=vector.tolist())
+    assert len(embed.calls) == sum(map(len, INTENT_EXEMPLARS.values()))
+    router.reset()
+    router.classify("Anything else?", query_embedding=vector.tolist())
+    assert len(embed.calls) == 2 * sum(map(len, INTENT_EXEMPLARS.values()))
+
+
+def test_weak_matches_fall_back_to_general(embed, monkeypatch):
+    monkeypatch.setattr(settings, "ROUTER_MIN_SIMILARITY", 0.5)
+    vector = np.ones(len(INTENTS))  # equally close to every centroid (similarity 1/sqrt(6))
+    vector[INTENTS.index("charging_info")] += 0.1
+    assert QueryRouter(embed).classify("Hmm?", query_embedding=vector.tolist()) == "general"
+
+
+def test_plans_only_fetch_what_the_intent_uses():
+    plan_for = QueryRouter.plan_for
+    assert plan_for("route_planning").stores == ["global_rag"]
+    assert plan_for("range_prediction").stores == ["global_rag", "personal_rag"]
+    assert plan_for("range_prediction").personal_include == ("documents",)
+    assert "metadatas" not in plan_for("comparison").global_include
+    assert plan_for("no_such_intent") is RETRIEVAL_PLANS["general"]
+    assert set(RETRIEVAL_PLANS) == set(INTENT_EXEMPLARS)
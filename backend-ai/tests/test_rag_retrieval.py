@@ -0,0 +1,72 @@
+"""
+Concurrent retrieval: both branches run side by side, a slow branch is dropped at its timeout
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from app.core.config import settings
+from app.services.query_router import RetrievalPlan
+
+BOTH = RetrievalPlan("both", global_results=3, personal_results=1)
+
+
+@pytest.fixture
+def branches(rag_service, monkeypatch):
+    """Stand-in query_global / query_personal; each waits on its gate when one is set"""
+    calls = {"global": [], "personal": []}
+    gates = {"global": None, "personal": None}
+    release = threading.Event()
+
+    def branch(name):
+        def query(*args):
+            calls[name].append(args)
+            if gates[name] is not None:
+                gates[name].wait()
+            return {"documents": [f"{name} document"], "metadatas": [{}], "distances": [0.1]}
+        return query
+
+    monkeypatch.setattr(rag_service, "query_global", branch("global"))
+    monkeypatch.setattr(rag_service, "query_personal", branch("personal"))
+    yield calls, gates, release
+    release.set()  # let blocked workers finish before the pool shuts down
+
+
+def test_both_branches_run_concurrently_on_one_query_embedding(rag_service, branches):
+    calls, gates, _ = branches
+    gates["global"] = gates["personal"] = threading.Barrier(2, timeout=2)  # neither returns alone
+
+    results = rag_service.retrieve("user_001", "range to Pune", BOTH)
+    assert results["global"]["documents"] == ["global document"]
+    assert results["personal"]["documents"] == ["personal document"]
+    (_, n, global_embedding, *_), = calls["global"]
+    (user_id, _, _, personal_embedding, _), = calls["personal"]
+    assert (n, user_id) == (3, "user_001")
+    assert global_embedding is personal_embedding  # embedded once, shared
+
+
+@pytest.mark.parametrize("retrieve", ["retrieve", "aretrieve"])
+def test_a_branch_past_its_timeout_is_dropped(rag_service, branches, monkeypatch, retrieve):
+    calls, gates, release = branches
+    monkeypatch.setattr(settings, "RAG_PERSONAL_TIMEOUT_SECONDS", 0.05)
+    gates["personal"] = release
+
+    started = time.monotonic()
+    if retrieve == "retrieve":
+        results = rag_service.retrieve("user_001", "range to Pune", BOTH)
+    else:
+        results = asyncio.run(rag_service.aretrieve("user_001", "range to Pune", BOTH))
+    assert time.monotonic() - started < settings.RAG_GLOBAL_TIMEOUT_SECONDS
+    assert results["global"]["documents"] == ["global document"]
+    assert results["personal"] == {"documents": [], "metadatas": [], "distances": []}
+
+
+def test_a_plan_only_runs_the_branches_it_needs(rag_service, branches):
+    calls, _, _ = branches
+    results = rag_service.retrieve("user_001", "route to Goa", RetrievalPlan("route_planning", global_results=1))
+    assert len(calls["global"]) == 1 and calls["personal"] == []
+    assert results["personal"]["documents"] == []
+
+    rag_service.retrieve("user_001", "hi", RetrievalPlan("nothing"))
+    assert len(calls["global"]) == 1
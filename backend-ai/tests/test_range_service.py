@@ -0,0 +1,228 @@
+"""
+Range estimates: verdict thresholds, fallbacks, suggested charging stops and fleet batches
+
+range_service reads everything through rag_service; a stand-in with fixed routes,
+drivers and energy multipliers replaces it so the arithmetic can be checked by hand.
+"""
+
+import importlib
+import sys
+import types
+import pytest
+from pydantic import ValidationError
+from app.core.config import settings
+from app.models.schemas import BatchRangePredictionRequest, BatchRangePredictionResponse, RangePredictionResponse
+from app.utils.gazetteer import LocationGazetteer
+
+ROUTES = {("Mumbai", "Pune"): (150.0, 500.0, "route"), ("Pune", "Goa"): (450.0, -300.0, "reverse_route")}
+USERS = {
+    "driver": {"avg_efficiency": 20.0, "battery_capacity": 60.0, "battery_health": 100, "ev_model": "MG ZS EV"},
+    "newcomer": {"ev_model": "Tata Nexon EV", "battery_health": 90},
+}
+WEATHER = {"cold": 1.2}
+
+
+class FakeEnergy:
+    def relative(self, weather=None, traffic=None, elevation_change_m=None):
+        return WEATHER.get(weather, 1.0)
+
+    def predict(self, distance_km, **conditions):
+        return {"efficiency_kwh_per_100km": 18.0}
+
+    def spread(self):
+        return 0.1
+
+
+@pytest.fixture
+def range_service(monkeypatch):
+    fake = types.SimpleNamespace(
+        gazetteer=LocationGazetteer(["Mumbai", "Pune", "Goa"]),
+        trips=types.SimpleNamespace(users=lambda ids: {i: USERS[i] for i in ids if i in USERS}),
+        profiles=types.SimpleNamespace(profile=lambda user_id: None),
+        similarity=types.SimpleNamespace(route_profiles=lambda routes: {key: ROUTES.get(key) for key in routes}),
+        energy=FakeEnergy(),
+        get_global_stats=lambda: {"avg_efficiency": 16.0},
+    )
+    monkeypatch.setitem(sys.modules, "app.services.rag_service", types.SimpleNamespace(rag_service=fake))
+    monkeypatch.delitem(sys.modules, "app.services.range_service", raising=False)
+    module = importlib.import_module("app.services.range_service")
+    yield module
+    sys.modules.pop("app.services.range_service", None)
+
+
+def request(charge, user_id="driver", start="Mumbai", end="Pune", **fields):
+    return {"user_id": user_id, "start_location": start, "end_location": end,
+            "current_battery_percent": charge, "weather": "pleasant", "traffic": "moderate", **fields}
+
+
+@pytest.mark.parametrize("charge, verdict, arrival", [
+    (100, "reachable", 50.0),    # 60 kWh, needs 30 kWh
+    (60, "reachable", 10.0),     # exactly the reserve
+    (55, "borderline", 5.0),
+    (50, "borderline", 0.0),     # arrives empty
+    (40, "unreachable", -10.0),
+])
+def test_verdict_thresholds(range_service, charge, verdict, arrival):
+    estimate = range_service.estimate_range(request(charge))
+    assert estimate["verdict"] == verdict
+    assert estimate["arrival_battery_percent"] == arrival
+    assert estimate["energy_needed_kwh"] == 30.0
+    assert estimate["can_reach"] is (arrival >= 0)
+    assert estimate["charge_needed_kwh"] == max(30.0 + 6.0 - 0.6 * charge, 0.0)
+    assert (estimate["reach_probability"] > 0.5) is (arrival > 0)
+
+
+def test_borderline_trip_gets_one_top_up(range_service):
+    estimate = range_service.estimate_range(request(55))
+    # 33 kWh on board, the reserve (6 kWh) is reached after 27 kWh = 135 km; 3 kWh more arrives with it
+    assert estimate["charging_stops"] == [{"at_km": 135.0, "energy_added_kwh": 3.0, "charge_to_percent": 15}]
+    assert range_service.estimate_range(request(100))["charging_stops"] == []
+
+
+def test_aliases_conditions_and_reversed_routes(range_service):
+    estimate = range_service.estimate_range(request(100, start="Bombay", end="Poona", weather="Cold"))
+    assert estimate["route"] == "Mumbai → Pune"
+    assert estimate["efficiency_kwh_per_100km"] == 24.0
+    assert estimate["elevation_change_m"] == 500
+
+    reverse = range_service.estimate_range(request(100, start="Pune", end="Goa"))
+    assert (reverse["distance_km"], reverse["distance_source"]) == (450.0, "reverse_route")
+
+
+def test_unknown_route_needs_a_distance(range_service):
+    estimate = range_service.estimate_range(request(80, start="Goa", end="Mumbai"))
+    assert estimate["verdict"] == "unknown"
+    assert estimate["distance_km"] is None and estimate["can_reach"] is None
+    assert estimate["charging_stops"] == []
+    assert "distance_km" in range_service.describe(estimate)
+
+    given = range_service.estimate_range(request(80, start="Goa", end="Mumbai", distance_km=100))
+    assert (given["distance_km"], given["distance_source"], given["verdict"]) == (100.0, "request", "reachable")
+
+
+def test_driver_without_history_uses_the_energy_model_and_ev_table(range_service):
+    estimate = range_service.estimate_range(request(100, user_id="newcomer"))
+    usable = settings.EV_BATTERY_KWH["Tata Nexon EV"] * 0.9
+    assert estimate["efficiency_kwh_per_100km"] == 18.0
+    assert estimate["energy_available_kwh"] == round(usable, 1)
+
+    stranger = range_service.estimate_range(request(100, user_id="stranger", battery_capacity_kwh=50))
+    assert estimate["energy_needed_kwh"] == stranger["energy_needed_kwh"] == 27.0
+    assert stranger["energy_available_kwh"] == 50.0
+
+
+def test_batch_matches_single_requests(range_service):
+    items = [request(charge, user_id=user_id, start=start, end=end, vehicle_id=f"v{i}")
+             for i, (charge, user_id, (start, end)) in enumerate(
+                 (charge, user_id, route) for charge in (30, 55, 90) for user_id in ("driver", "newcomer")
+                 for route in (("Mumbai", "Pune"), ("Pune", "Goa"), ("Goa", "Delhi")))]
+    results = range_service.estimate_ranges(items)
+    for i, (item, result) in enumerate(zip(items, results)):
+        assert result == {**range_service.estimate_range(item), "index": i}
+    summary = range_service.summarize(results)
+    assert sum(summary.values()) == len(items) and summary["unknown"] == 6
+
+
+@pytest.mark.parametrize("distance, efficiency, charge, usable", [
+    (500.0, 20.0, 100.0, 60.0),
+    (900.0, 16.0, 35.0, 40.0),
+    (160.0, 20.0, 55.0, 60.0),
+    (1200.0, 25.0, 15.0, 75.0),
+])
+def test_charging_stops_arrive_with_the_reserve(range_service, distance, efficiency, charge, usable):
+    available = usable * charge / 100
+    reserve = usable * settings.RANGE_RESERVE_PERCENT / 100
+    stops = range_service._charging_stops(distance, efficiency, available, usable)
+    needed = distance * efficiency / 100 + reserve - available
+
+    assert sum(stop["energy_added_kwh"] for stop in stops) == pytest.approx(needed, abs=0.05 * len(stops))
+    positions = [stop["at_km"] for stop in stops]
+    assert positions == sorted(positions) and all(0 <= at < distance for at in positions)
+    assert all(stop["charge_to_percent"] <= settings.RANGE_CHARGE_TO_PERCENT for stop in stops)
+
+    # Drive it: the battery never drops below the reserve and arrives with it
+    level, at = available, 0.0
+    for stop in stops:
+        level -= (stop["at_km"] - at) * efficiency / 100
+        assert level >= reserve - 0.05
+        level, at = level + stop["energy_added_kwh"], stop["at_km"]
+    assert level - (distance - at) * efficiency / 100 == pytest.approx(reserve, abs=0.1)
+
+
+def test_an_unknown_route_is_not_reported_as_unreachable(range_service, monkeypatch):
+    def no_model(**kwargs):
+        raise OSError("not cached")
+
+    rag = sys.modules["app.services.rag_service"].rag_service
+    rag.embed_query = lambda text: None
+    rag.add_index_listener = lambda listener: None
+    monkeypatch.setitem(sys.modules, "gpt4all", types.SimpleNamespace(GPT4All=no_model))
+    monkeypatch.delitem(sys.modules, "app.services.llm_service", raising=False)
+    llm_service = importlib.import_module("app.services.llm_service").llm_service
+    try:
+        result = llm_service.predict_range("driver", "Goa", "Mumbai", 80, "pleasant", "moderate")
+    finally:
+        sys.modules.pop("app.services.llm_service", None)
+
+    response = RangePredictionResponse(success=True, can_reach=result["can_reach"], prediction=result["response"],
+                                       verdict=result["estimate"]["verdict"])
+    assert (response.can_reach, response.verdict) == (None, "unknown")
+    assert llm_service.predict_range("driver", "Mumbai", "Pune", 100, "pleasant", "moderate")["can_reach"] is True
+
+
+@pytest.fixture
+def llm_service(range_service, monkeypatch):
+    """LLMService over the same stand-in (no model): narrate_range records the items it words"""
+    rag = sys.modules["app.services.rag_service"].rag_service
+    rag.embed_query = lambda text: None
+    rag.add_index_listener = lambda listener: None
+    monkeypatch.setitem(sys.modules, "gpt4all", types.SimpleNamespace(GPT4All=None))
+    monkeypatch.delitem(sys.modules, "app.services.llm_service", raising=False)
+    service = importlib.import_module("app.services.llm_service").llm_service
+    service.narrated = []
+
+    def narrate_range(request, estimate):
+        if request.get("vehicle_id") == "broken":
+            raise RuntimeError("generation failed")
+        service.narrated.append(request["vehicle_id"])
+        return f"narration of {request['vehicle_id']}"
+
+    monkeypatch.setattr(service, "narrate_range", narrate_range)
+    yield service
+    sys.modules.pop("app.services.llm_service", None)
+
+
+def fleet(*charges) -> BatchRangePredictionRequest:
+    return BatchRangePredictionRequest(items=[request(charge, vehicle_id=f"v{i}") for i, charge in enumerate(charges)])
+
+
+def test_batch_without_narration_never_calls_the_llm(llm_service):
+    batch = fleet(100, 55, 40, 52)
+    result = llm_service.predict_ranges([item.model_dump() for item in batch.items])
+    assert llm_service.narrated == []
+    assert [item["vehicle_id"] for item in result["results"]] == ["v0", "v1", "v2", "v3"]
+    assert result["summary"] == {"reachable": 1, "borderline": 2, "unreachable": 1, "unknown": 0}
+    BatchRangePredictionResponse(success=True, **result)
+
+
+def test_only_borderline_items_are_narrated_up_to_the_cap(llm_service, monkeypatch):
+    monkeypatch.setattr(settings, "RANGE_BATCH_MAX_NARRATIONS", 2)
+    batch = fleet(100, 55, 40, 52, 58, 30)  # borderline: v1, v3, v4
+    result = llm_service.predict_ranges([item.model_dump() for item in batch.items], narrate=True)
+    assert llm_service.narrated == ["v1", "v3"]  # batch order, then the cap
+    narrations = {item["vehicle_id"]: item.get("narration") for item in result["results"]}
+    assert narrations == {"v0": None, "v1": "narration of v1", "v2": None, "v3": "narration of v3",
+                          "v4": None, "v5": None}
+
+
+def test_a_failed_narration_keeps_the_estimate(llm_service):
+    items = [request(55, vehicle_id="broken"), request(52, vehicle_id="ok")]
+    result = llm_service.predict_ranges(items, narrate=True)
+    assert "narration" not in result["results"][0] and result["results"][0]["verdict"] == "borderline"
+    assert result["results"][1]["narration"] == "narration of ok"
+
+
+@pytest.mark.parametrize("items", [[], [request(50)] * 1001, [request(120)]])
+def test_batch_requests_are_bounded(items):
+    with pytest.raises(ValidationError):
+        BatchRangePredictionRequest(items=items)
@@ -0,0 +1,64 @@
+"""
+Recent-trip ring buffer: the newest N trips by date, with running sums equal to a recomputation
+"""
+
+import random
+from datetime import datetime, timedelta
+import pytest
+from app.services.profile_store import RecentTripWindow
+
+
+def assert_window(window: RecentTripWindow, pushed: list):
+    newest = sorted({trip["trip_id"]: trip for trip in pushed}.values(), key=lambda t: t["date"])
+    newest = newest[-window.trips.maxlen:]
+    assert [trip["trip_id"] for trip in window.trips] == [trip["trip_id"] for trip in newest]
+    assert window.sum_efficiency == pytest.approx(sum(t["efficiency_kwh_per_100km"] for t in newest))
+    assert window.sum_distance == pytest.approx(sum(t["distance_km"] for t in newest))
+    assert window.sum_speed == sum(t["avg_speed_kmh"] for t in newest)
+    assert window.sum_stops == sum(t["num_charging_stops"] for t in newest)
+    styles = {}
+    for trip in newest:
+        styles[trip["driving_style"]] = styles.get(trip["driving_style"], 0) + 1
+    assert window.style_counts == styles
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_out_of_order_uploads_keep_the_newest_trips(random_trip, seed):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    trips = [random_trip(rng, date=(start + timedelta(hours=rng.randint(0, 2000))).isoformat(),
+                         avg_speed_kmh=rng.randint(20, 90), num_charging_stops=rng.randint(0, 2),
+                         driving_style=rng.choice(("eco", "normal", "aggressive")))
+             for _ in range(60)]
+    window = RecentTripWindow(limit=10)
+    pushed = []
+    for trip in trips + rng.sample(trips, 10):  # re-uploads are duplicates
+        window.push(trip)
+        pushed.append(trip)
+        assert_window(window, pushed)
+    assert_window(RecentTripWindow.from_trips(trips, limit=10), trips)
+
+
+def test_push_reports_what_it_kept(make_trip):
+    window = RecentTripWindow(limit=3)
+    trips = [make_trip(date=f"2025-01-0{day}") for day in (5, 6, 7)]
+    assert all(window.push(trip) for trip in trips)
+    assert not window.push(trips[1])                                  # duplicate
+    assert not window.push(make_trip(date="2025-01-01"))              # older than the whole window
+    assert window.push(make_trip(date="2025-01-05T12:00:00"))         # late, but among the newest 3
+    assert [trip["date"] for trip in window.trips] == ["2025-01-05T12:00:00", "2025-01-06", "2025-01-07"]
+    assert window.push(make_trip(date="2025-01-08"))
+    assert [trip["date"] for trip in window.trips] == ["2025-01-06", "2025-01-07", "2025-01-08"]
+
+
+def test_profile_text_and_ties(make_trip):
+    window = RecentTripWindow.from_trips([
+        make_trip(date="2025-01-01", start_location="Goa", driving_style="eco", efficiency_kwh_per_100km=12.0),
+        make_trip(date="2025-01-02", driving_style="normal", efficiency_kwh_per_100km=18.0),
+    ])
+    assert window.common_route() == "Mumbai to Pune"  # tie: the most recent trip wins
+    assert window.dominant_style() == "normal"
+    text = window.pattern_text("user_001")
+    assert "Average efficiency: 15.00 kWh/100km" in text and "Total distance: 300 km" in text
+    assert text.index("- Mumbai to Pune") < text.index("- Goa to Pune")  # newest first
+    assert window.metadata()["recent_dates"] == "2025-01-02, 2025-01-01"
@@ -0,0 +1,86 @@
+"""
+Region-partitioned global index: writes land in the origin's partition, a query with a
+known origin reads only that partition, any other query scatter-gathers every partition
+"""
+
+import pytest
+from app.utils.gazetteer import OTHER_REGION, REGIONS, region_of
+
+ROUTES = [("Mumbai", "Pune"), ("Pune", "Goa"), ("Delhi", "Jaipur"), ("Jaipur", "Agra"),
+          ("Bangalore", "Mysore"), ("Chennai", "Kochi"), ("Kolkata", "Patna"), ("Shimla", "Manali")]
+
+
+@pytest.fixture
+def partitioned(setup_rag, make_trip):
+    """A published region-partitioned version holding a few trips per region"""
+    version = setup_rag.registry.next_version()
+    setup_rag.bind_collections(version)
+    setup_rag.trip_store.upsert_trips([
+        make_trip(start_location=start, end_location=end, distance_km=100.0 + 10 * i, weather=weather)
+        for i, (start, end) in enumerate(ROUTES) for weather in ("hot", "cold")
+    ])
+    setup_rag.catch_up_global_rag(None)
+    setup_rag.registry.publish(version, None, partitions=list(setup_rag.global_shards))
+    return setup_rag
+
+
+@pytest.fixture
+def rag_service(partitioned, rag_service):  # loaded after the partitioned version is published
+    return rag_service
+
+
+def partition_ids(rag_service) -> dict:
+    return {partition: set(shard.get(include=[])["ids"]) for partition, shard in rag_service.global_shards.items()}
+
+
+def test_region_of():
+    assert region_of("Mumbai") == "west"
+    assert region_of("Bangalore") == "south"
+    assert region_of("Shimla") == OTHER_REGION
+    assert region_of(None) == OTHER_REGION
+
+
+def test_service_serves_every_region_partition(rag_service):
+    assert set(rag_service.global_shards) == {*REGIONS, OTHER_REGION}
+    ids = partition_ids(rag_service)
+    trips = rag_service.trips.get_trips([trip_id for shard in ids.values() for trip_id in shard])
+    assert len(trips) == 2 * len(ROUTES)
+    for partition, shard in ids.items():
+        assert {region_of(trips[trip_id][1]["start_location"]) for trip_id in shard} <= {partition}
+
+
+def test_upsert_global_routes_rows_to_the_origin_partition(rag_service):
+    before = partition_ids(rag_service)
+    rag_service.upsert_global(
+        ["new_west", "new_south", "new_other"],
+        ["Trip from Goa to Pune", "Trip from Hyderabad to Chennai", "Trip from Shimla to Manali"],
+        [{"content_hash": "x"}] * 3,
+        ["Goa", "Hyderabad", "Shimla"],
+    )
+    added = {partition: ids - before[partition] for partition, ids in partition_ids(rag_service).items()}
+    assert added == {"north": set(), "west": {"new_west"}, "south": {"new_south"},
+                     "east": set(), OTHER_REGION: {"new_other"}}
+
+
+def test_known_origin_queries_only_its_partition(rag_service):
+    query = "trips from Bangalore in hot weather"
+    results = rag_service._query_trips(query, rag_service.embed_query(query), 10, ["metadatas", "distances"])
+    assert partition_ids(rag_service)["south"] == set(results["ids"][0])  # every south trip, nothing else
+
+
+def test_unknown_origin_merges_the_nearest_hits_of_every_partition(rag_service, partitioned):
+    query = "long trip in cold weather"
+    embedding = rag_service.embed_query(query)
+    results = rag_service._query_trips(query, embedding, 5, ["distances"])
+
+    # The same vectors in one unpartitioned collection give the same nearest hits
+    reference = partitioned.client.create_collection("reference")
+    for shard in rag_service.global_shards.values():
+        rows = shard.get(include=["embeddings"])
+        if rows["ids"]:
+            reference.add(ids=rows["ids"], embeddings=rows["embeddings"])
+    expected = reference.query(query_embeddings=[embedding], n_results=5, include=["distances"])
+
+    assert results["distances"][0] == pytest.approx(expected["distances"][0], abs=1e-5)
+    assert set(results["ids"][0]) == set(expected["ids"][0])
+    assert results["distances"][0] == sorted(results["distances"][0])
@@ -0,0 +1,112 @@
+"""
+Efficiency rollups: the triggers keep the daily / monthly buckets equal to a recomputation,
+pruning downsamples old days into their month
+"""
+
+import random
+from datetime import date, timedelta
+import pytest
+
+RECOMPUTED = ("SELECT start_location, end_location, substr(date, 1, {length}), weather, traffic, COUNT(*), "
+              "SUM(distance_km), SUM(efficiency_kwh_per_100km), "
+              "SUM(efficiency_kwh_per_100km * efficiency_kwh_per_100km), SUM(temperature_c) "
+              "FROM trips WHERE substr(date, 1, {length}) >= ? GROUP BY 1, 2, 3, 4, 5")
+
+
+def buckets(store, granularity: str) -> dict:
+    with store.connection() as conn:
+        return {tuple(row[:5]): tuple(row[5:]) for row in conn.execute(f"SELECT * FROM rollup_{granularity}")}
+
+
+def recomputed(store, granularity: str, since: str = "") -> dict:
+    length = {"daily": 10, "monthly": 7}[granularity]
+    with store.connection() as conn:
+        return {tuple(row[:5]): tuple(row[5:])
+                for row in conn.execute(RECOMPUTED.format(length=length), (since,))}
+
+
+def assert_same(actual: dict, expected: dict):
+    assert actual.keys() == expected.keys()
+    for key, values in expected.items():
+        assert actual[key] == pytest.approx(values), key
+
+
+def days_ago(days: int) -> str:
+    return (date.today() - timedelta(days=days)).isoformat() + "T08:00:00"
+
+
+def test_triggers_match_recomputation_after_inserts_updates_and_deletes(store, random_trip):
+    rng = random.Random(5)
+    trips = [random_trip(rng) for _ in range(200)]
+    store.upsert_trips(trips)
+
+    # Edits move trips between buckets (route, day, conditions); deletes empty some of them
+    store.upsert_trips([random_trip(rng, trip_id=trip["trip_id"], date=days_ago(rng.randint(0, 40)))
+                        for trip in rng.sample(trips, 60)])
+    store.delete_trips([trip["trip_id"] for trip in rng.sample(trips, 80)])
+
+    for granularity in ("daily", "monthly"):
+        assert_same(buckets(store, granularity), recomputed(store, granularity))
+    with store.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM rollup_daily WHERE trips <= 0").fetchone()[0] == 0
+
+
+def test_rebuild_matches_triggers(store, random_trip):
+    rng = random.Random(9)
+    store.upsert_trips([random_trip(rng) for _ in range(100)])
+    triggered = {granularity: buckets(store, granularity) for granularity in ("daily", "monthly")}
+    store.rebuild_rollups()
+    for granularity, expected in triggered.items():
+        assert_same(buckets(store, granularity), expected)
+
+
+def test_pruned_days_stay_counted_in_their_month(store, make_trip):
+    store.upsert_trips([make_trip(date=days_ago(days)) for days in (1, 2, 200, 201)])
+    store.rebuild_rollups(daily_days=0)  # every day kept until the prune
+    monthly = buckets(store, "monthly")
+
+    assert store.prune_rollups(daily_days=90) == 2
+    assert {key[2] for key in buckets(store, "daily")} == {days_ago(1)[:10], days_ago(2)[:10]}
+    assert buckets(store, "monthly") == monthly
+    assert sum(row["trips"] for row in store.efficiency_rollup("monthly")) == 4
+
+    # A late trip from a pruned day only reaches its month; deleting it leaves the daily buckets alone
+    late = make_trip(date=days_ago(150))
+    store.upsert_trips([late])
+    cutoff = (date.today() - timedelta(days=90)).isoformat()
+    assert_same(buckets(store, "daily"), recomputed(store, "daily", cutoff))
+    assert_same(buckets(store, "monthly"), recomputed(store, "monthly"))
+    store.delete_trips([late["trip_id"]])
+    assert_same(buckets(store, "daily"), recomputed(store, "daily", cutoff))
+
+
+def test_prune_never_moves_the_cutoff_back(store, make_trip):
+    store.upsert_trips([make_trip(date=days_ago(days)) for days in (1, 50)])
+    store.rebuild_rollups(daily_days=0)
+    assert store.prune_rollups(daily_days=30) == 1
+    assert store.prune_rollups(daily_days=90) == 0
+    store.upsert_trips([make_trip(date=days_ago(60))])  # still before the 30-day cutoff
+    assert len(buckets(store, "daily")) == 1
+
+
+def test_efficiency_rollup_sums_buckets(store, make_trip):
+    store.upsert_trips([
+        make_trip(date="2025-01-10T08:00:00", efficiency_kwh_per_100km=14.0, weather="cold"),
+        make_trip(date="2025-01-20T08:00:00", efficiency_kwh_per_100km=18.0, weather="cold"),
+        make_trip(date="2025-07-05T08:00:00", efficiency_kwh_per_100km=12.0, weather="hot"),
+        make_trip(date="2025-07-06T08:00:00", start_location="Goa", efficiency_kwh_per_100km=20.0),
+    ])
+    store.rebuild_rollups(daily_days=0)  # keep every day of these old dates
+
+    by_month = store.efficiency_rollup("monthly", group_by=("month",), start="Mumbai")
+    assert [(row["month"], row["trips"], row["avg_efficiency"]) for row in by_month] == [(1, 2, 16.0), (7, 1, 12.0)]
+    assert by_month[0]["std_efficiency"] == pytest.approx(2.83, abs=0.01)
+
+    winter = store.efficiency_rollup("daily", group_by=("weather",), months=(12, 1, 2))
+    assert [(row["weather"], row["trips"]) for row in winter] == [("cold", 2)]
+    assert [row["trips"] for row in store.efficiency_rollup("daily", group_by=(), since="2025-07-06")] == [1]
+
+    with pytest.raises(ValueError):
+        store.efficiency_rollup("weekly")
+    with pytest.raises(ValueError):
+        store.efficiency_rollup(group_by=("user_id",))
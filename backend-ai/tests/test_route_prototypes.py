@@ -0,0 +1,70 @@
+"""
+Route prototypes: one document per route + condition bucket, the same whether built
+in the setup pass or rebuilt from the trip store after an ingest
+"""
+
+import random
+import numpy as np
+import pytest
+from app.utils.route_prototypes import (RoutePrototypeBuilder, build_route_prototypes, create_prototype_text,
+                                        prototype_key)
+
+NETWORKS = ("Tata Power", "Statiq", "ChargeZone", "Jio-bp", "Ather Grid")
+
+
+@pytest.fixture
+def trips(random_trip):
+    rng = random.Random(5)
+    trips = []
+    for _ in range(300):
+        stops = [{"network": rng.choice(NETWORKS), "power_kw": 50, "duration_mins": 30}
+                 for _ in range(rng.randint(0, 2))]
+        trips.append(random_trip(rng, driving_style=rng.choice(("eco", "normal")),
+                                 charging_stops=stops, num_charging_stops=len(stops)))
+    return trips
+
+
+def test_one_prototype_per_bucket_with_its_statistics(trips):
+    prototypes = build_route_prototypes(trips)
+    buckets = {prototype_key(trip) for trip in trips}
+    assert len(prototypes) == len(buckets) < len(trips)
+    assert sum(proto["trip_count"] for proto in prototypes) == len(trips)
+
+    proto = max(prototypes, key=lambda p: p["trip_count"])
+    members = [trip for trip in trips if prototype_key(trip) == prototype_key(proto)]
+    efficiency = [trip["efficiency_kwh_per_100km"] for trip in members]
+    assert proto["trip_count"] == len(members)
+    assert proto["efficiency_kwh_per_100km"] == round(float(np.median(efficiency)), 2)
+    assert proto["efficiency_p10"] == round(float(np.percentile(efficiency, 10)), 2)
+    assert proto["charging_stop_rate"] == round(np.mean([bool(trip["charging_stops"]) for trip in members]), 2)
+    assert proto["prototype_id"] == "proto_" + "_".join(
+        part.lower().replace(" ", "-") for part in prototype_key(proto))
+
+
+def test_top_networks_by_count_then_name(make_trip):
+    stops = [[{"network": "Statiq"}], [{"network": "Statiq"}, {"network": "Jio-bp"}],
+             [{"network": "Tata Power"}], [{"network": "Ather Grid"}]]
+    forward = build_route_prototypes(make_trip(charging_stops=s, num_charging_stops=len(s)) for s in stops)
+    backward = build_route_prototypes(make_trip(charging_stops=s, num_charging_stops=len(s)) for s in stops[::-1])
+    assert forward[0]["charging_networks"] == backward[0]["charging_networks"] == "Statiq, Ather Grid, Jio-bp"
+
+
+def test_ingest_refresh_matches_the_setup_pass(store, trips):
+    store.upsert_trips(trips)
+    builder = RoutePrototypeBuilder()
+    for trip in trips:
+        builder.add(trip)
+    setup_pass = {proto["prototype_id"]: proto for proto in builder.build()}
+
+    for key in {prototype_key(trip) for trip in trips}:
+        [refreshed] = build_route_prototypes(store.prototype_trips(*key))
+        assert refreshed == setup_pass[refreshed["prototype_id"]]
+        assert create_prototype_text(refreshed) == create_prototype_text(setup_pass[refreshed["prototype_id"]])
+
+
+def test_prototype_text_reads_like_a_trip_document(make_trip):
+    [single] = build_route_prototypes([make_trip()])
+    text = create_prototype_text(single)
+    assert text.startswith("Trips from Mumbai to Pune (1 trip).")
+    assert "Networks used" not in text
+    assert "(2 trips)" in create_prototype_text(build_route_prototypes([make_trip(), make_trip()])[0])
@@ -0,0 +1,54 @@
+"""
+setup_rag.py --rebuild: trips the API changes during a build still reach the new version
+"""
+
+import pytest
+from conftest import FakeEmbedder
+
+
+@pytest.fixture
+def setup_rag(setup_rag):
+    setup_rag.bind_collections(setup_rag.registry.next_version())  # the version a --rebuild writes
+    return setup_rag
+
+
+def indexed(module) -> dict:
+    return module.partition_hashes(module.global_shards)
+
+
+def stored(module) -> dict:
+    return dict(module.trip_store.iter_content_hashes())
+
+
+def test_catch_up_indexes_trips_changed_during_the_build(setup_rag, make_trip):
+    trips = [make_trip(start_location=start) for start in ("Mumbai", "Pune", "Bangalore", "Delhi")]
+    setup_rag.trip_store.upsert_trips(trips)
+    stamp = setup_rag.catch_up_global_rag(None)
+    assert {trip_id: content for trip_id, (_, content) in indexed(setup_rag).items()} == stored(setup_rag)
+
+    # Meanwhile the API adds a trip, edits one into another region and deletes one
+    bangalore = indexed(setup_rag)["trip_00002"][0]
+    setup_rag.trip_store.upsert_trips([make_trip(start_location="Goa"),
+                                       make_trip(trip_id="trip_00000", start_location="Bangalore")])
+    setup_rag.trip_store.delete_trips(["trip_00001"])
+    setup_rag.catch_up_global_rag(stamp)
+
+    index = indexed(setup_rag)
+    assert {trip_id: content for trip_id, (_, content) in index.items()} == stored(setup_rag)
+    assert index["trip_00000"][0] == bangalore  # moved out of its old partition, not duplicated
+    assert sum(shard.count() for shard in setup_rag.global_shards.values()) == 4
+
+
+def test_catch_up_only_embeds_when_the_store_changed(setup_rag, make_trip):
+    trips = [make_trip() for _ in range(3)]
+    setup_rag.trip_store.upsert_trips(trips)
+    stamp = setup_rag.catch_up_global_rag(None)
+
+    calls = FakeEmbedder.calls
+    setup_rag.trip_store.upsert_trips(trips[:1])  # an identical re-upload is not a write
+    assert setup_rag.catch_up_global_rag(stamp) == stamp
+    assert FakeEmbedder.calls == calls
+
+    setup_rag.trip_store.upsert_trips([{**trips[1], "distance_km": 180.0}])
+    assert setup_rag.catch_up_global_rag(stamp) != stamp
+    assert FakeEmbedder.calls == calls + 1  # just the edited trip
@@ -0,0 +1,121 @@
+"""
+Trip similarity index: the expanded matrix form ranks trips exactly like a direct
+weighted distance, ingest keeps it current and a snapshot restores it unchanged
+"""
+
+import random
+import numpy as np
+import pytest
+from app.services.similarity_index import FEATURES, TripSimilarityIndex, trip_features
+
+WEIGHTS = {"route": 4.0, "distance_km": 2.0, "elevation_change_m": 1.0, "temperature_c": 1.0,
+           "traffic_delay_mins": 1.0, "avg_speed_kmh": 0.5, "style": 1.0, "start_battery_percent": 0.25}
+
+
+def brute_force(trips: list, start: str, end: str, weather: str, traffic: str, style: str,
+                battery: float) -> list:
+    """(trip_id, distance) of every trip, nearest first - the definition the index implements"""
+    raw = np.array([trip_features(trip) for trip in trips])
+    mean, std = raw.mean(axis=0), raw.std(axis=0)
+    std[std == 0] = 1.0
+
+    def average(field, **equals):
+        return np.mean([trip[field] for trip in trips if all(trip[k] == v for k, v in equals.items())])
+
+    query = np.array([
+        average("distance_km", start_location=start, end_location=end),
+        average("elevation_change_m", start_location=start, end_location=end),
+        average("temperature_c", weather=weather),
+        average("traffic_delay_mins", traffic=traffic),
+        average("avg_speed_kmh", traffic=traffic),
+        trip_features({"driving_style": style})[5],
+        battery,
+    ])
+    w = np.array([WEIGHTS[feature] for feature in FEATURES])
+    distances = ((raw - mean) / std - (query - mean) / std) ** 2 @ w
+    distances += np.array([WEIGHTS["route"] / 2 * ((trip["start_location"] != start) + (trip["end_location"] != end))
+                           for trip in trips])
+    return sorted(zip((trip["trip_id"] for trip in trips), distances), key=lambda hit: hit[1])
+
+
+@pytest.fixture
+def trips(store, random_trip):
+    rng = random.Random(21)
+    trips = [random_trip(rng, elevation_change_m=rng.randint(-400, 800), traffic_delay_mins=rng.randint(0, 60),
+                         avg_speed_kmh=rng.randint(30, 90), start_battery_percent=rng.randint(40, 100),
+                         driving_style=rng.choice(("eco", "normal", "sporty", "aggressive")))
+             for _ in range(300)]
+    store.upsert_trips(trips)
+    return trips
+
+
+@pytest.fixture
+def index(store):
+    return TripSimilarityIndex(store, weights=WEIGHTS)
+
+
+def ranked(hits: list) -> tuple:
+    return [trip_id for trip_id, _ in hits], [distance for _, distance in hits]
+
+
+def test_nearest_matches_a_direct_weighted_distance(index, trips):
+    conditions = dict(start="Mumbai", end="Goa", weather="hot", traffic="heavy", style="sporty", battery=80.0)
+    hits = index.nearest(10, conditions["start"], conditions["end"], conditions["weather"], conditions["traffic"],
+                         conditions["style"], conditions["battery"])
+    expected_ids, expected = ranked(brute_force(trips, **conditions)[:10])
+    ids, distances = ranked(hits)
+    assert distances == pytest.approx(expected, rel=1e-4, abs=1e-4)
+    assert ids == expected_ids
+
+
+def test_the_exact_route_wins_when_conditions_match(index, make_trip, store):
+    base = dict(distance_km=150.0, weather="hot", traffic="light", driving_style="eco")
+    store.upsert_trips([make_trip(trip_id="exact", start_location="Mumbai", end_location="Pune", **base),
+                        make_trip(trip_id="shared", start_location="Mumbai", end_location="Goa", **base),
+                        make_trip(trip_id="other", start_location="Goa", end_location="Bangalore", **base)])
+    hits = index.nearest(3, "Mumbai", "Pune", "hot", "light", "eco")
+    assert [trip_id for trip_id, _ in hits] == ["exact", "shared", "other"]
+    assert [distance for _, distance in hits] == pytest.approx([0.0, WEIGHTS["route"] / 2, WEIGHTS["route"]])
+
+
+def test_unknown_conditions_are_left_out(index, trips):
+    # Nobody drove Nashik -> Surat: its distance / elevation cannot weigh in, only the route penalty
+    hits = index.nearest(5, "Nashik", "Surat")
+    assert all(distance == pytest.approx(WEIGHTS["route"]) for _, distance in hits)
+    assert index.route_profile("Nashik", "Surat") is None
+
+
+def test_route_profile_falls_back_to_the_reverse_route(index, make_trip, store):
+    store.upsert_trips([make_trip(start_location="Pune", end_location="Goa", distance_km=d, elevation_change_m=e)
+                        for d, e in ((440.0, 300), (460.0, 500))])
+    assert index.route_profile("Pune", "Goa") == (450.0, 400.0, "route")
+    assert index.route_profile("Goa", "Pune") == (450.0, -400.0, "reverse_route")
+
+
+def test_ingested_trips_are_appended_or_replace_their_row(index, trips, make_trip):
+    index.nearest(1)  # built from the store
+    new = make_trip(trip_id="ingested", start_location="Kochi", end_location="Chennai", distance_km=690.0)
+    index.add([new])
+    assert index.nearest(1, "Kochi", "Chennai")[0][0] == "ingested"
+    assert index.route_profile("Kochi", "Chennai")[0] == 690.0
+
+    index.add([{**new, "start_location": "Chennai", "end_location": "Kochi", "distance_km": 700.0}])
+    assert index.route_profile("Kochi", "Chennai")[2] == "reverse_route"  # the old route is gone
+    assert index.route_profile("Chennai", "Kochi")[0] == 700.0
+    assert sum(trip_id == "ingested" for trip_id, _ in index.nearest(len(trips) + 5)) == 1
+
+
+def test_snapshot_restores_the_same_answers(index, store, trips, make_trip):
+    assert index.snapshot() is None  # nothing built yet
+    before = index.nearest(20, "Goa", "Pune", "cold", "moderate", "normal", 70.0)
+    arrays, metadata = index.snapshot()
+
+    restored = TripSimilarityIndex(store, weights=WEIGHTS)
+    restored.restore(arrays, metadata)
+    assert restored.nearest(20, "Goa", "Pune", "cold", "moderate", "normal", 70.0) == before
+    assert restored.route_profile("Goa", "Pune") == index.route_profile("Goa", "Pune")
+
+    # Ingest after a restore: a re-upload still finds its row, ids longer than the stored width fit
+    restored.add([{**trips[0], "distance_km": 999.0}, make_trip(trip_id="x" * 40)])
+    everything = [trip_id for trip_id, _ in restored.nearest(len(trips) + 5)]
+    assert len(everything) == len(trips) + 1 and "x" * 40 in everything
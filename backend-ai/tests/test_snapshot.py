@@ -0,0 +1,83 @@
+"""
+Snapshots: arrays come back memory-mapped and unchanged, and only for the stamp they were written with
+"""
+
+import json
+import os
+import numpy as np
+import pytest
+from app.utils.snapshot import MANIFEST, read_snapshot, write_snapshot
+
+STAMP = {"index_version": 3, "trips": [42, 7, 1050.5, 112.25]}
+
+
+def components() -> dict:
+    return {"similarity": ({"x": np.arange(12, dtype=np.float32).reshape(4, 3),
+                            "ids": np.array(["trip_1", "trip_2", "trip_3", "trip_4"])},
+                           {"size": 4, "words": ["Mumbai", None]})}
+
+
+def manifest(path) -> dict:
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def test_round_trip_is_memory_mapped_copy_on_write(tmp_path):
+    write_snapshot(str(tmp_path), STAMP, components())
+    restored, reason = read_snapshot(str(tmp_path), STAMP)
+    assert reason == ""
+    arrays, metadata = restored["similarity"]
+    expected, _ = components()["similarity"]
+    assert metadata == {"size": 4, "words": ["Mumbai", None]}
+    for name, array in expected.items():
+        assert isinstance(arrays[name], np.memmap)
+        np.testing.assert_array_equal(arrays[name], array)
+        assert arrays[name].dtype == array.dtype
+
+    arrays["x"][0, 0] = 99.0  # private to this process, the file is untouched
+    again, _ = read_snapshot(str(tmp_path), STAMP)
+    assert again["similarity"][0]["x"][0, 0] == 0.0
+
+
+def test_a_stamp_matches_as_stored(tmp_path):
+    write_snapshot(str(tmp_path), {"index_version": 3, "trips": (42, 7, 1050.5, 112.25)}, components())
+    assert read_snapshot(str(tmp_path), STAMP)[0] is not None  # a tuple stamp was stored as a list
+
+
+@pytest.mark.parametrize("stamp", [
+    {**STAMP, "index_version": 4},           # a new index version was published
+    {**STAMP, "trips": [43, 7, 1050.5, 112.25]},  # a trip changed since
+])
+def test_a_stale_snapshot_is_not_used(tmp_path, stamp):
+    write_snapshot(str(tmp_path), STAMP, components())
+    assert read_snapshot(str(tmp_path), stamp) == (None, "snapshot is stale")
+
+
+def test_missing_or_foreign_snapshots_are_not_used(tmp_path):
+    assert read_snapshot(str(tmp_path / "nothing"), STAMP) == (None, "no snapshot")
+    write_snapshot(str(tmp_path), STAMP, components())
+    data = manifest(tmp_path)
+    data["format"] = 0
+    (tmp_path / MANIFEST).write_text(json.dumps(data))
+    assert read_snapshot(str(tmp_path), STAMP)[1] == "snapshot format 0 (expected 1)"
+
+
+def test_damaged_arrays_are_not_used(tmp_path):
+    write_snapshot(str(tmp_path), STAMP, components())
+    generation = tmp_path / manifest(tmp_path)["generation"]
+    np.save(generation / "similarity.x.npy", np.zeros((5, 3), dtype=np.float32))
+    assert "does not match its manifest" in read_snapshot(str(tmp_path), STAMP)[1]
+    os.remove(generation / "similarity.x.npy")
+    assert read_snapshot(str(tmp_path), STAMP)[1].startswith("snapshot unreadable")
+
+
+def test_a_new_generation_replaces_the_old_one(tmp_path):
+    write_snapshot(str(tmp_path), STAMP, components())
+    first = manifest(tmp_path)["generation"]
+    newer = {**STAMP, "trips": [43, 8, 1100.0, 120.0]}
+    write_snapshot(str(tmp_path), newer, components())
+
+    assert manifest(tmp_path)["generation"] != first
+    assert sorted(os.listdir(tmp_path)) == sorted([MANIFEST, manifest(tmp_path)["generation"]])
+    assert read_snapshot(str(tmp_path), STAMP)[0] is None
+    assert read_snapshot(str(tmp_path), newer)[0] is not None
@@ -0,0 +1,183 @@
+"""
+Telemetry rollup: samples become the same trips however they are batched
+"""
+
+import json
+import types
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.trip_store import TRIP_FIELDS
+
+T0 = 1_760_000_000.0
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+@pytest.fixture
+def telemetry(load_service, monkeypatch):
+    monkeypatch.setattr(settings, "TELEMETRY_SWEEP_SECONDS", 3600.0)  # rollups only when the test asks
+    monkeypatch.setattr(settings, "TELEMETRY_TRIP_GAP_SECONDS", 300.0)
+    monkeypatch.setattr(settings, "TELEMETRY_MAX_CHARGE_MINUTES", 90.0)
+    monkeypatch.setattr(settings, "TELEMETRY_MIN_TRIP_KM", 1.0)
+    emitted = []
+    ingest = types.SimpleNamespace(
+        IngestQueueFull=IngestQueueFull,
+        ingest_service=types.SimpleNamespace(submit=emitted.extend),
+    )
+    rag = types.SimpleNamespace(rag_service=types.SimpleNamespace(
+        trips=types.SimpleNamespace(user=lambda user_id: {"ev_model": "MG ZS EV", "driving_style": "eco"})))
+    module = load_service("telemetry_service", ingest_service=ingest, rag_service=rag)
+    module.TelemetryService._instance = None  # a fresh singleton per test
+    service = module.TelemetryService()
+    service.emitted = emitted
+    yield module, service
+    service._stop.set()
+
+
+def samples(*legs, start=T0, step=10.0, soc=80.0, elevation=0.0):
+    """Samples for legs of (seconds, speed_kmh, soc change per sample, elevation change per sample)"""
+    rows, ts = [], start
+    for seconds, speed, dsoc, delevation in legs:
+        for _ in range(int(seconds / step)):
+            rows.append((ts, soc, speed, elevation, 28.0))
+            ts += step
+            soc += dsoc
+            elevation += delevation
+    return np.array(rows, dtype=[("ts", "<f8"), ("soc", "<f4"), ("speed_kmh", "<f4"),
+                                 ("elevation_m", "<f4"), ("temperature_c", "<f4")])
+
+
+def submit(service, user_id, batch, first=None, last=None, chunk=None):
+    """Binary submits; location markers go with the first / last request"""
+    chunk = chunk or len(batch)
+    parts = [batch[i:i + chunk] for i in range(0, len(batch), chunk)]
+    for i, part in enumerate(parts):
+        location = first if i == 0 else last if i == len(parts) - 1 else None
+        service.submit_binary(user_id, part.tobytes(), location=location, battery_kwh=50.0)
+
+
+def submit_ndjson(service, user_id, batch, locations, chunk):
+    """NDJSON submits with a location marker on the samples at the given indexes"""
+    lines = [json.dumps({"user_id": user_id, "battery_kwh": 50.0, **dict(zip(batch.dtype.names, map(float, row))),
+                         **({"location": locations[i]} if i in locations else {})})
+             for i, row in enumerate(batch.tolist())]
+    for i in range(0, len(lines), chunk):
+        service.submit_ndjson("\n".join(lines[i:i + chunk]).encode())
+
+
+def test_a_drive_becomes_one_dataset_shaped_trip(telemetry):
+    _, service = telemetry
+    # One hour at 72 km/h, 0.05 % SoC per 10 s, climbing 1 m per sample
+    submit(service, "user_001", samples((3600, 72.0, -0.05, 1.0)), first="Mumbai", last="Pune", chunk=120)
+    service.flush(close_all=True)
+
+    [trip] = service.emitted
+    assert set(trip) - {"charging_stops"} <= set(TRIP_FIELDS)
+    assert (trip["start_location"], trip["end_location"]) == ("Mumbai", "Pune")
+    assert trip["distance_km"] == pytest.approx(72 * 3590 / 3600, abs=0.1)
+    assert trip["start_battery_percent"] == 80.0 and trip["end_battery_percent"] == pytest.approx(62.05, abs=0.1)
+    assert trip["energy_used_kwh"] == pytest.approx(17.95 * 50 / 100, abs=0.05)
+    assert trip["efficiency_kwh_per_100km"] == pytest.approx(trip["energy_used_kwh"] / trip["distance_km"] * 100,
+                                                             abs=0.01)
+    assert trip["elevation_change_m"] == 359
+    assert (trip["traffic"], trip["weather"], trip["is_highway"]) == ("light", "sunny", True)
+    assert trip["driving_style"] == "eco" and trip["num_charging_stops"] == 0
+    assert service.stats()["trips_completed"] == 1
+
+
+@pytest.mark.parametrize("chunk, buffer", [(1, 16), (37, 64), (500, 1024)])
+def test_batching_does_not_change_the_trips(telemetry, monkeypatch, chunk, buffer):
+    _, service = telemetry
+    # Drive, charge, drive, a 15 min park (split), drive
+    drive = samples((1800, 50.0, -0.04, 0.5), (1200, 0.0, 0.25, 0.0), (1800, 80.0, -0.06, -0.5),
+                    (900, 0.0, 0.0, 0.0), (1200, 30.0, -0.03, 0.0))
+    locations = {0: "Mumbai", 479: "Pune", 570: "Pune", len(drive) - 1: "Goa"}
+    submit_ndjson(service, "reference", drive, locations, chunk=len(drive))
+    service.flush(close_all=True)
+
+    monkeypatch.setattr(settings, "TELEMETRY_BUFFER_SAMPLES", buffer)  # rollups mid-stream
+    submit_ndjson(service, "chunked", drive, locations, chunk=chunk)
+    service.flush(close_all=True)
+
+    by_user = {}
+    for trip in service.emitted:
+        by_user.setdefault(trip["user_id"], []).append(
+            {key: value for key, value in trip.items() if key not in ("trip_id", "user_id")})
+    assert [(trip["start_location"], trip["end_location"]) for trip in by_user["reference"]] == \
+        [("Mumbai", "Pune"), ("Pune", "Goa")]
+    assert len(by_user["chunked"]) == 2
+    for reference, chunked in zip(by_user["reference"], by_user["chunked"]):
+        assert chunked.keys() == reference.keys()
+        for key, value in reference.items():
+            if isinstance(value, float):
+                assert chunked[key] == pytest.approx(value, abs=0.02), key
+            else:
+                assert chunked[key] == value, key
+
+
+def test_charging_stops_stay_inside_the_trip(telemetry):
+    _, service = telemetry
+    # 30 min driving, a 20 min charge (+30 %), 30 min driving
+    submit(service, "user_001", samples((1800, 60.0, -0.1, 0.0), (1200, 0.0, 0.25, 0.0), (1800, 60.0, -0.1, 0.0)),
+           first="Pune", last="Goa", chunk=200)
+    service.flush(close_all=True)
+
+    [trip] = service.emitted
+    [stop] = trip["charging_stops"]
+    assert stop["charge_added"] == pytest.approx(30.0, abs=0.5)
+    assert stop["duration_mins"] == 20
+    assert stop["location"] == "Station at 30km"
+    assert trip["num_charging_stops"] == 1
+    assert trip["distance_km"] == pytest.approx(60.0, abs=0.5)
+
+
+def test_a_long_park_splits_trips(telemetry):
+    _, service = telemetry
+    first = samples((900, 40.0, -0.05, 0.0))
+    second = samples((900, 40.0, -0.05, 0.0), start=T0 + 900 + 3600)  # an hour later, parked, not charging
+    service.submit_binary("user_001", first.tobytes(), location="Mumbai", battery_kwh=50.0)
+    service.submit_binary("user_001", first[-1:].tobytes(), location="Pune")   # late: already buffered
+    service.submit_binary("user_001", second.tobytes(), location="Pune")
+    service.submit_binary("user_001", second[-2:].tobytes(), location="Goa")
+    service.flush(close_all=True)
+
+    routes = [(trip["start_location"], trip["end_location"]) for trip in service.emitted]
+    assert routes == [("Mumbai", "Pune"), ("Pune", "Goa")]
+    assert service.stats()["late_samples"] == 3
+
+
+def test_trips_without_a_route_or_too_short_are_not_stored(telemetry):
+    _, service = telemetry
+    submit(service, "no_markers", samples((1800, 60.0, -0.05, 0.0)))
+    submit(service, "start_only", samples((1800, 60.0, -0.05, 0.0)), first="Mumbai")
+    submit(service, "too_short", samples((30, 60.0, -0.05, 0.0)), first="Mumbai", last="Pune", chunk=1)
+    service.flush(close_all=True)
+
+    assert service.emitted == []
+    stats = service.stats()
+    assert (stats["trips_unlocated"], stats["trips_too_short"], stats["trips_completed"]) == (2, 1, 0)
+
+
+@pytest.mark.parametrize("field", ["ts", "soc", "speed_kmh", "elevation_m", "temperature_c"])
+def test_binary_samples_must_be_finite(telemetry, field):
+    module, service = telemetry
+    batch = samples((60, 50.0, -0.05, 0.0))
+    batch[field][2] = np.nan if field != "speed_kmh" else np.inf
+    with pytest.raises(module.TelemetryError, match=field):
+        service.submit_binary("user_001", batch.tobytes())
+    assert service.stats()["samples"] == 0
+
+
+def test_ndjson_input_is_validated(telemetry):
+    module, service = telemetry
+    line = {"user_id": "user_001", "ts": T0, "soc": 80, "speed_kmh": 50, "elevation_m": 0, "temperature_c": 25}
+    assert service.submit_ndjson(json.dumps(line).encode())["accepted"] == 1
+    for bad in ({**line, "soc": float("nan")}, {**line, "speed_kmh": float("inf")}, {**line, "battery_kwh": -5},
+                {key: value for key, value in line.items() if key != "ts"}):
+        with pytest.raises(module.TelemetryError, match="Line 2"):
+            service.submit_ndjson(b"\n".join([json.dumps(line).encode(), json.dumps(bad).encode()]))
+    with pytest.raises(module.TelemetryError, match="multiple of 24"):
+        service.submit_binary("user_001", b"\0" * 25)
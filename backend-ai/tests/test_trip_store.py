@@ -0,0 +1,90 @@
+"""
+Trip store: the aggregate triggers stay equal to a recomputation from trips
+"""
+
+import random
+import pytest
+
+
+def rows(store, sql: str) -> dict:
+    """key columns (marked with "|") -> remaining columns"""
+    keys = sql.count("|")
+    with store.connection() as conn:
+        return {tuple(row[:keys]): tuple(row[keys:]) for row in conn.execute(sql.replace("|", ""))}
+
+
+def assert_same(actual: dict, expected: dict):
+    assert actual.keys() == expected.keys()
+    for key, values in expected.items():
+        assert actual[key] == pytest.approx(values), key
+
+
+def assert_aggregates_match(store):
+    assert_same(
+        rows(store, "SELECT start_location|, end_location|, trips, sum_distance, sum_efficiency, min_efficiency, "
+                    "max_efficiency FROM route_aggregates"),
+        rows(store, "SELECT start_location|, end_location|, COUNT(*), SUM(distance_km), "
+                    "SUM(efficiency_kwh_per_100km), MIN(efficiency_kwh_per_100km), MAX(efficiency_kwh_per_100km) "
+                    "FROM trips GROUP BY start_location, end_location"))
+    assert_same(
+        rows(store, "SELECT user_id|, trips FROM user_aggregates"),
+        rows(store, "SELECT user_id|, COUNT(*) FROM trips GROUP BY user_id"))
+    assert_same(
+        rows(store, "SELECT id|, trips, users, sum_distance, sum_efficiency, min_efficiency, max_efficiency "
+                    "FROM global_aggregates"),
+        rows(store, "SELECT 1|, COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(distance_km), 0), "
+                    "COALESCE(SUM(efficiency_kwh_per_100km), 0), MIN(efficiency_kwh_per_100km), "
+                    "MAX(efficiency_kwh_per_100km) FROM trips"))
+
+
+def test_triggers_match_recomputation_after_inserts_updates_and_deletes(store, random_trip):
+    rng = random.Random(7)
+    trips = [random_trip(rng) for _ in range(200)]
+    store.upsert_trips(trips)
+    assert_aggregates_match(store)
+
+    # Edits move trips between routes and users (and change the extremes)
+    store.upsert_trips([random_trip(rng, trip_id=trip["trip_id"], date=trip["date"])
+                        for trip in rng.sample(trips, 60)])
+    assert_aggregates_match(store)
+
+    store.delete_trips([trip["trip_id"] for trip in rng.sample(trips, 80)])
+    assert_aggregates_match(store)
+
+
+def test_deleting_the_extreme_trips_recomputes_min_and_max(store, make_trip):
+    store.upsert_trips([make_trip(efficiency_kwh_per_100km=value) for value in (12.0, 16.0, 25.0)])
+    store.delete_trips(["trip_00000", "trip_00002"])
+    assert_aggregates_match(store)
+    assert store.global_stats()["most_efficient"] == store.global_stats()["least_efficient"] == 16.0
+
+
+def test_deleting_every_trip_empties_the_aggregates(store, make_trip):
+    trips = [make_trip(user_id=f"user_{i}") for i in range(5)]
+    store.upsert_trips(trips)
+    store.delete_trips([trip["trip_id"] for trip in trips])
+    assert_aggregates_match(store)
+    assert store.global_stats() == {"total_trips": 0}
+    assert store.distinct_locations() == []
+
+
+def test_rebuild_matches_triggers(store, random_trip):
+    rng = random.Random(11)
+    store.upsert_trips([random_trip(rng) for _ in range(100)])
+    queries = ("SELECT start_location|, end_location|, * FROM route_aggregates",
+               "SELECT user_id|, * FROM user_aggregates",
+               "SELECT id|, * FROM global_aggregates")
+    triggered = [rows(store, sql) for sql in queries]
+    store.rebuild_aggregates()
+    for sql, expected in zip(queries, triggered):
+        assert_same(rows(store, sql), expected)
+
+
+def test_popular_routes_and_locations_come_from_aggregates(store, make_trip):
+    store.upsert_trips([make_trip(start_location="Goa", end_location="Mumbai", distance_km=500.0),
+                        make_trip(start_location="Pune", end_location="Goa", efficiency_kwh_per_100km=12.0),
+                        make_trip(start_location="Pune", end_location="Goa", efficiency_kwh_per_100km=14.0)])
+    assert store.distinct_locations() == ["Goa", "Mumbai", "Pune"]
+    popular = store.popular_routes(limit=1)
+    assert len(popular) == 1
+    assert (popular[0]["count"], popular[0]["avg_efficiency"]) == (2, 13.0)
@@ -0,0 +1,72 @@
+"""
+Warm start: the served similarity index is restored from the snapshot written for the
+same index version and trip store, and rebuilt once either changed
+"""
+
+import pytest
+from app.core.config import settings
+from app.services.similarity_index import TripSimilarityIndex
+
+
+def test_content_stamp_follows_every_write(store, make_trip):
+    trips = [make_trip() for _ in range(3)]
+    empty = store.content_stamp()
+    store.upsert_trips(trips)
+    stamp = store.content_stamp()
+    assert stamp != empty
+
+    store.upsert_trips(trips[:1])  # an identical re-upload is not a change
+    assert store.content_stamp() == stamp
+    store.upsert_trips([{**trips[1], "weather": "cold"}])  # totals unchanged, the write counter moves
+    assert store.content_stamp() != stamp
+    stamp = store.content_stamp()
+    store.delete_trips([trips[2]["trip_id"]])
+    assert store.content_stamp() != stamp
+
+
+@pytest.fixture
+def served(rag_service, make_trip):
+    rag_service.trips.upsert_trips([make_trip(start_location=start, end_location=end, distance_km=distance)
+                                    for start, end, distance in (("Mumbai", "Pune", 150.0), ("Pune", "Goa", 450.0),
+                                                                 ("Goa", "Mumbai", 590.0))])
+    return rag_service
+
+
+def restart(rag_service) -> TripSimilarityIndex:
+    """What a new worker does at startup: a fresh (unbuilt) index, then the snapshot"""
+    rag_service.similarity = TripSimilarityIndex(rag_service.trips)
+    rag_service._snapshot_saved = None
+    rag_service._restore_snapshot()
+    return rag_service.similarity
+
+
+def test_a_saved_snapshot_is_mapped_at_startup(served, monkeypatch):
+    expected = served.similarity.nearest(3, "Mumbai", "Pune")
+    served.save_snapshot()
+
+    restored = restart(served)
+    monkeypatch.setattr(restored, "_build", lambda: pytest.fail("rebuilt despite a current snapshot"))
+    assert restored.nearest(3, "Mumbai", "Pune") == expected
+    assert served._snapshot_saved == served._snapshot_stamp()
+
+
+def test_nothing_is_written_before_the_index_is_built_or_when_unchanged(served, tmp_path, monkeypatch):
+    served.save_snapshot()  # never queried: nothing to save
+    assert not (tmp_path / settings.SNAPSHOT_DIR).exists()
+
+    served.similarity.nearest(1)
+    served.save_snapshot()
+    written = []
+    monkeypatch.setattr(served.similarity, "snapshot", lambda: written.append(1))
+    served.save_snapshot()
+    assert written == []
+
+
+def test_a_stale_snapshot_is_rebuilt(served, make_trip):
+    served.similarity.nearest(1)
+    served.save_snapshot()
+    served.trips.upsert_trips([make_trip(start_location="Kochi", end_location="Chennai", distance_km=690.0)])
+
+    restored = restart(served)
+    assert restored.snapshot() is None  # not restored: built from the store on first use
+    assert restored.route_profile("Kochi", "Chennai")[0] == 690.0